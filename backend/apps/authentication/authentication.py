@@ -0,0 +1,176 @@
+"""
+JWT authentication with in-process caching.
+
+The stock ``JWTAuthentication`` re-verifies the token signature and loads the
+user row on every request. ``CachedJWTAuthentication`` keeps verified claims
+in a bounded per-process LRU until the token's own ``exp``, resolves users
+from a short TTL cache, and checks revocation against a Bloom filter of the
+access-token revocation table so the database is only consulted on a (rare)
+positive.
+
+simplejwt's own blacklist only covers refresh tokens; access tokens are
+revoked with ``revoke_access_token`` (logout) and ``revoke_user``
+(deactivation, which also evicts the cached user in every process).
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from apps.core.bloom import BloomFilter
+
+from .models import AccessTokenRevocation
+
+
+class _ExpiringLRU:
+    """Thread-safe LRU whose entries also carry an absolute expiry time."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, expires):
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RevocationFilter:
+    """Access-token revocations, synced from ``AccessTokenRevocation``.
+
+    Revoked ``jti`` values go into a Bloom filter, so the database is only
+    consulted on a (rare) positive; per-user revocations are kept as
+    ``{user id: revoked at}`` and also evict the user from the user cache.
+    Rows written since the last sync are folded in every
+    ``JWT_REVOCATION_SYNC_SECONDS``, so another process notices a revocation
+    within that interval; the state is rebuilt from scratch every
+    ``JWT_REVOCATION_REBUILD_SECONDS`` so expired rows age out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._revoked_users = {}
+        self._since = None
+        self._synced_at = 0.0
+        self._built_at = 0.0
+
+    def _fold(self, rows):
+        for user_id, jti, created_at in rows:
+            if jti:
+                self._filter.add(jti)
+            else:
+                user_id = str(user_id)
+                self._revoked_users[user_id] = max(self._revoked_users.get(user_id, 0.0), created_at.timestamp())
+                _users.pop(user_id)
+
+    def _sync(self, now):
+        db_now = timezone.now()
+        rows = AccessTokenRevocation.objects.values_list('user_id', 'jti', 'created_at')
+        if self._filter is None or self._filter.is_full or now - self._built_at >= settings.JWT_REVOCATION_REBUILD_SECONDS:
+            rows = list(rows.filter(expires_at__gt=db_now))
+            self._filter = BloomFilter(capacity=max(1024, len(rows) * 2), error_rate=0.001)
+            self._revoked_users = {}
+            self._built_at = now
+        else:
+            rows = rows.filter(created_at__gte=self._since)
+        self._fold(rows)
+        # Overlap the next read by one interval so a row committed just after
+        # its created_at was stamped is not missed; folding it twice is harmless.
+        self._since = db_now - timedelta(seconds=settings.JWT_REVOCATION_SYNC_SECONDS)
+        self._synced_at = now
+
+    def is_revoked(self, jti, user_id, issued_at):
+        now = time.time()
+        if now - self._synced_at >= settings.JWT_REVOCATION_SYNC_SECONDS:
+            with self._lock:
+                if now - self._synced_at >= settings.JWT_REVOCATION_SYNC_SECONDS:
+                    self._sync(now)
+        revoked_at = self._revoked_users.get(str(user_id))
+        if revoked_at is not None and (issued_at is None or issued_at <= revoked_at):
+            return True
+        return bool(jti) and jti in self._filter and AccessTokenRevocation.objects.filter(jti=jti).exists()
+
+    def note(self, user_id, jti, created_at):
+        """Apply a revocation made by this process without waiting for the next sync."""
+        with self._lock:
+            if self._filter is not None:
+                self._fold([(user_id, jti, created_at)])
+
+
+_claims = _ExpiringLRU(settings.JWT_CLAIMS_CACHE_SIZE)
+_users = _ExpiringLRU(settings.JWT_CLAIMS_CACHE_SIZE)
+revocations = RevocationFilter()
+
+
+def revoke_access_token(token):
+    """Revoke one validated access token before it expires, e.g. on logout."""
+    row = AccessTokenRevocation.objects.create(
+        user_id=token[api_settings.USER_ID_CLAIM], jti=token[api_settings.JTI_CLAIM],
+        expires_at=datetime_from_epoch(token['exp']),
+    )
+    revocations.note(row.user_id, row.jti, row.created_at)
+
+
+def revoke_user(user_id):
+    """Revoke every access token ``user_id`` holds and drop the cached user, e.g. on deactivation.
+
+    Other processes stop accepting the tokens within ``JWT_REVOCATION_SYNC_SECONDS``.
+    """
+    row = AccessTokenRevocation.objects.create(
+        user_id=user_id, expires_at=timezone.now() + api_settings.ACCESS_TOKEN_LIFETIME,
+    )
+    _users.pop(str(user_id))
+    revocations.note(user_id, '', row.created_at)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = _claims.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            _claims.put(raw_token, token, token.payload['exp'])
+
+        payload = token.payload
+        if revocations.is_revoked(payload.get(api_settings.JTI_CLAIM), payload.get(api_settings.USER_ID_CLAIM),
+                                  payload.get('iat')):
+            _claims.pop(raw_token)
+            raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_not_valid'})
+        return token
+
+    def get_user(self, validated_token):
+        user_id = str(validated_token.payload.get(api_settings.USER_ID_CLAIM))
+        user = _users.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            _users.put(user_id, user, time.time() + settings.JWT_USER_CACHE_SECONDS)
+        # Callers may mutate request.user; never hand out the shared instance.
+        return copy.copy(user)
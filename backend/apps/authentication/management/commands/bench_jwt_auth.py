@@ -0,0 +1,28 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.authentication import CachedJWTAuthentication
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request JWT authentication cost with and without caching.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20_000)
+
+    def handle(self, *args, requests, **options):
+        user, _ = get_user_model().objects.get_or_create(username='bench-jwt-auth')
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        for label, auth in (('JWTAuthentication', JWTAuthentication()), ('CachedJWTAuthentication', CachedJWTAuthentication())):
+            auth.authenticate(request)
+            started = time.perf_counter()
+            for _ in range(requests):
+                auth.authenticate(request)
+            per_request = (time.perf_counter() - started) / requests
+            self.stdout.write(f'{label:<26} {per_request * 1e6:8.1f} us/request')
@@ -0,0 +1,34 @@
+"""
+Access-token revocation.
+"""
+
+from django.conf import settings
+from django.db import models
+
+
+class AccessTokenRevocation(models.Model):
+    """An access token revoked before its ``exp``.
+
+    simplejwt's blacklist only holds refresh tokens, so a stolen access token
+    stays valid until it expires. A row with ``jti`` set revokes that one
+    token (logout); a row with a blank ``jti`` revokes every access token of
+    ``user`` issued before ``created_at`` (deactivation, logout everywhere).
+    Rows are useless once ``expires_at`` passes and are flushed periodically.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    jti = models.CharField(max_length=255, blank=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'authentication_access_token_revocation'
+        indexes = [
+            models.Index(fields=['jti'], condition=~models.Q(jti=''), name='access_revocation_jti_idx'),
+            # Each process reads the rows added since its last sync.
+            models.Index(fields=['created_at'], name='access_revocation_created_idx'),
+            models.Index(fields=['expires_at'], name='access_revocation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.jti or "all tokens"}'
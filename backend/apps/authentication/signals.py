@@ -0,0 +1,17 @@
+"""
+Signal handlers for the authentication app.
+"""
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .authentication import revoke_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='authentication.revoke_deactivated_user')
+def revoke_deactivated_user(sender, instance, created, update_fields=None, **kwargs):
+    # Queryset updates (account deletion) skip this and call revoke_user themselves.
+    if created or instance.is_active or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    revoke_user(instance.pk)
@@ -0,0 +1,14 @@
+"""
+Celery tasks for the authentication app.
+"""
+
+from celery import shared_task
+from django.utils import timezone
+
+from .models import AccessTokenRevocation
+
+
+@shared_task(ignore_result=True)
+def flush_access_token_revocations():
+    """Drop revocations whose tokens have expired anyway."""
+    AccessTokenRevocation.objects.filter(expires_at__lte=timezone.now()).delete()
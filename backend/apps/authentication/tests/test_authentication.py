@@ -0,0 +1,126 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication import authentication
+from apps.authentication.authentication import CachedJWTAuthentication, revoke_access_token
+from apps.authentication.models import AccessTokenRevocation
+from apps.users.deletion import request_account_deletion
+from apps.users.models import User
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch, settings):
+    settings.JWT_REVOCATION_SYNC_SECONDS = 5
+    monkeypatch.setattr(authentication, '_claims', authentication._ExpiringLRU(100))
+    monkeypatch.setattr(authentication, '_users', authentication._ExpiringLRU(100))
+    monkeypatch.setattr(authentication, 'revocations', authentication.RevocationFilter())
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create(username='alice')
+
+
+def authenticate(token):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    return CachedJWTAuthentication().authenticate(request)
+
+
+def test_logout_revokes_only_that_access_token(user):
+    token, other = AccessToken.for_user(user), AccessToken.for_user(user)
+    assert authenticate(token)[0].pk == user.pk
+
+    revoke_access_token(token)
+
+    with pytest.raises(InvalidToken):
+        authenticate(token)
+    assert authenticate(other)[0].pk == user.pk
+
+
+def test_other_processes_see_a_revocation_at_their_next_sync(user):
+    token = AccessToken.for_user(user)
+    authenticate(token)
+    # Written by another process: this one only learns about it when it syncs.
+    AccessTokenRevocation.objects.create(
+        user=user, jti=token['jti'], expires_at=timezone.now() + timedelta(minutes=5),
+    )
+    assert authenticate(token)[0].pk == user.pk
+
+    with mock.patch('apps.authentication.authentication.time.time', return_value=time.time() + 6):
+        with pytest.raises(InvalidToken):
+            authenticate(token)
+
+
+def test_deactivation_evicts_the_cached_user_in_other_processes(user):
+    token = AccessToken.for_user(user)
+    authenticate(token)
+    # Another process deactivated the user; this one still holds the cached row.
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    AccessTokenRevocation.objects.create(user=user, expires_at=timezone.now() + timedelta(minutes=5))
+
+    with mock.patch('apps.authentication.authentication.time.time', return_value=time.time() + 6):
+        with pytest.raises(InvalidToken):
+            authenticate(token)
+    assert authentication._users.get(str(user.pk)) is None
+
+
+def test_saving_an_inactive_user_revokes_their_tokens(user):
+    token = AccessToken.for_user(user)
+    authenticate(token)
+
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+
+    with pytest.raises(InvalidToken):
+        authenticate(token)
+    assert AccessTokenRevocation.objects.filter(user=user, jti='').count() == 1
+
+
+def test_unrelated_saves_do_not_revoke(user):
+    user.first_name = 'Alice'
+    user.save()
+    user.is_active = False
+    user.save(update_fields=['first_name'])
+
+    assert not AccessTokenRevocation.objects.exists()
+
+
+def test_reactivated_user_can_sign_in_with_a_new_token(user):
+    user.is_active = False
+    user.save()
+    user.is_active = True
+    user.save()
+    # Tokens carry whole seconds: move the revocation before this one's iat.
+    AccessTokenRevocation.objects.update(created_at=timezone.now() - timedelta(seconds=2))
+    authentication.revocations = authentication.RevocationFilter()
+
+    token = AccessToken.for_user(user)
+    assert authenticate(token)[0].pk == user.pk
+
+
+def test_account_deletion_revokes_and_waits_for_every_process_to_sync(user, django_capture_on_commit_callbacks):
+    token = AccessToken.for_user(user)
+    authenticate(token)
+
+    with mock.patch('apps.users.tasks.delete_account.apply_async') as apply_async:
+        with django_capture_on_commit_callbacks(execute=True):
+            request_account_deletion(user)
+
+    with pytest.raises(InvalidToken):
+        authenticate(token)
+    apply_async.assert_called_once_with((user.pk,), countdown=5)
+
+
+def test_inactive_user_is_rejected_once_the_cache_is_gone(user):
+    token = AccessToken.for_user(user)
+    User.objects.filter(pk=user.pk).update(is_active=False)
+
+    with pytest.raises(AuthenticationFailed):
+        authenticate(token)
@@ -0,0 +1,351 @@
+"""
+Admin building blocks for very large tables.
+
+The stock changelist is built for small tables. Every page runs an exact
+``COUNT(*)`` (two, with ``show_full_result_count``), paginates with OFFSET,
+and offers filters and ``icontains`` searches that the database can only
+answer with a sequential scan. On swipes, interactions or notifications that
+is seconds to minutes per page view. LargeTableAdminMixin changes that:
+
+* counts come from the planner: ``pg_class.reltuples`` for the whole table,
+  the EXPLAIN row estimate for a filtered one. Exact ``COUNT(*)`` is only run
+  when the estimate is below ``ADMIN_ESTIMATED_COUNT_THRESHOLD``;
+* with the default primary-key ordering, pages are fetched by keyset
+  (``?after=<pk>``) rather than OFFSET, so page 10,000 costs the same as page 1.
+  Sorting by a column falls back to numbered pages;
+* list filters on columns that no index leads with are dropped. Searches
+  only use indexable lookups: ``=field`` (exact match) and ``^field``
+  (prefix, which needs a ``varchar_pattern_ops`` index). The admin system
+  checks (``manage.py check``) report each dropped filter or search field,
+  with the index that would make it usable.
+
+ExactInputFilter is a text-box filter for indexed columns such as foreign
+keys, where RelatedFieldListFilter would list the whole related table.
+"""
+
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core import checks
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import Counter, FeatureFlag, JobCheckpoint
+
+CURSOR_VAR = 'after'
+PATTERN_OPCLASSES = {'varchar_pattern_ops', 'text_pattern_ops'}
+
+
+def estimated_count(queryset):
+    """Planner estimate of ``queryset.count()``, or None when one isn't available."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+            # -1 until the table has been vacuumed or analyzed.
+            return row[0] if row and row[0] >= 0 else None
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            # queryset.none(), e.g. a search no field could match: nothing to plan.
+            return 0
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose ``count`` is a planner estimate once the table is large."""
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list) if hasattr(self.object_list, 'query') else None
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            self.estimated = True
+            return estimate
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList that pages by primary key when the listing is ordered by it."""
+
+    def __init__(self, request, *args, **kwargs):
+        # Read before super().__init__, which ends by calling get_results().
+        self.keyset_after = request.GET.get(CURSOR_VAR) or None
+        self.next_cursor = None
+        self.keyset = False
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def _keyset_descending(self):
+        """True/False for a pk-only ordering, None when the listing is sorted otherwise."""
+        # ChangeList may repeat the pk tie-breaker; duplicates don't change the order.
+        ordering = list(dict.fromkeys(self.queryset.query.order_by))
+        if len(ordering) != 1 or not isinstance(ordering[0], str):
+            return None
+        name = ordering[0].lstrip('-')
+        pk = self.lookup_opts.pk
+        if name not in ('pk', pk.name, pk.attname):
+            return None
+        return ordering[0].startswith('-')
+
+    def get_results(self, request):
+        descending = self._keyset_descending()
+        if descending is None or self.show_all:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        if self.keyset_after is not None:
+            try:
+                after = self.lookup_opts.pk.to_python(self.keyset_after)
+            except ValidationError:
+                raise IncorrectLookupParameters
+            queryset = queryset.filter(pk__lt=after) if descending else queryset.filter(pk__gt=after)
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            self.next_cursor = rows[-1].pk
+
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = self.keyset_after is not None or self.next_cursor is not None
+        self.paginator = paginator
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing filters, search or ordering starts over from the first page.
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or ()), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def next_page_query(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, [PAGE_VAR])
+
+    @property
+    def first_page_query(self):
+        return self.get_query_string(remove=[PAGE_VAR])
+
+
+class ExactInputFilter(admin.FieldListFilter):
+    """Free-text ``field = value`` filter, for indexed columns with too many values to list."""
+
+    template = 'admin/exact_input_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'parameter': self.lookup_kwarg,
+            'value': self.lookup_val or '',
+            # Keep the other filters, search and ordering when this form is submitted.
+            'hidden': [
+                (key, value) for key, value in changelist.params.items()
+                if key not in (self.lookup_kwarg, CURSOR_VAR, PAGE_VAR)
+            ],
+            'clear_query': changelist.get_query_string(remove=[self.lookup_kwarg]),
+        }
+
+
+# -- index introspection -------------------------------------------------------
+
+def _leading_columns(model, pattern_ops=False):
+    """Field names that lead some full (non-partial) index on ``model``'s table."""
+    opts = model._meta
+    leading = set()
+    if not pattern_ops:
+        for f in opts.concrete_fields:
+            if f.primary_key or f.unique or f.db_index:
+                leading.add(f.name)
+        for fields in opts.unique_together:
+            leading.add(fields[0])
+    for index in opts.indexes:
+        if index.condition is not None or not index.fields:
+            continue
+        if pattern_ops and not PATTERN_OPCLASSES.intersection(index.opclasses[:1]):
+            continue
+        if not pattern_ops and index.opclasses:
+            continue
+        leading.add(index.fields[0].lstrip('-'))
+    if not pattern_ops:
+        for constraint in opts.constraints:
+            if isinstance(constraint, models.UniqueConstraint) and constraint.fields and constraint.condition is None:
+                leading.add(constraint.fields[0])
+    return leading
+
+
+def _local_field(model, path):
+    try:
+        return model._meta.get_field(path)
+    except FieldDoesNotExist:
+        return None
+
+
+def _index_name(model, field, suffix):
+    return f'{model._meta.model_name}_{field}_{suffix}'[:30]
+
+
+def filter_field_name(entry):
+    """Field name a list_filter entry filters on, or None for custom filter classes."""
+    if isinstance(entry, (tuple, list)):
+        entry = entry[0]
+    return entry if isinstance(entry, str) else None
+
+
+def is_indexed_filter(model, entry):
+    name = filter_field_name(entry)
+    if name is None:
+        # SimpleListFilter subclasses write their own queries; trust them.
+        return True
+    return '__' not in name and name in _leading_columns(model)
+
+
+def split_search_field(entry):
+    """``('exact' | 'startswith' | None, field name)`` for a search_fields entry."""
+    if entry.startswith('='):
+        return 'exact', entry[1:]
+    if entry.startswith('^'):
+        return 'startswith', entry[1:]
+    return None, entry.lstrip('@')
+
+
+def is_indexed_search(model, entry):
+    lookup, name = split_search_field(entry)
+    if lookup is None or '__' in name:
+        return False
+    return name in _leading_columns(model, pattern_ops=lookup == 'startswith')
+
+
+def index_suggestions(model, list_filter=(), search_fields=()):
+    """``(setting, entry, hint)`` for every filter or search field no index serves."""
+    suggestions = []
+    for entry in list_filter:
+        if is_indexed_filter(model, entry):
+            continue
+        name = filter_field_name(entry)
+        if '__' in name:
+            hint = 'Filter on a local, indexed column instead of across a relation.'
+        else:
+            hint = f"Add models.Index(fields=['{name}'], name='{_index_name(model, name, 'idx')}')."
+        suggestions.append(('list_filter', name, hint))
+    for entry in search_fields:
+        if is_indexed_search(model, entry):
+            continue
+        lookup, name = split_search_field(entry)
+        if lookup == 'exact':
+            hint = f"Add models.Index(fields=['{name}'], name='{_index_name(model, name, 'idx')}')."
+        elif lookup == 'startswith':
+            hint = (f"Add models.Index(fields=['{name}'], name='{_index_name(model, name, 'prefix_idx')}', "
+                    f"opclasses=['varchar_pattern_ops']).")
+        else:
+            hint = f"Use '={name}' (exact) or '^{name}' (prefix) on an indexed column; substring search cannot use a btree."
+        suggestions.append(('search_fields', entry, hint))
+    return suggestions
+
+
+class LargeTableAdminMixin:
+    """ModelAdmin mixin for tables too large for exact counts, OFFSET paging or unindexed filters."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_list_filter(self, request):
+        return [entry for entry in super().get_list_filter(request) if is_indexed_filter(self.model, entry)]
+
+    def get_search_fields(self, request):
+        return [entry for entry in super().get_search_fields(request) if is_indexed_search(self.model, entry)]
+
+    def get_search_results(self, request, queryset, search_term):
+        """OR of exact / prefix matches over the search fields; never a substring scan."""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        condition = Q()
+        for entry in self.get_search_fields(request):
+            lookup, name = split_search_field(entry)
+            field = self.model._meta.get_field(name)
+            try:
+                value = field.to_python(search_term)
+            except ValidationError:
+                continue
+            condition |= Q(**{f'{field.attname}__{lookup}': value})
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), False
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        for setting, entry, hint in index_suggestions(self.model, self.list_filter, self.search_fields):
+            errors.append(checks.Warning(
+                f'{setting} entry {entry!r} on {type(self).__name__} is not served by an index and is ignored.',
+                hint=hint,
+                obj=type(self),
+                id='core.W001',
+            ))
+        if self.date_hierarchy:
+            errors.append(checks.Warning(
+                f'date_hierarchy on {type(self).__name__} aggregates the whole table on every page view.',
+                hint='Use a date-range list_filter on an indexed column instead.',
+                obj=type(self),
+                id='core.W002',
+            ))
+        return errors
+
+
+@admin.register(JobCheckpoint)
+class JobCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'updated_at')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+@admin.register(FeatureFlag)
+class FeatureFlagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'enabled', 'rollout_percent', 'description', 'updated_at')
+    list_editable = ('enabled', 'rollout_percent')
+    search_fields = ('name',)
+
+
+@admin.register(Counter)
+class CounterAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'key', 'value', 'updated_at')
+    search_fields = ('^key',)
+    # Totals are owned by fold_counters(); an edit here would be overwritten or double counted.
+    readonly_fields = ('key', 'value', 'updated_at')
@@ -0,0 +1,56 @@
+"""
+Helpers for walking large tables in bounded chunks.
+
+OFFSET pagination re-reads every skipped row, so a walk over N rows costs
+O(N^2). Keyset pagination seeks past the last key of the previous chunk and
+costs one index range scan per chunk no matter how deep the walk is.
+"""
+
+from django.db.models import Q
+
+
+def keyset_after(fields, values):
+    """Build the ``(f1, f2, ...) > (v1, v2, ...)`` row comparison as a Q.
+
+    The OR of per-column terms is what the comparison means, but Postgres can
+    only apply it as a filter. The leading ``f1 >= v1`` conjunct is implied by
+    it and gives the planner an index range to seek into.
+    """
+    condition = Q()
+    for i, field in enumerate(fields):
+        term = Q(**{f'{field}__gt': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            term &= Q(**{prev_field: prev_value})
+        condition |= term
+    if len(fields) > 1:
+        condition = Q(**{f'{fields[0]}__gte': values[0]}) & condition
+    return condition
+
+
+def row_key(row, fields):
+    """Extract the keyset tuple from a model instance or a ``.values()`` dict."""
+    if isinstance(row, dict):
+        return tuple(row[f] for f in fields)
+    return tuple(getattr(row, f) for f in fields)
+
+
+def keyset_chunks(queryset, batch_size, *, fields=('pk',), after=None):
+    """Yield ``(rows, last_key)`` for ``queryset`` in ``fields`` order.
+
+    ``fields`` must form a unique key (append ``'pk'`` as a tie-breaker) and
+    should be covered by an index. Pass a previously yielded ``last_key`` as
+    ``after`` to resume a walk.
+    """
+    fields = tuple(fields)
+    queryset = queryset.order_by(*fields)
+    while True:
+        page = queryset
+        if after is not None:
+            page = page.filter(keyset_after(fields, after))
+        rows = list(page[:batch_size])
+        if not rows:
+            return
+        after = row_key(rows[-1], fields)
+        yield rows, after
+        if len(rows) < batch_size:
+            return
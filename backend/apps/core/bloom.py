@@ -0,0 +1,96 @@
+"""
+Bloom filters.
+
+A Bloom filter answers "definitely not present" or "probably present" in a
+fixed number of bit probes, so it can sit in front of a slow exact check and
+absorb almost every negative lookup.
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity, error_rate=0.001, bits=None, count=0):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        size = (self.num_bits + 7) // 8
+        # Persisted bitmaps may come back short (trailing zero bytes trimmed).
+        self.bits = bytearray(bits or b'').ljust(size, b'\0')
+        self.count = count
+
+    def positions(self, item):
+        if isinstance(item, str):
+            item = item.encode()
+        elif isinstance(item, int):
+            item = item.to_bytes(8, 'little', signed=True)
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        # Kirsch-Mitzenmacher: k probes from two independent 64-bit hashes.
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for pos in self.positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(item))
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows by stacking layers as items are added.
+
+    Layer ``i`` holds ``initial_capacity * growth**i`` items at
+    ``error_rate * tightening**i``, which bounds the compound false-positive
+    rate by ``error_rate / (1 - tightening)`` however large the set gets.
+    """
+
+    def __init__(self, initial_capacity=1000, error_rate=0.001, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.layers = []
+
+    def layer_params(self, index):
+        return (
+            self.initial_capacity * self.growth ** index,
+            self.error_rate * self.tightening ** index,
+        )
+
+    def new_layer(self, bits=None, count=0):
+        capacity, error_rate = self.layer_params(len(self.layers))
+        layer = BloomFilter(capacity, error_rate, bits=bits, count=count)
+        self.layers.append(layer)
+        return layer
+
+    def add(self, item):
+        if not self.layers or self.layers[-1].is_full:
+            self.new_layer()
+        self.layers[-1].add(item)
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        return any(item in layer for layer in self.layers)
+
+    def __len__(self):
+        return sum(layer.count for layer in self.layers)
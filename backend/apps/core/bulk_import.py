@@ -0,0 +1,383 @@
+"""
+Streaming bulk imports through PostgreSQL COPY.
+
+django-import-export's ``Resource.import_data`` handles one row at a time:
+instantiate, ``full_clean``, ``save``, and often a ``SELECT`` to find the
+existing row first. That is fine for a few hundred coupons and hopeless for a
+million vocabulary rows. CopyImporter takes the same column mapping (straight
+from a Resource via ``from_resource`` if there is one) and:
+
+* streams the file in ``BULK_IMPORT_CHUNK_ROWS`` chunks (CSV through
+  pandas, XLSX through openpyxl's read-only reader), so memory stays flat;
+* validates each chunk column by column with vectorized pandas operations
+  (type coercion, defaults for blank cells, required values, max_length,
+  decimal places, choices, e-mail shape),
+  recording row-level errors and dropping the offending rows instead of
+  aborting;
+* COPYs the surviving rows into a temporary staging table with the target
+  columns' types;
+* checks foreign keys with one anti-join per column, again turning misses
+  into row errors;
+* merges the staging table into the target with a single
+  ``INSERT ... SELECT ... ON CONFLICT (key) DO UPDATE``. When a key repeats
+  in the file, the last row wins.
+
+Only the merge runs in a transaction, so the target table is written (and
+locked) once, briefly, at the end.
+"""
+
+import csv
+import io
+import logging
+import os
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+
+import pandas as pd
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ROW_COLUMN = '_row'
+NULL = r'\N'
+TRUE_VALUES = frozenset({'1', 't', 'true', 'y', 'yes', 'on'})
+FALSE_VALUES = frozenset({'0', 'f', 'false', 'n', 'no', 'off'})
+EMAIL_PATTERN = r'[^\s@]+@[^\s@]+\.[^\s@]+'
+
+# Covers the Big/Small/Positive variants and every AutoField too.
+INTEGER_FIELDS = (models.IntegerField,)
+TEXT_FIELDS = (models.CharField, models.TextField)
+
+
+def _decimal_places(text):
+    return max(-Decimal(text).as_tuple().exponent, 0)
+
+
+def _is_xlsx(path):
+    return os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm')
+
+
+def read_headers(path):
+    """Column names from the first row of a CSV or XLSX file."""
+    if not _is_xlsx(path):
+        return list(pd.read_csv(path, dtype=str, nrows=0).columns)
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        first = next(workbook.active.iter_rows(values_only=True), ())
+        return [str(h).strip() for h in first if h is not None]
+    finally:
+        workbook.close()
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    error_count: int = 0
+    # (row number, column, value, message); capped at BULK_IMPORT_MAX_REPORTED_ERRORS.
+    errors: list = field(default_factory=list)
+
+    @property
+    def skipped(self):
+        return self.rows - self.inserted - self.updated
+
+
+class CopyImporter:
+    """Import a CSV/XLSX file into ``model`` via COPY and a set-based merge.
+
+    ``columns`` maps file headers to model field names; ``key`` lists the
+    fields identifying an existing row (they must carry a unique constraint).
+    Without a key every row is inserted.
+    """
+
+    def __init__(self, model, columns, *, key=(), chunk_rows=None, error_writer=None):
+        self.model = model
+        self.meta = model._meta
+        self.fields = [self.meta.get_field(name) for name in columns.values()]
+        # Header -> field name (an FK given as ``user_id`` becomes ``user``).
+        self.columns = {header: f.name for header, f in zip(columns, self.fields)}
+        self.key = [self.meta.get_field(name) for name in key]
+        self.chunk_rows = chunk_rows or settings.BULK_IMPORT_CHUNK_ROWS
+        self.error_writer = error_writer
+        self.result = ImportResult()
+        self.stage_table = f'import_stage_{self.meta.db_table}'
+
+        for f in self.fields:
+            if not f.concrete or f.many_to_many or not self._supported(f):
+                raise ValueError(f'{self.meta.label}.{f.name} cannot be imported with COPY')
+        for f in self.key:
+            if f not in self.fields:
+                raise ValueError(f'Key field {f.name} is not among the imported columns')
+        self.defaults = self._insert_defaults()
+
+    @classmethod
+    def from_resource(cls, resource, **kwargs):
+        """Build an importer from a django-import-export ModelResource (instance or class)."""
+        if isinstance(resource, type):
+            resource = resource()
+        columns = {}
+        for f in resource.get_import_fields():
+            if '__' in (f.attribute or ''):
+                raise ValueError(f'Column {f.column_name} follows a relation; not supported by COPY imports')
+            if f.attribute:
+                columns[f.column_name] = f.attribute
+        key = [f.attribute for f in resource.get_import_id_fields_instances()] \
+            if hasattr(resource, 'get_import_id_fields_instances') else list(resource.get_import_id_fields())
+        if key == ['id'] and 'id' not in columns.values():
+            key = []
+        return cls(resource._meta.model, columns, key=key, **kwargs)
+
+    @staticmethod
+    def _supported(f):
+        return isinstance(f, (*INTEGER_FIELDS, *TEXT_FIELDS, models.ForeignKey, models.BooleanField,
+                              models.FloatField, models.DecimalField, models.DateField, models.UUIDField))
+
+    def _insert_defaults(self):
+        """Constant values for non-null model fields the file does not provide."""
+        defaults = {}
+        for f in self.meta.concrete_fields:
+            if f in self.fields or (f.primary_key and isinstance(f, models.AutoField)):
+                continue
+            if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False):
+                defaults[f] = timezone.now()
+            elif f.has_default() or (f.empty_strings_allowed and not f.null):
+                # The second case is '' for text columns, as Model.save() would store.
+                defaults[f] = f.get_db_prep_save(f.get_default(), connection)
+            elif not f.null:
+                raise ValueError(f'{self.meta.label}.{f.name} is required but not among the imported columns')
+        return defaults
+
+    # -- reading -------------------------------------------------------------
+
+    def chunks(self, path):
+        """Yield DataFrames of raw string values, with the 1-based file row in ROW_COLUMN."""
+        if _is_xlsx(path):
+            frames = self._xlsx_chunks(path)
+        else:
+            frames = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=self.chunk_rows)
+        first_row = 2  # row 1 is the header
+        for frame in frames:
+            missing = set(self.columns) - set(frame.columns)
+            if missing:
+                raise ValueError(f'Missing columns: {", ".join(sorted(missing))}')
+            frame = frame[list(self.columns)].rename(columns=self.columns)
+            frame.insert(0, ROW_COLUMN, range(first_row, first_row + len(frame)))
+            first_row += len(frame)
+            yield frame.reset_index(drop=True)
+
+    def _xlsx_chunks(self, path):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+            width = len(header)
+            while True:
+                # Read-only sheets trim trailing empty cells; pad rows back to the header.
+                batch = [tuple(row[:width]) + (None,) * (width - len(row)) for row in islice(rows, self.chunk_rows)]
+                if not batch:
+                    return
+                frame = pd.DataFrame(batch, columns=header, dtype=object)
+                yield frame.map(lambda v: '' if v is None else str(v))
+        finally:
+            workbook.close()
+
+    # -- validation ----------------------------------------------------------
+
+    def validate(self, frame):
+        """Coerce ``frame`` column by column; return only the valid rows, ready for COPY."""
+        bad = pd.Series(False, index=frame.index)
+        out = pd.DataFrame({ROW_COLUMN: frame[ROW_COLUMN]})
+        for f in self.fields:
+            raw = frame[f.name].astype(str).str.strip()
+            blank = raw == ''
+            value, checks = self._coerce(f, raw, blank)
+            invalid = pd.Series(False, index=frame.index)
+            for mask, message in checks:
+                # One error per cell: the first check it fails.
+                mask = mask & ~blank & ~invalid
+                self._record(frame, mask, f, message)
+                invalid |= mask
+
+            text = isinstance(f, TEXT_FIELDS)
+            defaulted = f not in self.key and f.has_default()
+            if defaulted:
+                # What Model() would fill in; a callable default is called once per row.
+                fill = f.get_default()
+                if callable(f.default):
+                    fill = pd.Series([f.get_default() for _ in range(int(blank.sum()))],
+                                     index=raw.index[blank], dtype=object)
+                    value = value.astype(object)
+                value = value.where(~blank, fill)
+            elif not text or f.null:
+                # Blank text is '' unless the column is nullable, as Django would store it.
+                value = value.where(~blank, None)
+
+            if f.choices:
+                # After the defaults, so a default outside the choices is caught too.
+                staged = value.astype(str)
+                unknown = ~invalid & value.notna() & (staged != '')
+                unknown &= ~staged.isin([str(choice) for choice, _ in f.flatchoices])
+                self._record(frame, unknown, f, 'Select a valid choice.')
+                invalid |= unknown
+
+            optional = f not in self.key and (f.null or (text and f.blank) or defaulted)
+            required = blank & (not optional)
+            self._record(frame, required, f, 'This field is required.')
+            bad |= invalid | required
+            out[f.column] = value
+        return out[~bad]
+
+    def _coerce(self, f, raw, blank):
+        """``(values, [(invalid mask, message), ...])`` for one column; blank rows are ignored."""
+        if isinstance(f, (*INTEGER_FIELDS, models.ForeignKey)):
+            target = f.target_field if isinstance(f, models.ForeignKey) else f
+            if not isinstance(target, INTEGER_FIELDS):
+                return raw, []
+            number = pd.to_numeric(raw.where(~blank), errors='coerce')
+            invalid = number.isna() | (number != number.round())
+            low, high = connection.ops.integer_field_range(target.get_internal_type())
+            invalid |= (number < low) | (number > high)
+            return number.where(~invalid).astype('Int64'), [(invalid, 'Enter a whole number.')]
+        if isinstance(f, models.BooleanField):
+            lowered = raw.str.lower()
+            invalid = ~lowered.isin(TRUE_VALUES | FALSE_VALUES)
+            return lowered.isin(TRUE_VALUES), [(invalid, 'Enter true or false.')]
+        if isinstance(f, models.FloatField):
+            number = pd.to_numeric(raw.where(~blank), errors='coerce')
+            return number, [(number.isna(), 'Enter a number.')]
+        if isinstance(f, models.DecimalField):
+            number = pd.to_numeric(raw.where(~blank), errors='coerce')
+            whole_digits = f.max_digits - f.decimal_places
+            # Counted on the text, as DecimalValidator does: '1.50' has two places.
+            places = raw.where(number.abs() < float('inf'), '0').map(_decimal_places)
+            # Keep the original text so no precision is lost to floats.
+            return raw, [
+                (number.isna(), 'Enter a number.'),
+                (number.abs() >= 10 ** whole_digits,
+                 f'Ensure that there are no more than {whole_digits} digits before the decimal point.'),
+                (places > f.decimal_places, f'Ensure that there are no more than {f.decimal_places} decimal places.'),
+            ]
+        if isinstance(f, models.DateTimeField):
+            moment = pd.to_datetime(raw.where(~blank), errors='coerce', utc=True, format='mixed')
+            return moment.dt.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00'), [(moment.isna(), 'Enter a valid date/time.')]
+        if isinstance(f, models.DateField):
+            moment = pd.to_datetime(raw.where(~blank), errors='coerce', format='mixed')
+            return moment.dt.strftime('%Y-%m-%d'), [(moment.isna(), 'Enter a valid date.')]
+        if isinstance(f, models.UUIDField):
+            invalid = ~raw.str.fullmatch(r'[0-9a-fA-F]{8}-?([0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}')
+            return raw, [(invalid, 'Enter a valid UUID.')]
+
+        # Text: check the constraints Django's validators would.
+        checks = []
+        if f.max_length:
+            checks.append((raw.str.len() > f.max_length, f'Ensure this value has at most {f.max_length} characters.'))
+        if isinstance(f, models.EmailField):
+            raw = raw.str.lower()
+            checks.append((~raw.str.fullmatch(EMAIL_PATTERN), 'Enter a valid email address.'))
+        return raw, checks
+
+    def _record(self, frame, mask, f, message):
+        count = int(mask.sum())
+        if not count:
+            return
+        self.result.error_count += count
+        rows = frame.loc[mask, [ROW_COLUMN, f.name]].itertuples(index=False, name=None)
+        if self.error_writer is not None:
+            rows = list(rows)
+            self.error_writer.writerows((row, f.name, value, message) for row, value in rows)
+        room = settings.BULK_IMPORT_MAX_REPORTED_ERRORS - len(self.result.errors)
+        self.result.errors.extend((row, f.name, value, message) for row, value in islice(rows, max(room, 0)))
+
+    # -- loading -------------------------------------------------------------
+
+    def run(self, path):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.stage_table}')
+            self._create_stage(cursor)
+            try:
+                for frame in self.chunks(path):
+                    self.result.rows += len(frame)
+                    valid = self.validate(frame)
+                    self._copy(cursor, valid)
+                    logger.info('%s: staged %d rows', self.meta.label, self.result.rows)
+                self._check_foreign_keys(cursor)
+                with transaction.atomic():
+                    self._merge(cursor)
+            finally:
+                cursor.execute(f'DROP TABLE IF EXISTS {self.stage_table}')
+        return self.result
+
+    def _column_list(self, prefix=''):
+        return ', '.join(f'{prefix}{connection.ops.quote_name(f.column)}' for f in self.fields)
+
+    def _create_stage(self, cursor):
+        # Same column types as the target, none of its constraints.
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {self.stage_table} AS '
+            f'SELECT {self._column_list()} FROM {connection.ops.quote_name(self.meta.db_table)} WITH NO DATA'
+        )
+        cursor.execute(f'ALTER TABLE {self.stage_table} ADD COLUMN {ROW_COLUMN} bigint')
+
+    def _copy(self, cursor, frame):
+        if frame.empty:
+            return
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False, header=False, na_rep=NULL, quoting=csv.QUOTE_MINIMAL)
+        buffer.seek(0)
+        columns = ', '.join([ROW_COLUMN] + [connection.ops.quote_name(f.column) for f in self.fields])
+        cursor.copy_expert(
+            f"COPY {self.stage_table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{NULL}')", buffer,
+        )
+
+    def _check_foreign_keys(self, cursor):
+        qn = connection.ops.quote_name
+        for f in self.fields:
+            if not isinstance(f, models.ForeignKey) or f.db_constraint is False:
+                continue
+            target = f.target_field
+            cursor.execute(
+                f'DELETE FROM {self.stage_table} s WHERE s.{qn(f.column)} IS NOT NULL AND NOT EXISTS '
+                f'(SELECT 1 FROM {qn(target.model._meta.db_table)} t WHERE t.{qn(target.column)} = s.{qn(f.column)}) '
+                f'RETURNING s.{ROW_COLUMN}, s.{qn(f.column)}'
+            )
+            missing = cursor.fetchall()
+            if missing:
+                frame = pd.DataFrame(missing, columns=[ROW_COLUMN, f.name])
+                self._record(frame, pd.Series(True, index=frame.index), f,
+                             f'No {target.model._meta.verbose_name} with this {target.name}.')
+
+    def _merge(self, cursor):
+        qn = connection.ops.quote_name
+        default_fields = list(self.defaults)
+        insert_columns = self._column_list() + ''.join(f', {qn(f.column)}' for f in default_fields)
+        select = self._column_list('s.') + ', %s' * len(default_fields)
+        if self.key:
+            key = ', '.join(qn(f.column) for f in self.key)
+            source = (f'SELECT DISTINCT ON ({key}) {select} FROM {self.stage_table} s '
+                      f'ORDER BY {key}, s.{ROW_COLUMN} DESC')
+            updates = [f for f in self.fields if f not in self.key]
+            updates += [f for f in default_fields if getattr(f, 'auto_now', False)]
+            if updates:
+                assignments = ', '.join(f'{qn(f.column)} = EXCLUDED.{qn(f.column)}' for f in updates)
+                conflict = f' ON CONFLICT ({key}) DO UPDATE SET {assignments}'
+            else:
+                conflict = f' ON CONFLICT ({key}) DO NOTHING'
+        else:
+            source = f'SELECT {select} FROM {self.stage_table} s ORDER BY s.{ROW_COLUMN}'
+            conflict = ''
+        # xmax is 0 only on freshly inserted tuples, which tells inserts from updates.
+        cursor.execute(
+            f'WITH merged AS (INSERT INTO {qn(self.meta.db_table)} ({insert_columns}) {source}{conflict} '
+            f'RETURNING (xmax = 0) AS inserted) '
+            f'SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged',
+            [self.defaults[f] for f in default_fields],
+        )
+        self.result.inserted, self.result.updated = cursor.fetchone()
@@ -0,0 +1,40 @@
+"""
+Pub/Sub consumers for the core app.
+"""
+
+from redis.exceptions import RedisError
+
+from . import counters
+from .pubsub import Consumer, PermanentError
+
+
+class CounterConsumer(Consumer):
+    """Counter deltas published by the app and Cloud Functions, one document per message.
+
+    Payload: ``{"path": "communities/abc", "deltas": {"memberCount": 1}}``.
+    The message id is the dedupe id, so a redelivered message is counted once.
+    """
+
+    subscription = 'counter-increments'
+    topic = 'counter-increments'
+    dead_letter_topic = 'counter-increments-dead-letter'
+    batch_size = 500
+    batch_wait = 0.5
+
+    def handle_batch(self, messages):
+        failures, items = {}, []
+        for message in messages:
+            try:
+                path, deltas = counters.parse_message(message.data)
+                if not deltas.keys() <= counters.FIELDS:
+                    raise ValueError(f'Not a sharded counter: {sorted(deltas.keys() - counters.FIELDS)}')
+            except (KeyError, TypeError, ValueError) as exc:
+                failures[message] = PermanentError(f'Malformed counter update: {exc}')
+                continue
+            items.append((message, (path, deltas, message.message_id)))
+
+        try:
+            counters.increment_many([item for _, item in items])
+        except RedisError as exc:
+            failures.update((message, exc) for message, _ in items)
+        return failures
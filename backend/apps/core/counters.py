@@ -0,0 +1,260 @@
+"""
+Sharded aggregate counters for hot Firestore documents.
+
+memberCount, attendeeCount, unreadCount and ratingSum/ratingCount are bumped
+with ``FieldValue.increment`` on a single document. Firestore sustains about
+one write per second per document, so a popular community or event becomes
+a queue of contended transactions. Counters routed through this module never
+write that document on the request path:
+
+* increment() adds its deltas to one of ``COUNTER_SHARDS`` Redis hashes,
+  chosen at random. It is one Lua call. All deltas of one call, e.g.
+  ratingSum plus ratingCount, land in the same shard together, and the
+  call is skipped if its ``dedupe_id`` was already seen. This makes Pub/Sub
+  redelivery safe.
+* fold_counters() runs every ten seconds from Celery beat. It takes one shard
+  at a time: the shard is renamed to a journal, which is O(1) and atomic, so
+  new increments start a fresh shard. The journal's sums are added to the
+  canonical Counter rows, and each changed document gets one Firestore
+  update carrying the absolute values.
+* get() / get_many() read the folded totals from a Redis hash and add any
+  deltas not folded yet. That is one MULTI round trip.
+
+Each journal carries a fold id. The Counter rows and the shard's
+JobCheckpoint are updated in one transaction, so a fold that crashes after
+committing is not applied twice. The next run sees the id already recorded
+and only drops the journal. Firestore receives absolute values, so
+re-sending them is harmless.
+
+A counter is the plain sum of its deltas. Reads and the Firestore copy
+clamp at zero, as the app already does for unreadCount. A decrement that
+overtakes its increment therefore never shows as negative. Once a field is
+routed here, nothing else should write it.
+"""
+
+import json
+import logging
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from .models import Counter, JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+FIELDS = frozenset({'memberCount', 'attendeeCount', 'unreadCount', 'ratingSum', 'ratingCount'})
+
+SHARD_KEY = 'greengo:counters:shard:{shard}'
+JOURNAL_KEY = 'greengo:counters:journal:{shard}'
+SEQUENCE_KEY = 'greengo:counters:sequence'
+TOTALS_KEY = 'greengo:counters:totals'
+DEDUPE_KEY = 'greengo:counters:seen:{dedupe_id}'
+FOLD_FIELD = '__fold'
+CHECKPOINT = 'core.counters.fold.{shard}'
+
+# KEYS: shard [, dedupe key]. ARGV: dedupe ttl, then field/delta pairs.
+INCREMENT_SCRIPT = """
+if #KEYS == 2 and not redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+# Moves the shard into an empty journal and stamps it with a fold id; returns
+# the id of the journal to fold, or 0 if there is nothing to fold.
+CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return 0
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('HSET', KEYS[2], ARGV[1], redis.call('INCR', KEYS[3]))
+end
+return tonumber(redis.call('HGET', KEYS[2], ARGV[1]))
+"""
+
+_scripts = {}
+
+
+def _script(source):
+    if source not in _scripts:
+        _scripts[source] = get_redis_connection('default').register_script(source)
+    return _scripts[source]
+
+
+def counter_key(path, field):
+    """``'communities/abc:memberCount'`` for field ``field`` of the document at ``path``."""
+    return f'{path}:{field}'
+
+
+def split_key(key):
+    path, _, field = key.rpartition(':')
+    return path, field
+
+
+def _increment_call(path, deltas, dedupe_id):
+    if not deltas.keys() <= FIELDS:
+        raise ValueError(f'Not a sharded counter: {sorted(deltas.keys() - FIELDS)}')
+    keys = [SHARD_KEY.format(shard=random.randrange(settings.COUNTER_SHARDS))]
+    if dedupe_id is not None:
+        keys.append(DEDUPE_KEY.format(dedupe_id=dedupe_id))
+    args = [settings.COUNTER_DEDUPE_SECONDS]
+    for field, delta in deltas.items():
+        args += [counter_key(path, field), int(delta)]
+    return keys, args
+
+
+def increment(path, deltas, dedupe_id=None):
+    """Add ``{field: delta}`` to the document's counters; False if ``dedupe_id`` was already applied."""
+    keys, args = _increment_call(path, deltas, dedupe_id)
+    return bool(_script(INCREMENT_SCRIPT)(keys=keys, args=args))
+
+
+def increment_many(items):
+    """increment() for each ``(path, deltas, dedupe_id)`` in one pipeline; returns a bool per item."""
+    script = _script(INCREMENT_SCRIPT)
+    with get_redis_connection('default').pipeline(transaction=False) as pipe:
+        for path, deltas, dedupe_id in items:
+            keys, args = _increment_call(path, deltas, dedupe_id)
+            script(keys=keys, args=args, client=pipe)
+        return [bool(applied) for applied in pipe.execute()]
+
+
+def get_many(keys):
+    """``{key: value}`` for counter keys: the folded total plus deltas not folded yet."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    # MULTI, so a fold cannot move deltas between shard, journal and totals mid-read.
+    with get_redis_connection('default').pipeline() as pipe:
+        pipe.hmget(TOTALS_KEY, keys)
+        for shard in range(settings.COUNTER_SHARDS):
+            pipe.hmget(SHARD_KEY.format(shard=shard), keys)
+            pipe.hmget(JOURNAL_KEY.format(shard=shard), keys)
+        totals, *pending = pipe.execute()
+
+    values = dict.fromkeys(keys, 0)
+    missing = [key for key, total in zip(keys, totals) if total is None]
+    if missing:
+        # Totals are rebuilt only by a fold or warm_totals(); fall back to the table meanwhile.
+        values.update(Counter.objects.filter(key__in=missing).values_list('key', 'value'))
+    for key, total in zip(keys, totals):
+        if total is not None:
+            values[key] = int(total)
+    for replies in pending:
+        for key, delta in zip(keys, replies):
+            if delta is not None:
+                values[key] += int(delta)
+    return {key: max(value, 0) for key, value in values.items()}
+
+
+def get(path, field):
+    key = counter_key(path, field)
+    return get_many([key])[key]
+
+
+def fold_shard(shard):
+    """Fold one shard into the Counter table; returns ``{key: new total}`` for the counters it changed."""
+    redis = get_redis_connection('default')
+    journal = JOURNAL_KEY.format(shard=shard)
+    fold_id = _script(CLAIM_SCRIPT)(
+        keys=[SHARD_KEY.format(shard=shard), journal, SEQUENCE_KEY], args=[FOLD_FIELD],
+    )
+    if not fold_id:
+        return {}
+    deltas = {key.decode(): int(delta) for key, delta in redis.hgetall(journal).items()}
+    deltas.pop(FOLD_FIELD, None)
+    checkpoint = CHECKPOINT.format(shard=shard)
+
+    with transaction.atomic():
+        if JobCheckpoint.load(checkpoint).get('fold', 0) >= fold_id:
+            # Applied by a run that died before dropping the journal.
+            totals = dict(Counter.objects.filter(key__in=list(deltas)).values_list('key', 'value'))
+        else:
+            totals = _apply(deltas)
+            JobCheckpoint.store(checkpoint, {'fold': fold_id})
+
+    with redis.pipeline() as pipe:
+        if totals:
+            pipe.hset(TOTALS_KEY, mapping=totals)
+        pipe.delete(journal)
+        pipe.execute()
+    return totals
+
+
+def _apply(deltas, chunk_size=1000):
+    keys = sorted(key for key, delta in deltas.items() if delta)
+    totals = {}
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        current = dict(
+            Counter.objects.select_for_update().filter(key__in=chunk).order_by('key').values_list('key', 'value')
+        )
+        rows = [Counter(key=key, value=current.get(key, 0) + deltas[key]) for key in chunk]
+        Counter.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['key'], update_fields=['value', 'updated_at'],
+        )
+        totals.update((row.key, row.value) for row in rows)
+    return totals
+
+
+def fold_counters(mirror=None):
+    """Fold every shard and copy the changed totals to Firestore; returns how many counters changed."""
+    totals = {}
+    for shard in range(settings.COUNTER_SHARDS):
+        totals.update(fold_shard(shard))
+    if totals and (settings.COUNTER_MIRROR_FIRESTORE if mirror is None else mirror):
+        mirror_to_firestore(totals)
+    return len(totals)
+
+
+def mirror_to_firestore(totals):
+    """Write ``{key: value}`` to Firestore, one update per document."""
+    # Imported here so processes that only increment don't load the Firestore client.
+    from .firestore_writer import BulkWriter
+
+    by_document = defaultdict(dict)
+    for key, value in totals.items():
+        path, field = split_key(key)
+        by_document[path][field] = max(value, 0)
+    with BulkWriter() as writer:
+        for path, fields in by_document.items():
+            writer.update(writer.client.document(path), fields)
+    if writer.result.failed:
+        logger.warning('Counter mirror: %d of %d documents failed: %s',
+                       writer.result.failed, len(by_document), writer.result.errors[:5])
+    return writer.result
+
+
+def warm_totals(chunk_size=10_000):
+    """Reload the Redis totals hash from the Counter table, e.g. after Redis lost it."""
+    redis = get_redis_connection('default')
+    loaded = 0
+    rows = Counter.objects.values_list('key', 'value').iterator(chunk_size=chunk_size)
+    batch = {}
+    for key, value in rows:
+        batch[key] = value
+        if len(batch) >= chunk_size:
+            redis.hset(TOTALS_KEY, mapping=batch)
+            loaded, batch = loaded + len(batch), {}
+    if batch:
+        redis.hset(TOTALS_KEY, mapping=batch)
+        loaded += len(batch)
+    return loaded
+
+
+def parse_message(data):
+    """``(path, deltas)`` from a ``{"path": ..., "deltas": {field: delta}}`` payload."""
+    payload = json.loads(data)
+    path, deltas = payload['path'], payload['deltas']
+    if not isinstance(path, str) or path.count('/') % 2 != 1:
+        raise ValueError(f'Not a document path: {path!r}')
+    if not deltas or not all(isinstance(delta, int) for delta in deltas.values()):
+        raise ValueError('Deltas must be a non-empty map of integers')
+    return path, deltas
@@ -0,0 +1,31 @@
+"""
+Lazily initialised Firebase Admin app and Firestore client shared by every backend module.
+"""
+
+import os
+from functools import lru_cache
+
+import firebase_admin
+from django.conf import settings
+from firebase_admin import credentials, firestore
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.firestore import Client
+
+
+def get_firebase_app():
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        cred = None
+        if settings.FIREBASE_ADMIN_CREDENTIALS:
+            cred = credentials.Certificate(settings.FIREBASE_ADMIN_CREDENTIALS)
+        return firebase_admin.initialize_app(cred, {'projectId': settings.GCP_PROJECT_ID})
+
+
+@lru_cache(maxsize=None)
+def get_firestore_client():
+    """Firestore client for the default app, or for the emulator when FIRESTORE_EMULATOR_HOST is set."""
+    if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        # The emulator accepts any credentials; don't require ADC on dev machines.
+        return Client(project=settings.GCP_PROJECT_ID, credentials=AnonymousCredentials())
+    return firestore.client(get_firebase_app())
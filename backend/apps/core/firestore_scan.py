@@ -0,0 +1,154 @@
+"""
+Parallel, partitioned reads of whole Firestore collections.
+
+Maintenance jobs over ``users``, ``messages`` or ``events`` used to page
+through a collection one query at a time, so a scan took as many round
+trips as it had pages. CollectionScanner splits the collection into
+contiguous document-id ranges and pages through them concurrently:
+
+* a plain collection is split on document-id prefixes. Auto ids and Auth
+  uids are uniform over ``[0-9A-Za-z]``, so equal slices of the two-character
+  prefix space hold roughly equal numbers of documents;
+* a collection group (e.g. every ``messages`` subcollection) uses Firestore's
+  partition query, which returns split points sampled from the real data.
+
+Each range is read in ``page_size`` pages ordered by document id, with an
+optional field projection. Pages are handed to the consumer through a bounded
+queue, so memory stays at roughly ``workers * 2`` pages whatever the
+collection size. Documents come out in no particular order.
+
+Workers are threads, not processes: the gRPC channel is not fork-safe and
+DocumentSnapshots do not pickle, and the scan is network-bound anyway.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import ascii_letters, digits
+
+from django.conf import settings
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from .firebase import get_firestore_client
+from .firestore_writer import RETRYABLE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Firestore orders document ids by their UTF-8 bytes.
+ID_ALPHABET = ''.join(sorted(digits + ascii_letters))
+_DONE = object()
+
+
+def id_split_points(partitions):
+    """Two-character id prefixes cutting the id space into ``partitions`` equal ranges."""
+    prefixes = len(ID_ALPHABET) ** 2
+    points = []
+    for i in range(1, partitions):
+        n = i * prefixes // partitions
+        points.append(ID_ALPHABET[n // len(ID_ALPHABET)] + ID_ALPHABET[n % len(ID_ALPHABET)])
+    return sorted(set(points))
+
+
+class CollectionScanner:
+    """Stream every document of a collection (or collection group) from parallel id ranges."""
+
+    def __init__(self, collection, *, client=None, group=False, fields=None, partitions=None,
+                 workers=None, page_size=None, max_attempts=None):
+        self.client = client or get_firestore_client()
+        self.collection = collection
+        self.group = group
+        self.fields = fields
+        self.workers = workers or settings.FIRESTORE_SCAN_WORKERS
+        self.partitions = partitions or self.workers * 4
+        self.page_size = page_size or settings.FIRESTORE_SCAN_PAGE_SIZE
+        self.max_attempts = max_attempts or settings.FIRESTORE_BULK_MAX_ATTEMPTS
+
+    def _base_query(self):
+        source = self.client.collection_group(self.collection) if self.group else self.client.collection(self.collection)
+        query = source.order_by(FieldPath.document_id())
+        if self.fields is not None:
+            query = query.select(self.fields)
+        return query
+
+    def ranges(self):
+        """``(start, end)`` document references: start inclusive, end exclusive, None is open."""
+        if self.partitions <= 1:
+            return [(None, None)]
+        if self.group:
+            split = self.client.collection_group(self.collection).get_partitions(self.partitions - 1)
+            return [(p.start_at, p.end_at) for p in split]
+        parent = self.client.collection(self.collection)
+        bounds = [None] + [parent.document(point) for point in id_split_points(self.partitions)] + [None]
+        return list(zip(bounds, bounds[1:]))
+
+    def stream(self):
+        """Yield DocumentSnapshots from all ranges; closing the generator stops the workers."""
+        ranges = self.ranges()
+        pages = queue.Queue(maxsize=self.workers * 2)
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix=f'firestore-scan-{self.collection}')
+        for start, end in ranges:
+            pool.submit(self._scan_range, start, end, pages, stop)
+        remaining = len(ranges)
+        try:
+            while remaining:
+                page = pages.get()
+                if page is _DONE:
+                    remaining -= 1
+                elif isinstance(page, BaseException):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            stop.set()
+            # Unblock workers waiting on a full queue so they can see the stop flag.
+            while True:
+                try:
+                    pages.get_nowait()
+                except queue.Empty:
+                    break
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _scan_range(self, start, end, pages, stop):
+        try:
+            range_query = self._base_query()
+            if end is not None:
+                range_query = range_query.end_before({FieldPath.document_id(): end})
+            last = None
+            while not stop.is_set():
+                query = range_query.limit(self.page_size)
+                if last is not None:
+                    query = query.start_after({FieldPath.document_id(): last})
+                elif start is not None:
+                    query = query.start_at({FieldPath.document_id(): start})
+                page = self._fetch(query)
+                if page:
+                    self._put(pages, page, stop)
+                    last = page[-1].reference
+                if len(page) < self.page_size:
+                    break
+            self._put(pages, _DONE, stop)
+        except Exception as exc:
+            logger.exception('Firestore scan of %s failed', self.collection)
+            self._put(pages, exc, stop)
+
+    def _fetch(self, query):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return list(query.stream())
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_attempts:
+                    raise
+                time.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    @staticmethod
+    def _put(pages, item, stop):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
@@ -0,0 +1,296 @@
+"""
+Bulk Firestore writes for backfills and migrations.
+
+The one-off Node scripts (``backfill-country-lower.js``,
+``populate-nicknames.js``) either commit one 500-doc batch at a time or await
+each ``set()`` in turn, so a run is bounded by round-trip latency. BulkWriter
+instead packs writes into ``batch_write`` RPCs of up to 500 operations,
+commits several of them concurrently and keeps going while they are in
+flight.
+
+Throughput is throttled two ways:
+
+* an ops/second token bucket that starts at 500 and grows by 50% every five
+  minutes (Firestore's 500/50/5 ramp-up rule for new traffic), and
+* an AIMD cap on concurrent commits, raised after clean commits and halved
+  whenever Firestore reports contention (ABORTED / RESOURCE_EXHAUSTED).
+
+``batch_write`` returns a status per write, so only the writes that failed
+with a retryable code are re-sent, with jittered exponential backoff.
+
+With a ``checkpoint`` name the writer also persists caller-supplied resume
+state through JobCheckpoint, but only once every write enqueued before that
+state has been committed, and never past a failed write, so a restarted job
+never skips one. Commits run out of order; the checkpoint follows the highest
+contiguous committed batch.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from google.api_core import exceptions as api_exceptions
+from google.cloud.firestore_v1.bulk_batch import BulkWriteBatch
+from google.rpc import code_pb2
+
+from .firebase import get_firestore_client
+from .models import JobCheckpoint
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPS = 500
+RAMP_INTERVAL_SECONDS = 5 * 60
+RAMP_FACTOR = 1.5
+
+CONTENTION_CODES = {code_pb2.ABORTED, code_pb2.RESOURCE_EXHAUSTED}
+RETRYABLE_CODES = CONTENTION_CODES | {code_pb2.UNAVAILABLE, code_pb2.DEADLINE_EXCEEDED, code_pb2.INTERNAL}
+RETRYABLE_ERRORS = (
+    api_exceptions.Aborted,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+)
+CONTENTION_ERRORS = (api_exceptions.Aborted, api_exceptions.ResourceExhausted)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight commits: +1 per round of clean commits, halved on contention."""
+
+    def __init__(self, initial, maximum):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+
+    def release(self, contended=False):
+        with self._cond:
+            self._active -= 1
+            if contended:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+@dataclass
+class BulkWriteResult:
+    written: int = 0
+    retried: int = 0
+    failed: int = 0
+    # (document path, status code, message) for the first failures only.
+    errors: list = field(default_factory=list)
+
+
+class BulkWriter:
+    """Buffered, concurrent, throttled writer; use as a context manager or call close()."""
+
+    MAX_REPORTED_ERRORS = 100
+
+    def __init__(self, client=None, *, checkpoint=None, max_workers=None, initial_ops_per_second=None,
+                 max_ops_per_second=None, max_attempts=None):
+        self.client = client or get_firestore_client()
+        self.checkpoint = checkpoint
+        self.max_workers = max_workers or settings.FIRESTORE_BULK_MAX_WORKERS
+        self.max_attempts = max_attempts or settings.FIRESTORE_BULK_MAX_ATTEMPTS
+        self.max_ops_per_second = max_ops_per_second or settings.FIRESTORE_BULK_MAX_OPS_PER_SECOND
+        rate = min(initial_ops_per_second or settings.FIRESTORE_BULK_INITIAL_OPS_PER_SECOND, self.max_ops_per_second)
+        self.result = BulkWriteResult()
+
+        self._bucket = TokenBucket(rate, capacity=max(rate, MAX_BATCH_OPS))
+        self._ramped_at = time.monotonic()
+        self._concurrency = AdaptiveConcurrency(max(1, self.max_workers // 4), self.max_workers)
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='firestore-bulk')
+        self._futures = set()
+        self._lock = threading.Lock()
+
+        self._ops = []
+        self._paths = set()
+        self._seq = 0
+        self._marks = {}
+        self._completed = set()
+        self._confirmed = -1
+        self._persisted_seq = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(clear_checkpoint=exc_type is None)
+
+    # -- public API ----------------------------------------------------------
+
+    @property
+    def resume_state(self):
+        """State last stored via mark() by a previous run of this checkpoint, if any."""
+        return JobCheckpoint.load(self.checkpoint) if self.checkpoint else {}
+
+    def set(self, reference, document_data, merge=False):
+        self._add(reference, 'set', (document_data,), {'merge': merge})
+
+    def create(self, reference, document_data):
+        self._add(reference, 'create', (document_data,), {})
+
+    def update(self, reference, field_updates):
+        self._add(reference, 'update', (field_updates,), {})
+
+    def delete(self, reference):
+        self._add(reference, 'delete', (), {})
+
+    def mark(self, state):
+        """Record resume state covering every write enqueued so far."""
+        if self.checkpoint:
+            self._marks[self._seq] = state
+            self._persist()
+
+    def flush(self):
+        """Send buffered writes and wait for everything in flight."""
+        self._submit()
+        wait(self._futures)
+        self._futures.clear()
+        self._persist()
+        return self.result
+
+    def close(self, clear_checkpoint=True):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+        # Only a clean run may forget its resume point; failed writes need a re-run.
+        if self.checkpoint and clear_checkpoint and not self.result.failed:
+            JobCheckpoint.clear(self.checkpoint)
+        return self.result
+
+    # -- batching ------------------------------------------------------------
+
+    def _add(self, reference, method, args, kwargs):
+        if reference.path in self._paths:
+            # batch_write rejects two writes to one document in the same RPC,
+            # and concurrent batches could apply them out of order.
+            self._submit()
+            wait(self._futures)
+        elif len(self._ops) >= MAX_BATCH_OPS:
+            self._submit()
+        self._ops.append((reference, method, args, kwargs))
+        self._paths.add(reference.path)
+
+    def _submit(self):
+        seq, ops = self._seq, self._ops
+        self._seq += 1
+        self._ops, self._paths = [], set()
+        if not ops:
+            self._mark_completed(seq)
+            return
+        # Bound memory: never hold more than a couple of batches per worker.
+        while len(self._futures) >= self.max_workers * 2:
+            _, self._futures = wait(self._futures, return_when=FIRST_COMPLETED)
+        self._ramp()
+        self._bucket.acquire(len(ops))
+        self._futures.add(self._pool.submit(self._commit, seq, ops))
+        self._persist()
+
+    def _ramp(self):
+        now = time.monotonic()
+        if now - self._ramped_at >= RAMP_INTERVAL_SECONDS and self._bucket.rate < self.max_ops_per_second:
+            self._bucket.rate = min(self.max_ops_per_second, self._bucket.rate * RAMP_FACTOR)
+            self._bucket.capacity = max(self._bucket.rate, MAX_BATCH_OPS)
+            self._ramped_at = now
+            logger.info('Firestore bulk writer ramped to %.0f ops/s', self._bucket.rate)
+
+    def _commit(self, seq, ops):
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                ops = self._send(ops, final=attempt == self.max_attempts)
+                if not ops:
+                    break
+                with self._lock:
+                    self.result.retried += len(ops)
+                time.sleep(min(60.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+        except Exception:
+            logger.exception('Firestore bulk commit failed')
+            with self._lock:
+                self.result.failed += len(ops)
+        finally:
+            self._mark_completed(seq)
+
+    def _send(self, ops, final):
+        """Commit ``ops`` once; return the subset worth retrying."""
+        batch = BulkWriteBatch(self.client)
+        for reference, method, args, kwargs in ops:
+            getattr(batch, method)(reference, *args, **kwargs)
+
+        self._concurrency.acquire()
+        contended = False
+        try:
+            response = batch.commit(retry=None)
+            # Per-write contention doesn't fail the RPC, but should still slow us down.
+            contended = any(status.code in CONTENTION_CODES for status in response.status)
+        except RETRYABLE_ERRORS as exc:
+            contended = isinstance(exc, CONTENTION_ERRORS)
+            if final:
+                self._record_failures([(op, exc.grpc_status_code, str(exc)) for op in ops])
+                return []
+            return ops
+        finally:
+            self._concurrency.release(contended)
+
+        retry, failures = [], []
+        for op, status in zip(ops, response.status):
+            if status.code == code_pb2.OK:
+                continue
+            if status.code in RETRYABLE_CODES and not final:
+                retry.append(op)
+            else:
+                failures.append((op, status.code, status.message))
+        with self._lock:
+            self.result.written += len(ops) - len(retry) - len(failures)
+        self._record_failures(failures)
+        return retry
+
+    def _record_failures(self, failures):
+        if not failures:
+            return
+        with self._lock:
+            self.result.failed += len(failures)
+            room = self.MAX_REPORTED_ERRORS - len(self.result.errors)
+            for (reference, method, _, _), code, message in failures[:max(room, 0)]:
+                self.result.errors.append((reference.path, code, message))
+        logger.warning('%d Firestore writes failed, e.g. %s', len(failures), failures[0][2])
+
+    # -- checkpointing -------------------------------------------------------
+
+    def _mark_completed(self, seq):
+        with self._lock:
+            self._completed.add(seq)
+            while self._confirmed + 1 in self._completed:
+                self._confirmed += 1
+                self._completed.discard(self._confirmed)
+
+    def _persist(self):
+        """Store the newest mark whose batches are all committed (caller thread only)."""
+        # Never move the resume point past a failed write.
+        if not self.checkpoint or self.result.failed:
+            return
+        with self._lock:
+            confirmed = self._confirmed
+        ready = [seq for seq in self._marks if seq <= confirmed]
+        if not ready:
+            return
+        latest = max(ready)
+        state = self._marks[latest]
+        for seq in ready:
+            del self._marks[seq]
+        if latest > self._persisted_seq:
+            JobCheckpoint.store(self.checkpoint, state)
+            self._persisted_seq = latest
@@ -0,0 +1,289 @@
+"""
+Server-side feature flags evaluated from an in-process snapshot.
+
+FeatureFlag rows are the source of truth and are edited in the admin. Every
+change publishes the full flag set to Redis under a new version number and
+announces that version on a pub/sub channel. Each process holds the flag set
+as an immutable snapshot, so is_enabled() is a dict lookup plus, for a
+partial rollout, one hash of the user id. There is no I/O on the request
+path.
+
+Rollouts bucket users by ``blake2b(user id, key=flag name) % 10000``. A user's
+bucket never changes, so raising a percentage only adds users. Each flag
+hashes with its own key, so two 10% rollouts reach different users.
+
+A daemon thread in each process listens on the channel. It loads a snapshot
+only when the version is newer than the one held, so a late or duplicated
+message can never roll flags back. Pub/sub drops messages while a subscriber
+is disconnected, so the thread also re-reads the published version every
+``FEATURE_FLAGS_RESYNC_SECONDS``. The same thread adds the process's
+evaluation counts to a Redis hash; see evaluation_counts().
+
+Flags without a row fall back to DEFAULTS, which mirror FeatureFlagsService in
+the Flutter app, and then to off.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.permissions import BasePermission
+
+from .models import FeatureFlag
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'greengo:flags:updates'
+SEQUENCE_KEY = 'greengo:flags:sequence'
+VERSION_KEY = 'greengo:flags:version'
+SNAPSHOT_KEY = 'greengo:flags:snapshot'
+COUNTS_KEY = 'greengo:flags:evaluations'
+BUCKETS = 10_000
+
+# Stores the snapshot only if its version is newer than the stored one.
+PUBLISH_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tonumber(ARGV[1]) <= current then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2])
+redis.call('PUBLISH', ARGV[3], ARGV[1])
+return 1
+"""
+
+# Mirrors FeatureFlagsService._defaults (lib/core/services/feature_flags_service.dart).
+DEFAULTS = {
+    'discovery': True,
+    'matches': True,
+    'profiles': True,
+    'messaging': True,
+    'videoCalls': False,
+    'voiceMessages': False,
+    'coins': True,
+    'shop': True,
+    'subscriptions': True,
+    'inAppPurchases': True,
+    'priorityConnects': True,
+    'profileBoosts': True,
+    'advancedFilters': True,
+    'gamification': True,
+    'achievements': True,
+    'dailyChallenges': True,
+    'streaks': True,
+    'aiCoach': True,
+    'culturalExchange': True,
+    'safetyAcademy': True,
+    'events': True,
+    'videoProfiles': True,
+    'exploreMap': True,
+    'culturalSpots': True,
+    'communities': True,
+    'travelMatching': True,
+    'analytics': True,
+    'crashReporting': True,
+    'performanceMonitoring': True,
+    'pushNotifications': True,
+    'emailNotifications': True,
+}
+
+
+def _hasher(name):
+    return hashlib.blake2b(digest_size=8, key=name.encode()[:64])
+
+
+def bucket(name, user_id, hasher=None):
+    """Stable rollout bucket in ``[0, BUCKETS)`` for ``user_id`` under flag ``name``."""
+    # Copying a keyed hasher skips re-deriving the key, the bulk of the cost.
+    hasher = (hasher or _hasher(name)).copy()
+    hasher.update(str(user_id).encode())
+    return int.from_bytes(hasher.digest(), 'little') % BUCKETS
+
+
+class CompiledFlag:
+    __slots__ = ('name', 'enabled', 'threshold', 'user_ids', '_hasher')
+
+    def __init__(self, name, enabled, rollout_percent=100, user_ids=()):
+        self.name = name
+        self.enabled = enabled
+        self.threshold = round(float(rollout_percent) * BUCKETS / 100)
+        self.user_ids = frozenset(user_ids)
+        self._hasher = _hasher(name)
+
+    def evaluate(self, user_id=None):
+        if not self.enabled:
+            return False
+        if self.threshold >= BUCKETS:
+            return True
+        if user_id is None:
+            return False
+        if user_id in self.user_ids:
+            return True
+        return self.threshold > 0 and bucket(self.name, user_id, self._hasher) < self.threshold
+
+
+def compile_snapshot(rows):
+    """Read-only ``{name: CompiledFlag}`` for DEFAULTS overlaid with ``rows``."""
+    flags = {name: CompiledFlag(name, enabled) for name, enabled in DEFAULTS.items()}
+    for row in rows:
+        flags[row['name']] = CompiledFlag(row['name'], row['enabled'], row['rollout_percent'], row['user_ids'])
+    return MappingProxyType(flags)
+
+
+class FlagStore:
+    """Per-process flag snapshot, kept current by a background listener thread."""
+
+    def __init__(self):
+        self.version = 0
+        self.flags = compile_snapshot(())
+        self._counts = {}
+        self._started = False
+        self._generation = 0
+        self._lock = threading.Lock()
+        # The listener thread doesn't survive a fork; the child starts its own on first use.
+        os.register_at_fork(after_in_child=self._forked)
+
+    def is_enabled(self, name, user_id=None):
+        if not self._started:
+            self._start()
+        flag = self.flags.get(name)
+        result = flag is not None and flag.evaluate(user_id)
+        counts = self._counts.get(name)
+        if counts is None:
+            counts = self._counts.setdefault(name, [0, 0])
+        # Unlocked: a concurrent increment may occasionally be lost.
+        counts[result] += 1
+        return result
+
+    def install(self, version, rows):
+        with self._lock:
+            if version <= self.version:
+                return False
+            self.flags = compile_snapshot(rows)
+            self.version = version
+        logger.info('Loaded feature flags version %d', version)
+        return True
+
+    def local_counts(self):
+        return {name: tuple(counts) for name, counts in self._counts.items()}
+
+    def _forked(self):
+        self._lock = threading.Lock()
+        self._started = False
+        self._counts = {}
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._generation += 1
+            generation = self._generation
+        try:
+            self.sync()
+        except (RedisError, ValueError):
+            logger.warning('Feature flags unavailable, using version %d', self.version, exc_info=True)
+        threading.Thread(target=self._listen, args=(generation,), name='feature-flags', daemon=True).start()
+
+    def sync(self):
+        """Install the published snapshot if it is newer; publish one if none exists yet."""
+        raw = get_redis_connection('default').get(SNAPSHOT_KEY)
+        if raw is None:
+            publish()
+            return
+        snapshot = json.loads(raw)
+        self.install(snapshot['version'], snapshot['flags'])
+
+    def flush_counts(self):
+        counts, self._counts = self._counts, {}
+        if not counts:
+            return
+        with get_redis_connection('default').pipeline(transaction=False) as pipe:
+            for name, (off, on) in counts.items():
+                if on:
+                    pipe.hincrby(COUNTS_KEY, f'{name}:on', on)
+                if off:
+                    pipe.hincrby(COUNTS_KEY, f'{name}:off', off)
+            pipe.execute()
+
+    def _listen(self, generation):
+        while self._generation == generation:
+            try:
+                pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Catch up on anything published before the subscription took effect.
+                self.sync()
+                resync_at = flush_at = time.monotonic()
+                while self._generation == generation:
+                    message = pubsub.get_message(timeout=1.0)
+                    now = time.monotonic()
+                    if message and int(message['data']) > self.version:
+                        self.sync()
+                    elif now - resync_at >= settings.FEATURE_FLAGS_RESYNC_SECONDS:
+                        self.sync()
+                        resync_at = now
+                    if now - flush_at >= settings.FEATURE_FLAGS_FLUSH_SECONDS:
+                        self.flush_counts()
+                        flush_at = now
+            except (RedisError, ValueError):
+                logger.warning('Feature flag listener lost Redis, retrying', exc_info=True)
+                time.sleep(5)
+
+
+store = FlagStore()
+is_enabled = store.is_enabled
+
+_script = None
+
+
+def _publish_script():
+    global _script
+    if _script is None:
+        _script = get_redis_connection('default').register_script(PUBLISH_SCRIPT)
+    return _script
+
+
+def publish():
+    """Publish every FeatureFlag row as a new snapshot version and install it locally."""
+    redis = get_redis_connection('default')
+    # Take the version before reading: a later version always sees later rows.
+    version = redis.incr(SEQUENCE_KEY)
+    rows = [
+        {**row, 'rollout_percent': float(row['rollout_percent'])}
+        for row in FeatureFlag.objects.values('name', 'enabled', 'rollout_percent', 'user_ids')
+    ]
+    _publish_script()(
+        keys=[VERSION_KEY, SNAPSHOT_KEY],
+        args=[version, json.dumps({'version': version, 'flags': rows}), CHANNEL],
+    )
+    store.install(version, rows)
+    return version
+
+
+def evaluation_counts():
+    """``{name: (off, on)}`` summed over every process's flushed counters."""
+    totals = {}
+    for field, value in get_redis_connection('default').hgetall(COUNTS_KEY).items():
+        name, _, outcome = field.decode().rpartition(':')
+        off, on = totals.get(name, (0, 0))
+        totals[name] = (off, on + int(value)) if outcome == 'on' else (off + int(value), on)
+    return totals
+
+
+class FeatureFlagPermission(BasePermission):
+    """Denies a view whose ``feature_flag`` is off for the requesting user."""
+
+    message = 'This feature is not available.'
+
+    def has_permission(self, request, view):
+        name = getattr(view, 'feature_flag', None)
+        if name is None:
+            return True
+        return is_enabled(name, request.user.pk if request.user.is_authenticated else None)
@@ -0,0 +1,123 @@
+"""
+Process-wide GeoIP lookups.
+
+The MaxMind City database is opened once per process in ``MODE_MMAP``: the
+file is mapped rather than read, so every worker on a host shares the same
+physical pages and startup costs nothing. Results are cached per network
+prefix (/24 for IPv4, /48 for IPv6), which is as fine-grained as the coarse
+location we attach to requests, so hot client networks never reach the
+reader at all.
+"""
+
+import ipaddress
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+import geoip2.database
+import geoip2.errors
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# How often to check whether the database file was replaced on disk.
+RELOAD_CHECK_SECONDS = 300
+
+
+class GeoLocation(NamedTuple):
+    country_code: str
+    region: str
+    city: str
+    latitude: float
+    longitude: float
+    time_zone: str
+
+
+_reader = None
+_reader_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_reader():
+    """The shared memory-mapped reader, reopened if the file was updated."""
+    global _reader, _reader_mtime, _checked_at
+    now = time.monotonic()
+    if _checked_at and now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _reader
+    with _lock:
+        path = settings.GEOIP_CITY_DATABASE
+        _checked_at = now
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            logger.warning('GeoIP database not found at %s', path)
+            return _reader
+        if _reader is None or mtime != _reader_mtime:
+            _reader = geoip2.database.Reader(path, mode=geoip2.database.MODE_MMAP)
+            _reader_mtime = mtime
+            _prefix_lookup.cache_clear()
+    return _reader
+
+
+def _prefix(address):
+    ip = ipaddress.ip_address(address)
+    bits = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f'{ip}/{bits}', strict=False).network_address)
+
+
+@lru_cache(maxsize=65_536)
+def _prefix_lookup(prefix):
+    reader = get_reader()
+    if reader is None:
+        return None
+    try:
+        r = reader.city(prefix)
+    except geoip2.errors.AddressNotFoundError:
+        return None
+    return GeoLocation(
+        country_code=r.country.iso_code or '',
+        region=r.subdivisions.most_specific.iso_code or '',
+        city=r.city.name or '',
+        latitude=r.location.latitude,
+        longitude=r.location.longitude,
+        time_zone=r.location.time_zone or '',
+    )
+
+
+def lookup(address):
+    """Coarse location for ``address``, or None for private/unknown addresses."""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return None
+    if ip.is_private or ip.is_loopback or ip.is_reserved:
+        return None
+    return _prefix_lookup(_prefix(address))
+
+
+def bulk_lookup(addresses):
+    """Map each distinct address to its location, resolving each prefix once.
+
+    Meant for analytics backfills over millions of rows: feed it chunks and
+    duplicate networks cost a dict hit instead of a tree walk.
+    """
+    results = {}
+    prefixes = {}
+    for address in set(addresses):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            results[address] = None
+            continue
+        if ip.is_private or ip.is_loopback or ip.is_reserved:
+            results[address] = None
+            continue
+        prefix = _prefix(address)
+        if prefix not in prefixes:
+            prefixes[prefix] = _prefix_lookup(prefix)
+        results[address] = prefixes[prefix]
+    return results
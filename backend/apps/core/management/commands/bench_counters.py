@@ -0,0 +1,68 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django_redis import get_redis_connection
+
+from apps.core import counters
+from apps.core.models import Counter
+
+
+class Command(BaseCommand):
+    help = 'Hammer one counter from many threads while folding, then check no increment was lost or doubled.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--increments', type=int, default=5_000, help='Per thread.')
+        parser.add_argument('--reads', type=int, default=10_000)
+
+    def handle(self, *args, threads, increments, reads, **options):
+        if not settings.DEBUG:
+            raise CommandError('Run against a development Redis and database (DEBUG=True); this folds every shard.')
+        path = f'_bench_counters/{uuid.uuid4().hex[:8]}'
+        key = counters.counter_key(path, 'memberCount')
+        stop = threading.Event()
+
+        def hammer():
+            for i in range(increments):
+                counters.increment(path, {'memberCount': 1 if i % 4 else -1, 'ratingCount': 1})
+
+        def fold_loop():
+            while not stop.is_set():
+                counters.fold_counters(mirror=False)
+                time.sleep(0.05)
+
+        folder = threading.Thread(target=fold_loop)
+        workers = [threading.Thread(target=hammer) for _ in range(threads)]
+        started = time.perf_counter()
+        folder.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        folder.join()
+        total = threads * increments
+        self.stdout.write(f'{total:,} increments from {threads} threads in {elapsed:.2f}s ({total / elapsed:,.0f}/s)')
+
+        expected = total // 2
+        live = counters.get(path, 'memberCount')
+        counters.fold_counters(mirror=False)
+        folded = Counter.objects.get(key=key).value
+        self.stdout.write(f'before final fold: {live:,}  folded: {folded:,}  expected: {expected:,}')
+        self.stdout.write(f'ratingCount: {counters.get(path, "ratingCount"):,}  expected: {total:,}')
+
+        applied = [counters.increment(path, {'memberCount': 1}, dedupe_id=f'{path}:once') for _ in range(3)]
+        self.stdout.write(f'dedupe: applied {applied}')
+
+        started = time.perf_counter()
+        for _ in range(reads):
+            counters.get(path, 'memberCount')
+        self.stdout.write(f'get()  {(time.perf_counter() - started) / reads * 1e6:8.1f} us/read')
+
+        counters.fold_counters(mirror=False)
+        Counter.objects.filter(key__startswith=f'{path}:').delete()
+        get_redis_connection('default').hdel(counters.TOTALS_KEY, key, counters.counter_key(path, 'ratingCount'))
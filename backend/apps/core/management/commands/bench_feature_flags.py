@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.flags import CompiledFlag, FlagStore
+
+
+class Command(BaseCommand):
+    help = 'Time in-process feature-flag evaluation and check rollout bucketing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100_000)
+
+    def handle(self, *args, checks, users, **options):
+        store = FlagStore()
+        store.install(1, [
+            {'name': 'on', 'enabled': True, 'rollout_percent': 100, 'user_ids': []},
+            {'name': 'rollout', 'enabled': True, 'rollout_percent': 25, 'user_ids': []},
+        ])
+        # Evaluate the locally installed snapshot without starting the Redis listener.
+        store._started = True
+
+        for name in ('on', 'rollout', 'unknown'):
+            started = time.perf_counter()
+            for user_id in range(checks):
+                store.is_enabled(name, user_id)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{name:<10} {elapsed / checks * 1e9:8.0f} ns/check')
+
+        for percent in (1, 10, 25, 50):
+            flag = CompiledFlag('rollout', True, percent)
+            share = sum(flag.evaluate(user_id) for user_id in range(users)) / users
+            self.stdout.write(f'rollout {percent:>3}%: {share:.2%} of {users:,} users')
+        narrow, wide = CompiledFlag('rollout', True, 10), CompiledFlag('rollout', True, 20)
+        kept = all(wide.evaluate(user_id) for user_id in range(users) if narrow.evaluate(user_id))
+        self.stdout.write(f'10% -> 20% keeps every enabled user: {kept}')
@@ -0,0 +1,96 @@
+import os
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from google.cloud import pubsub_v1
+
+from apps.core.pubsub import Consumer, ConsumerRunner, PermanentError, ensure_subscription
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure consumer throughput against the Pub/Sub emulator (docker compose, port 8085) '
+        'and check per-key ordering and dead-letter routing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100_000)
+        parser.add_argument('--keys', type=int, default=0, help='Ordering keys to spread messages over (0 = unordered).')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--lanes', type=int, default=8)
+        parser.add_argument('--poison', type=int, default=10, help='Messages that fail permanently.')
+        parser.add_argument('--timeout', type=float, default=300)
+
+    def handle(self, *args, count, keys, batch_size, lanes, poison, timeout, **options):
+        if not os.environ.get('PUBSUB_EMULATOR_HOST'):
+            raise CommandError('Set PUBSUB_EMULATOR_HOST (e.g. localhost:8085); this command creates test topics.')
+        run = uuid.uuid4().hex[:8]
+        seen = defaultdict(list)
+        done = []
+
+        class BenchConsumer(Consumer):
+            subscription = f'bench-{run}'
+            topic = f'bench-{run}'
+            dead_letter_topic = f'bench-{run}-dead-letter'
+            ordered = keys > 0
+            max_messages = 10_000
+
+            def handle_batch(self, messages):
+                failures = {}
+                for message in messages:
+                    if message.attributes.get('poison'):
+                        failures[message] = PermanentError('poison message')
+                    else:
+                        seen[message.ordering_key].append(int(message.attributes['seq']))
+                done.append(len(messages))
+                return failures
+
+        BenchConsumer.batch_size = batch_size
+        BenchConsumer.lanes = lanes
+        consumer = BenchConsumer()
+        ensure_subscription(consumer)
+        project = settings.PUBSUB_PROJECT_ID
+
+        publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(max_messages=1000, max_latency=0.05),
+            publisher_options=pubsub_v1.types.PublisherOptions(enable_message_ordering=keys > 0),
+        )
+        topic = publisher.topic_path(project, consumer.topic)
+        started = time.perf_counter()
+        futures = []
+        for seq in range(count + poison):
+            attributes = {'seq': str(seq)}
+            if seq >= count:
+                attributes['poison'] = '1'
+            key = f'k{seq % keys}' if keys else ''
+            futures.append(publisher.publish(topic, b'x' * 256, ordering_key=key, **attributes))
+        for future in futures:
+            future.result()
+        published = time.perf_counter() - started
+        self.stdout.write(f'published {count + poison:,} in {published:.1f}s ({(count + poison) / published:,.0f}/s)')
+
+        runner = ConsumerRunner(consumer, project=project)
+        started = time.perf_counter()
+        runner.start()
+        deadline = started + timeout
+        while sum(len(v) for v in seen.values()) < count and time.perf_counter() < deadline:
+            time.sleep(0.2)
+        consumed = time.perf_counter() - started
+        time.sleep(2)
+        runner.stop()
+
+        received = sum(len(v) for v in seen.values())
+        self.stdout.write(
+            f'consumed {received:,} in {consumed:.1f}s ({received / consumed:,.0f}/s, '
+            f'{len(done):,} batches, mean {sum(done) / max(len(done), 1):.0f}) stats={dict(runner.stats)}'
+        )
+        if received < count:
+            raise CommandError(f'Only {received:,} of {count:,} messages consumed before the timeout')
+        if keys and any(v != sorted(v) for v in seen.values()):
+            raise CommandError('Messages for an ordering key were handled out of order')
+        if runner.stats['dead_lettered'] != poison:
+            raise CommandError(f'Expected {poison} dead-lettered messages, got {runner.stats["dead_lettered"]}')
+        self.stdout.write(self.style.SUCCESS('Pub/Sub consumer benchmark passed'))
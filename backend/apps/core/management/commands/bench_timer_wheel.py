@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.timers import TimerStore, TimingWheel
+
+
+class Command(BaseCommand):
+    help = 'Benchmark timing-wheel insertion and expiry with synthetic reminders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000)
+        parser.add_argument('--spread', type=int, default=86_400, help='Seconds over which deadlines are spread.')
+        parser.add_argument('--redis', action='store_true', help='Also time durable scheduling into Redis.')
+        parser.add_argument('--chunk', type=int, default=10_000)
+
+    def handle(self, *args, count, spread, redis, chunk, **options):
+        rng = random.Random(42)
+        deadlines = [rng.random() * spread for _ in range(count)]
+
+        wheel = TimingWheel(tick=1.0, start=0)
+        started = time.perf_counter()
+        for i, due in enumerate(deadlines):
+            wheel.add(due, i)
+        insert = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fired = 0
+        for now in range(0, spread + 1, 60):
+            fired += len(wheel.advance(now))
+        expire = time.perf_counter() - started
+
+        self.stdout.write(f'{count:,} timers over {spread:,}s')
+        self.stdout.write(f'  wheel insert: {insert:.2f}s ({count / insert:,.0f}/s, {insert / count * 1e9:.0f} ns each)')
+        self.stdout.write(f'  wheel expire: {expire:.2f}s ({fired:,} fired)')
+
+        if redis:
+            store = TimerStore()
+            base = time.time() + 365 * 86_400
+            started = time.perf_counter()
+            for start in range(0, count, chunk):
+                store.schedule_many(
+                    (f'bench:{i}', base + deadlines[i], 'bench.noop', {})
+                    for i in range(start, min(start + chunk, count))
+                )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  redis schedule: {elapsed:.2f}s ({count / elapsed:,.0f}/s)')
+            for start in range(0, count, chunk):
+                store.cancel_many(f'bench:{i}' for i in range(start, min(start + chunk, count)))
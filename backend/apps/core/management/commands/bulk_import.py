@@ -0,0 +1,54 @@
+import csv
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from apps.core.bulk_import import CopyImporter, read_headers
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV/XLSX file into a model through COPY and a set-based merge.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='app_label.ModelName')
+        parser.add_argument('path')
+        parser.add_argument('--resource', help='Dotted path of a django-import-export ModelResource to take columns from.')
+        parser.add_argument('--column', action='append', default=[], metavar='HEADER=FIELD',
+                            help='Map a file column to a model field (repeatable); defaults to every header as-is.')
+        parser.add_argument('--key', nargs='+', default=[], help='Fields identifying existing rows to update.')
+        parser.add_argument('--errors', help='Write every rejected row to this CSV file.')
+        parser.add_argument('--chunk-rows', type=int)
+
+    def handle(self, *args, model, path, resource, column, key, errors, chunk_rows, **options):
+        model = apps.get_model(model)
+        error_file = open(errors, 'w', newline='', encoding='utf-8') if errors else None
+        try:
+            writer = None
+            if error_file is not None:
+                writer = csv.writer(error_file)
+                writer.writerow(['row', 'column', 'value', 'error'])
+            if resource:
+                importer = CopyImporter.from_resource(import_string(resource), chunk_rows=chunk_rows, error_writer=writer)
+            else:
+                columns = dict(pair.split('=', 1) for pair in column) or {h: h for h in read_headers(path)}
+                importer = CopyImporter(model, columns, key=key, chunk_rows=chunk_rows, error_writer=writer)
+            if importer.model is not model:
+                raise CommandError(f'{resource} imports {importer.model._meta.label}, not {model._meta.label}')
+            started = time.perf_counter()
+            result = importer.run(path)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if error_file is not None:
+                error_file.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{result.rows:,} rows in {elapsed:.1f}s ({result.rows / max(elapsed, 1e-9):,.0f}/s): '
+            f'{result.inserted:,} inserted, {result.updated:,} updated, {result.error_count:,} errors'
+        )
+        for row, name, value, message in result.errors[:20]:
+            self.stdout.write(f'  row {row} {name}={value!r}: {message}')
+
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.flags import evaluation_counts, publish, store
+
+
+class Command(BaseCommand):
+    help = 'List feature flags with their evaluation counts, or republish them to every process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--publish', dest='republish', action='store_true', help='Publish the database flags as a new version.')
+
+    def handle(self, *args, republish, **options):
+        if republish:
+            self.stdout.write(f'Published feature flags version {publish()}')
+        else:
+            store.sync()
+        counts = evaluation_counts()
+        self.stdout.write(f'Version {store.version}')
+        self.stdout.write(f'{"flag":<24}{"state":>10}{"rollout":>9}{"on":>14}{"off":>14}')
+        for name, flag in sorted(store.flags.items()):
+            off, on = counts.get(name, (0, 0))
+            state = 'on' if flag.enabled else 'off'
+            self.stdout.write(f'{name:<24}{state:>10}{flag.threshold / 100:>8.2f}%{on:>14,}{off:>14,}')
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from apps.core.pubsub import ConsumerRunner, ensure_subscription
+
+
+class Command(BaseCommand):
+    help = 'Run a batched Pub/Sub consumer from PUBSUB_CONSUMERS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(settings.PUBSUB_CONSUMERS))
+        parser.add_argument('--create', action='store_true', help='Create the topic and subscription first.')
+
+    def handle(self, *args, name, create, **options):
+        consumer = import_string(settings.PUBSUB_CONSUMERS[name])()
+        if create:
+            ensure_subscription(consumer)
+        ConsumerRunner(consumer).run_forever()
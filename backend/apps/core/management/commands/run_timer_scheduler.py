@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.timers import TimerScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the timing-wheel scheduler that dispatches one-shot timers to Celery.'
+
+    def handle(self, *args, **options):
+        TimerScheduler().run_forever()
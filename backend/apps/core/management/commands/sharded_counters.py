@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import counters
+from apps.core.models import Counter
+from apps.core.tasks import COUNTER_FOLD_LOCK_KEY
+
+
+class Command(BaseCommand):
+    help = 'Show sharded counters, fold them now, reload the Redis totals or re-copy every total to Firestore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('keys', nargs='*', help='Counter keys, e.g. communities/abc:memberCount.')
+        parser.add_argument('--fold', action='store_true', help='Fold every shard now.')
+        parser.add_argument('--warm', action='store_true', help='Reload the Redis totals from the database.')
+        parser.add_argument('--mirror-all', action='store_true', help='Write every total to Firestore.')
+
+    def handle(self, *args, keys, fold, warm, mirror_all, **options):
+        if fold or warm or mirror_all:
+            # Shares the periodic fold's lock: a concurrent fold would race the totals written here.
+            if not cache.add(COUNTER_FOLD_LOCK_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+                raise CommandError('A counter fold is running; try again shortly.')
+            try:
+                if fold:
+                    self.stdout.write(f'Folded {counters.fold_counters():,} counters')
+                if warm:
+                    self.stdout.write(f'Loaded {counters.warm_totals():,} totals into Redis')
+                if mirror_all:
+                    result = counters.mirror_to_firestore(dict(Counter.objects.values_list('key', 'value')))
+                    self.stdout.write(f'Mirrored {result.written:,} documents, {result.failed:,} failed')
+            finally:
+                cache.delete(COUNTER_FOLD_LOCK_KEY)
+
+        for key, value in counters.get_many(keys).items():
+            self.stdout.write(f'{key}  {value:,}')
@@ -0,0 +1,31 @@
+"""
+Project-wide middleware.
+"""
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .geoip import lookup
+
+
+def client_ip(request):
+    if settings.GEOIP_TRUST_FORWARDED_FOR:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class GeoIPMiddleware:
+    """Attach ``request.geo``: a :class:`~apps.core.geoip.GeoLocation`, falsy if unknown.
+
+    The lookup is lazy, so requests that never read ``request.geo`` pay only
+    for the wrapper object; those that do usually hit the prefix cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.geo = SimpleLazyObject(lambda: lookup(client_ip(request)))
+        return self.get_response(request)
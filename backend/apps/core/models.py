@@ -0,0 +1,87 @@
+"""
+Shared models used by more than one app.
+"""
+
+from django.contrib.postgres.fields import ArrayField
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+
+class JobCheckpoint(models.Model):
+    """Durable resume point for a long-running batch job.
+
+    Jobs store whatever cursor they need in ``state`` after each committed
+    batch, so a crashed or redeployed worker picks up where the last one
+    stopped instead of starting over.
+    """
+
+    name = models.CharField(max_length=200, unique=True)
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'core_job_checkpoint'
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def load(cls, name):
+        """Return the saved state for ``name``, or an empty dict."""
+        row = cls.objects.filter(name=name).values_list('state', flat=True).first()
+        return row or {}
+
+    @classmethod
+    def store(cls, name, state):
+        cls.objects.update_or_create(name=name, defaults={'state': state})
+
+    @classmethod
+    def clear(cls, name):
+        cls.objects.filter(name=name).delete()
+
+
+class FeatureFlag(models.Model):
+    """A server-side feature flag, evaluated in-process by apps.core.flags.
+
+    ``rollout_percent`` exposes an enabled flag to that share of users, chosen
+    by a stable hash of the user id, so a user stays in or out as the
+    percentage grows. ``user_ids`` are always in, whatever the percentage.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    description = models.CharField(max_length=255, blank=True)
+    enabled = models.BooleanField(default=False)
+    rollout_percent = models.DecimalField(
+        max_digits=5, decimal_places=2, default=100,
+        validators=[MinValueValidator(0), MaxValueValidator(100)],
+    )
+    user_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'core_feature_flag'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Counter(models.Model):
+    """Folded total of a sharded counter; see apps.core.counters.
+
+    ``key`` is ``<document path>:<field>``, e.g. ``communities/abc:memberCount``.
+    """
+
+    key = models.CharField(max_length=500, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'core_counter'
+        indexes = [
+            # Admin prefix search, e.g. every counter of one community.
+            models.Index(fields=['key'], name='counter_key_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f'{self.key} = {self.value}'
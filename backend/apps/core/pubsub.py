@@ -0,0 +1,263 @@
+"""
+Batched Pub/Sub consumers.
+
+A Consumer subclass names a subscription and implements ``handle_batch``;
+ConsumerRunner feeds it from a streaming pull:
+
+* the pull is flow-controlled, so at most ``max_messages`` messages and
+  ``max_bytes`` bytes are leased (received but not yet acked) at once;
+* received messages go to ``lanes`` worker threads. Each lane gathers up to
+  ``batch_size`` messages (or whatever arrived within ``batch_wait``
+  seconds) and hands them to ``handle_batch`` in one call;
+* after the call every message in the batch is acked or nacked. The client
+  library coalesces those into batched Acknowledge / ModifyAckDeadline RPCs,
+  and each ack frees flow-control budget for more messages.
+
+Messages with an ordering key always go to the same lane, so one key is
+handled in publish order. On an ordered subscription the client also holds
+back a key's next message until the previous one is acked, so per-key
+throughput is one message per batch cycle; parallelism comes from many keys.
+When a message fails there, later messages with its key are nacked rather
+than acked, in the same batch and until the failed message is redelivered
+(or ``ack_deadline_seconds`` pass), so none of them overtakes it.
+
+``handle_batch`` returns a ``{message: exception}`` mapping for the messages
+that failed (or raises to fail the whole batch). A failed message is nacked
+for redelivery until its ``delivery_attempt`` reaches
+``max_delivery_attempts``, or straight away if the exception is a
+PermanentError. It is then published to ``dead_letter_topic`` with the error
+in its attributes and acked. Pub/Sub only counts delivery attempts on
+subscriptions with a dead-letter policy, which ensure_subscription() sets up
+alongside the topic; without one, only PermanentErrors are dead-lettered and
+other failures keep being redelivered.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from google.api_core import exceptions as api_exceptions
+from google.cloud import pubsub_v1
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentError(Exception):
+    """A message that will never succeed; dead-letter it without retrying."""
+
+
+class Consumer:
+    subscription = None
+    topic = None
+    dead_letter_topic = None
+    ordered = False
+    max_delivery_attempts = 5
+    batch_size = 100
+    batch_wait = 0.2
+    max_messages = 1000
+    max_bytes = 64 * 1024 * 1024
+    lanes = 4
+    ack_deadline_seconds = 60
+
+    def handle_batch(self, messages):
+        """Process ``messages``; return ``{message: exception}`` for those that failed."""
+        raise NotImplementedError
+
+
+def ensure_subscription(consumer, project=None):
+    """Create the consumer's topic, dead-letter topic and subscription if missing."""
+    project = project or settings.PUBSUB_PROJECT_ID
+    publisher = pubsub_v1.PublisherClient()
+    subscriber = pubsub_v1.SubscriberClient()
+    for topic in filter(None, (consumer.topic, consumer.dead_letter_topic)):
+        try:
+            publisher.create_topic(name=publisher.topic_path(project, topic))
+        except api_exceptions.AlreadyExists:
+            pass
+    request = {
+        'name': subscriber.subscription_path(project, consumer.subscription),
+        'topic': publisher.topic_path(project, consumer.topic),
+        'ack_deadline_seconds': consumer.ack_deadline_seconds,
+        'enable_message_ordering': consumer.ordered,
+    }
+    if consumer.dead_letter_topic:
+        # Server-side policy too, so delivery_attempt is populated on messages.
+        request['dead_letter_policy'] = {
+            'dead_letter_topic': publisher.topic_path(project, consumer.dead_letter_topic),
+            'max_delivery_attempts': max(5, consumer.max_delivery_attempts),
+        }
+    try:
+        subscriber.create_subscription(request=request)
+    except api_exceptions.AlreadyExists:
+        pass
+
+
+class ConsumerRunner:
+    """Run one Consumer against its subscription until stopped."""
+
+    def __init__(self, consumer, *, project=None, subscriber=None, publisher=None):
+        self.consumer = consumer
+        self.project = project or settings.PUBSUB_PROJECT_ID
+        self.subscriber = subscriber or pubsub_v1.SubscriberClient()
+        self.publisher = publisher or (pubsub_v1.PublisherClient() if consumer.dead_letter_topic else None)
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        # Ordering key -> (id of its failed message, monotonic time the hold lapses).
+        self._held = {}
+        self._held_lock = threading.Lock()
+        self._inboxes = [queue.Queue() for _ in range(consumer.lanes)]
+        self._round_robin = itertools.count()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._future = None
+
+    @property
+    def subscription_path(self):
+        return self.subscriber.subscription_path(self.project, self.consumer.subscription)
+
+    def start(self):
+        for i, inbox in enumerate(self._inboxes):
+            thread = threading.Thread(
+                target=self._lane, args=(inbox,), name=f'pubsub-{self.consumer.subscription}-{i}', daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        flow_control = pubsub_v1.types.FlowControl(
+            max_messages=self.consumer.max_messages, max_bytes=self.consumer.max_bytes,
+        )
+        self._future = self.subscriber.subscribe(self.subscription_path, callback=self._receive, flow_control=flow_control)
+        logger.info('Consuming %s with %d lanes', self.subscription_path, len(self._inboxes))
+
+    def stop(self, timeout=30):
+        """Stop pulling, let lanes finish their current batch, and nack anything still queued."""
+        if self._future is not None:
+            self._future.cancel()
+            self._future.result(timeout=timeout)
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        for inbox in self._inboxes:
+            while True:
+                try:
+                    inbox.get_nowait().nack()
+                except queue.Empty:
+                    break
+
+    def run_forever(self, report_every=60):
+        self.start()
+        try:
+            while True:
+                time.sleep(report_every)
+                with self._stats_lock:
+                    snapshot, self.stats = self.stats, Counter()
+                if snapshot:
+                    logger.info('%s: %s in the last %ds', self.consumer.subscription, dict(snapshot), report_every)
+        finally:
+            self.stop()
+
+    # -- receiving -----------------------------------------------------------
+
+    def _receive(self, message):
+        if message.ordering_key:
+            lane = zlib.crc32(message.ordering_key.encode()) % len(self._inboxes)
+        else:
+            lane = next(self._round_robin) % len(self._inboxes)
+        self._inboxes[lane].put(message)
+
+    def _lane(self, inbox):
+        consumer = self.consumer
+        while not self._stopping.is_set():
+            try:
+                batch = [inbox.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + consumer.batch_wait
+            while len(batch) < consumer.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(inbox.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    # -- settling ------------------------------------------------------------
+
+    def _process(self, batch):
+        close_old_connections()
+        batch, held = self._split_held(batch)
+        for message in held:
+            message.nack()
+        failures = {}
+        if batch:
+            try:
+                failures = self.consumer.handle_batch(batch) or {}
+            except Exception as exc:
+                logger.exception('%s: batch of %d failed', self.consumer.subscription, len(batch))
+                failures = {message: exc for message in batch}
+        failed_keys, acked = set(), 0
+        for message in batch:
+            if message in failures:
+                self._fail(message, failures[message])
+                failed_keys.add(message.ordering_key)
+            elif self.consumer.ordered and message.ordering_key and message.ordering_key in failed_keys:
+                # Acking it would let it overtake the failed message of its key.
+                message.nack()
+                held.append(message)
+            else:
+                message.ack()
+                acked += 1
+        with self._stats_lock:
+            self.stats['acked'] += acked
+            self.stats['failed'] += len(failures)
+            self.stats['held'] += len(held)
+            self.stats['batches'] += 1
+
+    def _split_held(self, batch):
+        """``(ready, held)``: held messages wait behind a failed message of their ordering key."""
+        if not self.consumer.ordered:
+            return batch, []
+        now = time.monotonic()
+        ready, held = [], []
+        with self._held_lock:
+            for message in batch:
+                hold = self._held.get(message.ordering_key)
+                if hold and (hold[0] == message.message_id or hold[1] <= now):
+                    del self._held[message.ordering_key]
+                    hold = None
+                (held if hold else ready).append(message)
+        return ready, held
+
+    def _nack(self, message):
+        if self.consumer.ordered and message.ordering_key:
+            lapses = time.monotonic() + self.consumer.ack_deadline_seconds
+            with self._held_lock:
+                self._held.setdefault(message.ordering_key, (message.message_id, lapses))
+        message.nack()
+
+    def _fail(self, message, exc):
+        permanent = isinstance(exc, PermanentError)
+        # Only set on subscriptions with a dead-letter policy.
+        exhausted = (message.delivery_attempt or 0) >= self.consumer.max_delivery_attempts
+        if not self.consumer.dead_letter_topic or not (permanent or exhausted):
+            self._nack(message)
+            return
+        attributes = {
+            **message.attributes,
+            'dead_letter_error': f'{type(exc).__name__}: {exc}'[:1024],
+            'dead_letter_subscription': self.consumer.subscription,
+            'dead_letter_message_id': message.message_id,
+        }
+        topic = self.publisher.topic_path(self.project, self.consumer.dead_letter_topic)
+        future = self.publisher.publish(topic, message.data, **attributes)
+        # Only drop the original once the dead-letter copy is durable.
+        future.add_done_callback(lambda f: self._nack(message) if f.exception() else message.ack())
+        with self._stats_lock:
+            self.stats['dead_lettered'] += 1
@@ -0,0 +1,43 @@
+"""
+In-process rate limiting.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` are available. Requests above capacity are split."""
+        while tokens > 0:
+            take = min(tokens, self.capacity)
+            with self._lock:
+                self._refill()
+                if self._tokens >= take:
+                    self._tokens -= take
+                    tokens -= take
+                    continue
+                wait = (take - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,28 @@
+"""
+Signal handlers for the core app.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from redis.exceptions import RedisError
+
+from .flags import publish
+from .models import FeatureFlag
+
+logger = logging.getLogger(__name__)
+
+
+def _publish_flags():
+    try:
+        publish()
+    except RedisError:
+        logger.exception('Could not publish feature flags; run manage.py feature_flags --publish')
+
+
+@receiver(post_save, sender=FeatureFlag, dispatch_uid='core.publish_feature_flags_on_save')
+@receiver(post_delete, sender=FeatureFlag, dispatch_uid='core.publish_feature_flags_on_delete')
+def publish_feature_flags(sender, **kwargs):
+    transaction.on_commit(_publish_flags)
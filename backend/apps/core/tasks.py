@@ -0,0 +1,46 @@
+"""
+Celery tasks shared across apps.
+"""
+
+import logging
+
+from celery import current_app, shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from .counters import fold_counters
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FOLD_LOCK_KEY = 'core:counter_fold:lock'
+
+
+@shared_task(ignore_result=True)
+def fire_timers(task_name, calls):
+    """Run a batch of timer callbacks for ``task_name`` inline in this worker.
+
+    The timers were acked when the batch was sent, so a callback that fails
+    here is re-sent as its own task, which then retries under that task's
+    own policy.
+    """
+    task = current_app.tasks[task_name]
+    for kwargs in calls:
+        try:
+            task(**kwargs)
+        except Exception:
+            logger.exception('Timer callback %s failed for %s; re-sending it', task_name, kwargs)
+            task.apply_async(kwargs=kwargs, countdown=settings.TIMER_RETRY_SECONDS)
+
+
+@shared_task(ignore_result=True)
+def fold_sharded_counters():
+    """Fold counter shards into their totals; one fold runs at a time."""
+    if not cache.add(COUNTER_FOLD_LOCK_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('Counter fold already running, skipping')
+        return
+    try:
+        changed = fold_counters()
+    finally:
+        cache.delete(COUNTER_FOLD_LOCK_KEY)
+    if changed:
+        logger.info('Folded %d counters', changed)
@@ -0,0 +1,53 @@
+import pytest
+from django.contrib import admin
+from django.urls import path
+
+from apps.core.admin import estimated_count
+from apps.matching.admin import SwipeAdmin
+from apps.matching.models import Swipe
+from apps.users.models import User
+
+urlpatterns = [path('admin/', admin.site.urls)]
+
+pytestmark = pytest.mark.urls(__name__)
+
+
+@pytest.fixture(autouse=True)
+def static_storage(settings):
+    # The manifest storage only works after collectstatic.
+    settings.STORAGES = {**settings.STORAGES, 'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    }}
+
+
+@pytest.fixture
+def staff(client, db):
+    user = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+    client.force_login(user)
+    return user
+
+
+def test_estimated_count_of_an_empty_queryset_is_zero(db):
+    assert estimated_count(Swipe.objects.none()) == 0
+
+
+def test_search_no_field_can_match_lists_nothing(client, staff):
+    Swipe.objects.create(swiper=staff, target=User.objects.create(username='target'), direction='like')
+
+    response = client.get('/admin/matching/swipe/', {'q': 'foo'}, secure=True)
+
+    assert response.status_code == 200
+    assert response.context['cl'].result_count == 0 and response.context['cl'].result_list == []
+
+
+def test_pages_follow_the_keyset_cursor(client, staff, monkeypatch):
+    monkeypatch.setattr(SwipeAdmin, 'list_per_page', 2)
+    targets = User.objects.bulk_create(User(username=f'target{i}') for i in range(5))
+    swipes = Swipe.objects.bulk_create(Swipe(swiper=staff, target=t, direction='like') for t in targets)
+    newest = sorted((s.pk for s in swipes), reverse=True)
+
+    first = client.get('/admin/matching/swipe/', secure=True).context['cl']
+    second = client.get('/admin/matching/swipe/', {'after': first.next_cursor}, secure=True).context['cl']
+
+    assert [s.pk for s in first.result_list] == newest[:2] and first.result_count == 5
+    assert [s.pk for s in second.result_list] == newest[2:4] and second.multi_page
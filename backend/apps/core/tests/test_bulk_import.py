@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+
+from apps.core.bulk_import import ROW_COLUMN, CopyImporter
+from apps.core.models import FeatureFlag
+from apps.notifications.models import Notification
+
+
+def frame(column, values, **columns):
+    return pd.DataFrame({ROW_COLUMN: range(2, 2 + len(values)), column: values, **columns})
+
+
+def notifications(*fields):
+    return CopyImporter(Notification, {'user': 'user', **{name: name for name in fields}})
+
+
+def errors(importer):
+    return [(row, message) for row, _, _, message in importer.result.errors]
+
+
+def test_text_errors_are_reported_per_row():
+    importer = notifications('channel')
+
+    valid = importer.validate(frame('channel', ['email', 'pigeon', 'carrier-pigeon', 'sms'], user='1'))
+
+    assert list(valid['channel']) == ['email', 'sms']
+    assert errors(importer) == [
+        (4, 'Ensure this value has at most 8 characters.'),
+        (3, 'Select a valid choice.'),
+    ]
+
+
+def test_blank_cells_stage_the_field_default():
+    importer = notifications('channel', 'status', 'is_read')
+    rows = frame('channel', [''], status=' ', is_read='', user='1')
+
+    valid = importer.validate(rows)
+
+    assert valid[['channel', 'status', 'is_read']].values.tolist() == [['push', 'pending', False]]
+    assert importer.result.error_count == 0
+
+
+def test_a_default_outside_the_choices_is_rejected(monkeypatch):
+    monkeypatch.setattr(Notification._meta.get_field('channel'), 'default', 'fax')
+    importer = notifications('channel')
+
+    valid = importer.validate(frame('channel', ['', 'sms'], user='1'))
+
+    assert list(valid['channel']) == ['sms']
+    assert errors(importer) == [(2, 'Select a valid choice.')]
+
+
+def test_decimal_digits_and_places_are_checked():
+    importer = CopyImporter(FeatureFlag, {'name': 'name', 'rollout_percent': 'rollout_percent'})
+    rows = pd.DataFrame({
+        ROW_COLUMN: range(2, 9),
+        'name': list('abcdefg'),
+        'rollout_percent': ['12.5', '1.50', '0.125', '1000', 'lots', '', '2e1'],
+    })
+
+    valid = importer.validate(rows)
+
+    assert list(valid['rollout_percent']) == ['12.5', '1.50', 100, '2e1']
+    assert errors(importer) == [
+        (6, 'Enter a number.'),
+        (5, 'Ensure that there are no more than 3 digits before the decimal point.'),
+        (4, 'Ensure that there are no more than 2 decimal places.'),
+    ]
+
+
+@pytest.mark.parametrize('value, message', [
+    ('1.5', 'Enter a whole number.'),
+    ('', 'This field is required.'),
+])
+def test_key_fields_are_required_and_coerced(value, message):
+    importer = CopyImporter(FeatureFlag, {'id': 'id', 'name': 'name'}, key=['id'])
+
+    valid = importer.validate(pd.DataFrame({ROW_COLUMN: [2], 'id': [value], 'name': ['a']}))
+
+    assert valid.empty
+    assert errors(importer) == [(2, message)]
+
+
+@pytest.mark.django_db
+def test_run_merges_defaults_and_skips_rejected_rows(tmp_path):
+    FeatureFlag.objects.create(name='b', rollout_percent=10)
+    path = tmp_path / 'flags.csv'
+    path.write_text('name,enabled,rollout_percent\na,yes,\nb,,12.5\nc,no,0.125\n')
+
+    result = CopyImporter(FeatureFlag, {'name': 'name', 'enabled': 'enabled', 'rollout_percent': 'rollout_percent'},
+                          key=['name']).run(str(path))
+
+    assert (result.inserted, result.updated, result.skipped) == (1, 1, 1)
+    assert list(FeatureFlag.objects.values_list('name', 'enabled', 'rollout_percent')) == [
+        ('a', True, 100), ('b', False, 12.5),
+    ]
@@ -0,0 +1,100 @@
+from unittest import mock
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from apps.core import counters
+from apps.core.counters import (
+    CLAIM_SCRIPT, FOLD_FIELD, JOURNAL_KEY, SEQUENCE_KEY, SHARD_KEY, TOTALS_KEY, counter_key, fold_counters,
+    fold_shard, get, get_many, increment, increment_many,
+)
+from apps.core.models import Counter, JobCheckpoint
+
+PATH = 'communities/abc'
+MEMBERS = counter_key(PATH, 'memberCount')
+
+
+@pytest.fixture(autouse=True)
+def shards(settings):
+    settings.COUNTER_SHARDS = 1
+    settings.COUNTER_DEDUPE_SECONDS = 3600
+
+
+def claim(shard=0):
+    return counters._script(CLAIM_SCRIPT)(
+        keys=[SHARD_KEY.format(shard=shard), JOURNAL_KEY.format(shard=shard), SEQUENCE_KEY], args=[FOLD_FIELD],
+    )
+
+
+def test_a_redelivered_increment_is_applied_once(redis, db):
+    assert increment(PATH, {'memberCount': 1}, dedupe_id='msg-1')
+    assert not increment(PATH, {'memberCount': 1}, dedupe_id='msg-1')
+    assert increment(PATH, {'memberCount': 1})
+
+    assert increment_many([
+        (PATH, {'memberCount': 1, 'ratingSum': 4}, 'msg-2'),
+        (PATH, {'memberCount': 1, 'ratingSum': 4}, 'msg-2'),
+        (PATH, {'memberCount': 1}, 'msg-1'),
+    ]) == [True, False, False]
+    assert get(PATH, 'memberCount') == 3 and get(PATH, 'ratingSum') == 4
+
+
+def test_only_routed_fields_are_accepted(redis):
+    with pytest.raises(ValueError, match='likeCount'):
+        increment(PATH, {'memberCount': 1, 'likeCount': 1})
+
+
+def test_fold_moves_deltas_into_the_table_and_totals(redis, db):
+    increment(PATH, {'memberCount': 3, 'ratingSum': 0})
+    increment(PATH, {'memberCount': -1})
+
+    assert fold_counters(mirror=False) == 1
+
+    assert Counter.objects.get(key=MEMBERS).value == 2
+    assert not Counter.objects.filter(key=counter_key(PATH, 'ratingSum')).exists()
+    assert int(redis.hget(TOTALS_KEY, MEMBERS)) == 2
+    assert not redis.exists(SHARD_KEY.format(shard=0), JOURNAL_KEY.format(shard=0))
+    assert fold_shard(0) == {}
+
+
+def test_fold_that_died_after_committing_is_not_applied_twice(redis, db):
+    increment(PATH, {'memberCount': 3})
+    claim_script = counters._script(CLAIM_SCRIPT)
+    crashing = mock.Mock(wraps=redis)
+    crashing.pipeline.side_effect = ConnectionError('connection lost')
+
+    with mock.patch.object(counters, 'get_redis_connection', return_value=crashing), \
+            mock.patch.dict(counters._scripts, {CLAIM_SCRIPT: claim_script}):
+        with pytest.raises(ConnectionError):
+            fold_shard(0)
+
+    assert Counter.objects.get(key=MEMBERS).value == 3
+    assert JobCheckpoint.load('core.counters.fold.0') == {'fold': 1}
+    assert redis.exists(JOURNAL_KEY.format(shard=0))
+
+    increment(PATH, {'memberCount': 2})
+    assert fold_shard(0) == {MEMBERS: 3}
+    assert fold_shard(0) == {MEMBERS: 5}
+    assert Counter.objects.get(key=MEMBERS).value == 5 and get(PATH, 'memberCount') == 5
+
+
+def test_get_many_adds_totals_shard_and_journal(redis, db, settings):
+    settings.COUNTER_SHARDS = 2
+    unread, rating = counter_key(PATH, 'unreadCount'), counter_key(PATH, 'ratingSum')
+    redis.hset(TOTALS_KEY, mapping={MEMBERS: 10, unread: 1})
+    Counter.objects.create(key=rating, value=40)
+    redis.hset(SHARD_KEY.format(shard=0), mapping={MEMBERS: 2, unread: -4})
+    claim(0)
+    redis.hset(SHARD_KEY.format(shard=0), mapping={MEMBERS: 3})
+    redis.hset(SHARD_KEY.format(shard=1), mapping={rating: 5})
+
+    assert get_many([MEMBERS, unread, rating, counter_key(PATH, 'attendeeCount')]) == {
+        # Folded 10, journal 2, shard 3.
+        MEMBERS: 15,
+        # 1 - 4 clamps at zero.
+        unread: 0,
+        # No totals entry yet: the table's 40 plus the shard's 5.
+        rating: 45,
+        counter_key(PATH, 'attendeeCount'): 0,
+    }
+    assert get_many([]) == {}
@@ -0,0 +1,114 @@
+import os
+import threading
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from apps.core.firebase import get_firestore_client
+from apps.core.firestore_scan import ID_ALPHABET, CollectionScanner, id_split_points
+
+emulator = pytest.mark.skipif(not os.environ.get('FIRESTORE_EMULATOR_HOST'), reason='needs the Firestore emulator')
+
+
+def test_split_points_cut_the_prefix_space_evenly():
+    points = id_split_points(8)
+    positions = [ID_ALPHABET.index(p[0]) * len(ID_ALPHABET) + ID_ALPHABET.index(p[1]) for p in points]
+
+    assert len(points) == 7 and points == sorted(points)
+    widths = [b - a for a, b in zip([0] + positions, positions + [len(ID_ALPHABET) ** 2])]
+    assert max(widths) - min(widths) <= 1
+
+
+def test_ranges_are_contiguous_and_open_at_both_ends():
+    scanner = CollectionScanner('users', client=mock.MagicMock(), partitions=4, workers=2, page_size=10)
+    scanner.client.collection.return_value.document.side_effect = lambda point: point
+
+    ranges = scanner.ranges()
+
+    assert ranges == list(zip([None] + id_split_points(4), id_split_points(4) + [None]))
+
+
+class EndlessPages:
+    """Stands in for ``_fetch``: every range has more full pages than anyone will read."""
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, query):
+        with self.lock:
+            self.calls += 1
+            first = self.calls * self.page_size
+        return [SimpleNamespace(reference=i) for i in range(first, first + self.page_size)]
+
+
+def test_closing_the_stream_stops_workers_after_a_bounded_number_of_pages():
+    scanner = CollectionScanner('users', client=mock.MagicMock(), partitions=8, workers=2, page_size=5)
+    fetch = EndlessPages(scanner.page_size)
+
+    with mock.patch.object(scanner, '_fetch', fetch):
+        stream = scanner.stream()
+        assert len([next(stream) for _ in range(12)]) == 12
+        stream.close()
+
+    # Queue slots, pages held by blocked workers, and the pages yielded so far.
+    assert fetch.calls <= scanner.workers * 2 + scanner.workers + 3
+    assert not [t for t in threading.enumerate() if t.name.startswith('firestore-scan-users')]
+
+
+def test_a_failing_range_fails_the_scan():
+    scanner = CollectionScanner('users', client=mock.MagicMock(), partitions=4, workers=2, page_size=5)
+
+    with mock.patch.object(scanner, '_fetch', side_effect=ValueError('bad range')):
+        with pytest.raises(ValueError, match='bad range'):
+            list(scanner.stream())
+
+
+@pytest.fixture
+def client():
+    return get_firestore_client()
+
+
+@pytest.fixture
+def collection(client):
+    collection = client.collection(f'_scan_test_{uuid.uuid4().hex[:8]}')
+    yield collection
+    for doc in collection.select([]).stream():
+        doc.reference.delete()
+
+
+@emulator
+def test_every_document_is_read_exactly_once(client, collection):
+    # Auto ids plus ids sitting exactly on and around split points.
+    ids = [uuid.uuid4().hex[:20] for _ in range(40)] + id_split_points(8) + [p + '0' for p in id_split_points(8)]
+    ids += ['0', 'zzzz']
+    for doc_id in ids:
+        collection.document(doc_id).set({'n': 1, 'bulky': 'x' * 100})
+
+    scanner = CollectionScanner(collection.id, client=client, partitions=8, workers=3, page_size=3, fields=['n'])
+    docs = list(scanner.stream())
+
+    assert sorted(d.id for d in docs) == sorted(ids)
+    assert all(d.to_dict() == {'n': 1} for d in docs)
+
+
+@emulator
+def test_collection_group_scan_reads_every_subcollection(client, collection):
+    group = f'_scan_group_{uuid.uuid4().hex[:8]}'
+    expected = set()
+    for parent in ('a', 'b', 'c'):
+        for i in range(7):
+            ref = collection.document(parent).collection(group).document(f'{parent}{i}')
+            ref.set({'i': i})
+            expected.add(ref.path)
+
+    scanner = CollectionScanner(group, client=client, group=True, partitions=4, workers=2, page_size=4)
+    try:
+        assert {d.reference.path for d in scanner.stream()} == expected
+    finally:
+        for path in expected:
+            client.document(path).delete()
+
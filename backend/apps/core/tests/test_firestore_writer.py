@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from google.cloud.firestore_v1.bulk_batch import BulkWriteBatch
+from google.rpc import code_pb2
+
+from apps.core import firestore_writer
+from apps.core.firebase import get_firestore_client
+from apps.core.firestore_writer import BulkWriter
+from apps.core.models import JobCheckpoint
+
+pytestmark = [
+    pytest.mark.skipif(not os.environ.get('FIRESTORE_EMULATOR_HOST'), reason='needs the Firestore emulator'),
+    pytest.mark.django_db,
+]
+
+
+@pytest.fixture
+def client():
+    return get_firestore_client()
+
+
+@pytest.fixture
+def collection(client):
+    collection = client.collection(f'_bulk_writer_test_{uuid.uuid4().hex[:8]}')
+    yield collection
+    for doc in collection.select([]).stream():
+        doc.reference.delete()
+
+
+@pytest.fixture
+def commits():
+    """Sizes of every batch_write RPC; ``fail`` maps a commit number to (code, writes to fail)."""
+    sizes, fail = [], {}
+
+    class RecordingBatch(BulkWriteBatch):
+        def commit(self, retry=None, timeout=None):
+            size = len(self._write_pbs)
+            response = super().commit(retry=retry, timeout=timeout)
+            code, count = fail.get(len(sizes), (code_pb2.OK, 0))
+            for status in response.status[:count]:
+                status.code = code
+            sizes.append(size)
+            return response
+
+    # No backoff between attempts.
+    with mock.patch.object(firestore_writer, 'BulkWriteBatch', RecordingBatch), \
+            mock.patch.object(firestore_writer, 'random', mock.Mock(uniform=mock.Mock(return_value=0))):
+        yield SimpleNamespace(sizes=sizes, fail=fail)
+
+
+def count(collection):
+    return collection.count().get()[0][0].value
+
+
+def test_starts_at_500_ops_and_ramps_by_half_every_five_minutes_up_to_the_cap(client, collection):
+    writer = BulkWriter(client, max_workers=4, max_ops_per_second=1000)
+    assert writer._bucket.rate == 500
+
+    started = time.monotonic()
+    for i in range(1500):
+        writer.set(collection.document(f'doc{i:04d}'), {'i': i})
+    writer.flush()
+    # A full 500-token burst, then 1000 more writes at 500/s.
+    assert time.monotonic() - started >= 1.8
+    assert writer._bucket.rate == 500
+
+    rates = []
+    for step in range(3):
+        writer._ramped_at -= firestore_writer.RAMP_INTERVAL_SECONDS
+        writer.set(collection.document(f'ramp{step}'), {'step': step})
+        writer.flush()
+        rates.append(writer._bucket.rate)
+    writer.close()
+
+    assert rates == [750, 1000, 1000]
+    assert writer.result.written == 1503
+    assert count(collection) == 1503
+
+
+def test_only_writes_with_a_retryable_status_are_resent(client, collection, commits):
+    commits.fail[0] = (code_pb2.ABORTED, 3)
+
+    with BulkWriter(client, max_workers=4) as writer:
+        for i in range(10):
+            writer.set(collection.document(f'doc{i}'), {'i': i})
+
+    assert commits.sizes == [10, 3]
+    assert (writer.result.written, writer.result.retried, writer.result.failed) == (10, 3, 0)
+    assert count(collection) == 10
+
+
+def test_writes_with_a_permanent_status_fail_without_a_retry(client, collection, commits):
+    collection.document('taken').set({'i': 0})
+
+    with BulkWriter(client, max_workers=4) as writer:
+        writer.create(collection.document('taken'), {'i': 1})
+        writer.create(collection.document('free'), {'i': 1})
+
+    assert commits.sizes == [2]
+    assert (writer.result.written, writer.result.retried, writer.result.failed) == (1, 0, 1)
+    assert writer.result.errors[0][:2] == (collection.document('taken').path, code_pb2.ALREADY_EXISTS)
+    assert collection.document('taken').get().to_dict() == {'i': 0}
+
+
+def test_resumes_from_the_last_committed_mark(client, collection):
+    name = f'core.bulk_writer_test.{uuid.uuid4().hex[:8]}'
+
+    writer = BulkWriter(client, checkpoint=name, max_workers=4)
+    for i in range(1200):
+        writer.set(collection.document(f'doc{i:04d}'), {'i': i, 'run': 1})
+        if i % 100 == 99:
+            writer.mark({'next': i + 1})
+    # Stopped without finishing, like a crashed job.
+    writer.close(clear_checkpoint=False)
+    assert JobCheckpoint.load(name) == {'next': 1200}
+
+    with BulkWriter(client, checkpoint=name, max_workers=4) as writer:
+        start = writer.resume_state['next']
+        for i in range(start, 2000):
+            writer.set(collection.document(f'doc{i:04d}'), {'i': i, 'run': 2})
+            if i % 100 == 99:
+                writer.mark({'next': i + 1})
+
+    assert writer.result.written == 800
+    assert JobCheckpoint.load(name) == {}
+    assert count(collection) == 2000
+
+
+def test_checkpoint_never_moves_past_a_failed_write(client, collection, commits):
+    name = f'core.bulk_writer_test.{uuid.uuid4().hex[:8]}'
+    commits.fail[1] = (code_pb2.PERMISSION_DENIED, 1)
+
+    with BulkWriter(client, checkpoint=name, max_workers=1) as writer:
+        for i in range(1500):
+            writer.set(collection.document(f'doc{i:04d}'), {'i': i})
+            if i % 500 == 499:
+                writer.mark({'next': i + 1})
+
+    assert writer.result.failed == 1
+    # The first batch may or may not have been recorded before the second failed.
+    assert JobCheckpoint.load(name).get('next', 0) <= 500
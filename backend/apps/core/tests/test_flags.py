@@ -0,0 +1,122 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from apps.core import flags
+from apps.core.flags import (
+    BUCKETS, SNAPSHOT_KEY, VERSION_KEY, CompiledFlag, FeatureFlagPermission, FlagStore, bucket, evaluation_counts,
+    publish,
+)
+from apps.core.models import FeatureFlag
+
+USERS = range(1, 4001)
+
+
+@pytest.fixture
+def store():
+    """A process's store without its listener thread, standing in for the module's."""
+    store = FlagStore()
+    store._started = True
+    with mock.patch.object(flags, 'store', store), mock.patch.object(flags, 'is_enabled', store.is_enabled):
+        yield store
+
+
+def rollout(name, percent):
+    flag = CompiledFlag(name, True, percent)
+    return {user_id for user_id in USERS if flag.evaluate(user_id)}
+
+
+def test_buckets_are_stable_and_keyed_by_flag():
+    buckets = [bucket('videoCalls', user_id) for user_id in USERS]
+
+    assert buckets == [bucket('videoCalls', user_id, flags._hasher('videoCalls')) for user_id in USERS]
+    assert all(0 <= b < BUCKETS for b in buckets)
+    assert buckets != [bucket('voiceMessages', user_id) for user_id in USERS]
+
+
+def test_raising_the_rollout_only_adds_users():
+    ten, twenty_five, half = rollout('videoCalls', 10), rollout('videoCalls', 25), rollout('videoCalls', 50)
+
+    assert ten <= twenty_five <= half
+    assert abs(len(ten) - 400) < 80 and abs(len(half) - 2000) < 150
+    # Another flag's 10% is a different 10%.
+    assert len(ten & rollout('voiceMessages', 10)) < len(ten) / 2
+
+
+def test_listed_users_disabled_flags_and_anonymous_users():
+    flag = CompiledFlag('videoCalls', True, 0, user_ids=[7])
+
+    assert flag.evaluate(7) and not flag.evaluate(8) and not flag.evaluate(None)
+    assert CompiledFlag('videoCalls', True, 100).evaluate(None)
+    assert not CompiledFlag('videoCalls', False, 100, user_ids=[7]).evaluate(7)
+
+
+def test_install_ignores_versions_not_newer_than_the_held_one(store):
+    on = [{'name': 'videoCalls', 'enabled': True, 'rollout_percent': 100, 'user_ids': []}]
+    off = [{**on[0], 'enabled': False}]
+
+    assert store.install(2, on)
+    assert not store.install(1, off)
+    assert not store.install(2, off)
+
+    assert store.version == 2 and store.is_enabled('videoCalls')
+    assert store.is_enabled('discovery') and not store.is_enabled('noSuchFlag')
+
+
+def test_publish_stores_a_new_snapshot_and_installs_it(store, redis, db):
+    FeatureFlag.objects.create(name='videoCalls', enabled=True, rollout_percent=12.5, user_ids=[3])
+
+    assert publish() == 1
+    FeatureFlag.objects.filter(name='videoCalls').update(enabled=False)
+    assert publish() == 2
+
+    snapshot = json.loads(redis.get(SNAPSHOT_KEY))
+    assert snapshot == {'version': 2, 'flags': [
+        {'name': 'videoCalls', 'enabled': False, 'rollout_percent': 12.5, 'user_ids': [3]},
+    ]}
+    assert int(redis.get(VERSION_KEY)) == 2
+    assert store.version == 2 and not store.is_enabled('videoCalls', 3)
+
+    # A process that missed both messages catches up on its next sync.
+    behind = FlagStore()
+    behind.sync()
+    assert behind.version == 2 and behind.flags['videoCalls'].threshold == 1250
+
+
+def test_an_older_publish_never_overwrites_a_newer_snapshot(store, redis, db):
+    publish()
+    publish()
+
+    assert flags._publish_script()(keys=[VERSION_KEY, SNAPSHOT_KEY], args=[1, '{}', flags.CHANNEL]) == 0
+    assert json.loads(redis.get(SNAPSHOT_KEY))['version'] == 2
+
+
+def test_permission_follows_the_views_flag(store):
+    store.install(1, [{'name': 'videoCalls', 'enabled': True, 'rollout_percent': 0, 'user_ids': [5]}])
+    permission = FeatureFlagPermission()
+
+    def request(user_id=None):
+        return SimpleNamespace(user=SimpleNamespace(is_authenticated=user_id is not None, pk=user_id))
+
+    assert permission.has_permission(request(5), SimpleNamespace(feature_flag='videoCalls'))
+    assert not permission.has_permission(request(6), SimpleNamespace(feature_flag='videoCalls'))
+    assert not permission.has_permission(request(), SimpleNamespace(feature_flag='videoCalls'))
+    assert permission.has_permission(request(6), SimpleNamespace())
+
+
+def test_counts_from_every_process_add_up(store, redis):
+    other = FlagStore()
+    other._started = True
+    for user_id in range(3):
+        store.is_enabled('discovery', user_id)
+        store.is_enabled('videoCalls', user_id)
+    other.is_enabled('videoCalls')
+
+    store.flush_counts()
+    other.flush_counts()
+    other.flush_counts()
+
+    assert store.local_counts() == {} and other.local_counts() == {}
+    assert evaluation_counts() == {'discovery': (0, 3), 'videoCalls': (4, 0)}
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import geoip2.errors
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from apps.core import geoip
+from apps.core.middleware import GeoIPMiddleware
+
+
+class StubReader:
+    """Answers ``city()`` for a few networks and records every address it was asked about."""
+
+    def __init__(self, cities):
+        self.cities = cities
+        self.calls = []
+
+    def city(self, address):
+        self.calls.append(address)
+        for network, name in self.cities.items():
+            if address.startswith(network):
+                return SimpleNamespace(
+                    country=SimpleNamespace(iso_code='PT'),
+                    subdivisions=SimpleNamespace(most_specific=SimpleNamespace(iso_code='11')),
+                    city=SimpleNamespace(name=name),
+                    location=SimpleNamespace(latitude=38.7, longitude=-9.1, time_zone='Europe/Lisbon'),
+                )
+        raise geoip2.errors.AddressNotFoundError(address)
+
+
+@pytest.fixture
+def reader():
+    reader = StubReader({'81.84.12.': 'Lisbon', '2a01:4f8:10::': 'Porto'})
+    geoip._prefix_lookup.cache_clear()
+    with mock.patch.object(geoip, 'get_reader', return_value=reader):
+        yield reader
+    geoip._prefix_lookup.cache_clear()
+
+
+def test_addresses_in_one_network_share_a_lookup(reader):
+    assert geoip.lookup('81.84.12.7').city == 'Lisbon'
+    assert geoip.lookup('81.84.12.200').city == 'Lisbon'
+    assert geoip.lookup('2a01:4f8:10:1::5').city == 'Porto'
+    assert geoip.lookup('2a01:4f8:10:ffff::1').city == 'Porto'
+
+    assert reader.calls == ['81.84.12.0', '2a01:4f8:10::']
+
+
+def test_unknown_networks_are_cached_as_misses(reader):
+    assert geoip.lookup('81.84.13.1') is None
+    assert geoip.lookup('81.84.13.2') is None
+
+    assert reader.calls == ['81.84.13.0']
+
+
+def test_private_and_malformed_addresses_never_reach_the_reader(reader):
+    assert geoip.lookup('10.0.0.1') is None
+    assert geoip.lookup('::1') is None
+    assert geoip.lookup('not-an-ip') is None
+
+    assert reader.calls == []
+
+
+def test_bulk_lookup_resolves_each_prefix_once(reader):
+    results = geoip.bulk_lookup(['81.84.12.1', '81.84.12.2', '81.84.12.1', '192.168.1.1', 'junk'])
+
+    assert {address: r and r.city for address, r in results.items()} == {
+        '81.84.12.1': 'Lisbon', '81.84.12.2': 'Lisbon', '192.168.1.1': None, 'junk': None,
+    }
+    assert reader.calls == ['81.84.12.0']
+
+
+def test_middleware_looks_up_only_when_geo_is_read(reader, settings):
+    settings.GEOIP_TRUST_FORWARDED_FOR = True
+    seen = []
+    middleware = GeoIPMiddleware(lambda request: seen.append(request) or HttpResponse())
+
+    middleware(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='81.84.12.9, 10.0.0.1'))
+    assert reader.calls == []
+
+    assert seen[0].geo.city == 'Lisbon'
+    assert reader.calls == ['81.84.12.0']
+
+
+def test_middleware_ignores_forwarded_for_unless_trusted(reader, settings):
+    settings.GEOIP_TRUST_FORWARDED_FOR = False
+    seen = []
+    middleware = GeoIPMiddleware(lambda request: seen.append(request) or HttpResponse())
+
+    middleware(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='81.84.12.9'))
+
+    assert not seen[0].geo
+    assert reader.calls == []
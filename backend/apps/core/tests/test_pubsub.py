@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+
+from apps.core import pubsub
+from apps.core.pubsub import Consumer, ConsumerRunner, PermanentError
+
+
+class FlakyConsumer(Consumer):
+    subscription = 'test'
+    topic = 'test'
+    dead_letter_topic = 'test-dead-letter'
+    ordered = True
+
+    def __init__(self):
+        self.failing, self.handled = set(), []
+
+    def handle_batch(self, messages):
+        self.handled.append([message.message_id for message in messages])
+        return {
+            message: PermanentError('bad') if message.message_id.startswith('poison') else RuntimeError('down')
+            for message in messages if message.message_id in self.failing
+        }
+
+
+def message(message_id, ordering_key='', delivery_attempt=None):
+    return mock.Mock(
+        message_id=message_id, ordering_key=ordering_key, delivery_attempt=delivery_attempt,
+        data=b'{}', attributes={},
+    )
+
+
+def settled(*messages):
+    return ['ack' if m.ack.called else 'nack' if m.nack.called else None for m in messages]
+
+
+@pytest.fixture
+def consumer():
+    return FlakyConsumer()
+
+
+@pytest.fixture
+def runner(consumer):
+    publisher = mock.Mock()
+    publisher.publish.return_value.add_done_callback.side_effect = lambda callback: callback(
+        mock.Mock(exception=mock.Mock(return_value=None)),
+    )
+    return ConsumerRunner(consumer, project='test', subscriber=mock.Mock(), publisher=publisher)
+
+
+def test_later_messages_of_a_failed_key_are_nacked_until_it_is_redelivered(consumer, runner):
+    consumer.failing = {'a1'}
+    a1, a2, b1 = message('a1', 'a'), message('a2', 'a'), message('b1', 'b')
+    runner._process([a1, a2, b1])
+    assert settled(a1, a2, b1) == ['nack', 'nack', 'ack']
+
+    a3 = message('a3', 'a')
+    runner._process([a3])
+    assert settled(a3) == ['nack']
+    assert consumer.handled == [['a1', 'a2', 'b1']]
+
+    consumer.failing = set()
+    a1, a2 = message('a1', 'a', 2), message('a2', 'a', 2)
+    runner._process([a1, a2])
+    assert settled(a1, a2) == ['ack', 'ack']
+    assert runner.stats['held'] == 2
+
+
+def test_a_hold_lapses_after_the_ack_deadline(consumer, runner):
+    clock = mock.Mock(monotonic=mock.Mock(return_value=100.0))
+    consumer.failing = {'a1'}
+    with mock.patch.object(pubsub, 'time', clock):
+        runner._process([message('a1', 'a')])
+        clock.monotonic.return_value += consumer.ack_deadline_seconds
+        a2 = message('a2', 'a')
+        runner._process([a2])
+
+    assert settled(a2) == ['ack']
+
+
+def test_unordered_consumers_ack_whatever_succeeded(consumer, runner):
+    consumer.ordered = False
+    consumer.failing = {'a1'}
+    a1, a2 = message('a1', 'a'), message('a2', 'a')
+
+    runner._process([a1, a2])
+
+    assert settled(a1, a2) == ['nack', 'ack']
+
+
+def test_dead_letters_once_delivery_attempt_reaches_the_limit(consumer, runner):
+    consumer.failing = {'a1'}
+    early = message('a1', delivery_attempt=consumer.max_delivery_attempts - 1)
+    runner._process([early])
+    last = message('a1', delivery_attempt=consumer.max_delivery_attempts)
+    runner._process([last])
+
+    assert settled(early, last) == ['nack', 'ack']
+    runner.publisher.publish.assert_called_once()
+    assert runner.publisher.publish.call_args.kwargs['dead_letter_message_id'] == 'a1'
+
+
+def test_without_a_delivery_attempt_only_permanent_errors_are_dead_lettered(consumer, runner):
+    consumer.failing = {'a1', 'poison1'}
+    for _ in range(consumer.max_delivery_attempts + 1):
+        retried, poison = message('a1'), message('poison1')
+        runner._process([retried, poison])
+        assert settled(retried, poison) == ['nack', 'ack']
+
+    assert runner.publisher.publish.call_count == consumer.max_delivery_attempts + 1
+    assert {call.kwargs['dead_letter_message_id'] for call in runner.publisher.publish.call_args_list} == {'poison1'}
@@ -0,0 +1,107 @@
+from unittest import mock
+
+import pytest
+
+from apps.core import throttling
+from apps.core.throttling import SlidingWindowThrottle
+
+HOUR = 3600
+T0 = 1_700_000_000 // HOUR * HOUR
+
+
+class Workers:
+    """Several worker processes' lease tables against one (fake) Redis, with a controllable clock."""
+
+    def __init__(self, count):
+        self.tables = [({}, [0.0]) for _ in range(count)]
+        self.now = T0
+
+    def consume(self, worker, key='throttle_user_1', limit=1000, duration=HOUR):
+        leases, swept = self.tables[worker]
+        with mock.patch.object(throttling, '_leases', leases), \
+                mock.patch.object(throttling, '_swept_at', swept[0]), \
+                mock.patch.object(throttling, 'time', mock.Mock(time=mock.Mock(return_value=self.now))):
+            allowed = SlidingWindowThrottle.consume(SlidingWindowThrottle.__new__(SlidingWindowThrottle),
+                                                    key, limit, duration)
+            swept[0] = throttling._swept_at
+        return allowed
+
+
+def charged(redis, window=0, key='throttle_user_1', duration=HOUR):
+    return int(redis.get(f'greengo:{key}:{(T0 + window * duration) // duration}') or 0)
+
+
+@pytest.fixture(autouse=True)
+def lease_settings(settings):
+    settings.THROTTLE_LEASE_SIZE = 20
+    settings.THROTTLE_LEASE_DIVISOR = 20
+    settings.THROTTLE_LEASE_SECONDS = 10
+
+
+def test_sparse_traffic_over_many_workers_gets_the_whole_budget(redis):
+    # 1000/hour spread round-robin over 16 workers: every lease expires before
+    # its worker sees the caller again, so each one used to cost a full lease.
+    workers = Workers(16)
+    allowed = 0
+    for i in range(1000):
+        workers.now = T0 + i * 3.5
+        allowed += workers.consume(i % 16)
+
+    assert allowed == 1000
+    assert charged(redis) == 1000
+
+
+def test_burst_over_many_workers_never_exceeds_the_limit(redis):
+    workers = Workers(8)
+    allowed = sum(workers.consume(i % 8, limit=100, duration=60) for i in range(300))
+
+    assert allowed == 100
+    assert charged(redis, duration=60) == 100
+
+
+def test_expired_lease_returns_its_unused_tokens(redis):
+    workers = Workers(1)
+    for _ in range(8):
+        assert workers.consume(0)
+    # Leases of 1, 2, 4 and then 8 (capped at 1000 // 20 = 50): seven tokens unused.
+    assert charged(redis) == 15
+
+    workers.now += 11
+    assert workers.consume(0)
+    # The seven leftovers went back; the next lease is sized to what the last one used.
+    assert charged(redis) == 15 - 7 + 1
+    lease = workers.tables[0][0]['throttle_user_1']
+    assert (lease.size, lease.remaining) == (1, 0)
+
+
+def test_idle_leases_are_swept_back_by_later_traffic(redis):
+    workers = Workers(1)
+    for _ in range(4):
+        workers.consume(0, key='throttle_user_1')
+    assert charged(redis) == 7
+
+    workers.now += 11
+    workers.consume(0, key='throttle_user_2')
+
+    assert charged(redis) == 4
+    assert 'throttle_user_1' not in workers.tables[0][0]
+
+
+def test_window_rollover_refunds_into_the_previous_window(redis):
+    workers = Workers(1)
+    workers.now = T0 + HOUR - 1
+    for _ in range(4):
+        workers.consume(0)
+    assert charged(redis) == 7
+
+    workers.now = T0 + HOUR + 1
+    assert workers.consume(0)
+
+    assert charged(redis) == 4
+    assert charged(redis, window=1) == 1
+
+
+def test_fails_open_without_redis(settings):
+    settings.FAKE_REDIS_SERVER.connected = False
+
+    assert Workers(1).consume(0)
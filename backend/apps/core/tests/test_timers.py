@@ -0,0 +1,146 @@
+import random
+from unittest import mock
+
+import pytest
+
+from apps.core import tasks
+from apps.core.timers import DUE_KEY, PAYLOAD_KEY, PROCESSING_KEY, TimerScheduler, TimerStore, TimingWheel
+
+T0 = 1_700_000_000.0
+
+
+def test_wheel_fires_in_deadline_order_across_levels():
+    wheel = TimingWheel(tick=1.0, slots=8, levels=3, start=0)
+    rng = random.Random(1)
+    deadlines = {f't{i}': rng.randrange(0, 8 ** 3 - 1) for i in range(500)}
+    for name, due in deadlines.items():
+        wheel.add(due, name)
+
+    fired = []
+    for now in range(0, 8 ** 3, 7):
+        batch = wheel.advance(now)
+        assert all(deadlines[name] <= now for name in batch)
+        fired.extend(batch)
+
+    assert sorted(fired) == sorted(deadlines)
+    assert [deadlines[name] for name in fired] == sorted(deadlines.values())
+    assert len(wheel) == 0
+
+
+def test_wheel_fires_past_deadlines_on_the_next_tick_and_rejects_beyond_horizon():
+    wheel = TimingWheel(tick=1.0, slots=4, levels=2, start=100)
+    wheel.add(5, 'late')
+    assert wheel.advance(100) == ['late']
+    with pytest.raises(ValueError):
+        wheel.add(101 + 16, 'too far')
+
+
+@pytest.fixture
+def store(redis):
+    return TimerStore(redis)
+
+
+@pytest.fixture
+def send_task():
+    with mock.patch('apps.core.timers.current_app') as app:
+        yield app.send_task
+
+
+def scheduler(store, **kwargs):
+    kwargs = {'tick': 1.0, 'lookahead': 60, 'batch_size': 100, 'claim_timeout': 30, **kwargs}
+    sched = TimerScheduler(store, **kwargs)
+    sched.wheel = TimingWheel(tick=1.0, start=T0)
+    return sched
+
+
+def sent(send_task):
+    return [call.kwargs['args'] for call in send_task.call_args_list]
+
+
+def test_due_timers_are_dispatched_grouped_by_task_and_forgotten(store, send_task, redis):
+    store.schedule_many([
+        ('a', T0 + 5, 'events.remind', {'id': 1}),
+        ('b', T0 + 5, 'events.remind', {'id': 2}),
+        ('c', T0 + 6, 'chat.expire', {'id': 3}),
+    ])
+    sched = scheduler(store)
+
+    assert sched.step(T0) == 0
+    assert sched.step(T0 + 5) == 2
+    assert sched.step(T0 + 6) == 1
+
+    assert sent(send_task) == [['events.remind', [{'id': 1}, {'id': 2}]], ['chat.expire', [{'id': 3}]]]
+    assert redis.zcard(DUE_KEY) == redis.zcard(PROCESSING_KEY) == redis.hlen(PAYLOAD_KEY) == 0
+
+
+def test_failed_send_keeps_the_claim_and_is_retried_after_the_timeout(store, send_task, redis):
+    store.schedule_many([('a', T0 + 1, 'events.remind', {'id': 1})])
+    sched = scheduler(store, claim_timeout=30)
+    sched.step(T0)
+    send_task.side_effect = ConnectionError('broker down')
+
+    assert sched.step(T0 + 1) == 0
+    assert redis.zscore(PROCESSING_KEY, 'a') == T0 + 1
+    assert redis.hexists(PAYLOAD_KEY, 'a')
+
+    send_task.side_effect = None
+    # A fresh scheduler, as after a restart: the stale claim goes back to DUE.
+    sched = scheduler(store, claim_timeout=30)
+    assert sched.step(T0 + 20) == 0
+    # Recovered at the first refresh past the timeout (every lookahead / 4).
+    assert sched.step(T0 + 35) == 1
+    assert sent(send_task)[-1] == ['events.remind', [{'id': 1}]]
+    assert redis.zcard(PROCESSING_KEY) == redis.hlen(PAYLOAD_KEY) == 0
+
+
+def test_rescheduled_earlier_while_loaded_fires_once_at_the_new_time(store, send_task):
+    store.schedule_many([('a', T0 + 50, 'events.remind', {'v': 1})])
+    sched = scheduler(store, lookahead=60)
+    sched.step(T0)
+    assert sched._loaded == {'a': T0 + 50}
+
+    store.schedule_many([('a', T0 + 20, 'events.remind', {'v': 2})])
+    sched.step(T0 + 15)   # refresh: lookahead / 4
+    assert sched.step(T0 + 20) == 1
+    assert sent(send_task) == [['events.remind', [{'v': 2}]]]
+
+    assert sched.step(T0 + 50) == 0
+    assert send_task.call_count == 1
+
+
+def test_rescheduled_later_and_cancelled_timers_do_not_fire_early(store, send_task):
+    store.schedule_many([
+        ('later', T0 + 10, 'events.remind', {}),
+        ('cancelled', T0 + 10, 'events.remind', {}),
+    ])
+    sched = scheduler(store, lookahead=60)
+    sched.step(T0)
+    store.schedule_many([('later', T0 + 100, 'events.remind', {'moved': True})])
+    store.cancel('cancelled')
+
+    assert sched.step(T0 + 10) == 0
+    for now in range(int(T0) + 11, int(T0) + 100, 5):
+        sched.step(now)
+    assert sched.step(T0 + 100) == 1
+    assert sent(send_task) == [['events.remind', [{'moved': True}]]]
+
+
+def test_refresh_reads_only_the_new_part_of_the_window(store, send_task):
+    sched = scheduler(store, lookahead=60)
+    with mock.patch.object(store, 'window', wraps=store.window) as window:
+        sched.refresh(T0)
+        store.schedule_many([('soon', T0 + 5, 'events.remind', {})])
+        sched.refresh(T0 + 15)
+
+    assert [call.args[:2] for call in window.call_args_list] == [(None, T0 + 60), (T0 + 60, T0 + 75)]
+    # Scheduled inside the range already read: picked up from the change log.
+    assert sched._loaded == {'soon': T0 + 5}
+
+
+def test_failed_callbacks_are_re_sent_on_their_own(settings):
+    callback = mock.Mock(side_effect=lambda user_id: 1 / (user_id - 2))
+    with mock.patch.object(tasks, 'current_app', mock.Mock(tasks={'reminders.send': callback})):
+        tasks.fire_timers('reminders.send', [{'user_id': 1}, {'user_id': 2}, {'user_id': 3}])
+
+    assert callback.call_count == 3
+    callback.apply_async.assert_called_once_with(kwargs={'user_id': 2}, countdown=settings.TIMER_RETRY_SECONDS)
@@ -0,0 +1,191 @@
+"""
+Sliding-window throttles backed by Redis with locally leased budgets.
+
+DRF's stock throttles read and rewrite a full timestamp list in the cache on
+every request. These classes keep one integer per ``(scope, ident, window)``
+in Redis and estimate the sliding window as ``current + previous * overlap``.
+A worker atomically leases a small slice of the remaining budget and spends it
+locally, so most requests are decided in-process without touching Redis.
+
+Leased tokens are charged to the window when granted. Whatever a lease has
+not spent when it expires, runs out of window or is replaced is given back
+with DECRBY, and lease sizes follow each worker's recent use (starting at
+one token), so a caller spread thinly over many workers is charged for the
+requests it made rather than for the leases it touched.
+
+Rates come from ``DEFAULT_THROTTLE_RATES`` as before; ``THROTTLE_TIER_RATES``
+optionally overrides a scope's rate per membership tier.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import throttling
+
+logger = logging.getLogger(__name__)
+
+# Returns ARGV[5] unused tokens of a replaced lease to KEYS[3], then grants up
+# to ARGV[3] tokens from the estimated sliding-window budget.
+LEASE_SCRIPT = """
+local refund = tonumber(ARGV[5])
+if refund > 0 and redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('DECRBY', KEYS[3], refund)
+end
+local limit = tonumber(ARGV[1])
+local overlap = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local free = limit - current - math.floor(previous * overlap)
+if free <= 0 then
+    return 0
+end
+local grant = math.min(free, want)
+redis.call('INCRBY', KEYS[1], grant)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return grant
+"""
+
+# Returns ARGV[1] unused tokens to KEYS[1], unless the window is already gone.
+REFUND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('DECRBY', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+MAX_LEASES = 100_000
+
+_leases = {}
+_leases_lock = threading.Lock()
+_swept_at = 0.0
+_scripts = {}
+
+
+def _script(source):
+    if source not in _scripts:
+        _scripts[source] = get_redis_connection('default').register_script(source)
+    return _scripts[source]
+
+
+class _Lease:
+    """Tokens leased from the Redis counter ``counter``, spendable until ``expires``."""
+
+    __slots__ = ('counter', 'window', 'expires', 'size', 'remaining', 'next_size')
+
+    def __init__(self, counter, window, expires, size):
+        self.counter = counter
+        self.window = window
+        self.expires = expires
+        self.size = size
+        self.remaining = size
+        self.next_size = size
+
+    def close(self, now):
+        """Mark the lease spent, size the next one, and return how many tokens it still held."""
+        unused, self.remaining = self.remaining, 0
+        # Ran out while still valid: demand outpaces the lease, so double it.
+        # Otherwise lease only what this one actually used.
+        self.next_size = self.size * 2 if not unused and self.expires > now else max(1, self.size - unused)
+        return unused
+
+
+def _return_expired(now):
+    """Give the unused tokens of every expired lease back to Redis and forget those leases."""
+    global _swept_at
+    with _leases_lock:
+        if now - _swept_at < settings.THROTTLE_LEASE_SECONDS and len(_leases) < MAX_LEASES:
+            return
+        _swept_at = now
+        expired = [key for key, lease in _leases.items() if lease.expires <= now]
+        refunds = [(lease.counter, lease.close(now)) for lease in map(_leases.pop, expired)]
+    refunds = [(counter, unused) for counter, unused in refunds if unused]
+    if not refunds:
+        return
+    script = _script(REFUND_SCRIPT)
+    try:
+        with get_redis_connection('default').pipeline(transaction=False) as pipe:
+            for counter, unused in refunds:
+                script(keys=[counter], args=[unused], client=pipe)
+            pipe.execute()
+    except RedisError:
+        logger.warning('Could not return %d unused throttle leases', len(refunds), exc_info=True)
+
+
+class SlidingWindowThrottle(throttling.SimpleRateThrottle):
+    def rate_for(self, request):
+        tier = getattr(request.user, 'membership_tier', None)
+        return settings.THROTTLE_TIER_RATES.get(self.scope, {}).get(tier, self.rate)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        limit, duration = self.parse_rate(self.rate_for(request))
+        return self.consume(key, limit, duration)
+
+    def consume(self, key, limit, duration):
+        now = time.time()
+        window = int(now // duration)
+        window_end = (window + 1) * duration
+        with _leases_lock:
+            lease = _leases.get(key)
+            if lease and lease.remaining > 0 and lease.expires > now and lease.window == window:
+                lease.remaining -= 1
+                return True
+            # The lease is spent, expired or from an older window: its unused
+            # tokens go back in the same call that leases the next batch.
+            refund = lease.close(now) if lease else 0
+
+        overlap = 1 - (now - window * duration) / duration
+        # Lease a small share of the budget so one worker cannot starve others,
+        # and no more than this worker has recently used: an idle lease would
+        # hold tokens other workers need until it is returned.
+        cap = max(1, min(settings.THROTTLE_LEASE_SIZE, limit // settings.THROTTLE_LEASE_DIVISOR))
+        want = min(cap, lease.next_size) if lease else 1
+        _return_expired(now)
+        counter = f'greengo:{key}:{window}'
+        try:
+            granted = _script(LEASE_SCRIPT)(
+                keys=[counter, f'greengo:{key}:{window - 1}', lease.counter if lease else counter],
+                args=[limit, overlap, want, duration * 2, refund],
+            )
+        except RedisError:
+            logger.warning('Throttle store unavailable, allowing request', exc_info=True)
+            return True
+
+        if not granted:
+            self._wait = window_end - now
+            return False
+        expires = min(now + settings.THROTTLE_LEASE_SECONDS, window_end)
+        with _leases_lock:
+            current = _leases.get(key)
+            if current and current.remaining > 0 and current.counter == counter:
+                # Another thread leased concurrently; keep both batches spendable.
+                current.size += granted
+                current.remaining += granted
+            else:
+                current = _leases[key] = _Lease(counter, window, expires, granted)
+            current.remaining -= 1
+        return True
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowThrottle):
+    pass
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowThrottle):
+    pass
@@ -0,0 +1,341 @@
+"""
+One-shot timers for per-user jobs (event reminders, conversation expiry...).
+
+Celery Beat's DatabaseScheduler polls a table of *periodic* tasks and is the
+wrong tool for millions of individual deadlines. Timers live durably in a
+Redis sorted set (score = due time) and a single scheduler process pulls the
+next few seconds of them into an in-memory hierarchical timing wheel, where
+insertion and expiry are O(1). Due timers are claimed atomically from Redis
+into a processing set, handed to Celery in batches grouped by task, and only
+then removed. Claims left behind by a crashed scheduler go back to the due
+set after ``TIMER_CLAIM_TIMEOUT_SECONDS``, so a timer fires at least once.
+
+Schedule from anywhere with :func:`schedule_timer`; the scheduler itself is
+``manage.py run_timer_scheduler``.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+
+from celery import current_app
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+DUE_KEY = 'greengo:timers:due'
+PAYLOAD_KEY = 'greengo:timers:payload'
+# Claimed but not yet handed to Celery; score = claim time.
+PROCESSING_KEY = 'greengo:timers:processing'
+# Every (re)scheduled timer since the scheduler last looked; score = due time.
+CHANGES_KEY = 'greengo:timers:changes'
+
+# Moves timers that are still due from DUE to PROCESSING and returns their
+# payloads. A timer rescheduled to a later time (or cancelled) after it
+# entered the wheel is left alone. The payload stays until ack.
+CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+local out = {}
+for i = 2, #ARGV do
+    local id = ARGV[i]
+    local score = redis.call('ZSCORE', KEYS[1], id)
+    if score and tonumber(score) <= now then
+        redis.call('ZREM', KEYS[1], id)
+        redis.call('ZADD', KEYS[3], now, id)
+        out[#out + 1] = id
+        out[#out + 1] = redis.call('HGET', KEYS[2], id) or ''
+    end
+end
+return out
+"""
+
+# Forgets dispatched timers. A timer rescheduled while it was being
+# dispatched is back in DUE and keeps its (new) payload.
+ACK_SCRIPT = """
+for i = 1, #ARGV do
+    local id = ARGV[i]
+    if redis.call('ZREM', KEYS[3], id) == 1 and not redis.call('ZSCORE', KEYS[1], id) then
+        redis.call('HDEL', KEYS[2], id)
+    end
+end
+return #ARGV
+"""
+
+# Puts timers claimed before ARGV[1] (their dispatcher died) back in DUE,
+# due now, unless they were rescheduled meanwhile.
+RECOVER_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+for _, id in ipairs(stale) do
+    redis.call('ZREM', KEYS[3], id)
+    if redis.call('ZADD', KEYS[1], 'NX', ARGV[2], id) == 1 then
+        redis.call('ZADD', KEYS[4], ARGV[2], id)
+    end
+end
+return stale
+"""
+
+# Pops every pending change.
+DRAIN_SCRIPT = """
+local changes = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+redis.call('DEL', KEYS[1])
+return changes
+"""
+
+
+def _timestamp(when):
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+
+class TimingWheel:
+    """Hierarchical timing wheel.
+
+    ``levels`` wheels of ``slots`` buckets each; level ``L`` buckets span
+    ``slots ** L`` ticks. An item lands in the lowest level whose range covers
+    its delay and cascades one level down each time the wheel below wraps, so
+    every item is touched at most ``levels`` times between add and expiry.
+    """
+
+    def __init__(self, tick=1.0, slots=256, levels=4, start=None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.horizon = slots ** levels
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        # Next tick to fire.
+        self._current = int((time.time() if start is None else start) // tick)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, due, item):
+        """Schedule ``item`` at timestamp ``due``; past deadlines fire next tick."""
+        self._place(max(int(due // self.tick), self._current), item)
+        self._size += 1
+
+    def _place(self, at, item):
+        delta = at - self._current
+        if delta >= self.horizon:
+            raise ValueError('Deadline is beyond the wheel horizon')
+        span = 1
+        for level in range(self.levels):
+            if delta < span * self.slots:
+                self._wheels[level][(at // span) % self.slots].append((at, item))
+                return
+            span *= self.slots
+
+    def advance(self, now):
+        """Return every item due at or before ``now``, in deadline order."""
+        target = int(now // self.tick)
+        fired = []
+        while self._current <= target:
+            current = self._current
+            span = self.slots ** (self.levels - 1)
+            for level in range(self.levels - 1, 0, -1):
+                if current % span == 0:
+                    bucket = self._wheels[level][(current // span) % self.slots]
+                    if bucket:
+                        entries = bucket[:]
+                        bucket.clear()
+                        for at, item in entries:
+                            self._place(at, item)
+                span //= self.slots
+            bucket = self._wheels[0][current % self.slots]
+            if bucket:
+                fired.extend(item for _, item in bucket)
+                self._size -= len(bucket)
+                bucket.clear()
+            self._current += 1
+        return fired
+
+
+class TimerStore:
+    """Durable timer state in Redis."""
+
+    KEYS = [DUE_KEY, PAYLOAD_KEY, PROCESSING_KEY, CHANGES_KEY]
+
+    def __init__(self, redis=None):
+        self.redis = redis or get_redis_connection('default')
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+        self._ack = self.redis.register_script(ACK_SCRIPT)
+        self._recover = self.redis.register_script(RECOVER_SCRIPT)
+        self._drain = self.redis.register_script(DRAIN_SCRIPT)
+
+    def schedule_many(self, timers):
+        """Upsert ``(timer_id, when, task, kwargs)`` tuples in one round trip."""
+        pipe = self.redis.pipeline(transaction=False)
+        for timer_id, when, task, kwargs in timers:
+            due = _timestamp(when)
+            pipe.zadd(DUE_KEY, {timer_id: due})
+            pipe.zadd(CHANGES_KEY, {timer_id: due})
+            pipe.hset(PAYLOAD_KEY, timer_id, json.dumps({'task': task, 'kwargs': kwargs}))
+        pipe.execute()
+
+    def cancel_many(self, timer_ids):
+        timer_ids = list(timer_ids)
+        if not timer_ids:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for key in (DUE_KEY, PROCESSING_KEY, CHANGES_KEY):
+            pipe.zrem(key, *timer_ids)
+        pipe.hdel(PAYLOAD_KEY, *timer_ids)
+        pipe.execute()
+
+    def cancel(self, timer_id):
+        self.cancel_many([timer_id])
+
+    def window(self, after, until, limit):
+        """Timers due in ``(after, until]`` as ``(timer_id, due)`` pairs, earliest first."""
+        low = '-inf' if after is None else f'({after}'
+        rows = self.redis.zrangebyscore(DUE_KEY, low, until, start=0, num=limit, withscores=True)
+        return [(timer_id.decode(), due) for timer_id, due in rows]
+
+    def changes(self):
+        """Pop every timer (re)scheduled since the last call as ``(timer_id, due)`` pairs."""
+        out = self._drain(keys=[CHANGES_KEY])
+        return [(out[i].decode(), float(out[i + 1])) for i in range(0, len(out), 2)]
+
+    def claim(self, timer_ids, now):
+        """Atomically move still-due timers to processing and return ``(timer_id, payload)``."""
+        out = self._claim(keys=self.KEYS, args=[now, *timer_ids])
+        return [
+            (out[i].decode(), json.loads(out[i + 1]) if out[i + 1] else None)
+            for i in range(0, len(out), 2)
+        ]
+
+    def ack(self, timer_ids):
+        """Drop claimed timers once they have been handed to Celery."""
+        if timer_ids:
+            self._ack(keys=self.KEYS, args=list(timer_ids))
+
+    def recover(self, claimed_before, now):
+        """Return timers whose claim is older than ``claimed_before`` to DUE; returns their ids."""
+        return [timer_id.decode() for timer_id in self._recover(keys=self.KEYS, args=[claimed_before, now])]
+
+
+def schedule_timer(timer_id, when, task, **kwargs):
+    """Run Celery task ``task`` with ``kwargs`` once at ``when``.
+
+    ``timer_id`` is caller-chosen (e.g. ``f'event-reminder:{event_id}:{user_id}'``);
+    scheduling the same id again moves the timer instead of adding a second one.
+    """
+    TimerStore().schedule_many([(timer_id, when, task, kwargs)])
+
+
+def cancel_timer(timer_id):
+    TimerStore().cancel(timer_id)
+
+
+class TimerScheduler:
+    """Feeds the wheel from Redis and dispatches due timers to Celery.
+
+    The first refresh reads the whole lookahead window. Later refreshes read
+    only the range that has come into the window since, plus the change log,
+    which picks up timers scheduled or moved inside the range already read.
+    The wheel holds ``(timer_id, due)`` pairs. An entry whose due time no
+    longer matches ``_loaded`` has been rescheduled and is dropped when it
+    fires.
+    """
+
+    WINDOW_LIMIT = 1_000_000
+
+    def __init__(self, store=None, *, tick=None, lookahead=None, batch_size=None, claim_timeout=None):
+        self.store = store or TimerStore()
+        self.tick = tick or settings.TIMER_WHEEL_TICK_SECONDS
+        self.lookahead = lookahead or settings.TIMER_WHEEL_LOOKAHEAD_SECONDS
+        self.batch_size = batch_size or settings.TIMER_DISPATCH_BATCH_SIZE
+        self.claim_timeout = claim_timeout or settings.TIMER_CLAIM_TIMEOUT_SECONDS
+        self.wheel = TimingWheel(tick=self.tick)
+        # timer_id -> due time of its live wheel entry.
+        self._loaded = {}
+        # Every timer due at or before this has been read into the wheel.
+        self._loaded_until = None
+        self._next_refresh = 0.0
+
+    def _load(self, timer_id, due):
+        if self._loaded.get(timer_id) != due:
+            self._loaded[timer_id] = due
+            self.wheel.add(due, (timer_id, due))
+            return 1
+        return 0
+
+    def refresh(self, now):
+        """Pull newly scheduled timers and the next slice of the window into the wheel."""
+        recovered = self.store.recover(now - self.claim_timeout, now)
+        if recovered:
+            logger.warning('Re-queued %d timers whose dispatch never completed', len(recovered))
+        added = 0
+        # Drain before reading the range: anything scheduled in between shows up in both, once.
+        for timer_id, due in self.store.changes():
+            if self._loaded_until is not None and due <= self._loaded_until:
+                added += self._load(timer_id, due)
+        until = now + self.lookahead
+        rows = self.store.window(self._loaded_until, until, self.WINDOW_LIMIT)
+        if len(rows) == self.WINDOW_LIMIT:
+            # Truncated: stop before the last due time so none of its timers are skipped.
+            last = rows[-1][1]
+            rows = [row for row in rows if row[1] < last] or rows
+            until = rows[-1][1]
+            logger.warning('Timer window truncated at %d timers', self.WINDOW_LIMIT)
+        for timer_id, due in rows:
+            added += self._load(timer_id, due)
+        self._loaded_until = until
+        return added
+
+    def step(self, now):
+        if now >= self._next_refresh:
+            self.refresh(now)
+            self._next_refresh = now + self.lookahead / 4
+        due = []
+        for timer_id, at in self.wheel.advance(now):
+            # Stale entry of a timer that was rescheduled after it was loaded.
+            if self._loaded.get(timer_id) == at:
+                del self._loaded[timer_id]
+                due.append(timer_id)
+        if not due:
+            return 0
+        fired = 0
+        for start in range(0, len(due), self.batch_size):
+            claimed = self.store.claim(due[start:start + self.batch_size], now)
+            fired += self.dispatch(claimed)
+        return fired
+
+    def dispatch(self, claimed):
+        """Send claimed timers to Celery as one message per task per batch, then ack them.
+
+        A timer is acked only after its message was sent, so a crash in
+        between re-sends it after ``claim_timeout``: delivery is
+        at-least-once.
+        """
+        calls = {}
+        missing = []
+        for timer_id, payload in claimed:
+            if payload is None:
+                logger.warning('Timer %s fired without a payload', timer_id)
+                missing.append(timer_id)
+                continue
+            ids, kwargs_list = calls.setdefault(payload['task'], ([], []))
+            ids.append(timer_id)
+            kwargs_list.append(payload['kwargs'])
+        self.store.ack(missing)
+        fired = 0
+        for task, (ids, kwargs_list) in calls.items():
+            try:
+                current_app.send_task('apps.core.tasks.fire_timers', args=[task, kwargs_list])
+            except Exception:
+                logger.exception('Could not dispatch %d %s timers; they will be retried', len(ids), task)
+                continue
+            self.store.ack(ids)
+            fired += len(ids)
+        return fired
+
+    def run_forever(self):
+        logger.info('Timer scheduler started (tick=%ss, lookahead=%ss)', self.tick, self.lookahead)
+        while True:
+            now = time.time()
+            fired = self.step(now)
+            if fired:
+                logger.info('Dispatched %d timers', fired)
+            time.sleep(max(0.0, self.tick - (time.time() - now)))
@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from apps.core.admin import ExactInputFilter, LargeTableAdminMixin
+
+from .models import ExternalCountryStat, ExternalEvent
+
+
+@admin.register(ExternalEvent)
+class ExternalEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'source', 'external_id', 'title', 'city', 'country', 'start_date', 'seen_at')
+    list_filter = (('source', ExactInputFilter),)
+    search_fields = ('^geohash',)
+
+
+@admin.register(ExternalCountryStat)
+class ExternalCountryStatAdmin(admin.ModelAdmin):
+    list_display = ('source', 'country', 'count')
+    list_filter = ('source',)
+    ordering = ('source', '-count')
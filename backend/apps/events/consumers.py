@@ -0,0 +1,45 @@
+"""
+Pub/Sub consumers for the events app.
+"""
+
+import json
+from collections import defaultdict
+
+from apps.core.pubsub import Consumer, PermanentError
+
+from .ingest import NORMALIZERS, FeedIngester
+
+
+class ExternalEventConsumer(Consumer):
+    """Raw provider records published one per message, ``source`` attribute set.
+
+    Each batch goes through the same normalize / hash / geohash / upsert path
+    as a feed file, one chunk per source.
+    """
+
+    subscription = 'external-events-ingest'
+    topic = 'external-events'
+    dead_letter_topic = 'external-events-dead-letter'
+    batch_size = 500
+    batch_wait = 1.0
+
+    def handle_batch(self, messages):
+        failures = {}
+        by_source = defaultdict(list)
+        for message in messages:
+            source = message.attributes.get('source')
+            if source not in NORMALIZERS:
+                failures[message] = PermanentError(f'Unknown source {source!r}')
+                continue
+            try:
+                by_source[source].append((message, json.loads(message.data)))
+            except ValueError as exc:
+                failures[message] = PermanentError(f'Malformed record: {exc}')
+
+        for source, items in by_source.items():
+            ingester = FeedIngester(source, workers=1)
+            try:
+                ingester.write_chunk(list(ingester.rows(record for _, record in items)))
+            except Exception as exc:
+                failures.update((message, exc) for message, _ in items)
+        return failures
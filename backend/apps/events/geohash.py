@@ -0,0 +1,40 @@
+"""
+Standard geohash (base32, longitude on even bits).
+
+Must stay in step with functions/src/external_events/geohash.ts and the app's
+geohashForLocation in lib/core/utils/geo_query.dart, since all three read and
+write the same prefixes.
+"""
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(lat, lng, precision=9):
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    idx = bit = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                idx = idx * 2 + 1
+                lng_lo = mid
+            else:
+                idx *= 2
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                idx = idx * 2 + 1
+                lat_lo = mid
+            else:
+                idx *= 2
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[idx])
+            idx = bit = 0
+    return ''.join(chars)
@@ -0,0 +1,458 @@
+"""
+Streaming ingestion of external provider feeds into ExternalEvent.
+
+A feed is a JSON Lines dump of raw provider records (a local path or URL,
+optionally gzipped). Records flow through a generator chain:
+
+    read_feed -> normalize -> content hash -> geohash -> partition -> write
+
+and are never held in memory as a whole feed: the reader hands fixed-size
+chunks to writer threads through bounded queues, so at most
+``workers * (queue_depth + 1)`` chunks are alive at once and a slow database
+back-pressures the parser instead of letting it run ahead.
+
+Rows are partitioned over the writers by a hash of their external id, so a
+given event is only ever written by one thread in a run. Each writer locks the
+stored rows of its chunk, compares them against the content hashes, rewrites
+only new or changed events and applies the resulting per-country deltas to
+ExternalCountryStat in the same transaction, so country stats stay current
+without a rescan. The Pub/Sub consumer writes through the same path, so the
+locks also keep its deltas exact when both touch the same event.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import queue
+import threading
+import zlib
+from collections import Counter
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import geohash
+from .models import ExternalCountryStat, ExternalEvent
+
+logger = logging.getLogger(__name__)
+
+# Normalized fields that make up the content hash; geohash is derived from
+# latitude/longitude so it is left out.
+HASHED_FIELDS = (
+    'title', 'description', 'image_url', 'category', 'city', 'country',
+    'latitude', 'longitude', 'from_price', 'currency', 'rating',
+    'review_count', 'duration_minutes', 'start_date', 'booking_url',
+)
+UPDATE_FIELDS = HASHED_FIELDS + ('content_hash', 'geohash', 'fetched_at', 'seen_at')
+
+# Viator affiliate parameters appended to every booking URL.
+VIATOR_AFFILIATE = 'pid=P00306636&mcid=42383&medium=link'
+
+VIATOR_CATEGORIES = (
+    ('food_drink', ('wine', 'food', 'tasting', 'culinary', 'dinner', 'cooking', 'tapas',
+                    'brewery', 'beer', 'gastronom', 'street food', 'chef', 'lunch')),
+    ('cruises', ('cruise', 'boat', 'sail', 'kayak', 'yacht', 'catamaran', 'snorkel',
+                 'diving', 'scuba', 'ferry', 'canoe', 'rafting', 'whale', 'speedboat')),
+    ('culture', ('museum', 'gallery', 'exhibit', 'palace', 'cathedral', 'temple',
+                 'historic', 'heritage', 'castle', 'ruins', 'archaeolog', 'monument',
+                 'basilica', 'mosque')),
+    ('tickets', ('skip-the-line', 'skip the line', 'ticket', 'admission', 'entry',
+                 ' pass', 'fast track', 'fast-track', 'priority access')),
+    ('day_trips', ('day trip', 'day-trip', 'excursion', 'full-day', 'full day')),
+    ('nature', ('hike', 'hiking', 'safari', 'national park', 'nature', 'mountain',
+                'waterfall', 'forest', 'wildlife', 'garden', 'outdoor', 'desert',
+                'volcano', 'cave', 'jungle')),
+    ('city_tours', ('walking tour', 'city tour', 'guided tour', 'sightseeing',
+                    'bike tour', 'segway', 'hop-on', 'hop on', 'bus tour', 'tuk tuk', 'tour')),
+)
+
+
+def viator_category(title, description):
+    """Same keyword heuristic as viatorCategory() in the Cloud Functions ingester."""
+    text = f'{title or ""} {description or ""}'.lower()
+    for category, keywords in VIATOR_CATEGORIES:
+        if any(k in text for k in keywords):
+            return category
+    return 'other'
+
+
+# -- reading -----------------------------------------------------------------
+
+def read_feed(location):
+    """Yield raw records from a JSON Lines feed one line at a time."""
+    if location.startswith(('http://', 'https://')):
+        with requests.get(location, stream=True, timeout=(10, 300)) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            if location.endswith('.gz'):
+                yield from _parse_lines(gzip.open(response.raw, 'rt', encoding='utf-8'), location)
+            else:
+                yield from _parse_lines(response.iter_lines(decode_unicode=True), location)
+        return
+    opener = gzip.open if location.endswith('.gz') else open
+    with opener(location, 'rt', encoding='utf-8') as fh:
+        yield from _parse_lines(fh, location)
+
+
+def _parse_lines(lines, location):
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            logger.warning('Skipping malformed line %d in %s', lineno, location)
+            continue
+        if isinstance(record, dict):
+            yield record
+
+
+# -- normalization -----------------------------------------------------------
+
+def _text(value, limit=None):
+    value = '' if value is None else str(value).strip()
+    return value[:limit] if limit else value
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _int(value):
+    number = _float(value)
+    return int(number) if number is not None and number >= 0 else None
+
+
+def _price(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01')) if value is not None else None
+    except InvalidOperation:
+        return None
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def _viator(raw):
+    # Destination resolution happens when the feed is exported (it needs the
+    # whole destination tree), so city/country/coordinates arrive as hints.
+    variants = (raw.get('images') or [{}])[0].get('variants') or []
+    best = max(variants, key=lambda v: (v.get('width') or 0) * (v.get('height') or 0), default={})
+    url = raw.get('productUrl')
+    return {
+        'external_id': raw.get('productCode'),
+        'title': raw.get('title'),
+        'description': raw.get('description'),
+        'image_url': best.get('url'),
+        'category': viator_category(raw.get('title'), raw.get('description')),
+        'city': raw.get('_city'),
+        'country': raw.get('_country'),
+        'latitude': raw.get('_lat'),
+        'longitude': raw.get('_lng'),
+        'from_price': ((raw.get('pricing') or {}).get('summary') or {}).get('fromPrice'),
+        'currency': (raw.get('pricing') or {}).get('currency') or 'USD',
+        'rating': (raw.get('reviews') or {}).get('combinedAverageRating'),
+        'review_count': (raw.get('reviews') or {}).get('totalReviews'),
+        'duration_minutes': (raw.get('duration') or {}).get('fixedDurationInMinutes'),
+        'start_date': None,
+        'booking_url': f'{url.split("?")[0]}?{VIATOR_AFFILIATE}' if url else None,
+    }
+
+
+def _tiqets(raw):
+    city = raw.get('city') or {}
+    geo = raw.get('geolocation') or {}
+    image = (raw.get('images') or [{}])[0]
+    return {
+        'external_id': raw.get('id'),
+        'title': raw.get('title'),
+        'description': raw.get('tagline'),
+        'image_url': image.get('large') or image.get('medium'),
+        'category': 'attraction',
+        'city': city.get('name'),
+        'country': (city.get('country') or {}).get('code') or raw.get('_country'),
+        'latitude': geo.get('lat'),
+        'longitude': geo.get('lng'),
+        'from_price': (raw.get('price') or {}).get('amount'),
+        'currency': (raw.get('price') or {}).get('currency') or 'EUR',
+        'rating': (raw.get('ratings') or {}).get('average'),
+        'review_count': (raw.get('ratings') or {}).get('count'),
+        'duration_minutes': None,
+        'start_date': None,
+        'booking_url': raw.get('product_url'),
+    }
+
+
+def _ticketmaster(raw):
+    venue = ((raw.get('_embedded') or {}).get('venues') or [{}])[0]
+    location = venue.get('location') or {}
+    price = (raw.get('priceRanges') or [{}])[0]
+    images = raw.get('images') or []
+    best = max(images, key=lambda i: (i.get('width') or 0) * (i.get('height') or 0), default={})
+    segment = ((raw.get('classifications') or [{}])[0].get('segment') or {}).get('name')
+    return {
+        'external_id': raw.get('id'),
+        'title': raw.get('name'),
+        'description': raw.get('info'),
+        'image_url': best.get('url'),
+        'category': segment or 'event',
+        'city': (venue.get('city') or {}).get('name') or venue.get('name'),
+        'country': (venue.get('country') or {}).get('name') or raw.get('_country'),
+        'latitude': location.get('latitude'),
+        'longitude': location.get('longitude'),
+        'from_price': price.get('min'),
+        'currency': price.get('currency') or 'USD',
+        'rating': 0,
+        'review_count': 0,
+        'duration_minutes': None,
+        'start_date': ((raw.get('dates') or {}).get('start') or {}).get('localDate'),
+        'booking_url': raw.get('url'),
+    }
+
+
+NORMALIZERS = {
+    'viator': _viator,
+    'tiqets': _tiqets,
+    'ticketmaster': _ticketmaster,
+}
+
+
+def normalize(source, records, stats):
+    """Map raw provider records onto ExternalEvent fields, dropping unusable ones."""
+    mapper = NORMALIZERS[source]
+    for raw in records:
+        stats['read'] += 1
+        try:
+            fields = mapper(raw)
+        except (AttributeError, IndexError, TypeError):
+            fields = None
+        if not fields or not fields['external_id'] or not fields['title']:
+            stats['invalid'] += 1
+            continue
+        lat, lng = _float(fields['latitude']), _float(fields['longitude'])
+        if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            lat = lng = None
+        yield {
+            'source': source,
+            'external_id': _text(fields['external_id'], 100),
+            'title': _text(fields['title'], 500),
+            'description': _text(fields['description']),
+            'image_url': _text(fields['image_url'], 1000),
+            'category': _text(fields['category'], 40),
+            'city': _text(fields['city'], 120),
+            'country': _text(fields['country'], 80),
+            'latitude': lat,
+            'longitude': lng,
+            'from_price': _price(fields['from_price']),
+            'currency': _text(fields['currency'], 3).upper() or 'USD',
+            'rating': _float(fields['rating']) or 0.0,
+            'review_count': _int(fields['review_count']) or 0,
+            'duration_minutes': _int(fields['duration_minutes']),
+            'start_date': _date(fields['start_date']),
+            'booking_url': _text(fields['booking_url'], 1000),
+        }
+
+
+def with_content_hash(rows):
+    for row in rows:
+        payload = json.dumps([row[f] for f in HASHED_FIELDS], default=str, separators=(',', ':'))
+        row['content_hash'] = hashlib.sha1(payload.encode()).hexdigest()
+        yield row
+
+
+def with_geohash(rows, precision=9):
+    for row in rows:
+        has_point = row['latitude'] is not None
+        row['geohash'] = geohash.encode(row['latitude'], row['longitude'], precision) if has_point else ''
+        yield row
+
+
+# -- writing -----------------------------------------------------------------
+
+def apply_country_deltas(source, deltas):
+    """Add per-country count deltas for ``source``; call inside a transaction."""
+    # Sorted so concurrent writers always lock stat rows in the same order.
+    deltas = sorted((country, delta) for country, delta in deltas.items() if country and delta)
+    if not deltas:
+        return
+    ExternalCountryStat.objects.bulk_create(
+        [ExternalCountryStat(source=source, country=country) for country, _ in deltas],
+        ignore_conflicts=True,
+    )
+    now = timezone.now()
+    for country, delta in deltas:
+        ExternalCountryStat.objects.filter(source=source, country=country).update(
+            count=F('count') + delta, updated_at=now,
+        )
+
+
+def rebuild_country_stats(source):
+    """Recount country stats for one source from scratch (repair only)."""
+    counts = (
+        ExternalEvent.objects.filter(source=source).exclude(country='')
+        .values_list('country').annotate(n=Count('id'))
+    )
+    with transaction.atomic():
+        ExternalCountryStat.objects.filter(source=source).delete()
+        ExternalCountryStat.objects.bulk_create(
+            ExternalCountryStat(source=source, country=country, count=n) for country, n in counts
+        )
+
+
+class FeedIngester:
+    """Run one source's feed(s) through the pipeline with partitioned writers."""
+
+    def __init__(self, source, *, batch_size=None, workers=None, queue_depth=None):
+        if source not in NORMALIZERS:
+            raise ValueError(f'Unknown external event source: {source}')
+        self.source = source
+        self.batch_size = batch_size or settings.EXTERNAL_EVENTS_BATCH_SIZE
+        self.workers = max(1, workers or settings.EXTERNAL_EVENTS_WORKERS)
+        self.queue_depth = queue_depth or settings.EXTERNAL_EVENTS_QUEUE_DEPTH
+        self.started_at = timezone.now()
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def rows(self, records):
+        """Run raw provider records through normalize -> content hash -> geohash."""
+        return with_geohash(with_content_hash(normalize(self.source, records, self.stats)))
+
+    def run(self, locations, *, prune=False):
+        """Ingest ``locations`` (paths or URLs); ``prune`` drops events the feed no longer has."""
+        rows = self.rows(chain.from_iterable(read_feed(location) for location in locations))
+        if self.workers == 1:
+            for chunk in iter(lambda: list(islice(rows, self.batch_size)), []):
+                self.write_chunk(chunk)
+        else:
+            self._fan_out(rows)
+        if prune:
+            self.prune()
+        return dict(self.stats)
+
+    def _fan_out(self, rows):
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in range(self.workers)]
+        errors = []
+        threads = [
+            threading.Thread(target=self._writer, args=(q, errors), name=f'ingest-{self.source}-{i}', daemon=True)
+            for i, q in enumerate(queues)
+        ]
+        for thread in threads:
+            thread.start()
+        buffers = [[] for _ in range(self.workers)]
+        try:
+            for row in rows:
+                slot = zlib.crc32(row['external_id'].encode()) % self.workers
+                buffers[slot].append(row)
+                if len(buffers[slot]) >= self.batch_size:
+                    queues[slot].put(buffers[slot])
+                    buffers[slot] = []
+                if errors:
+                    break
+        finally:
+            for q, buffer in zip(queues, buffers):
+                if buffer and not errors:
+                    q.put(buffer)
+                q.put(None)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def _writer(self, chunks, errors):
+        try:
+            # Keep draining after a failure so the reader never blocks on a full queue.
+            for chunk in iter(chunks.get, None):
+                if not errors:
+                    try:
+                        self.write_chunk(chunk)
+                    except Exception as exc:
+                        logger.exception('External event writer failed for %s', self.source)
+                        errors.append(exc)
+        finally:
+            connection.close()
+
+    def write_chunk(self, rows):
+        """Dedupe one chunk against stored hashes and upsert what changed."""
+        latest = {row['external_id']: row for row in rows}
+        fetched_at = timezone.now()
+        with transaction.atomic():
+            # Locked, so the countries taken off the stats are the ones the upsert replaces
+            # even when the Pub/Sub consumer writes the same events concurrently.
+            existing = self._lock_existing(list(latest))
+            inserted = [
+                ExternalEvent(**row, fetched_at=fetched_at, seen_at=self.started_at)
+                for external_id, row in latest.items() if external_id not in existing
+            ]
+            if inserted:
+                ExternalEvent.objects.bulk_create(inserted, ignore_conflicts=True)
+                # Rows another writer inserted first are compared like any stored row.
+                existing.update(self._lock_existing(
+                    [event.external_id for event in inserted], exclude_fetched_at=fetched_at,
+                ))
+                inserted = [event for event in inserted if event.external_id not in existing]
+            deltas = Counter(event.country for event in inserted)
+            changed, unchanged = [], []
+            for external_id, (content_hash, country) in existing.items():
+                row = latest[external_id]
+                if content_hash == row['content_hash']:
+                    unchanged.append(external_id)
+                    continue
+                deltas[country] -= 1
+                deltas[row['country']] += 1
+                changed.append(ExternalEvent(**row, fetched_at=fetched_at, seen_at=self.started_at))
+
+            if changed:
+                ExternalEvent.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=['source', 'external_id'],
+                    update_fields=list(UPDATE_FIELDS),
+                )
+            if unchanged:
+                ExternalEvent.objects.filter(source=self.source, external_id__in=unchanged).update(
+                    seen_at=self.started_at,
+                )
+            apply_country_deltas(self.source, deltas)
+
+        with self._stats_lock:
+            self.stats['duplicate'] += len(rows) - len(latest)
+            self.stats['unchanged'] += len(unchanged)
+            self.stats['written'] += len(inserted) + len(changed)
+
+    def _lock_existing(self, external_ids, exclude_fetched_at=None):
+        """``{external_id: (content_hash, country)}`` for stored events, locked in external id order."""
+        events = ExternalEvent.objects.select_for_update().filter(
+            source=self.source, external_id__in=external_ids,
+        ).order_by('external_id')
+        if exclude_fetched_at is not None:
+            events = events.exclude(fetched_at=exclude_fetched_at)
+        return {
+            external_id: (content_hash, country)
+            for external_id, content_hash, country in events.values_list('external_id', 'content_hash', 'country')
+        }
+
+    def prune(self):
+        """Delete events this run did not see and take them off the country stats."""
+        stale = ExternalEvent.objects.filter(source=self.source, seen_at__lt=self.started_at)
+        with transaction.atomic():
+            # Locked, so a row a concurrent writer refreshes is neither deleted nor counted.
+            gone = list(stale.select_for_update().order_by('external_id').values_list('pk', 'country'))
+            deleted, _ = ExternalEvent.objects.filter(pk__in=[pk for pk, _ in gone]).delete()
+            gone_by_country = Counter(country for _, country in gone)
+            apply_country_deltas(self.source, {country: -n for country, n in gone_by_country.items()})
+        self.stats['pruned'] += deleted
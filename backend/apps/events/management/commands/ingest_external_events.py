@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.events.ingest import NORMALIZERS, FeedIngester, rebuild_country_stats
+
+
+class Command(BaseCommand):
+    help = 'Ingest JSON Lines provider feeds (paths or URLs, optionally gzipped) into external events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', choices=sorted(NORMALIZERS))
+        parser.add_argument('locations', nargs='*')
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--prune', action='store_true', help='Delete events missing from these feeds.')
+        parser.add_argument('--rebuild-stats', action='store_true', help='Recount country stats from scratch.')
+
+    def handle(self, *args, source, locations, workers, batch_size, prune, rebuild_stats, **options):
+        if not locations and not rebuild_stats:
+            raise CommandError('Give at least one feed location, or --rebuild-stats.')
+        if locations:
+            started = time.perf_counter()
+            stats = FeedIngester(source, batch_size=batch_size, workers=workers).run(locations, prune=prune)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                ', '.join(f'{key}={value:,}' for key, value in sorted(stats.items()))
+                + f' in {elapsed:.1f}s ({stats.get("read", 0) / max(elapsed, 1e-9):,.0f} records/s)'
+            )
+        if rebuild_stats:
+            rebuild_country_stats(source)
+            self.stdout.write(f'Rebuilt {source} country stats')
@@ -0,0 +1,64 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalCountryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('country', models.CharField(max_length=80)),
+                ('count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'events_external_country_stat',
+            },
+        ),
+        migrations.CreateModel(
+            name='ExternalEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('external_id', models.CharField(max_length=100)),
+                ('content_hash', models.CharField(max_length=40)),
+                ('title', models.CharField(max_length=500)),
+                ('description', models.TextField(blank=True)),
+                ('image_url', models.URLField(blank=True, max_length=1000)),
+                ('category', models.CharField(blank=True, max_length=40)),
+                ('city', models.CharField(blank=True, max_length=120)),
+                ('country', models.CharField(blank=True, max_length=80)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('geohash', models.CharField(blank=True, max_length=12)),
+                ('from_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('rating', models.FloatField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('duration_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('booking_url', models.URLField(blank=True, max_length=1000)),
+                ('fetched_at', models.DateTimeField()),
+                ('seen_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'events_external_event',
+                'indexes': [models.Index(fields=['geohash'], name='external_event_geohash_idx', opclasses=['varchar_pattern_ops']), models.Index(fields=['source', 'seen_at'], name='external_event_seen_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='externalevent',
+            constraint=models.UniqueConstraint(fields=('source', 'external_id'), name='external_event_unique_source_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='externalcountrystat',
+            constraint=models.UniqueConstraint(fields=('source', 'country'), name='external_country_stat_unique'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+"""
+Third-party experiences and events ingested from provider feeds.
+"""
+
+from django.db import models
+
+
+class ExternalEvent(models.Model):
+    """One bookable experience or event from an external provider."""
+
+    source = models.CharField(max_length=20)
+    external_id = models.CharField(max_length=100)
+    # SHA-1 of the normalized record; unchanged records are not rewritten.
+    content_hash = models.CharField(max_length=40)
+    title = models.CharField(max_length=500)
+    description = models.TextField(blank=True)
+    image_url = models.URLField(max_length=1000, blank=True)
+    category = models.CharField(max_length=40, blank=True)
+    city = models.CharField(max_length=120, blank=True)
+    country = models.CharField(max_length=80, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True)
+    from_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=3, default='USD')
+    rating = models.FloatField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    duration_minutes = models.PositiveIntegerField(null=True, blank=True)
+    start_date = models.DateField(null=True, blank=True)
+    booking_url = models.URLField(max_length=1000, blank=True)
+    fetched_at = models.DateTimeField()
+    # Last ingestion run that saw this record; older rows are pruned on a full re-feed.
+    seen_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'events_external_event'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'external_id'], name='external_event_unique_source_id'),
+        ]
+        indexes = [
+            # Nearest-first queries are geohash prefix scans (LIKE 'u09t%').
+            models.Index(fields=['geohash'], name='external_event_geohash_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['source', 'seen_at'], name='external_event_seen_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.source}:{self.external_id} {self.title}'
+
+
+class ExternalCountryStat(models.Model):
+    """Per-country event count for one source, kept current by the ingester."""
+
+    source = models.CharField(max_length=20)
+    country = models.CharField(max_length=80)
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'events_external_country_stat'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'country'], name='external_country_stat_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} {self.country}: {self.count}'
@@ -0,0 +1,36 @@
+"""
+Celery tasks for the events app.
+"""
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from .ingest import FeedIngester
+
+logger = logging.getLogger(__name__)
+
+INGEST_LOCK_KEY = 'events:ingest:{source}:lock'
+
+
+@shared_task(ignore_result=True)
+def ingest_external_events():
+    """Fan out one full re-feed per configured provider feed."""
+    for source, location in settings.EXTERNAL_EVENT_FEEDS.items():
+        ingest_external_feed.delay(source, [location], prune=True)
+
+
+@shared_task(ignore_result=True)
+def ingest_external_feed(source, locations, prune=False):
+    """Ingest one source's feed files; one run per source at a time."""
+    lock_key = INGEST_LOCK_KEY.format(source=source)
+    if not cache.add(lock_key, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('External event ingest for %s already running, skipping', source)
+        return
+    try:
+        stats = FeedIngester(source).run(locations, prune=prune)
+        logger.info('Ingested %s external events: %s', source, stats)
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+
+from apps.events.ingest import FeedIngester
+from apps.events.models import ExternalCountryStat, ExternalEvent
+
+
+def record(external_id, country, title='Louvre'):
+    return {'id': external_id, 'title': title, 'city': {'name': 'City', 'country': {'code': country}}}
+
+
+def write(ingester, *records):
+    ingester.write_chunk(list(ingester.rows(records)))
+
+
+def country_stats():
+    return dict(ExternalCountryStat.objects.filter(source='tiqets').values_list('country', 'count'))
+
+
+@pytest.mark.django_db
+def test_country_deltas_follow_inserts_moves_and_unchanged_rows():
+    write(FeedIngester('tiqets'), record('a', 'FR'), record('b', 'FR'), record('c', 'IT'))
+    assert country_stats() == {'FR': 2, 'IT': 1}
+
+    ingester = FeedIngester('tiqets')
+    write(ingester, record('a', 'FR'), record('b', 'ES'), record('c', 'IT', title='Colosseum'))
+
+    assert country_stats() == {'FR': 1, 'IT': 1, 'ES': 1}
+    assert ingester.stats['unchanged'] == 1
+    assert ingester.stats['written'] == 2
+
+
+@pytest.mark.django_db
+def test_row_inserted_by_another_writer_mid_chunk_is_counted_once():
+    ingester = FeedIngester('tiqets')
+    other = FeedIngester('tiqets')
+    lock_existing = ingester._lock_existing
+
+    def race(external_ids, exclude_fetched_at=None):
+        if exclude_fetched_at is None:
+            # The consumer commits the same event after our lock, before our insert.
+            found = lock_existing(external_ids)
+            write(other, record('a', 'IT'))
+            return found
+        return lock_existing(external_ids, exclude_fetched_at)
+
+    with mock.patch.object(ingester, '_lock_existing', side_effect=race):
+        write(ingester, record('a', 'FR'), record('b', 'FR'))
+
+    assert country_stats() == {'FR': 2, 'IT': 0}
+    assert ExternalEvent.objects.get(external_id='a').country == 'FR'
+    assert ingester.stats['written'] == 2
+
+
+@pytest.mark.django_db
+def test_row_inserted_by_another_writer_with_the_same_content_is_unchanged():
+    ingester = FeedIngester('tiqets')
+    lock_existing = ingester._lock_existing
+
+    def race(external_ids, exclude_fetched_at=None):
+        if exclude_fetched_at is None:
+            found = lock_existing(external_ids)
+            write(FeedIngester('tiqets'), record('a', 'FR'))
+            return found
+        return lock_existing(external_ids, exclude_fetched_at)
+
+    with mock.patch.object(ingester, '_lock_existing', side_effect=race):
+        write(ingester, record('a', 'FR'))
+
+    assert country_stats() == {'FR': 1}
+    assert ingester.stats['unchanged'] == 1
+    assert ingester.stats['written'] == 0
+
+
+@pytest.mark.django_db
+def test_prune_takes_unseen_events_off_the_stats():
+    write(FeedIngester('tiqets'), record('a', 'FR'), record('b', 'IT'))
+    ingester = FeedIngester('tiqets')
+    ingester.started_at = timezone.now() + timedelta(seconds=1)
+    write(ingester, record('a', 'FR'))
+
+    ingester.prune()
+
+    assert country_stats() == {'FR': 1, 'IT': 0}
+    assert list(ExternalEvent.objects.values_list('external_id', flat=True)) == ['a']
+    assert ingester.stats['pruned'] == 1
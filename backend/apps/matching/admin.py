@@ -0,0 +1,29 @@
+from django.contrib import admin
+
+from apps.core.admin import ExactInputFilter, LargeTableAdminMixin
+
+from .models import Match, Swipe, UserInteraction
+
+
+@admin.register(Swipe)
+class SwipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'swiper', 'target', 'direction', 'created_at')
+    list_filter = (('swiper', ExactInputFilter), ('target', ExactInputFilter))
+    list_select_related = ('swiper', 'target')
+    raw_id_fields = ('swiper', 'target')
+
+
+@admin.register(Match)
+class MatchAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user_low', 'user_high', 'created_at')
+    list_filter = (('user_low', ExactInputFilter), ('user_high', ExactInputFilter))
+    list_select_related = ('user_low', 'user_high')
+    raw_id_fields = ('user_low', 'user_high')
+
+
+@admin.register(UserInteraction)
+class UserInteractionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'target', 'kind', 'created_at')
+    list_filter = (('user', ExactInputFilter), ('target', ExactInputFilter))
+    list_select_related = ('user', 'target')
+    raw_id_fields = ('user', 'target')
@@ -0,0 +1,266 @@
+"""
+Approximate nearest-neighbour index over user embeddings.
+
+An IVF (inverted file) index: vectors are L2-normalised, clustered with
+spherical k-means, and stored contiguously grouped by cluster. A query scores
+the centroids, then only the vectors of the ``nprobe`` best clusters, trading
+a little recall for orders of magnitude fewer dot products than brute force.
+
+Index files are plain ``.npy`` arrays opened with ``mmap_mode='r'``, so every
+worker on a host shares one copy through the page cache. Rebuilds write a new
+version directory and flip the ``CURRENT`` pointer atomically; vectors
+updated since the build are kept in a small per-process delta that is
+searched exhaustively and shadows stale index entries.
+
+The index is built by one Celery worker and read by every web process, so
+``ANN_INDEX_DIR`` must be storage all of them mount (e.g. a Filestore/NFS
+volume); a host with its own local directory keeps serving whatever it last
+built. The delta is capped at ``ANN_MAX_DELTA`` vectors: past that (e.g.
+after the daily full ALS refit rewrites every vector) processes search the
+index alone and ask for a rebuild instead of pulling the table into memory.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import UserVector
+
+logger = logging.getLogger(__name__)
+
+ARRAYS = ('centroids', 'vectors', 'ids', 'offsets', 'id_order')
+REBUILD_REQUEST_KEY = 'matching:ann_rebuild:requested'
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def spherical_kmeans(x, nlist, iterations=20, seed=0, chunk=65_536):
+    """Cluster unit vectors by cosine similarity; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(x, centroids, chunk)
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=nlist)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(x[order], starts, axis=0)
+        empty = counts == 0
+        # Re-seed empty clusters from random points so nlist stays useful.
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+def assign(x, centroids, chunk=65_536):
+    labels = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), chunk):
+        labels[start:start + chunk] = np.argmax(x[start:start + chunk] @ centroids.T, axis=1)
+    return labels
+
+
+class IVFIndex:
+    def __init__(self, centroids, vectors, ids, offsets, id_order):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        # Positions of ``ids`` in ascending id order, for id -> vector lookups.
+        self.id_order = id_order
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, vectors, nlist=None, iterations=10, sample=100_000, seed=0):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        ids = np.asarray(ids, dtype=np.int64)
+        nlist = nlist or max(1, int(4 * np.sqrt(len(ids))))
+        nlist = min(nlist, len(ids))
+        rng = np.random.default_rng(seed)
+        train = vectors if len(vectors) <= sample else vectors[rng.choice(len(vectors), sample, replace=False)]
+        centroids = spherical_kmeans(train, nlist, iterations, seed)
+
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind='stable')
+        offsets = np.searchsorted(labels[order], np.arange(nlist + 1)).astype(np.int64)
+        ids = ids[order]
+        return cls(centroids, vectors[order], ids, offsets, np.argsort(ids, kind='stable'))
+
+    def save(self, path):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(path / f'{name}.npy', getattr(self, name))
+
+    @classmethod
+    def open(cls, path):
+        path = Path(path)
+        return cls(*(np.load(path / f'{name}.npy', mmap_mode='r') for name in ARRAYS))
+
+    def vector_of(self, user_id):
+        pos = np.searchsorted(self.ids, user_id, sorter=self.id_order)
+        if pos < len(self.ids) and self.ids[self.id_order[pos]] == user_id:
+            return np.asarray(self.vectors[self.id_order[pos]])
+        return None
+
+    def search(self, query, k=10, nprobe=8):
+        """Top-``k`` ``(ids, scores)`` by cosine similarity to ``query``."""
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        probe = _top_k(self.centroids @ query, nprobe)
+        ranges = [(self.offsets[c], self.offsets[c + 1]) for c in probe]
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = np.concatenate([self.vectors[a:b] for a, b in ranges])
+        candidate_ids = np.concatenate([self.ids[a:b] for a, b in ranges])
+        scores = candidates @ query
+        best = _top_k(scores, k)
+        return candidate_ids[best], scores[best]
+
+
+def _load_vectors(queryset):
+    ids, vectors = [], []
+    for user_id, blob in queryset.values_list('user_id', 'vector').iterator(chunk_size=10_000):
+        ids.append(user_id)
+        vectors.append(np.frombuffer(blob, dtype=np.float32))
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, settings.ANN_VECTOR_DIM), dtype=np.float32)
+    return np.asarray(ids, dtype=np.int64), np.vstack(vectors)
+
+
+def rebuild_index(root=None, keep=2):
+    """Build a fresh index from ``UserVector`` and make it current."""
+    root = Path(root or settings.ANN_INDEX_DIR)
+    built_at = timezone.now()
+    ids, vectors = _load_vectors(UserVector.objects.all())
+    if not len(ids):
+        logger.info('No user vectors; skipping ANN rebuild')
+        return None
+    started = time.perf_counter()
+    index = IVFIndex.build(ids, vectors)
+    version = root / built_at.strftime('v%Y%m%d%H%M%S')
+    index.save(version)
+    (version / 'BUILT_AT').write_text(built_at.isoformat())
+    pointer = root / 'CURRENT.tmp'
+    pointer.write_text(version.name)
+    os.replace(pointer, root / 'CURRENT')
+    for old in sorted(p for p in root.glob('v*') if p.is_dir())[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    logger.info('ANN index %s: %d vectors, %d lists in %.1fs',
+                version.name, len(index), len(index.centroids), time.perf_counter() - started)
+    return version
+
+
+class RecommendationIndex:
+    """Process-wide handle on the current index plus the post-build delta."""
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.ANN_INDEX_DIR)
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+        self._built_at = None
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_vectors = np.empty((0, settings.ANN_VECTOR_DIM), dtype=np.float32)
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < settings.ANN_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if now - self._checked_at < settings.ANN_REFRESH_SECONDS:
+                return
+            try:
+                version = (self.root / 'CURRENT').read_text().strip()
+            except FileNotFoundError:
+                version = None
+            if version and version != self._version:
+                path = self.root / version
+                if (path / 'BUILT_AT').exists():
+                    self._index = IVFIndex.open(path)
+                    self._built_at = parse_datetime((path / 'BUILT_AT').read_text())
+                    self._version = version
+                else:
+                    logger.warning('ANN index %s is not visible here; is ANN_INDEX_DIR shared?', path)
+            if self._built_at is not None:
+                self._load_delta()
+            self._checked_at = now
+
+    def _load_delta(self):
+        updated = UserVector.objects.filter(updated_at__gte=self._built_at)
+        if updated.values('pk')[:settings.ANN_MAX_DELTA + 1].count() > settings.ANN_MAX_DELTA:
+            # Searching the stale index beats holding the table in every process.
+            self._delta_ids = np.empty(0, dtype=np.int64)
+            self._delta_vectors = np.empty((0, settings.ANN_VECTOR_DIM), dtype=np.float32)
+            request_rebuild()
+            return
+        ids, vectors = _load_vectors(updated)
+        self._delta_ids, self._delta_vectors = ids, _normalize(vectors)
+
+    def vector_of(self, user_id):
+        self._refresh()
+        hit = np.flatnonzero(self._delta_ids == user_id)
+        if len(hit):
+            return self._delta_vectors[hit[0]]
+        return self._index.vector_of(user_id) if self._index is not None else None
+
+    def similar(self, user_id, k=20, nprobe=None):
+        """Ids of the ``k`` users most similar to ``user_id``, best first."""
+        query = self.vector_of(user_id)
+        if query is None:
+            return []
+        nprobe = nprobe or settings.ANN_NPROBE
+        if self._index is not None:
+            ids, scores = self._index.search(query, k + 1 + len(self._delta_ids), nprobe)
+        else:
+            ids, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Index entries for users in the delta are stale; the delta wins.
+        stale = np.isin(ids, self._delta_ids)
+        ids, scores = ids[~stale], scores[~stale]
+        if len(self._delta_ids):
+            delta_scores = self._delta_vectors @ query
+            ids = np.concatenate([ids, self._delta_ids])
+            scores = np.concatenate([scores, delta_scores])
+        best = _top_k(scores, k + 1)
+        return [int(i) for i in ids[best] if i != user_id][:k]
+
+
+def request_rebuild():
+    """Queue one index rebuild, however many processes find the delta too large."""
+    from .tasks import rebuild_ann_index
+
+    if cache.add(REBUILD_REQUEST_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('ANN delta exceeds %d vectors; requesting a rebuild', settings.ANN_MAX_DELTA)
+        rebuild_ann_index.delay()
+
+
+_shared = None
+
+
+def get_index():
+    global _shared
+    if _shared is None:
+        _shared = RecommendationIndex()
+    return _shared
@@ -0,0 +1,197 @@
+"""
+Precomputed discovery queues.
+
+Building a candidate list (geo box, mutual preferences, seen-filter, ranking)
+is too expensive to do on every discovery request. A Celery pipeline keeps a
+ranked list of the next ``DISCOVERY_QUEUE_SIZE`` candidates per active user
+in :class:`~apps.matching.models.DiscoveryQueue`, so the endpoint is a single
+primary-key read followed by a local seen-filter pass.
+
+Queues are refreshed when marked dirty (preferences or location changed) and
+otherwise once they are older than ``DISCOVERY_QUEUE_MAX_AGE_MINUTES``. A user
+stays due until their shard has run, so the scheduler leases each user it
+hands out (``lease_users``) and skips leased users on later ticks; the lease
+is released when the shard finishes, or expires after
+``DISCOVERY_LEASE_SECONDS`` if the worker died.
+"""
+
+import logging
+import math
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, F, Max, Q
+from django.db.models.functions import Extract, Now
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from apps.profiles.models import Profile
+
+from .models import DiscoveryQueue
+from .seen import SeenFilter
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+LEASE_KEY = 'greengo:discovery:lease:{user_id}'
+
+
+def _years_ago(today, years):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29 February
+        return today.replace(year=today.year - years, day=28)
+
+
+def _age(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def _distance_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def candidate_pool(profile, today=None):
+    """Profiles that satisfy both sides' hard preferences, newest activity first."""
+    today = today or date.today()
+    pool = Profile.objects.filter(
+        is_discoverable=True,
+        last_active_at__gte=timezone.now() - timedelta(days=settings.DISCOVERY_ACTIVE_DAYS),
+    ).exclude(user_id=profile.user_id)
+
+    if profile.interested_in:
+        pool = pool.filter(gender__in=profile.interested_in)
+    if profile.gender:
+        pool = pool.filter(interested_in__contains=[profile.gender])
+    pool = pool.filter(
+        birth_date__lte=_years_ago(today, profile.min_age),
+        birth_date__gt=_years_ago(today, profile.max_age + 1),
+    )
+    if profile.birth_date:
+        age = _age(profile.birth_date, today)
+        pool = pool.filter(min_age__lte=age, max_age__gte=age)
+
+    if profile.latitude is not None and profile.longitude is not None:
+        # Bounding box on the (latitude, longitude) index; exact distance is
+        # checked while ranking.
+        dlat = profile.max_distance_km / 111.0
+        dlng = profile.max_distance_km / max(1.0, 111.0 * math.cos(math.radians(profile.latitude)))
+        pool = pool.filter(
+            latitude__range=(profile.latitude - dlat, profile.latitude + dlat),
+            longitude__range=(profile.longitude - dlng, profile.longitude + dlng),
+        )
+
+    return pool.order_by('-last_active_at').values(
+        'user_id', 'latitude', 'longitude', 'last_active_at', 'interests'
+    )[:settings.DISCOVERY_POOL_SIZE]
+
+
+def rank(profile, rows, now):
+    """Score candidates by proximity, recency and shared interests."""
+    interests = set(profile.interests)
+    scored = []
+    for row in rows:
+        score = 0.0
+        if profile.latitude is not None and row['latitude'] is not None:
+            distance = _distance_km(profile.latitude, profile.longitude, row['latitude'], row['longitude'])
+            if distance > profile.max_distance_km:
+                continue
+            score += math.exp(-distance / max(1.0, profile.max_distance_km / 3))
+        hours_idle = (now - row['last_active_at']).total_seconds() / 3600
+        score += math.exp(-hours_idle / 48)
+        if interests:
+            score += 0.5 * len(interests.intersection(row['interests'])) / len(interests)
+        scored.append((score, row['user_id']))
+    scored.sort(reverse=True)
+    return [user_id for _, user_id in scored]
+
+
+def materialize(user_ids, seen=None):
+    """Recompute and store queues for ``user_ids``; returns queues written."""
+    seen = seen or SeenFilter()
+    now = timezone.now()
+    today = now.date()
+    queues = []
+    for profile in Profile.objects.filter(user_id__in=user_ids):
+        started = time.perf_counter()
+        ranked = rank(profile, candidate_pool(profile, today), now)
+        candidates = seen.exclude(profile.user_id, ranked)[:settings.DISCOVERY_QUEUE_SIZE]
+        queues.append(DiscoveryQueue(
+            user_id=profile.user_id,
+            candidate_ids=candidates,
+            computed_at=now,
+            compute_ms=(time.perf_counter() - started) * 1000,
+            dirty=False,
+        ))
+    DiscoveryQueue.objects.bulk_create(
+        queues,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['candidate_ids', 'computed_at', 'compute_ms', 'dirty'],
+    )
+    return len(queues)
+
+
+def due_user_ids():
+    """Active users whose queue is missing, dirty, or past the freshness SLA."""
+    stale_before = timezone.now() - timedelta(minutes=settings.DISCOVERY_QUEUE_MAX_AGE_MINUTES)
+    return (
+        Profile.objects.filter(
+            is_discoverable=True,
+            last_active_at__gte=timezone.now() - timedelta(days=settings.DISCOVERY_ACTIVE_DAYS),
+        )
+        .filter(
+            Q(user__discovery_queue__isnull=True)
+            | Q(user__discovery_queue__dirty=True)
+            | Q(user__discovery_queue__computed_at__lt=stale_before)
+        )
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+    )
+
+
+def lease_users(user_ids):
+    """The ids in ``user_ids`` not already handed to a materialize task, now leased to one."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    with get_redis_connection('default').pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.set(LEASE_KEY.format(user_id=user_id), 1, nx=True, ex=settings.DISCOVERY_LEASE_SECONDS)
+        return [user_id for user_id, leased in zip(user_ids, pipe.execute()) if leased]
+
+
+def release_users(user_ids):
+    if user_ids:
+        get_redis_connection('default').delete(*(LEASE_KEY.format(user_id=user_id) for user_id in user_ids))
+
+
+def read_queue(user_id, seen=None):
+    """The discovery endpoint's read path: one keyed lookup plus a seen pass."""
+    queue = DiscoveryQueue.objects.filter(user_id=user_id).values_list('candidate_ids', flat=True).first()
+    if queue is None:
+        materialize([user_id], seen=seen)
+        queue = DiscoveryQueue.objects.filter(user_id=user_id).values_list('candidate_ids', flat=True).first() or []
+    # Drop profiles swiped since the queue was computed.
+    return (seen or SeenFilter()).exclude(user_id, queue)
+
+
+def queue_stats():
+    """Staleness and compute-cost metrics across all stored queues."""
+    stats = DiscoveryQueue.objects.aggregate(
+        queues=Count('user'),
+        dirty=Count('user', filter=Q(dirty=True)),
+        avg_compute_ms=Avg('compute_ms'),
+        max_compute_ms=Max('compute_ms'),
+        avg_age_seconds=Avg(Extract(Now() - F('computed_at'), 'epoch')),
+        max_age_seconds=Max(Extract(Now() - F('computed_at'), 'epoch')),
+    )
+    stats['over_sla'] = DiscoveryQueue.objects.filter(
+        computed_at__lt=timezone.now() - timedelta(minutes=settings.DISCOVERY_QUEUE_MAX_AGE_MINUTES)
+    ).count()
+    return stats
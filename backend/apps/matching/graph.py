@@ -0,0 +1,222 @@
+"""
+Swipe-graph store: per-user inbound likes in Redis integer sets.
+
+Every right-swipe has to answer "did they already like me?". Instead of
+querying the swipe table, each user ``u`` has a Redis set of the integer ids
+that liked ``u``. Recording a like and checking the reverse edge is one Lua
+call, so concurrent mutual likes resolve to exactly one match. Small sets use
+Redis' packed ``intset`` encoding (raise ``set-max-intset-entries`` to keep
+popular profiles compact too).
+
+Mutual pairs are queued and turned into ``Match`` rows in bulk by
+:func:`flush_pending_matches`. The sets are a cache of ``Swipe`` rows and can
+be rebuilt at any time with :meth:`SwipeGraph.rebuild`.
+"""
+
+import logging
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from apps.core.batching import keyset_chunks
+from apps.notifications.models import Notification
+
+from .models import Match, Swipe
+from .seen import SeenFilter
+
+logger = logging.getLogger(__name__)
+
+LIKE_DIRECTIONS = (Swipe.Direction.LIKE, Swipe.Direction.SUPERLIKE)
+
+# KEYS: inbound set of the target, inbound set of the liker, pending-match
+# list, the target's set while a rebuild is loading it. ARGV: liker, target,
+# the pair to queue. Queueing in the same call means a mutual like is never
+# recorded without its match.
+LIKE_SCRIPT = """
+redis.call('SADD', KEYS[1], ARGV[1])
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('SADD', KEYS[4], ARGV[1])
+end
+local mutual = redis.call('SISMEMBER', KEYS[2], ARGV[2])
+if mutual == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[3])
+end
+return mutual
+"""
+
+# A crashed rebuild's half-loaded sets expire instead of collecting likes forever.
+REBUILD_KEY_SECONDS = 3600
+
+
+class SwipeGraph:
+    def __init__(self, redis=None, prefix='greengo:likes'):
+        self.redis = redis or get_redis_connection('default')
+        self.prefix = prefix
+        self.pending_key = f'{prefix}:pending_matches'
+        self._like = self.redis.register_script(LIKE_SCRIPT)
+
+    def inbound_key(self, user_id):
+        return f'{self.prefix}:in:{user_id}'
+
+    def rebuild_key(self, user_id):
+        return f'{self.prefix}:rebuild:{user_id}'
+
+    def _like_call(self, liker_id, target_id):
+        return {
+            'keys': [self.inbound_key(target_id), self.inbound_key(liker_id), self.pending_key,
+                     self.rebuild_key(target_id)],
+            'args': [liker_id, target_id, f'{min(liker_id, target_id)}:{max(liker_id, target_id)}'],
+        }
+
+    def like(self, liker_id, target_id):
+        """Record ``liker -> target``; returns True if it completes a mutual like."""
+        return bool(self._like(**self._like_call(liker_id, target_id)))
+
+    def like_many(self, pairs):
+        """Pipelined :meth:`like` for ``(liker_id, target_id)`` pairs; returns mutual pairs."""
+        pipe = self.redis.pipeline(transaction=False)
+        for liker_id, target_id in pairs:
+            self._like(**self._like_call(liker_id, target_id), client=pipe)
+        return [pair for pair, hit in zip(pairs, pipe.execute()) if hit]
+
+    def unlike(self, liker_id, target_id):
+        with self.redis.pipeline() as pipe:
+            pipe.srem(self.inbound_key(target_id), liker_id)
+            pipe.srem(self.rebuild_key(target_id), liker_id)
+            pipe.execute()
+
+    def has_liked(self, liker_id, target_id):
+        return bool(self.redis.sismember(self.inbound_key(target_id), liker_id))
+
+    def inbound_count(self, user_id):
+        return self.redis.scard(self.inbound_key(user_id))
+
+    def drop_user(self, user_id):
+        self.redis.delete(self.inbound_key(user_id), self.rebuild_key(user_id))
+
+    def rebuild(self, batch_size=10_000):
+        """Reload every inbound set from ``Swipe`` rows in ``(target, swiper)`` order.
+
+        Each target's set is loaded into a separate key and RENAMEd over the
+        live one once complete, so readers never see a partial set. Likes
+        recorded while a set is loading are written to both keys and survive
+        the swap. Sets of users nobody likes any more are deleted afterwards.
+        """
+        rows = Swipe.objects.filter(direction__in=LIKE_DIRECTIONS).values('target_id', 'swiper_id')
+        current, loaded, targets = None, 0, set()
+        pipe = self.redis.pipeline(transaction=True)
+        for batch, _ in keyset_chunks(rows, batch_size, fields=('target_id', 'swiper_id')):
+            members = []
+            for row in batch:
+                if row['target_id'] != current:
+                    self._load(pipe, current, members)
+                    self._swap(pipe, current)
+                    current, members = row['target_id'], []
+                    targets.add(current)
+                    pipe.delete(self.rebuild_key(current))
+                members.append(row['swiper_id'])
+            self._load(pipe, current, members)
+            loaded += len(batch)
+            pipe.execute()
+        self._swap(pipe, current)
+        pipe.execute()
+        dropped = self._drop_stale(targets, batch_size)
+        logger.info('Swipe graph rebuilt from %d likes, %d stale sets dropped', loaded, dropped)
+        return loaded
+
+    def _drop_stale(self, targets, batch_size):
+        """Delete inbound sets of users the pass found no likes for; returns how many."""
+        dropped, candidates = 0, []
+        for key in self.redis.scan_iter(match=self.inbound_key('*'), count=1000):
+            user_id = int(key.rsplit(b':', 1)[1])
+            if user_id not in targets:
+                candidates.append(user_id)
+            if len(candidates) >= batch_size:
+                dropped += self._drop_unliked(candidates)
+                candidates = []
+        return dropped + self._drop_unliked(candidates)
+
+    def _drop_unliked(self, user_ids):
+        if not user_ids:
+            return 0
+        # A like recorded after the pass walked past its target has a row by now; keep its set.
+        liked = set(Swipe.objects.filter(target_id__in=user_ids, direction__in=LIKE_DIRECTIONS)
+                    .values_list('target_id', flat=True).distinct())
+        stale = [self.inbound_key(user_id) for user_id in user_ids if user_id not in liked]
+        if stale:
+            self.redis.delete(*stale)
+        return len(stale)
+
+    def _load(self, pipe, user_id, members):
+        if members:
+            key = self.rebuild_key(user_id)
+            pipe.sadd(key, *members)
+            pipe.expire(key, REBUILD_KEY_SECONDS)
+
+    def _swap(self, pipe, user_id):
+        if user_id is None:
+            return
+        key = self.inbound_key(user_id)
+        pipe.rename(self.rebuild_key(user_id), key)
+        pipe.persist(key)
+
+    def requeue(self, pairs):
+        self.redis.rpush(self.pending_key, *(f'{low}:{high}' for low, high in pairs))
+
+    def pop_pending_matches(self, count):
+        pairs = self.redis.lpop(self.pending_key, count) or []
+        return [tuple(int(part) for part in pair.split(b':')) for pair in pairs]
+
+
+def record_swipe(swiper_id, target_id, direction, graph=None):
+    """Persist a swipe and, for likes, update the graph. Returns True on a match."""
+    Swipe.objects.update_or_create(swiper_id=swiper_id, target_id=target_id, defaults={'direction': direction})
+    SeenFilter().add(swiper_id, [target_id])
+    graph = graph or SwipeGraph()
+    if direction in LIKE_DIRECTIONS:
+        return graph.like(swiper_id, target_id)
+    graph.unlike(swiper_id, target_id)
+    return False
+
+
+def flush_pending_matches(graph=None, batch_size=1000):
+    """Create queued matches and their notifications in bulk; returns pairs flushed."""
+    graph = graph or SwipeGraph()
+    flushed = 0
+    while True:
+        pairs = graph.pop_pending_matches(batch_size)
+        if not pairs:
+            return flushed
+        try:
+            _create_matches(pairs)
+        except Exception:
+            graph.requeue(pairs)
+            raise
+        flushed += len(pairs)
+
+
+def _create_matches(pairs):
+    pairs = set(pairs)
+    with transaction.atomic():
+        existing = set(
+            Match.objects.filter(
+                user_low_id__in={low for low, _ in pairs},
+                user_high_id__in={high for _, high in pairs},
+            ).values_list('user_low_id', 'user_high_id')
+        )
+        new_pairs = pairs - existing
+        Match.objects.bulk_create(
+            [Match(user_low_id=low, user_high_id=high) for low, high in new_pairs],
+            ignore_conflicts=True,
+        )
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type='match',
+                title="It's a match!",
+                body='You have a new match. Say hello!',
+                data={'matchedUserId': other_id},
+            )
+            for low, high in new_pairs
+            for user_id, other_id in ((low, high), (high, low))
+        ])
@@ -0,0 +1,257 @@
+"""
+Sparse interaction matrix and incremental implicit-feedback ALS.
+
+``UserInteraction`` rows are folded into a SciPy CSR matrix (rows = acting
+user id, columns = target user id, values = summed interaction weight), so
+memory grows with the number of non-zeros plus one pointer per user rather
+than users squared. The matrix is extended incrementally from an id
+watermark.
+
+The matrix, both factor matrices and the watermark are one ``state.npz``,
+written to a temporary file and swapped in with ``os.replace``: a crash
+leaves the previous state whole, and the watermark can never disagree with
+the matrix it describes. ``INTERACTION_MODEL_DIR`` must be storage every
+Celery worker mounts (e.g. a Filestore/NFS volume), and updates are
+serialised by the task's lock.
+
+Factors come from implicit ALS (Hu, Koren & Volinsky, 2008). The periodic
+full fit alternates over every row; between full fits, :meth:`ImplicitALS.
+partial_fit` re-solves only the users and targets touched by new
+interactions against the current opposite factors. User factors are written
+to ``UserVector`` for the ANN index and ranking.
+"""
+
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from django.conf import settings
+
+from .models import UserInteraction, UserVector
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'state.npz'
+
+# Cap on the padded factor rows one ALS solve block materialises.
+SOLVE_BLOCK_BYTES = 256 * 1024 * 1024
+
+WEIGHTS = {
+    UserInteraction.Kind.VIEW: 0.5,
+    UserInteraction.Kind.LIKE: 1.0,
+    UserInteraction.Kind.SUPERLIKE: 2.0,
+    UserInteraction.Kind.MESSAGE: 3.0,
+    UserInteraction.Kind.MATCH: 4.0,
+}
+
+
+def _grow(matrix, size):
+    if matrix.shape[0] >= size:
+        return matrix
+    matrix = matrix.tocsr(copy=False)
+    matrix.resize((size, size))
+    return matrix
+
+
+class InteractionMatrix:
+    """Square user x user CSR matrix that accepts streamed COO updates."""
+
+    def __init__(self, matrix=None):
+        self._matrix = matrix if matrix is not None else sp.csr_matrix((0, 0), dtype=np.float32)
+        self._pending = []
+
+    @property
+    def matrix(self):
+        """The CSR matrix, with every batch added since the last read folded in at once."""
+        if self._pending:
+            rows, cols, weights = (np.concatenate(part) for part in zip(*self._pending))
+            self._pending = []
+            size = max(self._matrix.shape[0], int(rows.max()) + 1, int(cols.max()) + 1)
+            delta = sp.coo_matrix((weights, (rows, cols)), shape=(size, size)).tocsr()
+            self._matrix = _grow(self._matrix, size) + delta
+        return self._matrix
+
+    @property
+    def nnz(self):
+        return self.matrix.nnz
+
+    def add(self, rows, cols, weights):
+        """Queue a batch of ``(row, col, weight)`` triples; duplicates are summed."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if not len(rows):
+            return
+        self._pending.append((rows, cols, np.asarray(weights, dtype=np.float32)))
+
+
+class ImplicitALS:
+    def __init__(self, factors=None, regularization=0.05, alpha=10.0, cg_steps=3, seed=0):
+        self.factors = factors or settings.ANN_VECTOR_DIM
+        self.regularization = regularization
+        self.alpha = alpha
+        self.cg_steps = cg_steps
+        self.rng = np.random.default_rng(seed)
+        self.user_factors = np.empty((0, self.factors), dtype=np.float32)
+        self.item_factors = np.empty((0, self.factors), dtype=np.float32)
+
+    def _ensure(self, name, rows):
+        current = getattr(self, name)
+        if len(current) < rows:
+            extra = (self.rng.standard_normal((rows - len(current), self.factors)) * 0.01).astype(np.float32)
+            setattr(self, name, np.vstack([current, extra]))
+        return getattr(self, name)
+
+    def _solve(self, matrix, rows, solve_for, fixed):
+        """Least-squares update of ``solve_for[rows]`` holding ``fixed`` constant.
+
+        Each row takes ``cg_steps`` conjugate-gradient steps from its current
+        factors (Takács et al., 2011) instead of an exact ``k x k`` solve. Rows
+        are sorted by length and handled in blocks padded to the block's
+        longest row, so every step is a few array operations per block; a
+        block's padded factors stay under ``SOLVE_BLOCK_BYTES``.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+        counts = indptr[rows + 1] - indptr[rows]
+        solve_for[rows[counts == 0]] = 0
+        order = np.argsort(counts, kind='stable')
+        order = order[counts[order] > 0]
+        rows, counts = rows[order], counts[order]
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=np.float32)
+        budget = SOLVE_BLOCK_BYTES // fixed.itemsize // self.factors
+        start = 0
+        while start < len(rows):
+            end = min(len(rows), start + max(1, budget // (self.factors + counts[start])))
+            end = start + max(1, budget // (self.factors + counts[end - 1]))
+            block, lengths = rows[start:end], counts[start:end]
+            offsets = np.arange(lengths[-1])
+            present = offsets < lengths[:, None]
+            positions = np.minimum(indptr[block, None] + offsets, len(indices) - 1)
+            y = fixed[indices[positions]] * present[..., None]
+            confidence = self.alpha * data[positions] * present
+            solve_for[block] = self._conjugate_gradient(gram, y, confidence, solve_for[block])
+            start = end
+
+    def _conjugate_gradient(self, gram, y, confidence, x):
+        """Approximately solve ``(gram + Yᵀ C Y) x = Yᵀ (1 + C)`` for a padded block of rows."""
+        def product(v):
+            return v @ gram + np.einsum('bl,blk->bk', confidence * np.einsum('blk,bk->bl', y, v), y)
+
+        residual = np.einsum('bl,blk->bk', 1.0 + confidence, y) - product(x)
+        direction = residual.copy()
+        norm = np.einsum('bk,bk->b', residual, residual)
+        for _ in range(self.cg_steps):
+            step = product(direction)
+            curvature = np.einsum('bk,bk->b', direction, step)
+            alpha = np.divide(norm, curvature, out=np.zeros_like(norm), where=curvature > 0)
+            x = x + alpha[:, None] * direction
+            residual -= alpha[:, None] * step
+            new_norm = np.einsum('bk,bk->b', residual, residual)
+            beta = np.divide(new_norm, norm, out=np.zeros_like(norm), where=norm > 0)
+            direction = residual + beta[:, None] * direction
+            norm = new_norm
+        return x
+
+    def fit(self, matrix, iterations=10):
+        matrix = matrix.tocsr()
+        transposed = matrix.T.tocsr()
+        users = self._ensure('user_factors', matrix.shape[0])
+        items = self._ensure('item_factors', matrix.shape[1])
+        for iteration in range(iterations):
+            started = time.perf_counter()
+            self._solve(matrix, range(matrix.shape[0]), users, items)
+            self._solve(transposed, range(transposed.shape[0]), items, users)
+            logger.info('ALS iteration %d took %.1fs', iteration + 1, time.perf_counter() - started)
+
+    def partial_fit(self, matrix, user_rows, item_rows):
+        """Re-solve only the touched users and items against current factors."""
+        matrix = matrix.tocsr()
+        users = self._ensure('user_factors', matrix.shape[0])
+        items = self._ensure('item_factors', matrix.shape[1])
+        self._solve(matrix, np.unique(user_rows), users, items)
+        self._solve(matrix.T.tocsr(), np.unique(item_rows), items, users)
+
+
+def load_state(root):
+    """``(matrix, model, after)`` from ``root``, or ``(empty, empty, None)`` if there is no state yet."""
+    path = Path(root) / STATE_FILE
+    model = ImplicitALS()
+    if not path.exists():
+        return InteractionMatrix(), model, None
+    with np.load(path) as state:
+        matrix = sp.csr_matrix((state['data'], state['indices'], state['indptr']), shape=tuple(state['shape']))
+        model.user_factors = state['user_factors']
+        model.item_factors = state['item_factors']
+        after = int(state['after'])
+    return InteractionMatrix(matrix), model, after
+
+
+def save_state(root, matrix, model, after):
+    """Replace the state in ``root`` with ``matrix``, ``model`` and watermark ``after``, atomically."""
+    csr = matrix.matrix.tocsr()
+    path = Path(root) / STATE_FILE
+    tmp = path.with_name(f'{STATE_FILE}.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez(
+            f, data=csr.data, indices=csr.indices, indptr=csr.indptr, shape=np.asarray(csr.shape),
+            user_factors=model.user_factors, item_factors=model.item_factors, after=np.asarray(after),
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_user_vectors(factors, user_ids, batch_size=5000):
+    """Upsert the given users' factor rows into ``UserVector``."""
+    user_ids = [int(u) for u in user_ids]
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        UserVector.objects.bulk_create(
+            [UserVector(user_id=u, vector=factors[u].astype(np.float32).tobytes()) for u in chunk],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['vector', 'updated_at'],
+        )
+
+
+def update_model(full=False, batch_size=100_000):
+    """Fold new interactions into the matrix and refresh the affected factors."""
+    root = Path(settings.INTERACTION_MODEL_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    matrix, model, after = load_state(root)
+    if after is None:
+        # No state yet: fold every interaction and fit from scratch.
+        full, after = True, 0
+
+    touched_users, touched_items = [], []
+    while True:
+        rows = list(
+            UserInteraction.objects.filter(id__gt=after).order_by('id')
+            .values_list('id', 'user_id', 'target_id', 'kind')[:batch_size]
+        )
+        if not rows:
+            break
+        ids, users, targets, kinds = zip(*rows)
+        matrix.add(users, targets, [WEIGHTS[k] for k in kinds])
+        touched_users.extend(users)
+        touched_items.extend(targets)
+        after = ids[-1]
+
+    if full:
+        model.fit(matrix.matrix, iterations=settings.INTERACTION_ALS_ITERATIONS)
+        changed = np.flatnonzero(np.diff(matrix.matrix.indptr))
+    elif touched_users:
+        model.partial_fit(matrix.matrix, touched_users, touched_items)
+        changed = np.unique(touched_users)
+    else:
+        return 0
+
+    # Vectors first: if the save below never happens, the next run re-folds
+    # the same interactions from the old state and rewrites them.
+    write_user_vectors(model.user_factors, changed)
+    save_state(root, matrix, model, after)
+    logger.info('Interaction model updated: nnz=%d, %d user vectors written', matrix.nnz, len(changed))
+    return len(changed)
@@ -0,0 +1,47 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.matching.ann import IVFIndex, _normalize, _top_k
+
+
+class Command(BaseCommand):
+    help = 'Report ANN recall@k and latency against brute force on synthetic embeddings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--dim', type=int, default=64)
+        parser.add_argument('--clusters', type=int, default=2_000, help='Latent taste clusters in the synthetic data.')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=20)
+
+    def handle(self, *args, users, dim, clusters, queries, k, **options):
+        rng = np.random.default_rng(0)
+        centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+        vectors = centres[rng.integers(0, clusters, users)] + 1.0 * rng.normal(size=(users, dim)).astype(np.float32)
+        ids = np.arange(1, users + 1, dtype=np.int64)
+
+        started = time.perf_counter()
+        built = IVFIndex.build(ids, vectors)
+        self.stdout.write(f'build: {time.perf_counter() - started:.1f}s, {len(built.centroids)} lists')
+
+        with tempfile.TemporaryDirectory() as path:
+            built.save(path)
+            index = IVFIndex.open(path)
+            unit = _normalize(vectors)
+            picks = rng.integers(0, users, queries)
+
+            started = time.perf_counter()
+            truth = [set(ids[_top_k(unit @ unit[q], k)]) for q in picks]
+            brute = (time.perf_counter() - started) / queries
+            self.stdout.write(f'brute force: {brute * 1e3:.2f} ms/query')
+
+            self.stdout.write(f'{"nprobe":>6} {"recall@" + str(k):>10} {"ms/query":>9}')
+            for nprobe in (1, 2, 4, 8, 16, 32, 64):
+                started = time.perf_counter()
+                found = [index.search(unit[q], k, nprobe)[0] for q in picks]
+                latency = (time.perf_counter() - started) / queries
+                recall = np.mean([len(truth[i].intersection(found[i].tolist())) / k for i in range(queries)])
+                self.stdout.write(f'{nprobe:>6} {recall:>10.3f} {latency * 1e3:>9.2f}')
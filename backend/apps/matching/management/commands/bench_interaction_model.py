@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.matching.interactions import ImplicitALS, InteractionMatrix
+
+
+class Command(BaseCommand):
+    help = 'Time matrix ingestion and implicit-ALS training on a synthetic interaction matrix.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--per-user', type=int, default=20, help='Average interactions per user.')
+        parser.add_argument('--factors', type=int, default=64)
+        parser.add_argument('--iterations', type=int, default=1)
+        parser.add_argument('--touched', type=int, default=10_000, help='Users touched by the incremental update.')
+
+    def handle(self, *args, users, per_user, factors, iterations, touched, **options):
+        rng = np.random.default_rng(0)
+        total = users * per_user
+        # Zipf-ish popularity: a few profiles attract most of the attention.
+        popularity = rng.zipf(1.3, total) % users
+
+        matrix = InteractionMatrix()
+        started = time.perf_counter()
+        for start in range(0, total, 1_000_000):
+            stop = min(start + 1_000_000, total)
+            matrix.add(rng.integers(0, users, stop - start), popularity[start:stop], np.ones(stop - start))
+        ingest = time.perf_counter() - started
+        csr = matrix.matrix
+        footprint = csr.data.nbytes + csr.indices.nbytes + csr.indptr.nbytes
+        self.stdout.write(f'{users:,} users, {matrix.nnz:,} non-zeros')
+        self.stdout.write(f'  ingest: {ingest:.1f}s, matrix {footprint / 2**20:,.0f} MiB')
+
+        model = ImplicitALS(factors=factors)
+        started = time.perf_counter()
+        model.fit(csr, iterations=iterations)
+        per_iteration = (time.perf_counter() - started) / iterations
+        self.stdout.write(f'  full ALS: {per_iteration:.1f}s/iteration ({factors} factors)')
+
+        rows = rng.integers(0, users, touched)
+        cols = popularity[rng.integers(0, total, touched)]
+        matrix.add(rows, cols, np.ones(touched))
+        started = time.perf_counter()
+        model.partial_fit(matrix.matrix, rows, cols)
+        self.stdout.write(f'  incremental update of {touched:,} interactions: {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,49 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.matching.graph import SwipeGraph
+
+
+class Command(BaseCommand):
+    help = 'Load synthetic likes into a scratch swipe graph and time mutual-like checks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--chunk', type=int, default=5_000)
+        parser.add_argument('--probes', type=int, default=100_000)
+
+    def handle(self, *args, likes, users, chunk, probes, **options):
+        graph = SwipeGraph(prefix='greengo:bench:likes')
+        rng = random.Random(7)
+        memory_before = graph.redis.info('memory')['used_memory']
+
+        started = time.perf_counter()
+        mutual = 0
+        for start in range(0, likes, chunk):
+            pairs = [(rng.randint(1, users), rng.randint(1, users)) for _ in range(min(chunk, likes - start))]
+            mutual += len(graph.like_many([(a, b) for a, b in pairs if a != b]))
+        load = time.perf_counter() - started
+        memory = graph.redis.info('memory')['used_memory'] - memory_before
+
+        latencies = []
+        for _ in range(probes):
+            a, b = rng.randint(1, users), rng.randint(1, users)
+            t0 = time.perf_counter()
+            graph.has_liked(b, a)
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+
+        self.stdout.write(f'{likes:,} likes over {users:,} users, {mutual:,} mutual')
+        self.stdout.write(f'  load: {load:.1f}s ({likes / load:,.0f} likes/s)')
+        self.stdout.write(f'  memory: {memory / 2**20:,.0f} MiB ({memory / likes:.1f} B/like)')
+        self.stdout.write(
+            f'  mutual check: p50 {statistics.median(latencies) * 1e6:.0f} us, '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us (round trip included)'
+        )
+
+        for key in graph.redis.scan_iter(match='greengo:bench:likes:*', count=10_000):
+            graph.redis.unlink(key)
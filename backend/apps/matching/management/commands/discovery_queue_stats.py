@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.matching.discovery import queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Report discovery-queue staleness and per-user compute cost.'
+
+    def handle(self, *args, **options):
+        for key, value in queue_stats().items():
+            self.stdout.write(f'{key:<18} {value if value is not None else "-"}')
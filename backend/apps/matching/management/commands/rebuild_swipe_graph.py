@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.matching.graph import SwipeGraph
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis swipe graph from the swipe table.'
+
+    def handle(self, *args, **options):
+        loaded = SwipeGraph().rebuild()
+        self.stdout.write(f'Loaded {loaded:,} likes')
@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Swipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('like', 'Like'), ('superlike', 'Super like'), ('pass', 'Pass')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('swiper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swipes_made', to=settings.AUTH_USER_MODEL)),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swipes_received', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'matching_swipe',
+            },
+        ),
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'matching_match',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='swipe',
+            constraint=models.UniqueConstraint(fields=('swiper', 'target'), name='swipe_unique_pair'),
+        ),
+        migrations.AddIndex(
+            model_name='swipe',
+            index=models.Index(condition=models.Q(('direction__in', ['like', 'superlike'])), fields=['target', 'swiper'], name='swipe_inbound_like_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='match_unique_pair'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['user_high'], name='match_user_high_idx'),
+        ),
+    ]
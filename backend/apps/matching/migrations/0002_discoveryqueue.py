@@ -0,0 +1,36 @@
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('matching', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscoveryQueue',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='discovery_queue', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('candidate_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('computed_at', models.DateTimeField()),
+                ('compute_ms', models.FloatField(default=0)),
+                ('dirty', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'matching_discovery_queue',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='discoveryqueue',
+            index=models.Index(fields=['computed_at'], name='discovery_queue_computed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discoveryqueue',
+            index=models.Index(condition=models.Q(('dirty', True)), fields=['user'], name='discovery_queue_dirty_idx'),
+        ),
+    ]
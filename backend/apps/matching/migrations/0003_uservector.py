@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('matching', '0002_discoveryqueue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserVector',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('vector', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'matching_user_vector',
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+"""
+Swipes, matches, discovery queues and user embeddings.
+"""
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+
+
+class Swipe(models.Model):
+    class Direction(models.TextChoices):
+        LIKE = 'like', 'Like'
+        SUPERLIKE = 'superlike', 'Super like'
+        PASS = 'pass', 'Pass'
+
+    swiper = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='swipes_made')
+    target = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='swipes_received')
+    direction = models.CharField(max_length=10, choices=Direction.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'matching_swipe'
+        constraints = [
+            models.UniqueConstraint(fields=['swiper', 'target'], name='swipe_unique_pair'),
+        ]
+        indexes = [
+            # Inbound likes per user, in keyset order, for rebuilding the graph.
+            models.Index(
+                fields=['target', 'swiper'],
+                condition=models.Q(direction__in=['like', 'superlike']),
+                name='swipe_inbound_like_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.swiper_id} {self.direction} {self.target_id}'
+
+
+class Match(models.Model):
+    # Stored as an ordered pair (user_low < user_high) so each match is one row.
+    user_low = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'matching_match'
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='match_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['user_high'], name='match_user_high_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_low_id} <-> {self.user_high_id}'
+
+
+class DiscoveryQueue(models.Model):
+    """Precomputed, ranked discovery candidates for one user."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='discovery_queue'
+    )
+    candidate_ids = ArrayField(models.BigIntegerField(), default=list)
+    computed_at = models.DateTimeField()
+    compute_ms = models.FloatField(default=0)
+    # Set when the owner's preferences or location change; cleared on refresh.
+    dirty = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'matching_discovery_queue'
+        indexes = [
+            models.Index(fields=['computed_at'], name='discovery_queue_computed_idx'),
+            models.Index(fields=['user'], condition=models.Q(dirty=True), name='discovery_queue_dirty_idx'),
+        ]
+
+
+class UserVector(models.Model):
+    """A user's embedding for similarity recommendations, as packed float32."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='vector'
+    )
+    vector = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = 'matching_user_vector'
+
+
+class UserInteraction(models.Model):
+    """Implicit-feedback event from ``user`` towards ``target``."""
+
+    class Kind(models.TextChoices):
+        VIEW = 'view', 'Profile view'
+        LIKE = 'like', 'Like'
+        SUPERLIKE = 'superlike', 'Super like'
+        MESSAGE = 'message', 'Message'
+        MATCH = 'match', 'Match'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    target = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'matching_user_interaction'
@@ -0,0 +1,218 @@
+"""
+Per-user "already seen" filter for discovery.
+
+Every candidate batch must skip profiles the user has swiped on or that are
+blocked in either direction. Rather than an ever-growing ``NOT IN`` anti-join
+against the swipe table, each user has a scalable Bloom filter in Redis: one
+bitmap string per layer plus a small meta hash. Candidate building loads the
+(few KB) bitmaps once and probes candidates locally. New swipes never read
+the bitmaps: they fetch the meta hash to pick a layer, compute bit positions
+locally, set them with one ``BITFIELD`` per layer and bump the layer counts
+in a Lua script, so concurrent writers never clobber each other.
+
+A false positive hides a profile the user has not seen, never the reverse,
+so the tunable error rate only trades recall for memory. Filters are rebuilt
+from the swipe and block tables periodically, which also drops stale bits.
+"""
+
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from apps.core.batching import keyset_chunks
+from apps.core.bloom import BloomFilter, ScalableBloomFilter
+from apps.users.models import UserBlock
+
+from .models import Swipe
+
+logger = logging.getLogger(__name__)
+
+
+# Layers double in capacity, so 16 layers cover ~65k times the initial size.
+MAX_LAYERS = 16
+
+# KEYS[1] = meta hash. ARGV: ttl, then layer index / added count pairs.
+COUNT_SCRIPT = """
+local counts = {}
+for count in string.gmatch(redis.call('HGET', KEYS[1], 'counts') or '', '%d+') do
+    counts[#counts + 1] = tonumber(count)
+end
+for i = 2, #ARGV, 2 do
+    local index = tonumber(ARGV[i]) + 1
+    while #counts < index do
+        counts[#counts + 1] = 0
+    end
+    counts[index] = counts[index] + tonumber(ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], 'counts', table.concat(counts, ','))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return #counts
+"""
+
+
+def _redis_offset(pos):
+    # BloomFilter numbers bits LSB-first within a byte, SETBIT counts MSB-first;
+    # mapping the offset keeps the stored bytes identical to ``layer.bits``.
+    return (pos & ~7) | (7 - (pos & 7))
+
+
+@lru_cache(maxsize=4 * MAX_LAYERS)
+def _layer_shape(initial_capacity, error_rate, index):
+    """An empty layer with the geometry of layer ``index``, for computing bit positions."""
+    capacity, layer_error_rate = ScalableBloomFilter(initial_capacity, error_rate).layer_params(index)
+    return BloomFilter(capacity, layer_error_rate)
+
+
+class SeenFilter:
+    def __init__(self, redis=None, prefix='greengo:seen'):
+        self.redis = redis or get_redis_connection('default')
+        self.prefix = prefix
+        self.ttl = settings.SEEN_FILTER_TTL_DAYS * 86400
+        self._count = self.redis.register_script(COUNT_SCRIPT)
+
+    def _meta_key(self, user_id):
+        return f'{self.prefix}:{user_id}:meta'
+
+    def _layer_key(self, user_id, index):
+        return f'{self.prefix}:{user_id}:{index}'
+
+    def _empty(self):
+        return ScalableBloomFilter(
+            initial_capacity=settings.SEEN_FILTER_INITIAL_CAPACITY,
+            error_rate=settings.SEEN_FILTER_ERROR_RATE,
+        )
+
+    def load(self, user_id):
+        """Fetch the user's filter, rebuilding it from Postgres if it is missing."""
+        meta = self.redis.hgetall(self._meta_key(user_id))
+        if not meta:
+            return self.rebuild(user_id)
+        counts = [int(c) for c in meta[b'counts'].split(b',')]
+        pipe = self.redis.pipeline(transaction=False)
+        for index in range(len(counts)):
+            pipe.get(self._layer_key(user_id, index))
+        bloom = self._empty()
+        for bits, count in zip(pipe.execute(), counts):
+            bloom.new_layer(bits=bits, count=count)
+        return bloom
+
+    def exclude(self, user_id, candidate_ids):
+        """Drop candidates the user has already seen (and the user themself)."""
+        bloom = self.load(user_id)
+        return [cid for cid in candidate_ids if cid != user_id and cid not in bloom]
+
+    def add(self, user_id, profile_ids):
+        """Mark ``profile_ids`` as seen by ``user_id`` without loading the bitmaps."""
+        counts = self.redis.hget(self._meta_key(user_id), 'counts')
+        if counts is None:
+            counts = [layer.count for layer in self.rebuild(user_id).layers]
+        else:
+            counts = [int(c) for c in counts.split(b',')]
+        index = len(counts) - 1
+        positions, added = {}, {}
+        for profile_id in profile_ids:
+            if counts[index] + added.get(index, 0) >= self._shape(index).capacity and index + 1 < MAX_LAYERS:
+                index += 1
+                counts.append(0)
+            positions.setdefault(index, []).extend(self._shape(index).positions(profile_id))
+            added[index] = added.get(index, 0) + 1
+        if not added:
+            return
+        args = [self.ttl]
+        with self.redis.pipeline() as pipe:
+            for index, offsets in positions.items():
+                key = self._layer_key(user_id, index)
+                bitfield = pipe.bitfield(key)
+                for pos in offsets:
+                    bitfield.set('u1', _redis_offset(pos), 1)
+                bitfield.execute()
+                pipe.expire(key, self.ttl)
+                args += [index, added[index]]
+            self._count(keys=[self._meta_key(user_id)], args=args, client=pipe)
+            pipe.execute()
+
+    def _shape(self, index):
+        return _layer_shape(settings.SEEN_FILTER_INITIAL_CAPACITY, settings.SEEN_FILTER_ERROR_RATE, index)
+
+    def store(self, user_id, bloom, pipe=None):
+        """Replace the user's stored filter with ``bloom``."""
+        own_pipe = pipe is None
+        pipe = pipe or self.redis.pipeline(transaction=True)
+        for index, layer in enumerate(bloom.layers):
+            pipe.set(self._layer_key(user_id, index), bytes(layer.bits), ex=self.ttl)
+        # A rebuilt filter can have fewer layers than the one it replaces.
+        stale = [self._layer_key(user_id, i) for i in range(len(bloom.layers), MAX_LAYERS)]
+        if stale:
+            pipe.delete(*stale)
+        self._write_meta(pipe, user_id, bloom)
+        if own_pipe:
+            pipe.execute()
+
+    def _write_meta(self, pipe, user_id, bloom):
+        key = self._meta_key(user_id)
+        pipe.hset(key, 'counts', ','.join(str(layer.count) for layer in bloom.layers) or '0')
+        pipe.expire(key, self.ttl)
+
+    def rebuild(self, user_id):
+        bloom = self._empty()
+        bloom.update(Swipe.objects.filter(swiper_id=user_id).values_list('target_id', flat=True).iterator())
+        bloom.update(_blocked_ids([user_id]).get(user_id, ()))
+        if not bloom.layers:
+            bloom.new_layer()
+        self.store(user_id, bloom)
+        return bloom
+
+    def rebuild_all(self, batch_size=20_000):
+        """Rebuild every swiper's filter in one ``(swiper, target)`` keyset walk."""
+        rows = Swipe.objects.values('swiper_id', 'target_id')
+        current, bloom, rebuilt = None, None, 0
+        pending = {}
+        for batch, _ in keyset_chunks(rows, batch_size, fields=('swiper_id', 'target_id')):
+            for row in batch:
+                if row['swiper_id'] != current:
+                    if current is not None:
+                        pending[current] = bloom
+                    current, bloom = row['swiper_id'], self._empty()
+                bloom.add(row['target_id'])
+            rebuilt += self._flush(pending)
+            pending = {}
+        if current is not None:
+            pending[current] = bloom
+        rebuilt += self._flush(pending)
+        logger.info('Rebuilt %d seen filters', rebuilt)
+        return rebuilt
+
+    def _flush(self, blooms):
+        if not blooms:
+            return 0
+        blocked = _blocked_ids(blooms)
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id, bloom in blooms.items():
+            bloom.update(blocked.get(user_id, ()))
+            self.store(user_id, bloom, pipe=pipe)
+        pipe.execute()
+        return len(blooms)
+
+
+def _blocked_ids(user_ids):
+    """Map each user id to the ids they blocked or were blocked by."""
+    blocked = {}
+    rows = UserBlock.objects.filter(Q(blocker_id__in=user_ids) | Q(blocked_id__in=user_ids))
+    user_ids = set(user_ids)
+    for blocker_id, blocked_id in rows.values_list('blocker_id', 'blocked_id'):
+        if blocker_id in user_ids:
+            blocked.setdefault(blocker_id, []).append(blocked_id)
+        if blocked_id in user_ids:
+            blocked.setdefault(blocked_id, []).append(blocker_id)
+    return blocked
+
+
+def record_block(blocker_id, blocked_id):
+    """Hide two users from each other's discovery after a block."""
+    UserBlock.objects.get_or_create(blocker_id=blocker_id, blocked_id=blocked_id)
+    seen = SeenFilter()
+    seen.add(blocker_id, [blocked_id])
+    seen.add(blocked_id, [blocker_id])
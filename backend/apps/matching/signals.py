@@ -0,0 +1,23 @@
+"""
+Signal handlers for the matching app.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.profiles.models import Profile
+
+from .models import DiscoveryQueue
+
+# Profile fields that change who a user should be shown.
+QUEUE_FIELDS = frozenset({
+    'gender', 'birth_date', 'interested_in', 'min_age', 'max_age', 'max_distance_km',
+    'latitude', 'longitude', 'is_discoverable', 'interests',
+})
+
+
+@receiver(post_save, sender=Profile, dispatch_uid='matching.mark_discovery_queue_dirty')
+def mark_discovery_queue_dirty(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not QUEUE_FIELDS.intersection(update_fields)):
+        return
+    DiscoveryQueue.objects.filter(user_id=instance.user_id, dirty=False).update(dirty=True)
@@ -0,0 +1,93 @@
+"""
+Celery tasks for the matching app.
+"""
+
+import logging
+from itertools import islice
+
+from celery import group, shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from .ann import REBUILD_REQUEST_KEY, rebuild_index
+from .discovery import due_user_ids, lease_users, materialize, release_users
+from .graph import SwipeGraph, flush_pending_matches
+from .interactions import update_model
+from .seen import SeenFilter
+
+logger = logging.getLogger(__name__)
+
+ANN_REBUILD_LOCK_KEY = 'matching:ann_rebuild:lock'
+INTERACTION_LOCK_KEY = 'matching:interaction_model:lock'
+MATCH_FLUSH_LOCK_KEY = 'matching:match_flush:lock'
+
+
+@shared_task(ignore_result=True)
+def create_pending_matches():
+    """Turn queued mutual likes into matches; one flush runs at a time."""
+    # Overlapping flushes could both see a pair as new and notify it twice.
+    if not cache.add(MATCH_FLUSH_LOCK_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('Match flush already running, skipping')
+        return
+    try:
+        flush_pending_matches()
+    finally:
+        cache.delete(MATCH_FLUSH_LOCK_KEY)
+
+
+@shared_task(ignore_result=True)
+def rebuild_swipe_graph():
+    SwipeGraph().rebuild()
+
+
+@shared_task(ignore_result=True)
+def rebuild_seen_filters():
+    SeenFilter().rebuild_all()
+
+
+@shared_task(ignore_result=True)
+def schedule_discovery_queues():
+    """Fan out due users to materialize_discovery_queues in fixed-size shards.
+
+    Users still leased to an earlier tick's shard are skipped, so a backlog
+    is not enqueued again every minute.
+    """
+    ids = due_user_ids().iterator(chunk_size=settings.DISCOVERY_SHARD_SIZE)
+    chunks = iter(lambda: list(islice(ids, settings.DISCOVERY_SHARD_SIZE)), [])
+    leased = (user_id for chunk in chunks for user_id in lease_users(chunk))
+    shards = iter(lambda: list(islice(leased, settings.DISCOVERY_SHARD_SIZE)), [])
+    group(materialize_discovery_queues.s(shard) for shard in shards).apply_async()
+
+
+@shared_task(ignore_result=True)
+def materialize_discovery_queues(user_ids):
+    try:
+        materialize(user_ids)
+    finally:
+        release_users(user_ids)
+
+
+@shared_task(ignore_result=True)
+def rebuild_ann_index():
+    if not cache.add(ANN_REBUILD_LOCK_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('ANN index rebuild already running, skipping')
+        return
+    try:
+        rebuild_index()
+    finally:
+        cache.delete_many([ANN_REBUILD_LOCK_KEY, REBUILD_REQUEST_KEY])
+
+
+@shared_task(ignore_result=True)
+def update_interaction_model(full=False):
+    if not cache.add(INTERACTION_LOCK_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('Interaction model update already running, skipping')
+        return
+    try:
+        changed = update_model(full=full)
+    finally:
+        cache.delete(INTERACTION_LOCK_KEY)
+    if full and changed:
+        # A full refit rewrites every vector; rebuild now rather than let the
+        # whole table land in each process's delta until the next scheduled build.
+        rebuild_ann_index.delay()
@@ -0,0 +1,68 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from apps.matching import tasks
+from apps.matching.ann import RecommendationIndex, rebuild_index
+from apps.matching.models import UserVector
+from apps.users.models import User
+
+
+@pytest.fixture
+def vectors(db, settings, tmp_path):
+    settings.ANN_INDEX_DIR = str(tmp_path)
+    settings.ANN_VECTOR_DIM = 8
+    settings.ANN_REFRESH_SECONDS = 0
+    settings.ANN_MAX_DELTA = 3
+    rng = np.random.default_rng(0)
+    users = [User.objects.create(username=f'u{i}') for i in range(20)]
+    for user in users:
+        UserVector.objects.create(user=user, vector=rng.standard_normal(8).astype(np.float32).tobytes())
+    rebuild_index()
+    return users
+
+
+def touch(users):
+    for user in users:
+        vector = UserVector.objects.get(user=user)
+        vector.vector = np.ones(8, dtype=np.float32).tobytes()
+        vector.save()
+
+
+def test_small_delta_is_overlaid(vectors):
+    touch(vectors[:2])
+    index = RecommendationIndex()
+
+    assert index.similar(vectors[0].id, k=1) == [vectors[1].id]
+    assert sorted(index._delta_ids) == [vectors[0].id, vectors[1].id]
+
+
+def test_oversized_delta_searches_the_index_alone_and_requests_one_rebuild(vectors):
+    touch(vectors[:5])
+    with mock.patch.object(tasks.rebuild_ann_index, 'delay') as delay:
+        first, second = RecommendationIndex(), RecommendationIndex()
+        assert first.similar(vectors[0].id, k=3)
+        second.similar(vectors[0].id, k=3)
+
+    assert len(first._delta_ids) == 0
+    delay.assert_called_once_with()
+
+
+def test_full_refit_rebuilds_the_index_straight_away():
+    with mock.patch.object(tasks, 'update_model', return_value=10), \
+            mock.patch.object(tasks.rebuild_ann_index, 'delay') as delay:
+        tasks.update_interaction_model(full=True)
+        tasks.update_interaction_model()
+
+    delay.assert_called_once_with()
+
+
+def test_a_version_missing_on_this_host_keeps_the_current_index(vectors, tmp_path):
+    index = RecommendationIndex()
+    index.similar(vectors[0].id)
+    version = index._version
+    (tmp_path / 'CURRENT').write_text('v20990101000000')
+
+    assert index.similar(vectors[0].id)
+    assert index._version == version
@@ -0,0 +1,66 @@
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+
+from apps.matching import tasks
+from apps.matching.models import DiscoveryQueue
+from apps.profiles.models import Profile
+from apps.users.models import User
+
+
+@pytest.fixture
+def profiles(db, settings):
+    settings.DISCOVERY_SHARD_SIZE = 2
+    now = timezone.now()
+    return [
+        Profile.objects.create(user=User.objects.create(username=f'u{i}'), display_name=f'U{i}', last_active_at=now)
+        for i in range(5)
+    ]
+
+
+@pytest.fixture
+def fanned_out():
+    """Shards handed to materialize_discovery_queues, without running them."""
+    shards = []
+    with mock.patch.object(tasks, 'group', lambda signatures: mock.Mock(
+            apply_async=lambda: shards.extend(sig.args[0] for sig in signatures))):
+        yield shards
+
+
+def test_scheduled_users_are_not_fanned_out_again_while_their_shard_is_pending(profiles, fanned_out):
+    ids = [p.user_id for p in profiles]
+
+    tasks.schedule_discovery_queues()
+    assert fanned_out == [ids[:2], ids[2:4], ids[4:]]
+
+    fanned_out.clear()
+    tasks.schedule_discovery_queues()
+    assert fanned_out == []
+
+
+def test_finished_shards_release_their_users(profiles, fanned_out):
+    ids = [p.user_id for p in profiles]
+    tasks.schedule_discovery_queues()
+    shards = list(fanned_out)
+    fanned_out.clear()
+
+    tasks.materialize_discovery_queues(shards[0])
+    DiscoveryQueue.objects.filter(user_id=ids[0]).update(dirty=True)
+    tasks.schedule_discovery_queues()
+
+    # ids[1] is fresh now; ids[2:] are still leased to their pending shards.
+    assert fanned_out == [[ids[0]]]
+
+
+def test_a_failed_shard_still_releases_its_users(profiles, fanned_out):
+    ids = [p.user_id for p in profiles]
+    tasks.schedule_discovery_queues()
+    fanned_out.clear()
+
+    with mock.patch.object(tasks, 'materialize', side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            tasks.materialize_discovery_queues(ids[:2])
+    tasks.schedule_discovery_queues()
+
+    assert fanned_out == [ids[:2]]
@@ -0,0 +1,120 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+
+from apps.matching import graph as graph_module
+from apps.matching import tasks
+from apps.matching.graph import SwipeGraph, record_swipe
+from apps.matching.models import Swipe
+from apps.users.models import User
+
+
+@pytest.fixture
+def graph(redis):
+    return SwipeGraph(redis, prefix='test:likes')
+
+
+@pytest.fixture
+def users(db):
+    return [User.objects.create(username=f'u{i}') for i in range(4)]
+
+
+def members(graph, user_id):
+    return {int(m) for m in graph.redis.smembers(graph.inbound_key(user_id))}
+
+
+def test_mutual_like_is_queued_in_the_same_call(graph):
+    assert graph.like(1, 2) is False
+    assert graph.like(2, 1) is True
+
+    assert graph.pop_pending_matches(10) == [(1, 2)]
+
+
+def test_like_many_queues_each_mutual_pair_once(graph):
+    mutual = graph.like_many([(1, 2), (3, 1), (2, 1), (1, 3), (4, 5)])
+
+    assert mutual == [(2, 1), (1, 3)]
+    assert sorted(graph.pop_pending_matches(10)) == [(1, 2), (1, 3)]
+
+
+def test_rebuild_replaces_sets_without_leaving_build_keys(graph, users):
+    a, b, c, d = (u.id for u in users)
+    graph.redis.sadd(graph.inbound_key(a), 999)
+    Swipe.objects.bulk_create([
+        Swipe(swiper_id=b, target_id=a, direction='like'),
+        Swipe(swiper_id=c, target_id=a, direction='superlike'),
+        Swipe(swiper_id=d, target_id=a, direction='pass'),
+        Swipe(swiper_id=a, target_id=b, direction='like'),
+    ])
+
+    assert graph.rebuild(batch_size=1) == 3
+
+    assert members(graph, a) == {b, c}
+    assert members(graph, b) == {a}
+    assert graph.redis.ttl(graph.inbound_key(a)) == -1
+    assert not graph.redis.keys('test:likes:rebuild:*')
+
+
+def test_likes_recorded_while_a_set_is_loading_survive_the_swap(graph, users):
+    a, b, c, d = (u.id for u in users)
+    Swipe.objects.bulk_create([
+        Swipe(swiper_id=b, target_id=a, direction='like'),
+        Swipe(swiper_id=c, target_id=a, direction='like'),
+    ])
+    chunks = graph_module.keyset_chunks
+
+    def like_midway(*args, **kwargs):
+        for i, chunk in enumerate(chunks(*args, **kwargs)):
+            yield chunk
+            if i == 0:
+                # a's set is half loaded: d likes a and b withdraws.
+                graph.like(d, a)
+                graph.unlike(b, a)
+
+    with mock.patch.object(graph_module, 'keyset_chunks', like_midway):
+        graph.rebuild(batch_size=1)
+
+    assert members(graph, a) == {c, d}
+
+
+def test_rebuild_drops_sets_whose_likes_are_all_gone(graph, users):
+    a, b, c, d = (u.id for u in users)
+    graph.like(b, c)
+    graph.like(b, d)
+    Swipe.objects.bulk_create([
+        Swipe(swiper_id=b, target_id=a, direction='like'),
+        Swipe(swiper_id=a, target_id=d, direction='pass'),
+    ])
+
+    graph.rebuild(batch_size=1)
+
+    assert members(graph, a) == {b}
+    assert not graph.redis.exists(graph.inbound_key(c), graph.inbound_key(d))
+
+
+def test_rebuild_keeps_a_set_whose_like_landed_after_the_pass(graph, users):
+    a, b, c, _ = (u.id for u in users)
+    Swipe.objects.create(swiper_id=b, target_id=a, direction='like')
+    chunks = graph_module.keyset_chunks
+
+    def like_after_the_walk(*args, **kwargs):
+        yield from chunks(*args, **kwargs)
+        record_swipe(a, c, 'like', graph=graph)
+
+    with mock.patch.object(graph_module, 'keyset_chunks', like_after_the_walk):
+        graph.rebuild()
+
+    assert members(graph, c) == {a}
+
+
+def test_overlapping_match_flushes_are_skipped(db):
+    with mock.patch.object(tasks, 'flush_pending_matches') as flush:
+        cache.add(tasks.MATCH_FLUSH_LOCK_KEY, 1)
+        tasks.create_pending_matches()
+        flush.assert_not_called()
+
+        cache.delete(tasks.MATCH_FLUSH_LOCK_KEY)
+        tasks.create_pending_matches()
+        flush.assert_called_once_with()
+    assert cache.get(tasks.MATCH_FLUSH_LOCK_KEY) is None
@@ -0,0 +1,102 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from django.core.cache import cache
+
+from apps.matching import interactions, tasks
+from apps.matching.interactions import ImplicitALS, InteractionMatrix, load_state, update_model
+from apps.matching.models import UserInteraction, UserVector
+from apps.users.models import User
+
+
+@pytest.fixture
+def users(db, settings, tmp_path):
+    settings.INTERACTION_MODEL_DIR = str(tmp_path)
+    settings.ANN_VECTOR_DIM = 4
+    settings.INTERACTION_ALS_ITERATIONS = 2
+    return [User.objects.create(username=f'u{i}') for i in range(4)]
+
+
+def interact(user, target, kind='like'):
+    return UserInteraction.objects.create(user=user, target=target, kind=kind)
+
+
+def test_watermark_is_stored_with_the_matrix(users, tmp_path):
+    a, b, c, _ = users
+    interact(a, b)
+    update_model()
+    last = interact(b, c, 'message')
+
+    assert update_model() == 1
+
+    matrix, model, after = load_state(tmp_path)
+    assert after == last.id
+    assert matrix.matrix[a.id, b.id] == 1.0 and matrix.matrix[b.id, c.id] == 3.0
+    assert len(model.user_factors) > c.id
+    assert UserVector.objects.filter(user__in=[a, b]).count() == 2
+
+
+def test_crash_before_the_swap_keeps_the_old_state_and_counts_once(users, tmp_path):
+    a, b, c, _ = users
+    interact(a, b)
+    update_model()
+    interact(a, b)
+
+    with mock.patch.object(interactions.os, 'replace', side_effect=OSError('disk gone')):
+        with pytest.raises(OSError):
+            update_model()
+    assert load_state(tmp_path)[0].matrix[a.id, b.id] == 1.0
+
+    update_model()
+    assert load_state(tmp_path)[0].matrix[a.id, b.id] == 2.0
+
+
+def test_concurrent_updates_are_skipped(users):
+    cache.add(tasks.INTERACTION_LOCK_KEY, 1)
+    try:
+        with mock.patch.object(tasks, 'update_model') as update:
+            tasks.update_interaction_model()
+    finally:
+        cache.delete(tasks.INTERACTION_LOCK_KEY)
+
+    update.assert_not_called()
+
+
+def test_batches_are_folded_into_the_matrix_once():
+    matrix = InteractionMatrix()
+    with mock.patch.object(interactions, '_grow', wraps=interactions._grow) as grow:
+        matrix.add([1, 2], [2, 3], [1.0, 0.5])
+        matrix.add([1], [2], [2.0])
+        matrix.add([], [], [])
+        assert matrix.matrix[1, 2] == 3.0 and matrix.matrix[2, 3] == 0.5
+        assert matrix.nnz == 2
+
+    grow.assert_called_once()
+
+
+def test_conjugate_gradient_matches_an_exact_solve(settings):
+    settings.ANN_VECTOR_DIM = 3
+    rng = np.random.default_rng(1)
+    matrix = sp.random(12, 9, density=0.3, format='csr', dtype=np.float32, random_state=2).tolil()
+    matrix[4] = 0
+    matrix = matrix.tocsr()
+    fixed = rng.standard_normal((9, 3)).astype(np.float32)
+    # With as many steps as factors, conjugate gradient reaches the exact solution.
+    model = ImplicitALS(cg_steps=3)
+    rows = [0, 3, 4, 7, 8, 11]
+
+    expected = np.ones((12, 3), dtype=np.float32)
+    gram = fixed.T @ fixed + model.regularization * np.eye(3, dtype=np.float32)
+    for row in rows:
+        y = fixed[matrix[row].indices]
+        confidence = model.alpha * matrix[row].data
+        expected[row] = np.linalg.solve(gram + (y.T * confidence) @ y, y.T @ (1.0 + confidence)) if len(y) else 0
+
+    solved = np.ones((12, 3), dtype=np.float32)
+    # Room for a couple of padded rows per block, so rows span several blocks.
+    with mock.patch.object(interactions, 'SOLVE_BLOCK_BYTES', 4 * 3 * 12):
+        model._solve(matrix, rows, solved, fixed)
+
+    np.testing.assert_allclose(solved, expected, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,88 @@
+from unittest import mock
+
+import pytest
+
+from apps.matching.models import Swipe
+from apps.matching.seen import SeenFilter
+from apps.users.models import User, UserBlock
+
+
+@pytest.fixture
+def seen(redis, settings):
+    settings.SEEN_FILTER_INITIAL_CAPACITY = 4
+    settings.SEEN_FILTER_ERROR_RATE = 0.01
+    seen = SeenFilter(redis, prefix='test:seen')
+    seen.store(1, seen._empty())
+    return seen
+
+
+def counts(seen, user_id):
+    return seen.redis.hget(seen._meta_key(user_id), 'counts')
+
+
+def test_add_sets_the_same_bits_as_a_local_filter(seen):
+    seen.add(1, [10, 11, 12])
+
+    local = seen._empty()
+    local.update([10, 11, 12])
+    stored = seen.load(1)
+    assert [bytes(layer.bits) for layer in stored.layers] == [bytes(layer.bits) for layer in local.layers]
+    assert seen.exclude(1, [1, 10, 11, 12, 13]) == [13]
+
+
+def test_add_reads_only_the_meta(seen):
+    seen.add(1, [10])
+    with mock.patch.object(SeenFilter, 'load', side_effect=AssertionError('bitmaps loaded')), \
+            mock.patch.object(seen.redis, 'get', side_effect=AssertionError('bitmap read')):
+        seen.add(1, [11, 12])
+
+    assert counts(seen, 1) == b'3'
+
+
+def test_add_spills_into_new_layers_and_counts_every_item(seen):
+    seen.add(1, range(100, 106))
+    seen.add(1, range(106, 110))
+
+    # Layers hold 4, then 8 items.
+    assert counts(seen, 1) == b'4,6'
+    assert seen.exclude(1, list(range(100, 110))) == []
+
+
+def test_concurrent_writers_do_not_lose_counts(seen):
+    other = SeenFilter(seen.redis, prefix='test:seen')
+    seen.add(1, [10, 11])
+    other.add(1, [12])
+    seen.add(1, [13])
+
+    assert counts(seen, 1) == b'4'
+    assert seen.exclude(1, [10, 11, 12, 13]) == []
+
+
+def test_missing_filter_is_rebuilt_before_adding(seen, db):
+    users = [User.objects.create(username=f'u{i}') for i in range(3)]
+    Swipe.objects.create(swiper=users[0], target=users[1], direction='pass')
+
+    seen.add(users[0].id, [users[2].id])
+
+    assert seen.exclude(users[0].id, [u.id for u in users]) == []
+    assert counts(seen, users[0].id) == b'2'
+
+
+def test_rebuild_all_walks_swipers_across_chunk_boundaries(seen, db):
+    users = [User.objects.create(username=f'u{i}') for i in range(5)]
+    ids = [u.id for u in users]
+    swipes = {ids[0]: ids[1:], ids[1]: [ids[0], ids[3]], ids[2]: [ids[4]], ids[3]: ids[:3]}
+    Swipe.objects.bulk_create(
+        Swipe(swiper_id=swiper, target_id=target, direction='pass')
+        for swiper, targets in swipes.items() for target in targets
+    )
+    UserBlock.objects.create(blocker_id=ids[4], blocked_id=ids[1])
+
+    # Chunks of two split most swipers' rows over several pages.
+    assert seen.rebuild_all(batch_size=2) == 4
+
+    for user_id, targets in swipes.items():
+        others = [i for i in ids if i != user_id]
+        hidden = targets + ([ids[4]] if user_id == ids[1] else [])
+        assert seen.exclude(user_id, others) == [i for i in others if i not in hidden]
+        assert counts(seen, user_id) == str(len(hidden)).encode()
@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from apps.core.admin import ExactInputFilter, LargeTableAdminMixin
+
+from .models import Notification, PushDevice
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'notification_type', 'channel', 'status', 'created_at', 'sent_at')
+    list_filter = (('user', ExactInputFilter),)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(PushDevice)
+class PushDeviceAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'platform', 'is_active', 'last_seen_at')
+    list_filter = (('user', ExactInputFilter),)
+    search_fields = ('=token',)
+    raw_id_fields = ('user',)
@@ -0,0 +1,159 @@
+"""
+Batched, multi-channel notification dispatch.
+
+Pending :class:`~apps.notifications.models.Notification` rows are claimed in
+``(created_at, id)`` order, collapsed into one digest per user, channel and
+type, resolved to device tokens / addresses with one query per channel, and
+handed to the channel transport in provider-sized batches under a per-provider
+rate limit. Row statuses are written back with bulk updates after each batch.
+
+Claiming is a short transaction of its own: the rows are locked with SKIP
+LOCKED, marked ``sending`` with a ``claimed_at`` stamp and committed before
+any provider call, so no row lock or transaction is held across HTTP calls or
+rate-limit sleeps, and a failed status write cannot put delivered messages
+back in the queue. Rows still ``sending`` after
+``NOTIFICATION_CLAIM_TIMEOUT_SECONDS`` were claimed by a worker that died
+mid-batch; requeue_stale() returns them to pending.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.ratelimit import TokenBucket
+from apps.users.models import User
+
+from .models import Notification, PushDevice
+from .transports import OutboundMessage, get_transport
+
+logger = logging.getLogger(__name__)
+
+_buckets = {}
+
+
+def _bucket(channel):
+    # Limits are per worker process; size NOTIFICATION_RATE_LIMITS accordingly.
+    if channel not in _buckets:
+        _buckets[channel] = TokenBucket(settings.NOTIFICATION_RATE_LIMITS[channel])
+    return _buckets[channel]
+
+
+def digest(notifications):
+    """Collapse a burst for one user/channel/type into a single message."""
+    latest = notifications[-1]
+    count = len(notifications)
+    body = latest.body if count == 1 else f'{latest.body} (+{count - 1} more)'
+    data = dict(latest.data)
+    if count > 1:
+        data['digestCount'] = count
+    return OutboundMessage(
+        user_id=latest.user_id,
+        title=latest.title,
+        body=body,
+        data=data,
+        notification_ids=[n.id for n in notifications],
+    )
+
+
+def _resolve_recipients(channel, messages):
+    user_ids = {m.user_id for m in messages}
+    recipients = defaultdict(list)
+    if channel == Notification.Channel.PUSH:
+        rows = PushDevice.objects.filter(user_id__in=user_ids, is_active=True).values_list('user_id', 'token')
+    elif channel == Notification.Channel.EMAIL:
+        rows = User.objects.filter(id__in=user_ids).exclude(email='').values_list('id', 'email')
+    else:
+        rows = User.objects.filter(id__in=user_ids).exclude(phone_number='').values_list('id', 'phone_number')
+    for user_id, address in rows:
+        recipients[user_id].append(address)
+    for message in messages:
+        message.recipients = recipients.get(message.user_id, [])
+
+
+class NotificationDispatcher:
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.NOTIFICATION_DISPATCH_BATCH_SIZE
+
+    def dispatch_pending(self):
+        """Send one claimed batch of due notifications; returns rows processed."""
+        pending = self.claim(timezone.now())
+        if not pending:
+            return 0
+
+        groups = defaultdict(list)
+        for notification in pending:
+            groups[(notification.channel, notification.user_id, notification.notification_type)].append(notification)
+        by_channel = defaultdict(list)
+        for (channel, _, _), notifications in groups.items():
+            by_channel[channel].append(digest(notifications))
+
+        sent = failed = 0
+        for channel, messages in by_channel.items():
+            ok, bad = self._send_channel(channel, messages)
+            sent += ok
+            failed += bad
+
+        logger.info('Dispatched %d notifications (%d sent, %d failed)', len(pending), sent, failed)
+        return len(pending)
+
+    def claim(self, now):
+        """Mark one batch of due, pending rows ``sending`` and return them."""
+        with transaction.atomic():
+            pending = list(
+                Notification.objects.select_for_update(skip_locked=True)
+                .filter(status=Notification.Status.PENDING)
+                .filter(Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now))
+                .order_by('created_at', 'id')[:self.batch_size]
+            )
+            if pending:
+                Notification.objects.filter(id__in=[n.id for n in pending]).update(
+                    status=Notification.Status.SENDING, claimed_at=now,
+                )
+        return pending
+
+    @staticmethod
+    def requeue_stale(now=None):
+        """Return rows left ``sending`` by a dead worker to pending; returns how many."""
+        cutoff = (now or timezone.now()) - timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS)
+        requeued = Notification.objects.filter(status=Notification.Status.SENDING, claimed_at__lt=cutoff).update(
+            status=Notification.Status.PENDING, claimed_at=None,
+        )
+        if requeued:
+            logger.warning('Requeued %d notifications from an abandoned dispatch', requeued)
+        return requeued
+
+    @staticmethod
+    def _record(sent, failed):
+        # Only rows still claimed: a requeued row now belongs to another dispatch.
+        claimed = Notification.objects.filter(status=Notification.Status.SENDING)
+        if sent:
+            claimed.filter(id__in=sent).update(status=Notification.Status.SENT, sent_at=timezone.now())
+        if failed:
+            claimed.filter(id__in=failed).update(status=Notification.Status.FAILED)
+
+    def _send_channel(self, channel, messages):
+        transport = get_transport(channel)
+        bucket = _bucket(channel)
+        _resolve_recipients(channel, messages)
+        sent_count = failed_count = 0
+        for start in range(0, len(messages), transport.max_batch):
+            chunk = messages[start:start + transport.max_batch]
+            bucket.acquire(len(chunk))
+            try:
+                results = transport.send(chunk)
+            except Exception:
+                logger.exception('%s transport failed on a batch of %d', channel, len(chunk))
+                results = [False] * len(chunk)
+            sent, failed = [], []
+            for message, ok in zip(chunk, results):
+                (sent if ok else failed).extend(message.notification_ids)
+            # Written per provider batch so a crash later in the claim re-sends as little as possible.
+            self._record(sent, failed)
+            sent_count += len(sent)
+            failed_count += len(failed)
+        return sent_count, failed_count
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='channel',
+            field=models.CharField(choices=[('push', 'Push'), ('email', 'Email'), ('sms', 'SMS')], default='push', max_length=8),
+        ),
+        migrations.CreateModel(
+            name='PushDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=255, unique=True)),
+                ('platform', models.CharField(blank=True, max_length=16)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_seen_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='push_devices', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notifications_push_device',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pushdevice',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='push_device_active_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+"""
+Outbound notification queue.
+"""
+
+from django.conf import settings
+from django.db import models
+
+
+class Notification(models.Model):
+    class Channel(models.TextChoices):
+        PUSH = 'push', 'Push'
+        EMAIL = 'email', 'Email'
+        SMS = 'sms', 'SMS'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        # Claimed by a dispatcher and handed to the provider; see claimed_at.
+        SENDING = 'sending', 'Sending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications'
+    )
+    notification_type = models.CharField(max_length=50)
+    channel = models.CharField(max_length=8, choices=Channel.choices, default=Channel.PUSH)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    scheduled_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'notifications_notification'
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='notif_pending_idx',
+            ),
+            models.Index(
+                fields=['claimed_at'],
+                condition=models.Q(status='sending'),
+                name='notif_sending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.notification_type} -> {self.user_id}'
+
+
+class PushDevice(models.Model):
+    """An FCM registration token for one of a user's devices."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='push_devices'
+    )
+    token = models.CharField(max_length=255, unique=True)
+    platform = models.CharField(max_length=16, blank=True)
+    is_active = models.BooleanField(default=True)
+    last_seen_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'notifications_push_device'
+        indexes = [
+            models.Index(fields=['user'], condition=models.Q(is_active=True), name='push_device_active_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.platform or "device"} for {self.user_id}'
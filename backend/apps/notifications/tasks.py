@@ -0,0 +1,17 @@
+"""
+Celery tasks for the notifications app.
+"""
+
+from celery import shared_task
+
+from .dispatcher import NotificationDispatcher
+
+
+@shared_task(ignore_result=True)
+def dispatch_notifications(max_batches=50):
+    """Drain the pending queue, a claimed batch at a time."""
+    NotificationDispatcher.requeue_stale()
+    dispatcher = NotificationDispatcher()
+    for _ in range(max_batches):
+        if dispatcher.dispatch_pending() < dispatcher.batch_size:
+            break
@@ -0,0 +1,137 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from apps.notifications.dispatcher import NotificationDispatcher
+from apps.notifications.models import Notification, PushDevice
+from apps.notifications.transports import Transport
+from apps.users.models import User
+
+
+class RecordingTransport(Transport):
+    max_batch = 2
+
+    def __init__(self, results=None):
+        self.batches = []
+        self.results = results
+        self.seen_status = []
+        self.in_transaction = []
+
+    def send(self, messages):
+        self.batches.append(messages)
+        ids = [i for m in messages for i in m.notification_ids]
+        self.seen_status.append(set(Notification.objects.filter(id__in=ids).values_list('status', flat=True)))
+        self.in_transaction.append(connection.in_atomic_block)
+        return self.results(messages) if self.results else [True] * len(messages)
+
+
+@pytest.fixture
+def transport():
+    transport = RecordingTransport()
+    with mock.patch('apps.notifications.dispatcher.get_transport', return_value=transport):
+        yield transport
+
+
+@pytest.fixture
+def users(db):
+    users = [User.objects.create(username=f'u{i}', email=f'u{i}@example.com') for i in range(3)]
+    for user in users:
+        PushDevice.objects.create(user=user, token=f'token-{user.id}')
+    return users
+
+
+def notify(user, kind='like', **fields):
+    return Notification.objects.create(user=user, notification_type=kind, title=kind, body=f'{kind} body', **fields)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sends_outside_any_transaction_with_rows_marked_sending(users, transport):
+    for user in users:
+        notify(user)
+
+    assert NotificationDispatcher(batch_size=10).dispatch_pending() == 3
+
+    assert transport.in_transaction == [False, False]
+    assert transport.seen_status == [{'sending'}, {'sending'}]
+    assert set(Notification.objects.values_list('status', flat=True)) == {'sent'}
+    assert all(n.sent_at and n.claimed_at for n in Notification.objects.all())
+
+
+@pytest.mark.django_db
+def test_collapses_a_burst_into_one_digest_per_user_and_type(users, transport):
+    for _ in range(3):
+        notify(users[0])
+    notify(users[0], kind='match')
+    notify(users[1], scheduled_at=timezone.now() + timedelta(hours=1))
+
+    assert NotificationDispatcher().dispatch_pending() == 4
+
+    messages = [m for batch in transport.batches for m in batch]
+    assert sorted(len(m.notification_ids) for m in messages) == [1, 3]
+    burst = next(m for m in messages if len(m.notification_ids) == 3)
+    assert burst.body == 'like body (+2 more)'
+    assert burst.data['digestCount'] == 3
+    assert burst.recipients == [f'token-{users[0].id}']
+    assert Notification.objects.get(user=users[1]).status == 'pending'
+
+
+@pytest.mark.django_db
+def test_failed_messages_are_marked_failed(users, transport):
+    transport.results = lambda messages: [m.user_id != users[1].id for m in messages]
+    for user in users:
+        notify(user)
+
+    NotificationDispatcher().dispatch_pending()
+
+    assert dict(Notification.objects.values_list('user_id', 'status')) == {
+        users[0].id: 'sent', users[1].id: 'failed', users[2].id: 'sent',
+    }
+
+
+@pytest.mark.django_db
+def test_failed_status_write_leaves_rows_claimed_not_pending(users, transport):
+    for user in users:
+        notify(user)
+    dispatcher = NotificationDispatcher()
+
+    with mock.patch.object(NotificationDispatcher, '_record', side_effect=RuntimeError('db went away')):
+        with pytest.raises(RuntimeError):
+            dispatcher.dispatch_pending()
+    assert set(Notification.objects.values_list('status', flat=True)) == {'sending'}
+
+    # Claimed rows are not picked up again until their claim is stale.
+    assert dispatcher.dispatch_pending() == 0
+    assert len(transport.batches) == 1
+
+
+@pytest.mark.django_db
+def test_requeue_stale_returns_only_abandoned_claims(users, settings):
+    settings.NOTIFICATION_CLAIM_TIMEOUT_SECONDS = 600
+    now = timezone.now()
+    stale = notify(users[0], status='sending', claimed_at=now - timedelta(minutes=11))
+    fresh = notify(users[1], status='sending', claimed_at=now - timedelta(minutes=5))
+
+    assert NotificationDispatcher.requeue_stale(now) == 1
+
+    stale.refresh_from_db()
+    fresh.refresh_from_db()
+    assert (stale.status, stale.claimed_at) == ('pending', None)
+    assert fresh.status == 'sending'
+
+
+@pytest.mark.django_db
+def test_late_result_does_not_overwrite_a_requeued_row(users, transport):
+    row = notify(users[0])
+
+    def requeue_then_succeed(messages):
+        Notification.objects.filter(id=row.id).update(status='pending', claimed_at=None)
+        return [True] * len(messages)
+
+    transport.results = requeue_then_succeed
+    NotificationDispatcher().dispatch_pending()
+
+    row.refresh_from_db()
+    assert row.status == 'pending'
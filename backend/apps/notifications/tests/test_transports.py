@@ -0,0 +1,12 @@
+from apps.notifications.transports import pooled_session
+
+
+def test_provider_posts_are_retried_only_when_provably_not_delivered():
+    retry = pooled_session().get_adapter('https://api.twilio.com').max_retries
+
+    assert retry.is_retry('POST', 429, has_retry_after=True)
+    assert not retry.is_retry('POST', 503, has_retry_after=True)
+    assert not retry.is_retry('POST', 500)
+    # A read timeout means the request reached the provider.
+    assert retry.read == 0
+    assert retry.connect == 3
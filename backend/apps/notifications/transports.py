@@ -0,0 +1,204 @@
+"""
+Delivery transports, one per channel.
+
+Each transport takes a list of :class:`OutboundMessage` no longer than its
+``max_batch`` and returns one success flag per message. Provider clients are
+created once per process and reuse pooled HTTP connections.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutboundMessage:
+    user_id: int
+    title: str
+    body: str
+    data: dict
+    notification_ids: list
+    # FCM tokens, an email address or a phone number, depending on channel.
+    recipients: list = field(default_factory=list)
+
+
+class ProviderRetry(Retry):
+    """Retries only ``status_forcelist`` responses.
+
+    urllib3 otherwise retries any 413/429/503 that carries Retry-After,
+    whatever the forcelist says.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        return status_code in self.status_forcelist and super().is_retry(method, status_code, has_retry_after)
+
+
+def pooled_session(pool_size=20):
+    """A requests session that keeps connections alive and honours 429 Retry-After.
+
+    Every send is a POST that the provider may already have acted on, so
+    only failures that prove it did not are retried: connection errors and
+    429 rate limiting. A 503 or a read timeout may follow a delivered SMS or
+    email, so those are reported as failures rather than re-sent.
+    """
+    session = requests.Session()
+    retry = ProviderRetry(
+        total=3,
+        connect=3,
+        read=0,
+        other=0,
+        backoff_factor=0.5,
+        status_forcelist=(429,),
+        allowed_methods=None,
+        respect_retry_after_header=True,
+    )
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry))
+    return session
+
+
+class Transport:
+    channel = None
+    max_batch = 1
+
+    def send(self, messages):
+        raise NotImplementedError
+
+
+class FCMTransport(Transport):
+    """Firebase Cloud Messaging; one message per device token."""
+
+    channel = 'push'
+    # FCM's per-call limit for send_each / multicast.
+    max_batch = 500
+
+    def send(self, messages):
+        from firebase_admin import messaging
+
+        from apps.core.firebase import get_firebase_app
+
+        from .models import PushDevice
+
+        app = get_firebase_app()
+        results = [False] * len(messages)
+        envelopes = []
+        for i, message in enumerate(messages):
+            data = {k: v if isinstance(v, str) else json.dumps(v) for k, v in message.data.items()}
+            for token in message.recipients:
+                envelopes.append((i, token, messaging.Message(
+                    token=token,
+                    notification=messaging.Notification(title=message.title, body=message.body),
+                    data=data,
+                )))
+
+        dead_tokens = []
+        for start in range(0, len(envelopes), self.max_batch):
+            chunk = envelopes[start:start + self.max_batch]
+            response = messaging.send_each([env for _, _, env in chunk], app=app)
+            for (i, token, _), result in zip(chunk, response.responses):
+                if result.success:
+                    results[i] = True
+                elif isinstance(result.exception, messaging.UnregisteredError):
+                    dead_tokens.append(token)
+        if dead_tokens:
+            PushDevice.objects.filter(token__in=dead_tokens).update(is_active=False)
+        return results
+
+
+class SendGridTransport(Transport):
+    """SendGrid v3 mail send with one personalization per recipient."""
+
+    channel = 'email'
+    # SendGrid's personalizations-per-request limit.
+    max_batch = 1000
+    url = 'https://api.sendgrid.com/v3/mail/send'
+
+    def __init__(self):
+        self.session = pooled_session()
+        self.session.headers['Authorization'] = f'Bearer {settings.SENDGRID_API_KEY}'
+
+    def send(self, messages):
+        addressed = [m for m in messages if m.recipients]
+        if not addressed:
+            return [False] * len(messages)
+        payload = {
+            'from': {'email': settings.DEFAULT_FROM_EMAIL},
+            'content': [{'type': 'text/plain', 'value': '-body-'}],
+            'personalizations': [
+                {
+                    'to': [{'email': m.recipients[0]}],
+                    'subject': m.title,
+                    'substitutions': {'-body-': m.body},
+                }
+                for m in addressed
+            ],
+        }
+        response = self.session.post(self.url, json=payload, timeout=30)
+        if response.status_code != 202:
+            logger.error('SendGrid rejected batch of %d: %s %s', len(addressed), response.status_code, response.text[:500])
+            return [False] * len(messages)
+        return [bool(m.recipients) for m in messages]
+
+
+class TwilioTransport(Transport):
+    """Twilio Messages API; one request per SMS over a shared connection pool."""
+
+    channel = 'sms'
+    max_batch = 100
+
+    def __init__(self):
+        self.session = pooled_session()
+        self.session.auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        self.url = f'https://api.twilio.com/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json'
+
+    def send(self, messages):
+        results = []
+        for message in messages:
+            if not message.recipients:
+                results.append(False)
+                continue
+            response = self.session.post(self.url, data={
+                'To': message.recipients[0],
+                'From': settings.TWILIO_PHONE_NUMBER,
+                'Body': f'{message.title}\n{message.body}' if message.title else message.body,
+            }, timeout=15)
+            if response.status_code >= 400:
+                logger.error('Twilio send to user %s failed: %s', message.user_id, response.text[:500])
+            results.append(response.status_code < 400)
+        return results
+
+
+class StubTransport(Transport):
+    """Local development and test transport; records messages in ``outbox``."""
+
+    max_batch = 1000
+    outbox = []
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, messages):
+        for message in messages:
+            logger.info('[%s stub] user=%s %s: %s', self.channel, message.user_id, message.title, message.body)
+        StubTransport.outbox.extend((self.channel, m) for m in messages)
+        return [True] * len(messages)
+
+
+_transports = {}
+
+
+def get_transport(channel):
+    """Process-wide transport for ``channel``, built once from settings."""
+    if channel not in _transports:
+        if settings.NOTIFICATION_STUB_TRANSPORTS:
+            _transports[channel] = StubTransport(channel)
+        else:
+            _transports[channel] = import_string(settings.NOTIFICATION_TRANSPORTS[channel])()
+    return _transports[channel]
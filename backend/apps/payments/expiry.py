@@ -0,0 +1,132 @@
+"""
+Batched subscription-expiry sweep.
+
+Server-side counterpart of ``SubscriptionExpiryService`` in the Flutter app:
+instead of each client checking its own membership on launch, one job walks
+every lapsed subscription in ``(expires_at, id)`` keyset order, expires them
+with set-based updates, downgrades users left without cover, and queues the
+"Subscription Expired" notifications in bulk.
+
+Progress is checkpointed after every committed batch, so a crashed sweep
+resumes from its watermark rather than rescanning from the start.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.batching import keyset_chunks
+from apps.core.models import JobCheckpoint
+from apps.notifications.models import Notification
+from apps.users.models import MembershipTier, User, tier_cache_key
+
+from .models import Subscription
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'payments.subscription_expiry'
+KEY_FIELDS = ('expires_at', 'id')
+
+
+@dataclass
+class SweepResult:
+    scanned: int = 0
+    expired: int = 0
+    downgraded: int = 0
+
+
+class SubscriptionExpirySweeper:
+    """Expire lapsed subscriptions in keyset-ordered, checkpointed batches."""
+
+    def __init__(self, *, batch_size=None, checkpoint=CHECKPOINT_NAME):
+        self.batch_size = batch_size or settings.SUBSCRIPTION_SWEEP_BATCH_SIZE
+        self.checkpoint = checkpoint
+
+    def run(self, now=None):
+        state = JobCheckpoint.load(self.checkpoint)
+        # A resumed sweep keeps the cutoff it started with so the keyset walk
+        # stays over the same, stable range.
+        cutoff = parse_datetime(state['cutoff']) if 'cutoff' in state else (now or timezone.now())
+        after = None
+        if state.get('after'):
+            after = (parse_datetime(state['after'][0]), state['after'][1])
+            logger.info('Resuming subscription sweep after %s', state['after'])
+
+        result = SweepResult()
+        rows = (
+            Subscription.objects.filter(status=Subscription.Status.ACTIVE, expires_at__lte=cutoff)
+            .exclude(tier=MembershipTier.TEST)
+            .values('id', 'user_id', 'expires_at')
+        )
+        for batch, last_key in keyset_chunks(rows, self.batch_size, fields=KEY_FIELDS, after=after):
+            expired, downgraded = self._expire_batch(batch, cutoff)
+            result.scanned += len(batch)
+            result.expired += expired
+            result.downgraded += downgraded
+            JobCheckpoint.store(self.checkpoint, {
+                'cutoff': cutoff.isoformat(),
+                'after': [last_key[0].isoformat(), last_key[1]],
+            })
+
+        JobCheckpoint.clear(self.checkpoint)
+        logger.info(
+            'Subscription sweep done: scanned=%d expired=%d downgraded=%d',
+            result.scanned, result.expired, result.downgraded,
+        )
+        return result
+
+    def _expire_batch(self, batch, cutoff):
+        now = timezone.now()
+        sub_ids = [row['id'] for row in batch]
+        user_ids = {row['user_id'] for row in batch}
+
+        with transaction.atomic():
+            expired = Subscription.objects.filter(
+                id__in=sub_ids, status=Subscription.Status.ACTIVE
+            ).update(status=Subscription.Status.EXPIRED, updated_at=now)
+
+            # Users who renewed or upgraded still hold cover past the cutoff.
+            covered = set(
+                Subscription.objects.filter(user_id__in=user_ids, status=Subscription.Status.ACTIVE)
+                .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=cutoff))
+                .values_list('user_id', flat=True)
+            )
+            # Reading the current tier first keeps retries idempotent: a user
+            # already on FREE is neither updated nor notified twice.
+            downgrades = list(
+                User.objects.filter(id__in=user_ids - covered)
+                .exclude(membership_tier__in=[MembershipTier.FREE, MembershipTier.TEST])
+                .values_list('id', 'membership_tier')
+            )
+            if downgrades:
+                User.objects.filter(id__in=[uid for uid, _ in downgrades]).update(
+                    membership_tier=MembershipTier.FREE
+                )
+                Notification.objects.bulk_create(
+                    [self._downgrade_notification(uid, tier) for uid, tier in downgrades]
+                )
+                keys = [tier_cache_key(uid) for uid, _ in downgrades]
+                transaction.on_commit(lambda: cache.delete_many(keys))
+
+        return expired, len(downgrades)
+
+    @staticmethod
+    def _downgrade_notification(user_id, previous_tier):
+        label = MembershipTier(previous_tier).label
+        return Notification(
+            user_id=user_id,
+            notification_type='system',
+            title='Subscription Expired',
+            body=(
+                f'Your {label} subscription has expired. '
+                'You have been moved to the Free tier. '
+                'Upgrade anytime to restore your premium features!'
+            ),
+            data={'previousTier': previous_tier, 'action': 'subscription_expired'},
+        )
@@ -0,0 +1,42 @@
+"""
+Subscriptions and billing state.
+"""
+
+from django.conf import settings
+from django.db import models
+
+from apps.users.models import MembershipTier
+
+
+class Subscription(models.Model):
+    class Status(models.TextChoices):
+        ACTIVE = 'active', 'Active'
+        EXPIRED = 'expired', 'Expired'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='subscriptions'
+    )
+    tier = models.CharField(max_length=16, choices=MembershipTier.choices)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.ACTIVE)
+    # NULL means the subscription never lapses (admin grants, testers).
+    expires_at = models.DateTimeField(null=True, blank=True)
+    auto_renew = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'payments_subscription'
+        indexes = [
+            models.Index(fields=['user', 'status'], name='sub_user_status_idx'),
+            # Drives the expiry sweep: a range scan over active rows only,
+            # already in (expires_at, id) keyset order.
+            models.Index(
+                fields=['expires_at', 'id'],
+                condition=models.Q(status='active'),
+                name='sub_active_expiry_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.tier} ({self.status})'
@@ -0,0 +1,26 @@
+"""
+Celery tasks for the payments app.
+"""
+
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+from .expiry import SubscriptionExpirySweeper
+
+logger = logging.getLogger(__name__)
+
+SWEEP_LOCK_KEY = 'payments:subscription_sweep:lock'
+
+
+@shared_task(ignore_result=True)
+def sweep_expired_subscriptions():
+    """Periodic entry point for the expiry sweep; one sweep runs at a time."""
+    if not cache.add(SWEEP_LOCK_KEY, 1, timeout=30 * 60):
+        logger.info('Subscription sweep already running, skipping')
+        return
+    try:
+        SubscriptionExpirySweeper().run()
+    finally:
+        cache.delete(SWEEP_LOCK_KEY)
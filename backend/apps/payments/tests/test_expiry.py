@@ -0,0 +1,98 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.core.models import JobCheckpoint
+from apps.notifications.models import Notification
+from apps.payments.expiry import CHECKPOINT_NAME, SubscriptionExpirySweeper
+from apps.payments.models import Subscription
+from apps.users.models import MembershipTier, User, tier_cache_key
+
+pytestmark = pytest.mark.django_db
+
+NOW = timezone.now()
+
+
+def subscribe(username, tier=MembershipTier.GOLD, expires_in=timedelta(days=-1), **fields):
+    user = User.objects.create(username=username, membership_tier=tier)
+    return Subscription.objects.create(
+        user=user, tier=tier, expires_at=NOW + expires_in if expires_in is not None else None, **fields,
+    )
+
+
+def test_expires_lapsed_subscriptions_and_downgrades_their_users(django_capture_on_commit_callbacks):
+    lapsed = subscribe('lapsed')
+    cache.set(tier_cache_key(lapsed.user_id), MembershipTier.GOLD)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        result = SubscriptionExpirySweeper(batch_size=10).run(now=NOW)
+
+    lapsed.refresh_from_db()
+    lapsed.user.refresh_from_db()
+    assert (result.scanned, result.expired, result.downgraded) == (1, 1, 1)
+    assert lapsed.status == Subscription.Status.EXPIRED
+    assert lapsed.user.membership_tier == MembershipTier.FREE
+    notification = Notification.objects.get(user=lapsed.user)
+    assert notification.data == {'previousTier': 'GOLD', 'action': 'subscription_expired'}
+    assert cache.get(tier_cache_key(lapsed.user_id)) is None
+    assert JobCheckpoint.load(CHECKPOINT_NAME) == {}
+
+
+def test_keeps_tier_of_users_still_covered():
+    lapsed = subscribe('renewed')
+    Subscription.objects.create(user=lapsed.user, tier=MembershipTier.GOLD, expires_at=NOW + timedelta(days=30))
+    lifetime = subscribe('lifetime', expires_in=None)
+    tester = subscribe('tester', tier=MembershipTier.TEST)
+    future = subscribe('future', expires_in=timedelta(days=1))
+
+    result = SubscriptionExpirySweeper(batch_size=10).run(now=NOW)
+
+    assert (result.expired, result.downgraded) == (1, 0)
+    assert set(User.objects.values_list('membership_tier', flat=True)) == {'GOLD', 'TEST'}
+    for untouched in (lifetime, tester, future):
+        untouched.refresh_from_db()
+        assert untouched.status == Subscription.Status.ACTIVE
+    assert not Notification.objects.exists()
+
+
+def test_crashed_sweep_resumes_from_its_checkpoint():
+    subs = [subscribe(f'user{i}', expires_in=timedelta(hours=-10 + i)) for i in range(5)]
+    sweeper = SubscriptionExpirySweeper(batch_size=2)
+    expire_batch = sweeper._expire_batch
+    calls = []
+
+    def crash_on_second_batch(batch, cutoff):
+        calls.append([row['id'] for row in batch])
+        if len(calls) == 2:
+            raise RuntimeError('worker lost')
+        return expire_batch(batch, cutoff)
+
+    with mock.patch.object(sweeper, '_expire_batch', crash_on_second_batch), pytest.raises(RuntimeError):
+        sweeper.run(now=NOW)
+
+    state = JobCheckpoint.load(CHECKPOINT_NAME)
+    assert state['cutoff'] == NOW.isoformat()
+    assert state['after'][1] == subs[1].id
+
+    # The resumed run keeps the original cutoff even though "now" moved on.
+    late = subscribe('late', expires_in=timedelta(minutes=30))
+    result = SubscriptionExpirySweeper(batch_size=2).run(now=NOW + timedelta(hours=1))
+
+    assert result.scanned == 3
+    assert Notification.objects.count() == 5
+    assert set(Subscription.objects.filter(status='active').values_list('id', flat=True)) == {late.id}
+    assert JobCheckpoint.load(CHECKPOINT_NAME) == {}
+
+
+def test_rerun_after_commit_does_not_notify_twice():
+    sub = subscribe('twice')
+    SubscriptionExpirySweeper().run(now=NOW)
+    Subscription.objects.filter(pk=sub.pk).update(status=Subscription.Status.ACTIVE)
+
+    result = SubscriptionExpirySweeper().run(now=NOW)
+
+    assert (result.expired, result.downgraded) == (1, 0)
+    assert Notification.objects.count() == 1
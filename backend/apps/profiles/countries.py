@@ -0,0 +1,97 @@
+"""
+Country-name normalization shared with the Flutter app and backfill scripts.
+
+Profiles created on localized devices store the country in the device
+language ("Italia", "Deutschland"); queries and stats key on the English
+name and its lower-cased form.
+"""
+
+COUNTRY_NORMALIZATION = {
+    # Italian
+    'italia': 'Italy', 'stati uniti': 'United States', "stati uniti d'america": 'United States',
+    'germania': 'Germany', 'francia': 'France', 'spagna': 'Spain', 'svizzera': 'Switzerland',
+    'regno unito': 'United Kingdom', 'paesi bassi': 'Netherlands', 'giappone': 'Japan',
+    'cina': 'China', 'brasile': 'Brazil', 'portogallo': 'Portugal', 'svezia': 'Sweden',
+    'norvegia': 'Norway', 'danimarca': 'Denmark', 'finlandia': 'Finland', 'belgio': 'Belgium',
+    'grecia': 'Greece', 'turchia': 'Turkey', 'egitto': 'Egypt', 'sudafrica': 'South Africa',
+    'messico': 'Mexico', 'corea del sud': 'South Korea', 'corea del nord': 'North Korea',
+    'nuova zelanda': 'New Zealand', 'irlanda': 'Ireland', 'polonia': 'Poland',
+    'romania': 'Romania', 'ungheria': 'Hungary', 'repubblica ceca': 'Czech Republic',
+    'croazia': 'Croatia', 'lussemburgo': 'Luxembourg', 'cipro': 'Cyprus', 'islanda': 'Iceland',
+    'lettonia': 'Latvia', 'lituania': 'Lithuania', 'estonia': 'Estonia',
+    'slovacchia': 'Slovakia', 'slovenia': 'Slovenia', 'albania': 'Albania',
+    'marocco': 'Morocco', 'tunisia': 'Tunisia', 'thailandia': 'Thailand',
+    'filippine': 'Philippines', 'emirati arabi uniti': 'United Arab Emirates',
+    'arabia saudita': 'Saudi Arabia',
+    # German
+    'deutschland': 'Germany', 'frankreich': 'France', 'vereinigte staaten': 'United States',
+    'vereinigtes königreich': 'United Kingdom', 'großbritannien': 'United Kingdom',
+    'italien': 'Italy', 'spanien': 'Spain', 'schweiz': 'Switzerland',
+    'niederlande': 'Netherlands', 'belgien': 'Belgium', 'österreich': 'Austria',
+    'griechenland': 'Greece', 'türkei': 'Turkey', 'ägypten': 'Egypt',
+    'brasilien': 'Brazil', 'mexiko': 'Mexico', 'argentinien': 'Argentina',
+    'schweden': 'Sweden', 'norwegen': 'Norway', 'dänemark': 'Denmark',
+    'finnland': 'Finland', 'irland': 'Ireland', 'polen': 'Poland',
+    'rumänien': 'Romania', 'ungarn': 'Hungary', 'tschechien': 'Czech Republic',
+    'kroatien': 'Croatia', 'slowakei': 'Slovakia', 'slowenien': 'Slovenia',
+    'albanien': 'Albania', 'neuseeland': 'New Zealand', 'südafrika': 'South Africa',
+    'südkorea': 'South Korea', 'nordkorea': 'North Korea', 'philippinen': 'Philippines',
+    'lettland': 'Latvia', 'litauen': 'Lithuania', 'estland': 'Estonia',
+    'tunesien': 'Tunisia', 'saudi-arabien': 'Saudi Arabia',
+    'vereinigte arabische emirate': 'United Arab Emirates', 'zypern': 'Cyprus',
+    'luxemburg': 'Luxembourg',
+    # Spanish
+    'estados unidos': 'United States', 'reino unido': 'United Kingdom',
+    'alemania': 'Germany', 'españa': 'Spain', 'suiza': 'Switzerland',
+    'países bajos': 'Netherlands', 'bélgica': 'Belgium', 'suecia': 'Sweden',
+    'noruega': 'Norway', 'dinamarca': 'Denmark', 'turquía': 'Turkey',
+    'egipto': 'Egypt', 'japón': 'Japan', 'nueva zelanda': 'New Zealand',
+    'sudáfrica': 'South Africa', 'méxico': 'Mexico', 'hungría': 'Hungary',
+    'república checa': 'Czech Republic', 'eslovaquia': 'Slovakia', 'eslovenia': 'Slovenia',
+    'filipinas': 'Philippines', 'tailandia': 'Thailand',
+    'emiratos árabes unidos': 'United Arab Emirates', 'arabia saudí': 'Saudi Arabia',
+    'chipre': 'Cyprus', 'islandia': 'Iceland', 'letonia': 'Latvia',
+    'marruecos': 'Morocco', 'túnez': 'Tunisia',
+    # French
+    'états-unis': 'United States', 'états unis': 'United States',
+    'royaume-uni': 'United Kingdom', 'allemagne': 'Germany', 'espagne': 'Spain',
+    'suisse': 'Switzerland', 'pays-bas': 'Netherlands', 'belgique': 'Belgium',
+    'italie': 'Italy', 'autriche': 'Austria', 'grèce': 'Greece',
+    'turquie': 'Turkey', 'égypte': 'Egypt', 'brésil': 'Brazil',
+    'mexique': 'Mexico', 'argentine': 'Argentina', 'suède': 'Sweden',
+    'norvège': 'Norway', 'danemark': 'Denmark', 'finlande': 'Finland',
+    'irlande': 'Ireland', 'pologne': 'Poland', 'roumanie': 'Romania',
+    'hongrie': 'Hungary', 'tchéquie': 'Czech Republic', 'république tchèque': 'Czech Republic',
+    'croatie': 'Croatia', 'slovaquie': 'Slovakia', 'slovénie': 'Slovenia',
+    'albanie': 'Albania', 'nouvelle-zélande': 'New Zealand',
+    'afrique du sud': 'South Africa', 'corée du sud': 'South Korea',
+    'corée du nord': 'North Korea', 'japon': 'Japan', 'chine': 'China',
+    'thaïlande': 'Thailand', 'émirats arabes unis': 'United Arab Emirates',
+    'arabie saoudite': 'Saudi Arabia', 'chypre': 'Cyprus', 'islande': 'Iceland',
+    'lituanie': 'Lithuania', 'lettonie': 'Latvia', 'estonie': 'Estonia',
+    'maroc': 'Morocco', 'tunisie': 'Tunisia',
+    # Portuguese
+    'alemanha': 'Germany', 'frança': 'France', 'espanha': 'Spain',
+    'suíça': 'Switzerland', 'itália': 'Italy', 'áustria': 'Austria',
+    'grécia': 'Greece', 'turquia': 'Turkey', 'egito': 'Egypt',
+    'japão': 'Japan', 'nova zelândia': 'New Zealand', 'áfrica do sul': 'South Africa',
+    'coreia do sul': 'South Korea', 'coreia do norte': 'North Korea',
+    'polônia': 'Poland', 'romênia': 'Romania', 'hungria': 'Hungary',
+    'república tcheca': 'Czech Republic', 'eslováquia': 'Slovakia',
+    'eslovênia': 'Slovenia', 'croácia': 'Croatia', 'albânia': 'Albania',
+    'tailândia': 'Thailand', 'emirados árabes unidos': 'United Arab Emirates',
+    'arábia saudita': 'Saudi Arabia', 'islândia': 'Iceland',
+    'letônia': 'Latvia', 'lituânia': 'Lithuania', 'estônia': 'Estonia',
+    'marrocos': 'Morocco', 'tunísia': 'Tunisia',
+    # English variants
+    'united states of america': 'United States', 'usa': 'United States', 'us': 'United States',
+    'uk': 'United Kingdom', 'great britain': 'United Kingdom', 'england': 'United Kingdom',
+    'holland': 'Netherlands', 'czechia': 'Czech Republic',
+    "côte d'ivoire": 'Ivory Coast',
+}
+
+
+def normalize_country(country):
+    if not country:
+        return country
+    return COUNTRY_NORMALIZATION.get(country.lower(), country)
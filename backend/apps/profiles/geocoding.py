@@ -0,0 +1,142 @@
+"""
+Local reverse geocoding against the ``City`` table.
+
+Cities are projected onto the unit sphere and loaded into a KD-tree, so
+"nearest city" is an exact great-circle nearest-neighbour query (straight-line
+chord distance is monotonic in arc distance) answered in microseconds with no
+provider call. Vectorised queries make it practical to backfill millions of
+rows in one pass.
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from scipy.spatial import cKDTree
+
+from apps.core.batching import keyset_chunks
+
+from .models import City, Profile
+from .search import refresh_search_vectors
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class CityMatch(NamedTuple):
+    city_id: int
+    name: str
+    country_code: str
+    distance_km: float
+
+
+def to_unit_vectors(lat, lng):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def _chord(km):
+    return 2 * math.sin(min(km, math.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+
+def _arc_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+class CityIndex:
+    def __init__(self, ids, names, country_codes, latitudes, longitudes):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = names
+        self.country_codes = country_codes
+        self.tree = cKDTree(to_unit_vectors(latitudes, longitudes))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_database(cls):
+        rows = list(City.objects.values_list('id', 'name', 'country_code', 'latitude', 'longitude'))
+        if not rows:
+            raise City.DoesNotExist('The city table is empty; run import_cities first.')
+        return cls(*zip(*rows))
+
+    def _match(self, i, chord):
+        return CityMatch(int(self.ids[i]), self.names[i], self.country_codes[i], float(_arc_km(chord)))
+
+    def nearest(self, lat, lng, max_km=None):
+        """Closest city to a point, or None if none lies within ``max_km``."""
+        bound = _chord(max_km) if max_km is not None else np.inf
+        chord, i = self.tree.query(to_unit_vectors(lat, lng), distance_upper_bound=bound)
+        return None if i == len(self.ids) else self._match(i, chord)
+
+    def nearest_many(self, lats, lngs, max_km=None, workers=-1):
+        """Vectorised :meth:`nearest`; returns ``(indices, distances_km)``.
+
+        Points with no city within ``max_km`` get index ``-1``.
+        """
+        bound = _chord(max_km) if max_km is not None else np.inf
+        chord, idx = self.tree.query(to_unit_vectors(lats, lngs), distance_upper_bound=bound, workers=workers)
+        idx = np.where(idx == len(self.ids), -1, idx)
+        return idx, _arc_km(np.where(np.isinf(chord), np.nan, chord))
+
+    def within(self, lat, lng, radius_km):
+        """Cities within ``radius_km`` of a point, nearest first."""
+        point = to_unit_vectors(lat, lng)
+        hits = self.tree.query_ball_point(point, _chord(radius_km))
+        chords = np.linalg.norm(self.tree.data[hits] - point, axis=1) if hits else []
+        return [self._match(i, c) for c, i in sorted(zip(chords, hits))]
+
+
+_index = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_city_index():
+    """Process-wide index, reloaded every ``CITY_INDEX_TTL_SECONDS``."""
+    global _index, _loaded_at
+    if _index is None or time.monotonic() - _loaded_at > settings.CITY_INDEX_TTL_SECONDS:
+        with _lock:
+            if _index is None or time.monotonic() - _loaded_at > settings.CITY_INDEX_TTL_SECONDS:
+                _index = CityIndex.from_database()
+                _loaded_at = time.monotonic()
+    return _index
+
+
+def backfill_profiles(batch_size=10_000, max_km=None, overwrite=False):
+    """Fill ``city`` / ``country_code`` on located profiles in one keyset pass."""
+    index = get_city_index()
+    max_km = max_km or settings.REVERSE_GEOCODE_MAX_KM
+    rows = Profile.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if not overwrite:
+        rows = rows.filter(Q(city='') | Q(country_code=''))
+    rows = rows.only('user_id', 'latitude', 'longitude', 'city', 'country_code')
+
+    updated = 0
+    for batch, _ in keyset_chunks(rows, batch_size, fields=('user_id',)):
+        idx, _distances = index.nearest_many(
+            [p.latitude for p in batch], [p.longitude for p in batch], max_km=max_km
+        )
+        changed = []
+        for profile, i in zip(batch, idx):
+            if i < 0:
+                continue
+            profile.city = index.names[i]
+            profile.country_code = index.country_codes[i]
+            changed.append(profile)
+        with transaction.atomic():
+            Profile.objects.bulk_update(changed, ['city', 'country_code'])
+            # bulk_update skips post_save; city is part of the search vector.
+            refresh_search_vectors(Profile.objects.filter(pk__in=[p.pk for p in changed]))
+        updated += len(changed)
+    logger.info('Reverse-geocoded %d profiles', updated)
+    return updated
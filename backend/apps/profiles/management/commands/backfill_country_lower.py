@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from apps.core.firebase import get_firestore_client
+from apps.core.firestore_writer import BulkWriter
+from apps.profiles.countries import normalize_country
+
+CHECKPOINT_NAME = 'profiles.backfill_country_lower'
+
+
+class Command(BaseCommand):
+    help = 'Normalize Firestore profile countries to English and set location.countryLower (resumable).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restart', action='store_true', help='Ignore any saved resume point.')
+
+    def handle(self, *args, restart, **options):
+        client = get_firestore_client()
+        profiles = client.collection('profiles')
+        processed = updated = 0
+        with BulkWriter(client, checkpoint=CHECKPOINT_NAME) as writer:
+            after = None if restart else writer.resume_state.get('after')
+            query = profiles.select(['location']).order_by(FieldPath.document_id())
+            if after:
+                self.stdout.write(f'Resuming after profiles/{after}')
+                query = query.start_after({FieldPath.document_id(): profiles.document(after)})
+            for doc in query.stream():
+                processed += 1
+                location = (doc.to_dict() or {}).get('location') or {}
+                country = location.get('country')
+                if isinstance(country, str):
+                    normalized = normalize_country(country)
+                    if country != normalized or location.get('countryLower') != normalized.lower():
+                        writer.update(doc.reference, {
+                            'location.country': normalized,
+                            'location.countryLower': normalized.lower(),
+                        })
+                        updated += 1
+                if processed % 500 == 0:
+                    writer.mark({'after': doc.id})
+        result = writer.result
+        self.stdout.write(
+            f'Processed {processed:,}, updated {updated:,} '
+            f'(written={result.written:,} retried={result.retried:,} failed={result.failed:,})'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.profiles.geocoding import backfill_profiles
+
+
+class Command(BaseCommand):
+    help = 'Fill profile city/country from coordinates using the local city KD-tree.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='Also re-geocode profiles that already have a city.')
+        parser.add_argument('--max-km', type=float, default=None)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, overwrite, max_km, batch_size, **options):
+        updated = backfill_profiles(batch_size=batch_size, max_km=max_km, overwrite=overwrite)
+        self.stdout.write(f'Updated {updated:,} profiles')
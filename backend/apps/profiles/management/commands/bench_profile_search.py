@@ -0,0 +1,145 @@
+import csv
+import io
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.profiles.models import Profile
+from apps.profiles.search import rebuild_search_vectors, search_profiles
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'Lukas', 'Hannah',
+    'Maximilian', 'Sophie', 'Jonas', 'Lena', 'Alejandro', 'Lucía', 'Javier', 'Carmen', 'Santiago', 'Valentina',
+    'Louis', 'Chloé', 'Gabriel', 'Camille', 'Raphaël', 'Léa', 'Francesco', 'Giulia', 'Alessandro', 'Chiara',
+    'Lorenzo', 'Martina', 'João', 'Beatriz', 'Miguel', 'Mariana', 'Thiago', 'Larissa', 'Rafael', 'Fernanda',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Müller', 'Schmidt', 'Schneider', 'Fischer', 'García', 'Martínez',
+    'López', 'Sánchez', 'Martin', 'Bernard', 'Dubois', 'Moreau', 'Rossi', 'Russo', 'Ferrari', 'Esposito',
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Costa', 'Pereira', 'Almeida', 'Ribeiro', 'Carvalho', 'Gomes',
+]
+CITIES = [
+    'London', 'New York', 'Berlin', 'Munich', 'Madrid', 'Barcelona', 'Paris', 'Lyon', 'Rome', 'Milan',
+    'Lisbon', 'Porto', 'São Paulo', 'Rio de Janeiro', 'Mexico City', 'Buenos Aires', 'Toronto', 'Vienna',
+]
+INTERESTS = [
+    'hiking', 'cooking', 'travel', 'photography', 'music', 'dancing', 'yoga', 'football', 'reading', 'wine',
+    'cinema', 'surfing', 'painting', 'running', 'climbing', 'gaming', 'theatre', 'cycling', 'coffee', 'languages',
+]
+BIO_WORDS = {
+    'en': 'love hiking mountains cooking dinners friends travelling beaches reading books running marathons'.split(),
+    'de': 'liebe wandern berge kochen abendessen freunde reisen strände lesen bücher laufen konzerte'.split(),
+    'es': 'me encanta caminar montañas cocinar cenas amigos viajar playas leer libros correr conciertos'.split(),
+    'fr': "j'adore randonnées montagnes cuisiner dîners amis voyager plages lire livres courir concerts".split(),
+    'it': 'amo camminare montagne cucinare cene amici viaggiare spiagge leggere libri correre concerti'.split(),
+    'pt': 'adoro caminhadas montanhas cozinhar jantares amigos viajar praias ler livros correr concertos'.split(),
+}
+LANGUAGES = [choice for choice, _ in Profile.Language.choices]
+
+
+def _typo(rng, word):
+    i = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+class Command(BaseCommand):
+    help = 'Load synthetic profiles into scratch tables and time ranked, typo-tolerant profile search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200, help='Queries per query kind.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=20_000)
+
+    def handle(self, *args, profiles, queries, limit, batch_size, **options):
+        rng = random.Random(11)
+        with connection.cursor() as cursor:
+            # Temporary tables shadow the real ones for this session only.
+            for table in ('users_user', 'profiles_profile'):
+                cursor.execute(f'CREATE TEMPORARY TABLE {table} (LIKE {table} INCLUDING ALL)')
+            try:
+                started = time.perf_counter()
+                self._load(cursor, rng, profiles)
+                load = time.perf_counter() - started
+
+                started = time.perf_counter()
+                rebuild_search_vectors(batch_size=batch_size)
+                index = time.perf_counter() - started
+                cursor.execute('ANALYZE users_user')
+                cursor.execute('ANALYZE profiles_profile')
+                self.stdout.write(f'{profiles:,} profiles: loaded in {load:.1f}s, indexed in {index:.1f}s '
+                                  f'({profiles / index:,.0f}/s)')
+
+                for kind, make in self._query_kinds(rng).items():
+                    self._time(kind, make, queries, limit)
+                sql, params = search_profiles('Giulia Rossi', language='it')[:limit].query.sql_with_params()
+                cursor.execute(f'EXPLAIN {sql}', params)
+                self.stdout.write('Plan for "Giulia Rossi":')
+                for (line,) in cursor.fetchall():
+                    self.stdout.write(f'  {line}')
+            finally:
+                cursor.execute('DROP TABLE IF EXISTS pg_temp.profiles_profile, pg_temp.users_user')
+
+    def _load(self, cursor, rng, count, chunk=100_000):
+        for start in range(1, count + 1, chunk):
+            ids = range(start, min(start + chunk, count + 1))
+            users, profiles = io.StringIO(), io.StringIO()
+            user_rows, profile_rows = csv.writer(users), csv.writer(profiles)
+            for pk in ids:
+                language = rng.choice(LANGUAGES)
+                words = BIO_WORDS.get(language, BIO_WORDS['pt'])
+                user_rows.writerow([pk, '', 'f', f'bench{pk}', '', '', '', 'f', 't', '2024-01-01T00:00:00Z', 'FREE', ''])
+                profile_rows.writerow([
+                    pk, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    ' '.join(rng.choice(words) for _ in range(rng.randint(4, 20))), '',
+                    '{' + ','.join(rng.sample(INTERESTS, rng.randint(1, 5))) + '}', '{}',
+                    18, 99, 100, 't', rng.choice(CITIES), '', language, '2024-01-01T00:00:00Z', '2024-01-01T00:00:00Z',
+                ])
+            users.seek(0)
+            profiles.seek(0)
+            cursor.copy_expert(
+                'COPY users_user (id, password, is_superuser, username, first_name, last_name, email, is_staff, '
+                'is_active, date_joined, membership_tier, phone_number) FROM STDIN WITH (FORMAT csv)', users,
+            )
+            cursor.copy_expert(
+                'COPY profiles_profile (user_id, display_name, bio, gender, interests, interested_in, min_age, max_age, '
+                'max_distance_km, is_discoverable, city, country_code, language, created_at, updated_at) '
+                'FROM STDIN WITH (FORMAT csv)',
+                profiles,
+            )
+
+    @staticmethod
+    def _query_kinds(rng):
+        def name():
+            return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', None
+
+        def typo():
+            return _typo(rng, rng.choice(FIRST_NAMES)), None
+
+        def word():
+            language = rng.choice(LANGUAGES)
+            return rng.choice(BIO_WORDS.get(language, BIO_WORDS['pt'])), language
+
+        def mixed():
+            return f'{rng.choice(FIRST_NAMES)} {rng.choice(INTERESTS)}', 'en'
+
+        return {'full name': name, 'name with typo': typo, 'bio word (stemmed)': word, 'name + interest': mixed}
+
+    def _time(self, kind, make, queries, limit):
+        latencies, hits = [], 0
+        for _ in range(queries):
+            term, language = make()
+            t0 = time.perf_counter()
+            hits += len(search_profiles(term, language=language)[:limit])
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        self.stdout.write(
+            f'  {kind:<20} p50 {statistics.median(latencies) * 1e3:6.1f} ms  '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1e3:6.1f} ms  '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.1f} ms  ({hits / queries:.1f} hits/query)'
+        )
@@ -0,0 +1,44 @@
+import csv
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.profiles.models import City
+
+# Column positions in the GeoNames cities dump (e.g. cities15000.txt).
+NAME, LATITUDE, LONGITUDE, COUNTRY, ADMIN1, POPULATION = 1, 4, 5, 8, 10, 14
+
+
+class Command(BaseCommand):
+    help = 'Load the reference city table from a GeoNames cities TSV dump.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--min-population', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, path, min_population, batch_size, **options):
+        csv.field_size_limit(10_000_000)
+        loaded = 0
+        with open(path, encoding='utf-8', newline='') as fh, transaction.atomic():
+            City.objects.all().delete()
+            batch = []
+            for row in csv.reader(fh, delimiter='\t', quoting=csv.QUOTE_NONE):
+                population = int(row[POPULATION] or 0)
+                if population < min_population:
+                    continue
+                batch.append(City(
+                    name=row[NAME],
+                    country_code=row[COUNTRY],
+                    admin_region=row[ADMIN1],
+                    latitude=float(row[LATITUDE]),
+                    longitude=float(row[LONGITUDE]),
+                    population=population,
+                ))
+                if len(batch) >= batch_size:
+                    City.objects.bulk_create(batch)
+                    loaded += len(batch)
+                    batch = []
+            City.objects.bulk_create(batch)
+            loaded += len(batch)
+        self.stdout.write(f'Loaded {loaded:,} cities')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.firebase import get_firestore_client
+from apps.core.firestore_writer import BulkWriter
+
+
+class Command(BaseCommand):
+    help = 'Populate the public Firestore nicknames/{nickname} -> {email, uid} lookup from profiles.'
+
+    def handle(self, *args, **options):
+        client = get_firestore_client()
+        nicknames = client.collection('nicknames')
+        created = skipped = 0
+        with BulkWriter(client) as writer:
+            for doc in client.collection('profiles').select(['nickname', 'email']).stream():
+                data = doc.to_dict() or {}
+                nickname, email = data.get('nickname'), data.get('email')
+                if not nickname or not email:
+                    skipped += 1
+                    continue
+                writer.set(nicknames.document(nickname.lower()), {'email': email, 'uid': doc.id})
+                created += 1
+        self.stdout.write(f'Created {created:,}, skipped {skipped:,}, failed {writer.result.failed:,}')
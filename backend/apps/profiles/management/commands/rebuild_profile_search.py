@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.profiles.search import rebuild_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recompute profile search vectors in keyset batches (backfill after migrating, or re-index).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing-only', action='store_true', help='Only profiles that were never indexed.')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, missing_only, batch_size, **options):
+        updated = rebuild_search_vectors(batch_size=batch_size, missing_only=missing_only)
+        self.stdout.write(f'Indexed {updated:,} profiles')
@@ -0,0 +1,50 @@
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('display_name', models.CharField(max_length=100)),
+                ('bio', models.TextField(blank=True)),
+                ('birth_date', models.DateField(blank=True, null=True)),
+                ('gender', models.CharField(blank=True, choices=[('male', 'Male'), ('female', 'Female'), ('non_binary', 'Non-binary')], max_length=16)),
+                ('interests', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, size=None)),
+                ('interested_in', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(choices=[('male', 'Male'), ('female', 'Female'), ('non_binary', 'Non-binary')], max_length=16), blank=True, default=list, size=None)),
+                ('min_age', models.PositiveSmallIntegerField(default=18)),
+                ('max_age', models.PositiveSmallIntegerField(default=99)),
+                ('max_distance_km', models.PositiveIntegerField(default=100)),
+                ('is_discoverable', models.BooleanField(default=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('country_code', models.CharField(blank=True, max_length=2)),
+                ('last_active_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'profiles_profile',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('is_discoverable', True)), fields=['latitude', 'longitude'], name='profile_discoverable_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['last_active_at'], name='profile_last_active_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The GIN indexes are built CONCURRENTLY so the profiles table stays writable.
+    atomic = False
+
+    dependencies = [
+        ('profiles', '0002_city'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='profile',
+            name='language',
+            field=models.CharField(choices=[('en', 'English'), ('de', 'German'), ('es', 'Spanish'), ('fr', 'French'), ('it', 'Italian'), ('pt', 'Portuguese'), ('pt_BR', 'Portuguese (Brazil)')], default='en', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='profile_search_vector_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['display_name'], name='profile_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
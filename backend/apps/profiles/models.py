@@ -0,0 +1,91 @@
+"""
+Dating profiles, discovery preferences and reference cities.
+"""
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+
+
+class Profile(models.Model):
+    class Gender(models.TextChoices):
+        MALE = 'male', 'Male'
+        FEMALE = 'female', 'Female'
+        NON_BINARY = 'non_binary', 'Non-binary'
+
+    class Language(models.TextChoices):
+        """The app's locales (``lib/l10n``); picks the stemmer for the user's own text."""
+
+        EN = 'en', 'English'
+        DE = 'de', 'German'
+        ES = 'es', 'Spanish'
+        FR = 'fr', 'French'
+        IT = 'it', 'Italian'
+        PT = 'pt', 'Portuguese'
+        PT_BR = 'pt_BR', 'Portuguese (Brazil)'
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='profile'
+    )
+    display_name = models.CharField(max_length=100)
+    bio = models.TextField(blank=True)
+    birth_date = models.DateField(null=True, blank=True)
+    gender = models.CharField(max_length=16, choices=Gender.choices, blank=True)
+    interests = ArrayField(models.CharField(max_length=50), default=list, blank=True)
+
+    # Discovery preferences
+    interested_in = ArrayField(models.CharField(max_length=16, choices=Gender.choices), default=list, blank=True)
+    min_age = models.PositiveSmallIntegerField(default=18)
+    max_age = models.PositiveSmallIntegerField(default=99)
+    max_distance_km = models.PositiveIntegerField(default=100)
+    is_discoverable = models.BooleanField(default=True)
+
+    # Location
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    country_code = models.CharField(max_length=2, blank=True)
+
+    language = models.CharField(max_length=8, choices=Language.choices, default=Language.EN)
+    # Maintained by apps.profiles.search; NULL until the profile is first indexed.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    last_active_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'profiles_profile'
+        indexes = [
+            models.Index(
+                fields=['latitude', 'longitude'],
+                condition=models.Q(is_discoverable=True),
+                name='profile_discoverable_geo_idx',
+            ),
+            models.Index(fields=['last_active_at'], name='profile_last_active_idx'),
+            GinIndex(fields=['search_vector'], name='profile_search_vector_idx'),
+            GinIndex(fields=['display_name'], name='profile_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return self.display_name
+
+
+class City(models.Model):
+    """Reference city coordinates used for local reverse geocoding."""
+
+    name = models.CharField(max_length=200)
+    country_code = models.CharField(max_length=2)
+    admin_region = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    population = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'profiles_city'
+        verbose_name_plural = 'cities'
+
+    def __str__(self):
+        return f'{self.name}, {self.country_code}'
@@ -0,0 +1,193 @@
+"""
+Profile search on PostgreSQL full-text and trigram indexes.
+
+``SearchFilter`` turns ``?search=`` into ``ILIKE '%term%'`` over each field:
+no index can serve it, so every search scans the whole profiles table, and
+it neither ranks results nor forgives a typo. Here each profile instead carries
+a precomputed ``search_vector`` (GIN indexed):
+
+* A: display name, and B: city. Both use the ``simple`` configuration,
+  because names and places must not be stemmed.
+* B: interests, and C: bio, stemmed with the profile's own language (one of
+  the app's seven locales).
+* D: interests and bio again, unstemmed, so a word typed in another language
+  still matches exactly.
+
+A query is parsed with ``websearch_to_tsquery`` in the searcher's language
+and in ``simple``, and the two are ORed together. Typo tolerance comes from
+a ``pg_trgm`` GIN index on the display name: ``display_name %> term``
+matches names whose words are trigram-similar to the term, at the threshold
+ProfileSearchQuerySet sets for each query it runs. Both conditions
+are index scans (combined with a BitmapOr). Results are ranked by
+``ts_rank`` plus trigram word similarity.
+
+Vectors are kept current incrementally: a post_save handler (see signals)
+recomputes the row's vector when a searchable field changes. The
+``rebuild_profile_search`` command backfills or re-indexes in keyset batches.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Func, Q, Value, When
+from django.db.models.functions import Coalesce
+from rest_framework.filters import BaseFilterBackend
+
+from apps.core.batching import keyset_chunks
+from apps.users.models import UserBlock
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration per Profile.Language; PostgreSQL ships all of these.
+SEARCH_CONFIGS = {
+    Profile.Language.EN: 'english',
+    Profile.Language.DE: 'german',
+    Profile.Language.ES: 'spanish',
+    Profile.Language.FR: 'french',
+    Profile.Language.IT: 'italian',
+    Profile.Language.PT: 'portuguese',
+    Profile.Language.PT_BR: 'portuguese',
+}
+
+# Profile fields the vector is built from; saving any of them re-indexes the row.
+SEARCH_FIELDS = frozenset({'display_name', 'city', 'interests', 'bio', 'language'})
+
+MAX_TERM_LENGTH = 100
+
+
+def _language_config():
+    whens = [When(language=language, then=Value(config)) for language, config in SEARCH_CONFIGS.items()]
+    return Case(*whens, default=Value('simple'), output_field=models.CharField())
+
+
+def profile_vector():
+    """Expression computing a profile's search_vector from its own columns."""
+    interests = Func(F('interests'), Value(' '), function='array_to_string', output_field=models.TextField())
+    language = _language_config()
+    return (
+        SearchVector('display_name', config='simple', weight='A')
+        + SearchVector('city', config='simple', weight='B')
+        + SearchVector(interests, config=language, weight='B')
+        + SearchVector('bio', config=language, weight='C')
+        + SearchVector(interests, 'bio', config='simple', weight='D')
+    )
+
+
+def refresh_search_vectors(queryset):
+    """Recompute search_vector for every profile in ``queryset`` with one UPDATE.
+
+    Call it after bulk_update() or queryset.update() of a SEARCH_FIELDS
+    column; those bypass the post_save handler.
+    """
+    return queryset.update(search_vector=profile_vector())
+
+
+def rebuild_search_vectors(batch_size=5_000, missing_only=False):
+    """Re-index profiles in keyset batches of ``batch_size``, one short UPDATE each."""
+    rows = Profile.objects.all()
+    if missing_only:
+        rows = rows.filter(search_vector__isnull=True)
+    updated = 0
+    for batch, _ in keyset_chunks(rows.values('user_id'), batch_size, fields=('user_id',)):
+        updated += refresh_search_vectors(Profile.objects.filter(pk__in=[row['user_id'] for row in batch]))
+    logger.info('Rebuilt search vectors for %d profiles', updated)
+    return updated
+
+
+def visible_profiles(viewer=None):
+    """Profiles that may appear in search results for ``viewer``.
+
+    Leaves out hidden (non-discoverable) profiles, deactivated or deleted
+    accounts, staff and support accounts, the viewer, and anyone either
+    side has blocked.
+    """
+    queryset = Profile.objects.filter(is_discoverable=True, user__is_active=True, user__is_staff=False)
+    if viewer is not None:
+        queryset = queryset.exclude(user_id=viewer.pk).exclude(
+            user_id__in=UserBlock.objects.filter(blocker_id=viewer.pk).values('blocked_id'),
+        ).exclude(
+            user_id__in=UserBlock.objects.filter(blocked_id=viewer.pk).values('blocker_id'),
+        )
+    return queryset
+
+
+@contextmanager
+def trigram_threshold(using='default'):
+    """Transaction in which ``%>`` matches at ``PROFILE_SEARCH_TRIGRAM_THRESHOLD``."""
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('SET LOCAL pg_trgm.word_similarity_threshold = %s',
+                           [settings.PROFILE_SEARCH_TRIGRAM_THRESHOLD])
+        yield
+
+
+class ProfileSearchQuerySet(models.QuerySet):
+    """Search results; every query they run sets the trigram threshold first.
+
+    SET LOCAL keeps the setting to the search's own transaction, so other
+    queries on the connection keep pg_trgm's default.
+    """
+
+    def _fetch_all(self):
+        if self._result_cache is not None:
+            return super()._fetch_all()
+        with trigram_threshold(self.db):
+            super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        with trigram_threshold(self.db):
+            return super().count()
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        with trigram_threshold(self.db):
+            return super().exists()
+
+
+def search_profiles(term, *, viewer=None, language=None, queryset=None):
+    """Profiles matching ``term``, best first, annotated with ``rank``.
+
+    ``language`` is the searcher's locale, used to stem the query.
+    """
+    term = ' '.join(term.split())[:MAX_TERM_LENGTH]
+    queryset = queryset if queryset is not None else visible_profiles(viewer)
+    if not term:
+        return queryset.none()
+    config = SEARCH_CONFIGS.get(language, 'simple')
+    query = SearchQuery(term, config='simple', search_type='websearch')
+    if config != 'simple':
+        query |= SearchQuery(term, config=config, search_type='websearch')
+    results = (
+        queryset
+        .filter(Q(search_vector=query) | Q(display_name__trigram_word_similar=term))
+        .annotate(rank=(
+            # Not-yet-indexed rows (NULL vector) can still match, and rank, by name.
+            Coalesce(SearchRank(F('search_vector'), query), Value(0.0))
+            + TrigramWordSimilarity(term, 'display_name')
+        ))
+        .order_by('-rank', 'pk')
+    )
+    return ProfileSearchQuerySet(Profile, query=results.query, using=results.db)
+
+
+class ProfileSearchFilter(BaseFilterBackend):
+    """Drop-in for SearchFilter on Profile viewsets, backed by search_profiles."""
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        if not term.strip():
+            return queryset
+        user = request.user if request.user.is_authenticated else None
+        language = request.query_params.get('lang') or getattr(getattr(user, 'profile', None), 'language', None)
+        visible = visible_profiles(user) & queryset
+        return search_profiles(term, viewer=user, language=language, queryset=visible)
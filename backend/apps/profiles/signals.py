@@ -0,0 +1,16 @@
+"""
+Signal handlers for the profiles app.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Profile
+from .search import SEARCH_FIELDS, refresh_search_vectors
+
+
+@receiver(post_save, sender=Profile, dispatch_uid='profiles.refresh_search_vector')
+def refresh_search_vector(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    refresh_search_vectors(Profile.objects.filter(pk=instance.pk))
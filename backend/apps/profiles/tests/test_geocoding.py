@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from apps.profiles.geocoding import EARTH_RADIUS_KM, CityIndex
+from apps.profiles.models import City
+
+CITIES = [
+    ('Lisbon', 'PT', 38.7223, -9.1393),
+    ('Porto', 'PT', 41.1579, -8.6291),
+    ('Suva', 'FJ', -18.1416, 178.4419),
+    ('Labasa', 'FJ', -16.4332, 179.3645),
+    ('Apia', 'WS', -13.8333, -171.7667),
+]
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+@pytest.fixture
+def index():
+    names, codes, lats, lngs = zip(*CITIES)
+    return CityIndex(range(1, len(CITIES) + 1), names, codes, lats, lngs)
+
+
+def test_nearest_returns_the_city_and_its_great_circle_distance(index):
+    match = index.nearest(38.75, -9.2)
+
+    assert (match.city_id, match.name, match.country_code) == (1, 'Lisbon', 'PT')
+    assert match.distance_km == pytest.approx(haversine_km(38.75, -9.2, 38.7223, -9.1393), rel=1e-6)
+
+
+def test_nearest_looks_across_the_antimeridian(index):
+    # 0.8 degrees of longitude from Labasa, 8 from Apia, on the other side of 180.
+    match = index.nearest(-15.5, -179.8)
+
+    assert match.name == 'Labasa'
+    assert match.distance_km == pytest.approx(haversine_km(-15.5, -179.8, -16.4332, 179.3645), rel=1e-6)
+
+
+def test_nearest_respects_max_km(index):
+    assert index.nearest(0.0, 0.0, max_km=1000) is None
+    assert index.nearest(41.0, -8.6, max_km=50).name == 'Porto'
+
+
+def test_nearest_many_marks_points_without_a_city(index):
+    idx, distances = index.nearest_many([41.0, 0.0, -17.0], [-8.6, 0.0, 179.9], max_km=500)
+
+    assert list(idx) == [1, -1, 3]
+    assert math.isnan(distances[1])
+    assert distances[2] == pytest.approx(haversine_km(-17.0, 179.9, -16.4332, 179.3645), rel=1e-6)
+
+
+def test_within_spans_the_antimeridian_nearest_first(index):
+    matches = index.within(-16.0, -179.5, radius_km=600)
+
+    assert [m.name for m in matches] == ['Labasa', 'Suva']
+    assert [m.distance_km for m in matches] == pytest.approx(
+        [haversine_km(-16.0, -179.5, lat, lng) for _, _, lat, lng in CITIES[3:1:-1]], rel=1e-6
+    )
+    assert index.within(0.0, 0.0, radius_km=100) == []
+
+
+def test_from_database_needs_cities(db):
+    with pytest.raises(City.DoesNotExist):
+        CityIndex.from_database()
+
+    City.objects.bulk_create(City(name=n, country_code=c, latitude=lat, longitude=lng) for n, c, lat, lng in CITIES)
+
+    assert CityIndex.from_database().nearest(-15.5, -179.8).name == 'Labasa'
@@ -0,0 +1,68 @@
+import pytest
+from django.db import connection
+
+from apps.profiles.models import Profile
+from apps.profiles.search import search_profiles, trigram_threshold
+from apps.users.models import User, UserBlock
+
+
+def threshold():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting('pg_trgm.word_similarity_threshold', true)")
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture
+def trigram(db):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            pytest.skip('needs the pg_trgm extension')
+
+
+@pytest.fixture
+def profiles(trigram):
+    def profile(username, display_name, bio, **kwargs):
+        user = User.objects.create(username=username)
+        return Profile.objects.create(user=user, display_name=display_name, bio=bio, **kwargs)
+
+    return {
+        'giulia': profile('giulia', 'Giulia Rossi', 'Weekend hikes and good coffee', language='en'),
+        'marco': profile('marco', 'Marco Bianchi', 'Cinema and cooking', language='en'),
+        'hidden': profile('hidden', 'Anna Hiking', 'Hiking every day', is_discoverable=False),
+    }
+
+
+def test_stemmed_words_match_visible_profiles_only(profiles):
+    results = search_profiles('hiking', language='en')
+
+    assert list(results) == [profiles['giulia']]
+    assert results.count() == 1
+
+
+def test_misspelt_names_match_at_the_configured_threshold(profiles, settings):
+    settings.PROFILE_SEARCH_TRIGRAM_THRESHOLD = 0.4
+    assert [p.display_name for p in search_profiles('Giula', language='en')] == ['Giulia Rossi']
+
+    settings.PROFILE_SEARCH_TRIGRAM_THRESHOLD = 0.95
+    assert not search_profiles('Giula', language='en').exists()
+
+
+def test_blocked_profiles_are_left_out(profiles):
+    viewer = profiles['marco'].user
+    UserBlock.objects.create(blocker=profiles['giulia'].user, blocked=viewer)
+
+    assert search_profiles('Giulia', viewer=viewer).count() == 0
+    assert search_profiles('Marco', viewer=profiles['giulia'].user).count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_threshold_is_scoped_to_the_search_transaction(settings):
+    settings.PROFILE_SEARCH_TRIGRAM_THRESHOLD = 0.35
+    before = threshold()
+
+    with trigram_threshold():
+        assert float(threshold()) == 0.35
+
+    # Without pg_trgm loaded, the reset placeholder reads back as '' rather than NULL.
+    assert threshold() in (before, '')
@@ -0,0 +1,234 @@
+"""
+Cascading account deletion.
+
+``user.delete()`` lets Django's collector load every dependent row of every
+app into memory and delete them all in one transaction, holding row locks on
+swipes, matches, notifications etc. for the whole run. For a heavy account
+that is one very long transaction that other users' writes queue behind.
+
+AccountDeletion does the same cascade as a job:
+
+* the plan is derived from the model graph: every relation pointing at the
+  user (directly or through a cascaded row) becomes a step, ordered so that
+  dependents are removed before the rows they point at. SET_NULL and
+  SET_DEFAULT relations become update steps;
+* each step walks its rows in primary-key order (keyset, never OFFSET) and
+  deletes ``ACCOUNT_DELETION_BATCH_SIZE`` of them per short transaction, with
+  a lock timeout so a batch backs off instead of waiting behind other
+  writers;
+* batches are paced by a token bucket, and the position (step and last key)
+  is stored in a JobCheckpoint after each one.
+
+Every step only ever removes rows that still match the user, so re-running a
+half-finished deletion is safe; the checkpoint just saves rescanning. The user
+is deactivated and their access tokens revoked first, and the job starts only
+once every process has seen the revocation, so no new rows appear while it
+runs; the user row itself goes last.
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection, models, transaction
+from google.api_core import exceptions as api_exceptions
+from google.cloud import storage
+
+from apps.authentication.authentication import revoke_user
+from apps.core.batching import keyset_chunks
+from apps.core.models import JobCheckpoint
+from apps.core.ratelimit import TokenBucket
+from apps.matching.graph import SwipeGraph
+
+from .models import tier_cache_key
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = 'account-deletion:'
+MAX_BATCH_ATTEMPTS = 5
+MAX_DEPTH = 8
+
+
+@dataclass(frozen=True)
+class Step:
+    model: type
+    # Lookup from ``model`` to the user's pk, e.g. ``swiper_id`` or ``match__user_low_id``.
+    lookup: str
+    action: str = 'delete'
+    # Column to reset for 'set_null' / 'set_default' steps.
+    field: str = None
+
+    @property
+    def label(self):
+        return f'{self.model._meta.label}.{self.lookup}:{self.action}'
+
+
+def _reverse_relations(model):
+    # Hidden relations (related_name='+') included, as Django's own collector does.
+    return [
+        f for f in model._meta.get_fields(include_hidden=True)
+        if f.auto_created and not f.concrete and (f.one_to_one or f.one_to_many)
+    ]
+
+
+def _collect(model, lookup, plan, depth):
+    if depth > MAX_DEPTH:
+        raise RuntimeError(f'Deletion plan too deep at {model._meta.label}.{lookup}')
+    for rel in _reverse_relations(model):
+        on_delete = rel.on_delete
+        child, fk = rel.related_model, rel.field
+        child_lookup = f'{fk.name}__{lookup}' if lookup else fk.attname
+        if on_delete is models.CASCADE:
+            _collect(child, child_lookup, plan, depth + 1)
+            plan.append(Step(child, child_lookup))
+        elif on_delete is models.SET_NULL:
+            plan.append(Step(child, child_lookup, 'set_null', fk.attname))
+        elif on_delete is models.SET_DEFAULT:
+            plan.append(Step(child, child_lookup, 'set_default', fk.attname))
+        # PROTECT, RESTRICT, SET() and DO_NOTHING are left to the final delete
+        # of the user row, which applies them exactly as user.delete() would.
+
+
+@lru_cache(maxsize=None)
+def deletion_plan():
+    """Steps removing everything that hangs off a user, dependents first."""
+    plan = []
+    _collect(get_user_model(), '', plan, 0)
+    return tuple(plan)
+
+
+class AccountDeletion:
+    """Delete one user and everything that depends on them; ``run`` returns True when done."""
+
+    def __init__(self, user_id, *, batch_size=None, rows_per_second=None, time_budget=None, storage_client=None):
+        self.user_id = user_id
+        self.batch_size = batch_size or settings.ACCOUNT_DELETION_BATCH_SIZE
+        self.time_budget = time_budget or settings.ACCOUNT_DELETION_SLICE_SECONDS
+        rate = rows_per_second or settings.ACCOUNT_DELETION_ROWS_PER_SECOND
+        self.bucket = TokenBucket(rate, capacity=max(rate, self.batch_size))
+        self.storage_client = storage_client
+        self.checkpoint = f'{CHECKPOINT_PREFIX}{user_id}'
+        self.plan = deletion_plan()
+        self.stats = {'deleted': 0, 'updated': 0, 'blobs': 0}
+
+    def run(self):
+        user_model = get_user_model()
+        user = user_model._base_manager.filter(pk=self.user_id).first()
+        if user is None:
+            # Already gone: a previous run finished (or the user never existed).
+            JobCheckpoint.clear(self.checkpoint)
+            return True
+        if user.is_active:
+            user_model._base_manager.filter(pk=self.user_id).update(is_active=False)
+            revoke_user(self.user_id)
+            cache.delete(tier_cache_key(self.user_id))
+
+        labels = [step.label for step in self.plan]
+        state = JobCheckpoint.load(self.checkpoint)
+        if state.get('plan') != labels:
+            # New job, or the models changed since it started: every step is
+            # idempotent, so starting the walk over is always safe.
+            state = {'plan': labels, 'media': False, 'step': 0, 'after': None}
+
+        deadline = time.monotonic() + self.time_budget
+        if not state['media']:
+            self._delete_media(user)
+            state['media'] = True
+            JobCheckpoint.store(self.checkpoint, state)
+
+        while state['step'] < len(self.plan):
+            step = self.plan[state['step']]
+            after = tuple(state['after']) if state['after'] is not None else None
+            if not self._run_step(step, after, state, deadline):
+                return False
+            state.update(step=state['step'] + 1, after=None)
+            JobCheckpoint.store(self.checkpoint, state)
+            if time.monotonic() >= deadline:
+                return False
+
+        # Anything the plan left alone (PROTECT, DO_NOTHING, ...) is handled here.
+        self._in_batch(lambda: user_model._base_manager.filter(pk=self.user_id).delete())
+        SwipeGraph().drop_user(self.user_id)
+        cache.delete(tier_cache_key(self.user_id))
+        JobCheckpoint.clear(self.checkpoint)
+        logger.info('Deleted account %s: %s', self.user_id, self.stats)
+        return True
+
+    # -- database ------------------------------------------------------------
+
+    def _run_step(self, step, after, state, deadline):
+        manager = step.model._base_manager
+        rows = manager.filter(**{step.lookup: self.user_id}).values('pk')
+        for batch, after in keyset_chunks(rows, self.batch_size, after=after):
+            pks = [row['pk'] for row in batch]
+            self.bucket.acquire(len(pks))
+            if step.action == 'delete':
+                # Goes through the collector so signals fire; dependents are
+                # already gone, so it only ever touches these rows.
+                self._in_batch(lambda: manager.filter(pk__in=pks).delete())
+                self.stats['deleted'] += len(pks)
+            else:
+                field = step.model._meta.get_field(step.field)
+                value = None if step.action == 'set_null' else field.get_default()
+                self._in_batch(lambda: manager.filter(pk__in=pks).update(**{step.field: value}))
+                self.stats['updated'] += len(pks)
+            state['after'] = list(after)
+            JobCheckpoint.store(self.checkpoint, state)
+            if time.monotonic() >= deadline:
+                return False
+        return True
+
+    def _in_batch(self, operation):
+        """Run ``operation`` in its own short transaction, backing off on lock waits."""
+        for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    if connection.vendor == 'postgresql':
+                        with connection.cursor() as cursor:
+                            cursor.execute(
+                                'SET LOCAL lock_timeout = %s', [f'{settings.ACCOUNT_DELETION_LOCK_TIMEOUT_MS}ms'],
+                            )
+                    return operation()
+            except OperationalError:
+                if attempt == MAX_BATCH_ATTEMPTS:
+                    raise
+                time.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    # -- storage -------------------------------------------------------------
+
+    def _delete_media(self, user):
+        client = self.storage_client or storage.Client(project=settings.GCP_PROJECT_ID)
+        targets = [(settings.USER_PHOTOS_BUCKET, p.format(username=user.username))
+                   for p in settings.DATA_EXPORT_MEDIA_PREFIXES]
+        targets.append((settings.DATA_EXPORT_BUCKET, f'{settings.DATA_EXPORT_PREFIX}{user.pk}/'))
+        for bucket_name, prefix in targets:
+            bucket = client.bucket(bucket_name)
+            while True:
+                blobs = list(bucket.list_blobs(prefix=prefix, max_results=self.batch_size))
+                if not blobs:
+                    break
+                self.bucket.acquire(len(blobs))
+                for blob in blobs:
+                    try:
+                        blob.delete()
+                    except api_exceptions.NotFound:
+                        pass
+                self.stats['blobs'] += len(blobs)
+
+
+def request_account_deletion(user):
+    """Deactivate ``user`` now and schedule the cascade."""
+    from .tasks import delete_account
+
+    get_user_model()._base_manager.filter(pk=user.pk).update(is_active=False)
+    revoke_user(user.pk)
+    cache.delete(tier_cache_key(user.pk))
+    JobCheckpoint.objects.get_or_create(name=f'{CHECKPOINT_PREFIX}{user.pk}')
+    # Other processes may accept the user's tokens until their next revocation sync.
+    countdown = settings.JWT_REVOCATION_SYNC_SECONDS
+    transaction.on_commit(lambda: delete_account.apply_async((user.pk,), countdown=countdown))
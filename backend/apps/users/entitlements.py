@@ -0,0 +1,348 @@
+"""
+Membership-tier entitlements, compiled into a flat lookup table.
+
+Server-side counterpart of ``TierEntitlements`` / ``TierGate`` in the Flutter
+app. ``TIER_LADDER`` holds every entitlement's value per tier, in the app's
+units: ``None`` means unlimited and TEST mirrors PLATINUM. compile_ladder()
+turns it into an immutable EntitlementTable, a single tuple indexed by
+``tier * len(Entitlement) + entitlement``. A check is then one dict lookup and
+one tuple index, with no database or cache access.
+
+Tiers can be re-balanced at runtime. publish_overrides() stores the overrides
+and a new version number in Redis. Each process notices the version change
+within ``ENTITLEMENTS_REFRESH_SECONDS``, compiles a fresh table and swaps it
+in whole, so readers never see a half-built table.
+
+Metered entitlements (daily connects, monthly boosts) count usage per user and
+period in Redis:
+
+* consume() checks against the cap and increments in one round trip.
+* usage() reads every counter of a user with one MGET.
+* UsageRecorder batches increments recorded after the fact into one pipeline.
+"""
+
+import enum
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import MembershipTier
+
+logger = logging.getLogger(__name__)
+
+
+class Entitlement(enum.IntEnum):
+    MAX_EVENTS = 0
+    MAX_GROUPS = 1
+    MAX_DAILY_CONNECTS = 2
+    BOOSTS_PER_MONTH = 3
+    MAX_BOOSTED_VISIBLE = 4
+    MONTHLY_COINS = 5
+    DISCOVERY_FREE_REVEAL = 6
+    TTS_COST_COINS = 7
+    SEARCH_FILTER_LEVEL = 8
+    SEE_WHO_CONNECTED = 9
+    TRAVEL_MODE = 10
+    PRIORITY_SUPPORT = 11
+    ANALYTICS = 12
+    BECOME_BUSINESS = 13
+
+
+class SearchFilterLevel(enum.IntEnum):
+    NONE = 0
+    BASIC = 1
+    PLUS = 2
+    ALL = 3
+
+
+UNLIMITED = None
+
+# Table row order; TEST takes PLATINUM's values unless overridden.
+TIERS = (MembershipTier.FREE, MembershipTier.SILVER, MembershipTier.GOLD, MembershipTier.PLATINUM, MembershipTier.TEST)
+_TIER_INDEX = {tier: index for index, tier in enumerate(TIERS)}
+_WIDTH = len(Entitlement)
+
+# (FREE, SILVER, GOLD, PLATINUM); keep in step with lib/core/services/tier_entitlements.dart.
+TIER_LADDER = {
+    Entitlement.MAX_EVENTS: (1, 3, 5, UNLIMITED),
+    Entitlement.MAX_GROUPS: (1, UNLIMITED, UNLIMITED, UNLIMITED),
+    Entitlement.MAX_DAILY_CONNECTS: (10, 50, 200, UNLIMITED),
+    Entitlement.BOOSTS_PER_MONTH: (0, 1, 4, 30),
+    Entitlement.MAX_BOOSTED_VISIBLE: (2, 5, 10, 999),
+    Entitlement.MONTHLY_COINS: (100, 500, 1500, 5000),
+    Entitlement.DISCOVERY_FREE_REVEAL: (100, 200, 300, 500),
+    Entitlement.TTS_COST_COINS: (5, 5, 5, 5),
+    Entitlement.SEARCH_FILTER_LEVEL: (SearchFilterLevel.NONE, SearchFilterLevel.BASIC,
+                                      SearchFilterLevel.PLUS, SearchFilterLevel.ALL),
+    Entitlement.SEE_WHO_CONNECTED: (False, False, True, True),
+    Entitlement.TRAVEL_MODE: (False, True, True, True),
+    Entitlement.PRIORITY_SUPPORT: (False, False, True, True),
+    Entitlement.ANALYTICS: (False, False, False, True),
+    Entitlement.BECOME_BUSINESS: (False, False, False, True),
+}
+
+# Entitlements whose limit applies to usage within a calendar period (UTC).
+METERED = {
+    Entitlement.MAX_DAILY_CONNECTS: 'day',
+    Entitlement.BOOSTS_PER_MONTH: 'month',
+}
+
+VERSION_KEY = 'greengo:entitlements:version'
+OVERRIDES_KEY = 'greengo:entitlements:overrides'
+
+
+class EntitlementTable:
+    """Immutable, versioned entitlement values for every tier.
+
+    Values live in one flat tuple; each tier's row is a slice of it, looked
+    up by the tier's plain string value and indexed by Entitlement.
+    """
+
+    __slots__ = ('version', '_values', '_rows', '_default')
+
+    def __init__(self, version, values):
+        values = tuple(values)
+        rows = {tier.value: values[i * _WIDTH:(i + 1) * _WIDTH] for i, tier in enumerate(TIERS)}
+        for name, value in (('version', version), ('_values', values), ('_rows', rows), ('_default', rows[MembershipTier.FREE.value])):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('EntitlementTable is immutable')
+
+    def get(self, tier, entitlement):
+        """Value of ``entitlement`` for ``tier``; unknown tiers get FREE's values."""
+        return self._rows.get(tier, self._default)[entitlement]
+
+    def for_tier(self, tier):
+        row = self._rows.get(tier, self._default)
+        return {entitlement: row[entitlement] for entitlement in Entitlement}
+
+
+def _validate(entitlement, value):
+    default = TIER_LADDER[entitlement][0]
+    if isinstance(default, bool):
+        if not isinstance(value, bool):
+            raise ValueError(f'{entitlement.name} takes true/false, not {value!r}')
+        return value
+    if value is None:
+        return UNLIMITED
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f'{entitlement.name} takes a non-negative integer or null, not {value!r}')
+    if entitlement is Entitlement.SEARCH_FILTER_LEVEL:
+        return SearchFilterLevel(value)
+    return value
+
+
+def compile_ladder(overrides=None, version=0):
+    """Build an EntitlementTable from TIER_LADDER plus ``{entitlement: {tier: value}}`` overrides.
+
+    Entitlement and tier keys may be enum members or their names. Raises
+    ValueError for unknown names and for values of the wrong kind.
+    """
+    rows = {tier: [None] * _WIDTH for tier in TIERS}
+    for entitlement, values in TIER_LADDER.items():
+        for tier, value in zip(TIERS, (*values, values[-1])):
+            rows[tier][entitlement] = value
+    for name, per_tier in (overrides or {}).items():
+        try:
+            entitlement = name if isinstance(name, Entitlement) else Entitlement[name]
+        except KeyError:
+            raise ValueError(f'Unknown entitlement {name!r}')
+        for tier, value in per_tier.items():
+            if tier not in _TIER_INDEX:
+                raise ValueError(f'Unknown tier {tier!r}')
+            rows[TIERS[_TIER_INDEX[tier]]][entitlement] = _validate(entitlement, value)
+    return EntitlementTable(version, [value for tier in TIERS for value in rows[tier]])
+
+
+_table = compile_ladder()
+_next_refresh = 0.0
+_refresh_lock = threading.Lock()
+
+
+def _refresh(now):
+    global _table, _next_refresh
+    with _refresh_lock:
+        if now < _next_refresh:
+            return
+        try:
+            version, overrides = get_redis_connection('default').mget([VERSION_KEY, OVERRIDES_KEY])
+            version = int(version or 0)
+            if version != _table.version:
+                _table = compile_ladder(json.loads(overrides or '{}'), version)
+                logger.info('Loaded tier entitlements version %d', version)
+        except (RedisError, ValueError):
+            logger.warning('Could not refresh tier entitlements, keeping version %d', _table.version, exc_info=True)
+        _next_refresh = now + settings.ENTITLEMENTS_REFRESH_SECONDS
+
+
+def current_table():
+    """The entitlement table in effect, re-checking the published version at most every refresh interval."""
+    now = time.monotonic()
+    if now >= _next_refresh:
+        _refresh(now)
+    return _table
+
+
+def limit(tier, entitlement):
+    """Value of ``entitlement`` for ``tier``: a count (None = unlimited), a level, or a flag."""
+    return current_table().get(tier, entitlement)
+
+
+def allows(tier, entitlement):
+    """Whether ``tier`` has the feature at all: a true flag, or a non-zero/unlimited count."""
+    value = current_table().get(tier, entitlement)
+    return value is None or bool(value)
+
+
+def within_limit(tier, entitlement, current, amount=1):
+    """Whether ``amount`` more on top of ``current`` usage stays within ``tier``'s cap."""
+    value = current_table().get(tier, entitlement)
+    return value is None or current + amount <= value
+
+
+def publish_overrides(overrides):
+    """Validate ``overrides``, publish them as a new version and install them locally.
+
+    Other processes pick the new version up within ENTITLEMENTS_REFRESH_SECONDS.
+    """
+    global _table
+    serialized = {
+        (key.name if isinstance(key, Entitlement) else key): {str(tier): value for tier, value in per_tier.items()}
+        for key, per_tier in overrides.items()
+    }
+    compile_ladder(serialized)
+    redis = get_redis_connection('default')
+    with redis.pipeline() as pipe:
+        pipe.set(OVERRIDES_KEY, json.dumps(serialized))
+        pipe.incr(VERSION_KEY)
+        _, version = pipe.execute()
+    with _refresh_lock:
+        _table = compile_ladder(serialized, version)
+    return version
+
+
+def published_overrides():
+    raw = get_redis_connection('default').get(OVERRIDES_KEY)
+    return json.loads(raw or '{}')
+
+
+# -- metered usage --------------------------------------------------------------
+
+CONSUME_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if limit >= 0 and current + amount > limit then
+    return {0, current}
+end
+current = redis.call('INCRBY', KEYS[1], amount)
+redis.call('EXPIREAT', KEYS[1], tonumber(ARGV[3]))
+return {1, current}
+"""
+
+_script = None
+
+
+def _consume_script():
+    global _script
+    if _script is None:
+        _script = get_redis_connection('default').register_script(CONSUME_SCRIPT)
+    return _script
+
+
+def _period(entitlement, now):
+    """``(label, expires_at)`` of the metering period containing ``now``; kept a day past its end."""
+    now = now or datetime.now(timezone.utc)
+    if METERED[entitlement] == 'day':
+        label = now.strftime('%Y%m%d')
+        end = datetime(now.year, now.month, now.day, tzinfo=timezone.utc) + timedelta(days=1)
+    else:
+        label = now.strftime('%Y%m')
+        end = datetime(now.year + now.month // 12, now.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return label, int((end + timedelta(days=1)).timestamp())
+
+
+def _counter(user_id, entitlement, now=None):
+    label, expires_at = _period(entitlement, now)
+    return f'greengo:usage:{user_id}:{entitlement.name.lower()}:{label}', expires_at
+
+
+@dataclass(frozen=True)
+class GateResult:
+    """Mirrors ``TierGateResult``: ``limit`` is None when unlimited."""
+
+    allowed: bool
+    tier: str
+    current: int
+    limit: int | None = None
+
+
+def consume(user_id, tier, entitlement, amount=1, now=None):
+    """Count ``amount`` uses of a metered entitlement if the tier's cap allows it.
+
+    Check and increment are one atomic Redis call, so concurrent requests
+    cannot overshoot the cap. A zero allotment is denied without touching
+    Redis. If Redis is down the use is allowed and not counted, as with the
+    request throttles.
+    """
+    cap = current_table().get(tier, entitlement)
+    if cap == 0:
+        return GateResult(False, tier, 0, 0)
+    key, expires_at = _counter(user_id, entitlement, now)
+    try:
+        allowed, current = _consume_script()(keys=[key], args=[-1 if cap is None else cap, amount, expires_at])
+    except RedisError:
+        logger.warning('Usage store unavailable, allowing %s for %s', entitlement.name, user_id, exc_info=True)
+        return GateResult(True, tier, 0, cap)
+    return GateResult(bool(allowed), tier, int(current), cap)
+
+
+def usage(user_id, entitlements=tuple(METERED), now=None):
+    """``{entitlement: count}`` for the current period, read with a single MGET."""
+    entitlements = list(entitlements)
+    values = get_redis_connection('default').mget([_counter(user_id, e, now)[0] for e in entitlements])
+    return {entitlement: int(value or 0) for entitlement, value in zip(entitlements, values)}
+
+
+class UsageRecorder:
+    """Buffers usage increments and writes them to Redis in one pipeline.
+
+    For usage that is recorded after the fact rather than gated (e.g. from a
+    Pub/Sub consumer). Flushes every ``ENTITLEMENTS_USAGE_BATCH_SIZE``
+    distinct counters and on leaving the ``with`` block.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.ENTITLEMENTS_USAGE_BATCH_SIZE
+        self._pending = {}
+
+    def record(self, user_id, entitlement, amount=1, now=None):
+        key, expires_at = _counter(user_id, entitlement, now)
+        total, _ = self._pending.get(key, (0, expires_at))
+        self._pending[key] = (total + amount, expires_at)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        with get_redis_connection('default').pipeline(transaction=False) as pipe:
+            for key, (amount, expires_at) in pending.items():
+                pipe.incrby(key, amount)
+                pipe.expireat(key, expires_at)
+            pipe.execute()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
@@ -0,0 +1,276 @@
+"""
+Streaming GDPR data exports.
+
+An export is a zip in Cloud Storage with one JSON Lines file per table
+section (split every ``DATA_EXPORT_ROWS_PER_ENTRY`` rows) and the user's
+media objects under ``media/``. Nothing is ever held whole: rows come off a
+server-side cursor, media is copied in ``DATA_EXPORT_CHUNK_BYTES`` reads,
+and output goes straight into a chunked resumable upload, so memory stays
+flat whatever the account size.
+
+Each zip entry is uploaded as its own object ("part") holding the entry's
+local header, data and data descriptor at the archive offset it will end up
+at. DataExport.progress records the uploaded parts, the ZipInfo of every
+entry and the cursor of the current step, and is saved after every part. A
+crashed or time-sliced job resumes from the next part. Finalizing writes the
+central directory as one more part and composes all parts, in order, into
+the final archive.
+"""
+
+import time
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import chain
+from shutil import copyfileobj
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from google.api_core import exceptions as api_exceptions
+from google.cloud import storage
+
+from .models import DataExport
+
+# Cloud Storage compose accepts at most 32 sources per call.
+COMPOSE_LIMIT = 32
+ZIPINFO_FIELDS = (
+    'filename', 'date_time', 'compress_type', 'CRC', 'compress_size', 'file_size', 'header_offset',
+    'flag_bits', 'external_attr', 'internal_attr', 'create_system', 'create_version',
+    'extract_version', 'volume', 'reserved',
+)
+
+
+@dataclass(frozen=True)
+class Section:
+    name: str
+    model: str
+    where: object
+    exclude: tuple = ()
+
+
+SECTIONS = (
+    Section('account', 'users.User', lambda user: Q(pk=user.pk), exclude=('password',)),
+    Section('profile', 'profiles.Profile', lambda user: Q(user=user)),
+    Section('blocks', 'users.UserBlock', lambda user: Q(blocker=user)),
+    Section('referrals', 'users.Referral', lambda user: Q(referrer=user) | Q(referred=user)),
+    Section('swipes', 'matching.Swipe', lambda user: Q(swiper=user)),
+    Section('matches', 'matching.Match', lambda user: Q(user_low=user) | Q(user_high=user)),
+    Section('interactions', 'matching.UserInteraction', lambda user: Q(user=user)),
+    Section('subscriptions', 'payments.Subscription', lambda user: Q(user=user)),
+    Section('notifications', 'notifications.Notification', lambda user: Q(user=user)),
+    Section('devices', 'notifications.PushDevice', lambda user: Q(user=user)),
+)
+
+_encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+class _OffsetWriter:
+    """Write-only stream that reports positions relative to the whole archive.
+
+    It has no ``seek``, so ZipFile writes data descriptors instead of
+    patching headers in place, and ``tell`` starts at the part's offset so
+    header offsets come out right for the composed archive.
+    """
+
+    def __init__(self, raw, offset):
+        self.raw = raw
+        self.offset = offset
+        self.written = 0
+
+    def write(self, data):
+        self.raw.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset + self.written
+
+    def flush(self):
+        pass
+
+
+def _dump_info(info):
+    state = {field: getattr(info, field) for field in ZIPINFO_FIELDS}
+    state['extra'] = info.extra.hex()
+    state['comment'] = info.comment.hex()
+    return state
+
+
+def _load_info(state):
+    info = zipfile.ZipInfo(state['filename'], tuple(state['date_time']))
+    for field in ZIPINFO_FIELDS[2:]:
+        setattr(info, field, state[field])
+    info.extra = bytes.fromhex(state['extra'])
+    info.comment = bytes.fromhex(state['comment'])
+    return info
+
+
+class ExportBuilder:
+    """Build one DataExport step by step; ``run`` returns True once the archive is ready."""
+
+    def __init__(self, export, *, client=None, rows_per_entry=None, time_budget=None):
+        self.export = export
+        self.user = export.user
+        self.client = client or storage.Client(project=settings.GCP_PROJECT_ID)
+        self.bucket = self.client.bucket(settings.DATA_EXPORT_BUCKET)
+        self.media_bucket = self.client.bucket(settings.USER_PHOTOS_BUCKET)
+        self.rows_per_entry = rows_per_entry or settings.DATA_EXPORT_ROWS_PER_ENTRY
+        self.time_budget = time_budget or settings.DATA_EXPORT_SLICE_SECONDS
+        self.prefix = f'{settings.DATA_EXPORT_PREFIX}{export.user_id}/{export.pk}/'
+        self.media_prefixes = [p.format(username=self.user.username) for p in settings.DATA_EXPORT_MEDIA_PREFIXES]
+        self.state = export.progress or {'parts': [], 'entries': [], 'step': 0, 'after': None, 'chunk': 0}
+
+    def run(self):
+        deadline = time.monotonic() + self.time_budget
+        while True:
+            step = self.state['step']
+            if step < len(SECTIONS):
+                finished = self._write_rows(SECTIONS[step])
+            elif step < len(SECTIONS) + len(self.media_prefixes):
+                finished = self._write_media(self.media_prefixes[step - len(SECTIONS)])
+            else:
+                self._finalize()
+                return True
+            if finished:
+                self.state.update(step=step + 1, after=None, chunk=0)
+            self._save()
+            if time.monotonic() >= deadline:
+                return False
+
+    def _save(self):
+        self.export.progress = self.state
+        self.export.save(update_fields=['progress', 'updated_at'])
+
+    # -- parts ---------------------------------------------------------------
+
+    @contextmanager
+    def _entry(self, name, compression, large=False):
+        """Upload one zip entry as the next part; yields a writable stream for its data."""
+        parts = self.state['parts']
+        part_name = f'{self.prefix}part-{len(parts):05d}'
+        offset = sum(part['size'] for part in parts)
+        blob = self.bucket.blob(part_name)
+        with blob.open('wb', chunk_size=settings.DATA_EXPORT_CHUNK_BYTES, ignore_flush=True) as raw:
+            out = _OffsetWriter(raw, offset)
+            archive = zipfile.ZipFile(out, 'w', compression=compression, allowZip64=True)
+            with archive.open(name, 'w', force_zip64=large) as dest:
+                yield dest
+            info = archive.filelist[-1]
+            # The central directory is written once, by _finalize.
+            archive._didModify = False
+            archive.close()
+        parts.append({'name': part_name, 'size': out.written})
+        self.state['entries'].append(_dump_info(info))
+
+    def _write_rows(self, section):
+        model = apps.get_model(section.model)
+        pk = model._meta.pk.attname
+        fields = [f.attname for f in model._meta.concrete_fields if f.name not in section.exclude]
+        rows = model.objects.filter(section.where(self.user)).order_by(pk).values(*fields)
+        if self.state['after'] is not None:
+            rows = rows.filter(**{f'{pk}__gt': self.state['after']})
+        # iterator() streams from a server-side cursor on PostgreSQL.
+        rows = rows[:self.rows_per_entry].iterator(chunk_size=2000)
+        first = next(rows, None)
+        if first is None:
+            return True
+        chunk = self.state['chunk']
+        name = f'{section.name}.jsonl' if chunk == 0 else f'{section.name}-{chunk:03d}.jsonl'
+        count, last = 0, None
+        with self._entry(name, zipfile.ZIP_DEFLATED) as dest:
+            for row in chain((first,), rows):
+                dest.write(_encoder.encode(row).encode())
+                dest.write(b'\n')
+                count += 1
+                last = row[pk]
+        self.state.update(after=last, chunk=chunk + 1)
+        return count < self.rows_per_entry
+
+    def _write_media(self, prefix):
+        after = self.state['after']
+        blobs = self.media_bucket.list_blobs(prefix=prefix, start_offset=after, max_results=2)
+        blob = next((b for b in blobs if b.name != after), None)
+        if blob is None:
+            return True
+        large = (blob.size or 0) > zipfile.ZIP64_LIMIT
+        # Media is already compressed; store it as-is.
+        with self._entry(f'media/{blob.name}', zipfile.ZIP_STORED, large=large) as dest:
+            with blob.open('rb', chunk_size=settings.DATA_EXPORT_CHUNK_BYTES) as src:
+                copyfileobj(src, dest, settings.DATA_EXPORT_CHUNK_BYTES)
+        self.state['after'] = blob.name
+        return False
+
+    # -- finalizing ----------------------------------------------------------
+
+    def _finalize(self):
+        parts = self.state['parts']
+        offset = sum(part['size'] for part in parts)
+        directory = self.bucket.blob(f'{self.prefix}central-directory')
+        with directory.open('wb', chunk_size=settings.DATA_EXPORT_CHUNK_BYTES, ignore_flush=True) as raw:
+            out = _OffsetWriter(raw, offset)
+            archive = zipfile.ZipFile(out, 'w', allowZip64=True)
+            for state in self.state['entries']:
+                info = _load_info(state)
+                archive.filelist.append(info)
+                archive.NameToInfo[info.filename] = info
+            archive.close()
+
+        sources = [self.bucket.blob(part['name']) for part in parts] + [directory]
+        archive_name = f'{self.prefix}greengo-data-{self.export.user_id}.zip'
+        temporaries = []
+        level = 0
+        while len(sources) > COMPOSE_LIMIT:
+            merged = []
+            for i in range(0, len(sources), COMPOSE_LIMIT):
+                target = self.bucket.blob(f'{self.prefix}compose-{level}-{i // COMPOSE_LIMIT:05d}')
+                target.compose(sources[i:i + COMPOSE_LIMIT])
+                merged.append(target)
+            temporaries.extend(merged)
+            sources = merged
+            level += 1
+        final = self.bucket.blob(archive_name)
+        final.content_type = 'application/zip'
+        final.compose(sources)
+
+        for blob in [self.bucket.blob(part['name']) for part in parts] + [directory] + temporaries:
+            try:
+                blob.delete()
+            except api_exceptions.NotFound:
+                pass
+
+        self.export.status = DataExport.Status.READY
+        self.export.archive_name = archive_name
+        self.export.size_bytes = offset + out.written
+        self.export.completed_at = timezone.now()
+        self.export.progress = {}
+        self.export.save(update_fields=['status', 'archive_name', 'size_bytes', 'completed_at', 'progress', 'updated_at'])
+
+
+def request_data_export(user):
+    """Return the user's in-progress export, or start a new one."""
+    from .tasks import build_data_export
+
+    active = DataExport.objects.filter(user=user, status__in=[DataExport.Status.PENDING, DataExport.Status.RUNNING])
+    export = active.first()
+    if export is not None:
+        return export
+    try:
+        with transaction.atomic():
+            export = DataExport.objects.create(user=user)
+    except IntegrityError:
+        # Lost a race with a concurrent request.
+        return active.get()
+    transaction.on_commit(lambda: build_data_export.delay(export.pk))
+    return export
+
+
+def download_url(export, client=None):
+    """Short-lived signed URL for a finished export."""
+    client = client or storage.Client(project=settings.GCP_PROJECT_ID)
+    blob = client.bucket(settings.DATA_EXPORT_BUCKET).blob(export.archive_name)
+    return blob.generate_signed_url(version='v4', expiration=timedelta(hours=settings.DATA_EXPORT_LINK_HOURS))
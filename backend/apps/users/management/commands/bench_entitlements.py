@@ -0,0 +1,40 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.users import entitlements
+from apps.users.entitlements import TIERS, Entitlement
+
+
+class Command(BaseCommand):
+    help = 'Time in-process entitlement checks and Redis-backed usage metering.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=1_000_000)
+        parser.add_argument('--consumes', type=int, default=10_000)
+
+    def handle(self, *args, checks, consumes, **options):
+        rng = random.Random(3)
+        calls = [(rng.choice(TIERS), rng.choice(list(Entitlement))) for _ in range(1024)]
+        entitlements.current_table()
+
+        for label, check in (('limit()', entitlements.limit), ('allows()', entitlements.allows)):
+            started = time.perf_counter()
+            for i in range(checks):
+                check(*calls[i & 1023])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label:<12} {elapsed / checks * 1e9:8.0f} ns/check')
+
+        started = time.perf_counter()
+        for i in range(consumes):
+            entitlements.consume(f'bench-{i % 100}', 'PLATINUM', Entitlement.MAX_DAILY_CONNECTS)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{"consume()":<12} {elapsed / consumes * 1e6:8.1f} us/call')
+
+        started = time.perf_counter()
+        with entitlements.UsageRecorder() as recorder:
+            for i in range(consumes):
+                recorder.record(f'bench-{i % 100}', Entitlement.BOOSTS_PER_MONTH)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{"record()":<12} {elapsed / consumes * 1e6:8.1f} us/call (batched)')
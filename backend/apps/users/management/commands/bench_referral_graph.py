@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.users.referrals import ReferralGraph
+
+
+class Command(BaseCommand):
+    help = 'Time referral-graph construction and fraud-ring queries on a synthetic graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000_000)
+        parser.add_argument('--referred-share', type=float, default=0.3)
+        parser.add_argument('--rings', type=int, default=1000, help='Planted referral cycles.')
+        parser.add_argument('--farms', type=int, default=100, help='Planted burst referrers.')
+
+    def handle(self, *args, users, referred_share, rings, farms, **options):
+        rng = np.random.default_rng(5)
+        referred = rng.permutation(users)[:int(users * referred_share)] + 1
+        referrers = rng.integers(1, users + 1, size=len(referred))
+        times = rng.uniform(0, 30 * 86400, size=len(referred))
+        # Farms: 50 signups each inside one hour.
+        farm_ids = referred[:farms * 50]
+        referrers[:farms * 50] = np.repeat(rng.integers(1, users + 1, size=farms), 50)
+        times[:farms * 50] = np.repeat(rng.uniform(0, 29 * 86400, size=farms), 50) + rng.uniform(0, 3600, farms * 50)
+        # Rings: three users each referring the next.
+        ring = referred[farms * 50:farms * 50 + rings * 3].reshape(rings, 3)
+        referrers[farms * 50:farms * 50 + rings * 3] = np.roll(ring, 1, axis=1).ravel()
+        keep = referrers != referred
+        self.stdout.write(f'{users:,} users, {keep.sum():,} referrals, {len(farm_ids):,} farmed')
+
+        started = time.perf_counter()
+        graph = ReferralGraph.from_edges(referrers[keep], referred[keep], times[keep])
+        self.stdout.write(f'build      {time.perf_counter() - started:6.2f}s')
+        started = time.perf_counter()
+        cycles = graph.cycles()
+        self.stdout.write(f'cycles     {time.perf_counter() - started:6.2f}s  {len(cycles):,} found')
+        started = time.perf_counter()
+        bursts = graph.fan_out(20, 86400)
+        self.stdout.write(f'fan-out    {time.perf_counter() - started:6.2f}s  {len(bursts):,} referrers')
+        sample = rng.choice(referred, 100_000)
+        started = time.perf_counter()
+        for user_id in sample:
+            graph.chain(user_id)
+        self.stdout.write(f'chain()    {(time.perf_counter() - started) / len(sample) * 1e6:6.1f} us/lookup')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.deletion import AccountDeletion, deletion_plan
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Delete (or resume deleting) one account in the foreground, or print the deletion plan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int, nargs='?')
+        parser.add_argument('--plan', action='store_true', help='Print the deletion steps and exit.')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--rows-per-second', type=int)
+
+    def handle(self, *args, user_id, plan, batch_size, rows_per_second, **options):
+        if plan:
+            for i, step in enumerate(deletion_plan(), 1):
+                self.stdout.write(f'{i:3d}. {step.label}')
+            return
+        if user_id is None:
+            raise CommandError('Pass a user id, or --plan')
+        if not User.objects.filter(pk=user_id).exists():
+            self.stdout.write(f'User {user_id} does not exist; clearing any leftover checkpoint')
+        deletion = AccountDeletion(user_id, batch_size=batch_size, rows_per_second=rows_per_second)
+        while not deletion.run():
+            self.stdout.write(f'  {deletion.stats}')
+        self.stdout.write(f'Deleted account {user_id}: {deletion.stats}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.export import ExportBuilder, download_url
+from apps.users.models import DataExport, User
+
+
+class Command(BaseCommand):
+    help = 'Build (or resume) a GDPR data export for one user in the foreground.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+
+    def handle(self, *args, user_id, **options):
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            raise CommandError(f'No user {user_id}')
+        # Resume an in-progress export rather than queueing a Celery build beside this one.
+        export = DataExport.objects.filter(
+            user=user, status__in=[DataExport.Status.PENDING, DataExport.Status.RUNNING],
+        ).first() or DataExport.objects.create(user=user)
+        export.status = DataExport.Status.RUNNING
+        export.save(update_fields=['status', 'updated_at'])
+        builder = ExportBuilder(export)
+        while not builder.run():
+            self.stdout.write(f'  {len(builder.state["parts"]):,} parts written')
+        self.stdout.write(f'Export {export.pk}: {export.size_bytes:,} bytes at {export.archive_name}')
+        self.stdout.write(download_url(export))
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.users.referrals import ReferralGraph, attribute_rewards
+
+
+class Command(BaseCommand):
+    help = 'Report referral cycles and fan-out bursts, or attribute pending referral rewards now.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attribute', action='store_true', help='Run the reward pass in the foreground.')
+        parser.add_argument('--fan-out-limit', type=int, default=settings.REFERRAL_FAN_OUT_LIMIT,
+                            help='Report threshold only; the reward pass uses the settings.')
+        parser.add_argument('--fan-out-hours', type=int, default=settings.REFERRAL_FAN_OUT_WINDOW_HOURS)
+        parser.add_argument('--show', type=int, default=20, help='How many cycles / referrers to list.')
+
+    def handle(self, *args, attribute, fan_out_limit, fan_out_hours, show, **options):
+        started = time.perf_counter()
+        graph = ReferralGraph.load()
+        self.stdout.write(f'{len(graph):,} users, {graph.edge_count:,} referrals, '
+                          f'loaded in {time.perf_counter() - started:.1f}s')
+
+        cycles = graph.cycles()
+        self.stdout.write(f'{len(cycles):,} referral cycles')
+        for cycle in sorted(cycles, key=len, reverse=True)[:show]:
+            self.stdout.write('  ' + ' -> '.join(map(str, [*cycle, cycle[0]])))
+
+        bursts = graph.fan_out(fan_out_limit, fan_out_hours * 3600)
+        self.stdout.write(f'{len(bursts):,} referrers with {fan_out_limit}+ signups within {fan_out_hours}h')
+        for referrer_id, total in sorted(bursts.items(), key=lambda item: -item[1])[:show]:
+            self.stdout.write(f'  {referrer_id}: {total:,} referrals')
+
+        if attribute:
+            started = time.perf_counter()
+            result = attribute_rewards(graph=graph)
+            self.stdout.write(f'{result} in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.entitlements import (
+    TIERS, Entitlement, SearchFilterLevel, compile_ladder, publish_overrides, published_overrides,
+)
+
+
+def _format(value):
+    if value is None:
+        return '∞'
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, SearchFilterLevel):
+        return value.name.lower()
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = 'Show the tier entitlement table, or publish a runtime override of one entitlement.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--set', dest='override', nargs=3, metavar=('ENTITLEMENT', 'TIER', 'VALUE'),
+                            help='VALUE is a JSON number, true/false, or null for unlimited.')
+        parser.add_argument('--reset', action='store_true', help='Drop every override and return to TIER_LADDER.')
+
+    def handle(self, *args, override, reset, **options):
+        overrides = {} if reset else published_overrides()
+        if override:
+            name, tier, raw = override
+            try:
+                overrides.setdefault(name.upper(), {})[tier.upper()] = json.loads(raw)
+            except json.JSONDecodeError:
+                raise CommandError(f'{raw!r} is not a JSON value')
+        if override or reset:
+            try:
+                version = publish_overrides(overrides)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f'Published entitlements version {version}')
+
+        table = compile_ladder(overrides)
+        self.stdout.write(f'{"":<22}' + ''.join(f'{tier:>10}' for tier in TIERS))
+        for entitlement in Entitlement:
+            values = [table.get(tier, entitlement) for tier in TIERS]
+            self.stdout.write(f'{entitlement.name:<22}' + ''.join(f'{_format(value):>10}' for value in values))
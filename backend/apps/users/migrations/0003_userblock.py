@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_phone_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blocked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks_received', to=settings.AUTH_USER_MODEL)),
+                ('blocker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks_made', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'users_user_block',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='userblock',
+            constraint=models.UniqueConstraint(fields=('blocker', 'blocked'), name='user_block_unique_pair'),
+        ),
+        migrations.AddIndex(
+            model_name='userblock',
+            index=models.Index(fields=['blocked'], name='user_block_blocked_idx'),
+        ),
+    ]
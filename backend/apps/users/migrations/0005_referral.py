@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_data_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Referral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('rewarded', 'Rewarded'), ('capped', 'Over monthly cap'), ('rejected', 'Rejected')], default='pending', max_length=16)),
+                ('reward_coins', models.PositiveIntegerField(default=0)),
+                ('reason', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('referred', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='referral', to=settings.AUTH_USER_MODEL)),
+                ('referrer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referrals_made', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'users_referral',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='referral_pending_idx'), models.Index(condition=models.Q(('status', 'rewarded')), fields=['referrer', 'processed_at'], name='referral_rewarded_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='referral',
+            constraint=models.CheckConstraint(check=models.Q(('referrer', models.F('referred')), _negated=True), name='referral_not_self'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_referral'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referral',
+            name='granted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='referral',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='referral',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('rewarded', 'Rewarded'), ('capped', 'Over monthly cap'), ('rejected', 'Rejected'), ('legacy', 'Credited at redemption')], default='pending', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='referral',
+            index=models.Index(condition=models.Q(('granted_at__isnull', True), ('status', 'rewarded')), fields=['id'], name='referral_ungranted_idx'),
+        ),
+    ]
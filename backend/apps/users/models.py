@@ -0,0 +1,129 @@
+"""
+User accounts.
+"""
+
+from django.contrib.auth.models import AbstractUser
+from django.db import models
+from django.utils import timezone
+
+
+class MembershipTier(models.TextChoices):
+    """Mirrors ``MembershipTier`` in ``lib/features/membership``."""
+
+    FREE = 'FREE', 'Free'
+    SILVER = 'SILVER', 'Silver VIP'
+    GOLD = 'GOLD', 'Gold VIP'
+    PLATINUM = 'PLATINUM', 'Platinum VIP'
+    TEST = 'TEST', 'Tester'
+
+
+class User(AbstractUser):
+    membership_tier = models.CharField(
+        max_length=16, choices=MembershipTier.choices, default=MembershipTier.FREE
+    )
+    phone_number = models.CharField(max_length=20, blank=True)
+
+    class Meta:
+        db_table = 'users_user'
+
+
+class UserBlock(models.Model):
+    """``blocker`` has blocked ``blocked``; hides each from the other everywhere."""
+
+    blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocks_made')
+    blocked = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocks_received')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'users_user_block'
+        constraints = [
+            models.UniqueConstraint(fields=['blocker', 'blocked'], name='user_block_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['blocked'], name='user_block_blocked_idx'),
+        ]
+
+
+class DataExport(models.Model):
+    """A user's request for a copy of their data, built as a zip in Cloud Storage."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='data_exports')
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    # Resume state of the builder: uploaded parts, zip entries, current cursor.
+    progress = models.JSONField(default=dict, blank=True)
+    archive_name = models.CharField(max_length=255, blank=True)
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'users_data_export'
+        constraints = [
+            # At most one export in progress per user.
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='data_export_one_active',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Export {self.pk} for {self.user_id} ({self.status})'
+
+
+class Referral(models.Model):
+    """``referred`` redeemed ``referrer``'s code; synced, rewarded and credited in batches by apps.users.referrals."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        REWARDED = 'rewarded', 'Rewarded'
+        # Valid, but the referrer had reached the monthly coin cap.
+        CAPPED = 'capped', 'Over monthly cap'
+        REJECTED = 'rejected', 'Rejected'
+        # Redeemed before the backend owned referrer rewards; redeemReferral credited it.
+        LEGACY = 'legacy', 'Credited at redemption'
+
+    referrer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referrals_made')
+    # A user can redeem one code, ever.
+    referred = models.OneToOneField(User, on_delete=models.CASCADE, related_name='referral')
+    code = models.CharField(max_length=16)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    reward_coins = models.PositiveIntegerField(default=0)
+    reason = models.CharField(max_length=64, blank=True)
+    # When the code was redeemed (Firestore redeemedAt), not when the row was synced.
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Set once a REWARDED row's coins are credited in Firestore.
+    granted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'users_referral'
+        constraints = [
+            models.CheckConstraint(check=~models.Q(referrer=models.F('referred')), name='referral_not_self'),
+        ]
+        indexes = [
+            # The reward job walks pending rows in id order.
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='referral_pending_idx'),
+            # Monthly cap: coins already granted to a referrer since a date.
+            models.Index(fields=['referrer', 'processed_at'], condition=models.Q(status='rewarded'),
+                         name='referral_rewarded_idx'),
+            # The grant job walks rewarded rows not credited yet.
+            models.Index(fields=['id'], condition=models.Q(status='rewarded', granted_at__isnull=True),
+                         name='referral_ungranted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.referrer_id} -> {self.referred_id} ({self.status})'
+
+
+def tier_cache_key(user_id):
+    """Cache key under which a user's resolved tier is memoized."""
+    return f'users:tier:{user_id}'
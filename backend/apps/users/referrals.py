@@ -0,0 +1,377 @@
+"""
+Referral graph and batched reward attribution.
+
+The ``redeemReferral`` Cloud Function used to credit each referrer as each
+signup happened: two Firestore transactions per redemption, and nothing that
+sees more than one edge at a time. It now only claims the redemption in
+``referrals/{uid}`` (and grants the new user's membership); the referrer's
+reward is decided here in one batched pass, against the whole graph.
+
+ReferralGraph keeps the graph as integer arrays. User ids are mapped to dense
+indexes by their position in a sorted ``ids`` array. A user redeems at most
+one code, so every node has at most one referrer (``parent``). The reverse
+direction (who a user referred, ordered by signup time) is stored CSR-style
+as ``offsets`` plus ``children``. Ten million referrals take roughly 300 MB.
+
+Because the graph has one referrer per node, fraud-ring queries are cheap:
+
+* on_cycle() peels nodes that nobody names as referrer off level by level. What remains
+  are exactly the users on referral cycles (A referred B, B referred A, ...).
+* fan_out() uses one vectorized sliding window over each referrer's sorted
+  signup times to find referrers with ``limit`` or more signups inside
+  ``window`` seconds.
+
+attribute_rewards() loads the graph once, then walks pending referrals in
+keyset batches:
+
+* Referrals touching a cycle are rejected, as are those of fan-out
+  referrers.
+* The rest earn ``REFERRAL_REWARD_COINS`` each, up to
+  ``REFERRAL_MONTHLY_CAP_COINS`` per referrer per calendar month. The cap is
+  counted once per batch with a single aggregate.
+
+sync_redemptions() copies the claims into Referral, resuming from the last
+``redeemedAt`` it saw. Claims made before redeemReferral stopped crediting
+referrers carry no ``referrerRewardPending`` flag and are stored as LEGACY:
+they count for the graph but were already paid.
+
+grant_rewards() credits REWARDED rows in Firestore, one transaction per
+referrer shaped like grantCoins() in ``functions/src/shared/grants.ts``. The
+ledger entry is ``coinTransactions/referral_{id}``, so a referral is never
+credited twice even if the run dies before ``granted_at`` is stored. The
+"you earned coins" notification goes out only once the coins are there.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from google.cloud.firestore_v1 import FieldFilter, Increment, transactional
+
+from apps.core.batching import keyset_chunks
+from apps.core.firebase import get_firestore_client
+from apps.core.models import JobCheckpoint
+from apps.notifications.models import Notification
+
+from .models import Referral, User
+
+logger = logging.getLogger(__name__)
+
+SYNC_CHECKPOINT = 'users.referrals.sync'
+# As grantCoins() in functions/src/shared/grants.ts.
+COIN_EXPIRY_DAYS = 365
+
+
+class ReferralGraph:
+    def __init__(self, ids, parent, joined):
+        self.ids = ids
+        self.parent = parent
+        # Signup (redemption) time of each referred user, epoch seconds; NaN otherwise.
+        self.joined = joined
+        referred = np.flatnonzero(parent >= 0)
+        referred = referred[np.lexsort((joined[referred], parent[referred]))]
+        self.offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parent[referred], minlength=len(ids)), out=self.offsets[1:])
+        self.children = referred.astype(np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self):
+        return len(self.children)
+
+    @classmethod
+    def from_edges(cls, referrer_ids, referred_ids, times):
+        referrer_ids = np.asarray(referrer_ids, dtype=np.int64)
+        referred_ids = np.asarray(referred_ids, dtype=np.int64)
+        ids, dense = np.unique(np.concatenate([referrer_ids, referred_ids]), return_inverse=True)
+        referred = dense[len(referrer_ids):]
+        parent = np.full(len(ids), -1, dtype=np.int32)
+        parent[referred] = dense[:len(referrer_ids)]
+        joined = np.full(len(ids), np.nan)
+        joined[referred] = np.asarray(times, dtype=np.float64)
+        return cls(ids, parent, joined)
+
+    @classmethod
+    def load(cls, queryset=None, chunk_size=100_000):
+        """Build the graph from every Referral row, streamed with a server-side cursor."""
+        queryset = Referral.objects.all() if queryset is None else queryset
+        rows = queryset.values_list('referrer_id', 'referred_id', 'created_at').iterator(chunk_size=chunk_size)
+        # Convert chunk by chunk so the full edge list is never held as Python objects.
+        referrers, referred, times = [np.empty(0, np.int64)], [np.empty(0, np.int64)], [np.empty(0)]
+        while chunk := list(islice(rows, chunk_size)):
+            referrers.append(np.fromiter((row[0] for row in chunk), np.int64, len(chunk)))
+            referred.append(np.fromiter((row[1] for row in chunk), np.int64, len(chunk)))
+            times.append(np.fromiter((row[2].timestamp() for row in chunk), np.float64, len(chunk)))
+        return cls.from_edges(np.concatenate(referrers), np.concatenate(referred), np.concatenate(times))
+
+    def index_of(self, user_id):
+        """Dense index of ``user_id``, or -1 if the user is not in the graph."""
+        i = int(np.searchsorted(self.ids, user_id))
+        return i if i < len(self.ids) and self.ids[i] == user_id else -1
+
+    def referrer_of(self, user_id):
+        i = self.index_of(user_id)
+        return int(self.ids[self.parent[i]]) if i >= 0 and self.parent[i] >= 0 else None
+
+    def referred_by(self, user_id):
+        """Users ``user_id`` referred, in signup order."""
+        i = self.index_of(user_id)
+        if i < 0:
+            return []
+        return self.ids[self.children[self.offsets[i]:self.offsets[i + 1]]].tolist()
+
+    def chain(self, user_id, max_depth=100):
+        """``user_id``'s referrer, their referrer, and so on (stops at a cycle)."""
+        i = self.index_of(user_id)
+        chain, seen = [], {i}
+        while i >= 0 and len(chain) < max_depth:
+            i = int(self.parent[i])
+            if i < 0 or i in seen:
+                break
+            seen.add(i)
+            chain.append(int(self.ids[i]))
+        return chain
+
+    def on_cycle(self):
+        """Boolean mask of the nodes that lie on a referral cycle."""
+        parent = self.parent
+        alive = np.ones(len(self), dtype=bool)
+        indegree = np.bincount(parent[parent >= 0], minlength=len(self))
+        frontier = np.flatnonzero(indegree == 0)
+        while frontier.size:
+            alive[frontier] = False
+            up = parent[frontier]
+            up = up[up >= 0]
+            np.subtract.at(indegree, up, 1)
+            up = np.unique(up)
+            frontier = up[(indegree[up] == 0) & alive[up]]
+        return alive
+
+    def cycles(self):
+        """Every referral cycle, as a list of user ids in referral order."""
+        remaining = set(np.flatnonzero(self.on_cycle()).tolist())
+        cycles = []
+        while remaining:
+            start = i = remaining.pop()
+            cycle = [int(self.ids[i])]
+            while (i := int(self.parent[i])) != start:
+                remaining.discard(i)
+                cycle.append(int(self.ids[i]))
+            cycles.append(cycle)
+        return cycles
+
+    def fan_out(self, limit, window):
+        """``{referrer_id: referrals}`` for referrers with ``limit`` signups within ``window`` seconds."""
+        if limit < 1 or self.edge_count < limit:
+            return {}
+        times = self.joined[self.children]
+        owner = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        first, last = np.arange(self.edge_count - limit + 1), np.arange(limit - 1, self.edge_count)
+        burst = (owner[first] == owner[last]) & (times[last] - times[first] <= window)
+        flagged = np.unique(owner[first[burst]])
+        counts = np.diff(self.offsets)[flagged]
+        return dict(zip(self.ids[flagged].tolist(), counts.tolist()))
+
+    def suspicious(self, fan_out_limit=None, fan_out_window=None):
+        """``{user_id: reason}`` for users on a cycle or referring in bursts."""
+        limit = fan_out_limit or settings.REFERRAL_FAN_OUT_LIMIT
+        window = fan_out_window or settings.REFERRAL_FAN_OUT_WINDOW_HOURS * 3600
+        flagged = dict.fromkeys(self.fan_out(limit, window), 'fan_out')
+        flagged.update(dict.fromkeys(self.ids[self.on_cycle()].tolist(), 'cycle'))
+        return flagged
+
+
+@dataclass
+class RewardResult:
+    scanned: int = 0
+    rewarded: int = 0
+    capped: int = 0
+    rejected: int = 0
+    coins: int = 0
+
+
+def attribute_rewards(*, batch_size=None, graph=None, now=None):
+    """Decide every pending referral in one keyset pass; returns a RewardResult."""
+    batch_size = batch_size or settings.REFERRAL_BATCH_SIZE
+    reward, cap = settings.REFERRAL_REWARD_COINS, settings.REFERRAL_MONTHLY_CAP_COINS
+    now = now or timezone.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    result = RewardResult()
+    pending = Referral.objects.filter(status=Referral.Status.PENDING)
+    if not pending.exists():
+        return result
+
+    graph = graph if graph is not None else ReferralGraph.load()
+    suspicious = graph.suspicious()
+    rows = pending.values('id', 'referrer_id', 'referred_id')
+    for batch, _ in keyset_chunks(rows, batch_size, fields=('id',)):
+        referrer_ids = {row['referrer_id'] for row in batch}
+        granted = dict(
+            Referral.objects.filter(
+                status=Referral.Status.REWARDED, referrer_id__in=referrer_ids, processed_at__gte=month_start,
+            ).values('referrer_id').annotate(total=Sum('reward_coins')).values_list('referrer_id', 'total')
+        )
+        decided = []
+        for row in batch:
+            referrer_id = row['referrer_id']
+            reason = suspicious.get(row['referred_id']) or suspicious.get(referrer_id)
+            if reason:
+                status, coins = Referral.Status.REJECTED, 0
+                result.rejected += 1
+            elif granted.get(referrer_id, 0) + reward > cap:
+                status, coins, reason = Referral.Status.CAPPED, 0, 'monthly_cap'
+                result.capped += 1
+            else:
+                status, coins, reason = Referral.Status.REWARDED, reward, ''
+                granted[referrer_id] = granted.get(referrer_id, 0) + reward
+                result.rewarded += 1
+                result.coins += reward
+            decided.append(Referral(
+                id=row['id'], status=status, reward_coins=coins, reason=reason or '', processed_at=now,
+            ))
+
+        Referral.objects.bulk_update(decided, ['status', 'reward_coins', 'reason', 'processed_at'], batch_size=1000)
+        result.scanned += len(batch)
+        logger.info('Referral rewards: %s', result)
+    return result
+
+
+def sync_redemptions(*, client=None, batch_size=None):
+    """Copy redeemReferral claims into Referral; returns how many rows were added."""
+    client = client or get_firestore_client()
+    batch_size = batch_size or settings.REFERRAL_BATCH_SIZE
+    query = client.collection('referrals').order_by('redeemedAt')
+    since = JobCheckpoint.load(SYNC_CHECKPOINT).get('since')
+    if since:
+        # Inclusive, so claims sharing the last timestamp are not skipped; re-adding one is a no-op.
+        query = query.where(filter=FieldFilter('redeemedAt', '>=', datetime.fromisoformat(since)))
+    docs = query.select(['redeemedCode', 'redeemedFrom', 'redeemedAt', 'referrerRewardPending']).stream()
+    added = 0
+    while batch := [doc.to_dict() | {'uid': doc.id} for doc in islice(docs, batch_size)]:
+        added += _add_referrals(batch)
+        JobCheckpoint.store(SYNC_CHECKPOINT, {'since': batch[-1]['redeemedAt'].isoformat()})
+    return added
+
+
+def _add_referrals(claims):
+    uids = {claim['uid'] for claim in claims} | {claim['redeemedFrom'] for claim in claims}
+    users = dict(User.objects.filter(username__in=uids).values_list('username', 'id'))
+    rows = []
+    for claim in claims:
+        referrer_id, referred_id = users.get(claim['redeemedFrom']), users.get(claim['uid'])
+        if referrer_id is None or referred_id is None or referrer_id == referred_id:
+            logger.warning('Referral sync: skipping %s -> %s, no such user', claim['redeemedFrom'], claim['uid'])
+            continue
+        legacy = not claim.get('referrerRewardPending')
+        rows.append(Referral(
+            referrer_id=referrer_id, referred_id=referred_id, code=claim['redeemedCode'][:16],
+            created_at=claim['redeemedAt'],
+            status=Referral.Status.LEGACY if legacy else Referral.Status.PENDING,
+            processed_at=claim['redeemedAt'] if legacy else None,
+        ))
+    # A user redeems one code, ever: claims already synced are skipped by the unique referred_id.
+    synced = set(Referral.objects.filter(referred_id__in=[row.referred_id for row in rows])
+                 .values_list('referred_id', flat=True))
+    Referral.objects.bulk_create(rows, ignore_conflicts=True)
+    return sum(row.referred_id not in synced for row in rows)
+
+
+def grant_rewards(*, client=None, batch_size=None, now=None):
+    """Credit REWARDED referrals' coins in Firestore; returns how many referrals were credited."""
+    client = client or get_firestore_client()
+    batch_size = batch_size or settings.REFERRAL_BATCH_SIZE
+    now = now or timezone.now()
+    rows = Referral.objects.filter(status=Referral.Status.REWARDED, granted_at__isnull=True).values(
+        'id', 'referrer_id', 'reward_coins', 'code', 'referrer__username', 'referred__username',
+    )
+    credited = 0
+    for batch, _ in keyset_chunks(rows, batch_size, fields=('id',)):
+        by_referrer = defaultdict(list)
+        for row in batch:
+            by_referrer[row['referrer_id']].append(row)
+        granted, earned = [], {}
+        for referrer_id, referrals in by_referrer.items():
+            try:
+                credit_coins(client, referrals[0]['referrer__username'], referrals, now)
+            except Exception:
+                # Left ungranted; the next run retries and the ledger keeps it from paying twice.
+                logger.exception('Referral grant failed for referrer %s', referrer_id)
+                continue
+            granted += [row['id'] for row in referrals]
+            earned[referrer_id] = sum(row['reward_coins'] for row in referrals)
+        with transaction.atomic():
+            Referral.objects.filter(id__in=granted).update(granted_at=now)
+            Notification.objects.bulk_create([_reward_notification(uid, coins) for uid, coins in earned.items()])
+        credited += len(granted)
+    return credited
+
+
+def credit_coins(client, uid, referrals, now):
+    """Add ``referrals``' coins to ``coinBalances/{uid}`` in one transaction, skipping any already credited."""
+    balance_ref = client.collection('coinBalances').document(uid)
+    ledger = {row['id']: client.collection('coinTransactions').document(f'referral_{row["id"]}') for row in referrals}
+
+    @transactional
+    def apply(tx):
+        snapshots = {snap.reference.path: snap for snap in tx.get_all([balance_ref, *ledger.values()])}
+        fresh = [row for row in referrals if not snapshots[ledger[row['id']].path].exists]
+        if not fresh:
+            return
+        balance = snapshots[balance_ref.path].to_dict() or {}
+        total, batches = balance.get('totalCoins', 0), list(balance.get('coinBatches', []))
+        for row in fresh:
+            total += row['reward_coins']
+            batches.append(_coin_batch(row, now))
+            tx.set(ledger[row['id']], {
+                'userId': uid,
+                'type': 'credit',
+                'amount': row['reward_coins'],
+                'balanceAfter': total,
+                'reason': 'referralBonus',
+                'metadata': {'source': 'reward', 'referredUser': row['referred__username'], 'code': row['code']},
+                'createdAt': now,
+            })
+        coins = sum(row['reward_coins'] for row in fresh)
+        tx.set(balance_ref, {
+            'userId': uid,
+            'totalCoins': total,
+            'earnedCoins': balance.get('earnedCoins', 0) + coins,
+            'lastUpdated': now,
+            'coinBatches': batches,
+        }, merge=True)
+        tx.set(client.collection('referrals').document(uid), {
+            'invitedCount': Increment(len(fresh)),
+            'coinsEarned': Increment(coins),
+        }, merge=True)
+
+    apply(client.transaction())
+
+
+def _coin_batch(row, now):
+    return {
+        'batchId': f'referral_{row["id"]}',
+        'initialCoins': row['reward_coins'],
+        'remainingCoins': row['reward_coins'],
+        'source': 'reward',
+        'acquiredDate': now,
+        'expirationDate': now + timedelta(days=COIN_EXPIRY_DAYS),
+    }
+
+
+def _reward_notification(user_id, coins):
+    return Notification(
+        user_id=user_id,
+        notification_type='referral_reward',
+        title='You earned referral coins',
+        body=f'Friends you invited joined GreenGo, earning you {coins} coins.',
+        data={'action': 'referral_reward', 'coins': coins},
+    )
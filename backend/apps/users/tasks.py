@@ -0,0 +1,111 @@
+"""
+Celery tasks for the users app.
+"""
+
+import logging
+
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.core.models import JobCheckpoint
+from apps.notifications.models import Notification
+
+from .deletion import CHECKPOINT_PREFIX, AccountDeletion
+from .export import ExportBuilder
+from .models import DataExport
+from .referrals import attribute_rewards, grant_rewards, sync_redemptions
+
+logger = logging.getLogger(__name__)
+
+EXPORT_LOCK_KEY = 'users:data_export:{export_id}:lock'
+DELETION_LOCK_KEY = 'users:account_deletion:{user_id}:lock'
+REFERRAL_LOCK_KEY = 'users:referral_rewards:lock'
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=5)
+def build_data_export(self, export_id):
+    """Build a data export in time slices; each slice re-enqueues the next one."""
+    lock_key = EXPORT_LOCK_KEY.format(export_id=export_id)
+    if not cache.add(lock_key, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('Data export %s is already being built, skipping', export_id)
+        return
+    try:
+        export = DataExport.objects.select_related('user').get(pk=export_id)
+        if export.status not in (DataExport.Status.PENDING, DataExport.Status.RUNNING):
+            return
+        if export.status == DataExport.Status.PENDING:
+            export.status = DataExport.Status.RUNNING
+            export.save(update_fields=['status', 'updated_at'])
+        try:
+            finished = ExportBuilder(export).run()
+        except Exception as exc:
+            if self.request.retries >= self.max_retries:
+                logger.exception('Data export %s failed', export_id)
+                DataExport.objects.filter(pk=export_id).update(status=DataExport.Status.FAILED, error=str(exc)[:2000])
+                return
+            # Progress is saved per part, so a retry resumes rather than restarts.
+            raise self.retry(exc=exc, countdown=60 * 2 ** self.request.retries)
+    finally:
+        cache.delete(lock_key)
+
+    if not finished:
+        build_data_export.delay(export_id)
+        return
+    Notification.objects.create(
+        user_id=export.user_id,
+        notification_type='data_export_ready',
+        title='Your data export is ready',
+        body='The copy of your GreenGo data you requested is ready to download.',
+        data={'action': 'data_export_ready', 'export_id': export.pk},
+    )
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=5)
+def delete_account(self, user_id):
+    """Run an account deletion in time slices; each slice re-enqueues the next one."""
+    lock_key = DELETION_LOCK_KEY.format(user_id=user_id)
+    if not cache.add(lock_key, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('Account %s is already being deleted, skipping', user_id)
+        return
+    try:
+        finished = AccountDeletion(user_id).run()
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            # The checkpoint stays behind; resume_account_deletions picks it up later.
+            logger.exception('Deleting account %s failed', user_id)
+            return
+        raise self.retry(exc=exc, countdown=60 * 2 ** self.request.retries)
+    finally:
+        cache.delete(lock_key)
+
+    if not finished:
+        delete_account.delay(user_id)
+
+
+@shared_task(ignore_result=True)
+def resume_account_deletions():
+    """Re-enqueue deletions whose checkpoint has not moved for a while (lost or failed tasks)."""
+    stale = timezone.now() - timedelta(seconds=settings.ACCOUNT_DELETION_STALE_SECONDS)
+    names = JobCheckpoint.objects.filter(
+        name__startswith=CHECKPOINT_PREFIX, updated_at__lt=stale,
+    ).values_list('name', flat=True)
+    for name in names:
+        delete_account.delay(int(name[len(CHECKPOINT_PREFIX):]))
+
+
+@shared_task(ignore_result=True)
+def attribute_referral_rewards():
+    """Periodic entry point for referral rewards: sync, decide, then credit; one pass runs at a time."""
+    if not cache.add(REFERRAL_LOCK_KEY, 1, timeout=settings.CELERY_TASK_TIME_LIMIT):
+        logger.info('Referral rewards already running, skipping')
+        return
+    try:
+        sync_redemptions()
+        attribute_rewards()
+        grant_rewards()
+    finally:
+        cache.delete(REFERRAL_LOCK_KEY)
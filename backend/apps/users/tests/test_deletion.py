@@ -0,0 +1,168 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from django.db import models
+from google.api_core import exceptions as api_exceptions
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from apps.core.models import JobCheckpoint
+from apps.matching.models import Swipe
+from apps.users import deletion
+from apps.users.deletion import AccountDeletion, Step, deletion_plan
+from apps.users.models import User, UserBlock
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def delete(self):
+        if self.name in self.bucket.gone:
+            # Someone else deleted it between the listing and now.
+            self.bucket.objects.discard(self.name)
+            raise api_exceptions.NotFound(self.name)
+        self.bucket.objects.remove(self.name)
+
+
+class FakeBucket:
+    def __init__(self, *names):
+        self.objects = set(names)
+        self.gone = set()
+
+    def list_blobs(self, prefix, max_results=None):
+        names = sorted(n for n in self.objects if n.startswith(prefix))
+        return iter([FakeBlob(self, n) for n in names[:max_results]])
+
+
+@pytest.fixture
+def storage(settings):
+    settings.USER_PHOTOS_BUCKET = 'photos'
+    settings.DATA_EXPORT_BUCKET = 'exports'
+    buckets = {'photos': FakeBucket(), 'exports': FakeBucket()}
+    return mock.Mock(bucket=buckets.__getitem__, buckets=buckets)
+
+
+@pytest.fixture
+def user(db):
+    user = User.objects.create(username='alice')
+    others = User.objects.bulk_create(User(username=f'other{i}') for i in range(5))
+    Swipe.objects.bulk_create(Swipe(swiper=user, target=o, direction='like') for o in others)
+    UserBlock.objects.create(blocker=others[0], blocked=user)
+    OutstandingToken.objects.create(user=user, jti='jti-1', token='token', expires_at='2030-01-01T00:00Z')
+    return user
+
+
+def job(user, storage, **kwargs):
+    return AccountDeletion(user.pk, batch_size=2, rows_per_second=10_000, storage_client=storage, **kwargs)
+
+
+def test_plan_removes_dependents_before_the_rows_they_point_at():
+    user_model, parent, child, nullable = (
+        type(name, (), {'_meta': SimpleNamespace(label=name)}) for name in ('User', 'Parent', 'Child', 'Nullable')
+    )
+
+    def relation(model, on_delete, name, attname):
+        field = SimpleNamespace(name=name, attname=attname)
+        return SimpleNamespace(on_delete=on_delete, related_model=model, field=field)
+
+    graph = {
+        user_model: [relation(parent, models.CASCADE, 'user', 'user_id')],
+        parent: [relation(child, models.CASCADE, 'parent', 'parent_id'),
+                 relation(nullable, models.SET_NULL, 'parent', 'parent_id')],
+        child: [], nullable: [],
+    }
+    plan = []
+    with mock.patch.object(deletion, '_reverse_relations', graph.__getitem__):
+        deletion._collect(user_model, '', plan, 0)
+
+    assert plan == [
+        Step(child, 'parent__user_id'),
+        Step(nullable, 'parent__user_id', 'set_null', 'parent_id'),
+        Step(parent, 'user_id'),
+    ]
+
+
+def test_plan_nulls_outstanding_tokens_and_deletes_swipes():
+    plan = deletion_plan()
+
+    assert Step(OutstandingToken, 'user_id', 'set_null', 'user_id') in plan
+    assert Step(Swipe, 'swiper_id') in plan and Step(Swipe, 'target_id') in plan
+    assert all(step.model is not User for step in plan)
+
+
+def test_resumes_mid_step_from_the_checkpoint(user, storage):
+    swipes = list(Swipe.objects.order_by('pk').values_list('pk', flat=True))
+    chunks = deletion.keyset_chunks
+    resumed_from = []
+
+    def killed_after_one_swipe_batch(rows, *args, **kwargs):
+        for i, chunk in enumerate(chunks(rows, *args, **kwargs)):
+            if rows.model is Swipe and i == 1:
+                raise RuntimeError('worker killed')
+            yield chunk
+
+    with mock.patch.object(deletion, 'keyset_chunks', killed_after_one_swipe_batch):
+        with pytest.raises(RuntimeError):
+            job(user, storage).run()
+
+    state = JobCheckpoint.load(f'account-deletion:{user.pk}')
+    assert deletion_plan()[state['step']] == Step(Swipe, 'swiper_id')
+    assert state['after'] == [swipes[1]]
+    assert list(Swipe.objects.order_by('pk').values_list('pk', flat=True)) == swipes[2:]
+    assert OutstandingToken.objects.get().user_id is None
+
+    def recording(rows, *args, after=None, **kwargs):
+        if rows.model is Swipe:
+            resumed_from.append(after)
+        return chunks(rows, *args, after=after, **kwargs)
+
+    with mock.patch.object(deletion, 'keyset_chunks', recording):
+        assert job(user, storage).run() is True
+
+    assert resumed_from[0] == tuple(state['after'])
+    assert not User.objects.filter(pk=user.pk).exists()
+    assert not Swipe.objects.exists() and not UserBlock.objects.exists()
+    assert OutstandingToken.objects.count() == 1
+    assert JobCheckpoint.load(f'account-deletion:{user.pk}') == {}
+
+
+def test_time_budget_ends_a_slice_and_the_next_one_carries_on(user, storage):
+    clock = iter(range(1000))
+
+    with mock.patch.object(deletion, 'time', mock.Mock(monotonic=lambda: next(clock))):
+        slices = 1
+        while not job(user, storage, time_budget=1).run():
+            slices += 1
+
+    assert slices > 3
+    assert not User.objects.filter(pk=user.pk).exists() and not Swipe.objects.exists()
+
+
+def test_rerun_after_the_user_row_is_gone_is_a_no_op(user, storage):
+    assert job(user, storage).run() is True
+    JobCheckpoint.store(f'account-deletion:{user.pk}', {'plan': [], 'media': True, 'step': 3, 'after': [1]})
+
+    with mock.patch.object(AccountDeletion, '_run_step') as run_step:
+        assert job(user, storage).run() is True
+
+    run_step.assert_not_called()
+    assert JobCheckpoint.load(f'account-deletion:{user.pk}') == {}
+
+
+def test_media_under_the_users_prefixes_is_deleted(user, storage, settings):
+    settings.DATA_EXPORT_PREFIX = 'exports/'
+    settings.DATA_EXPORT_MEDIA_PREFIXES = ['profiles/{username}/', 'voice_intros/{username}/']
+    photos, exports = storage.buckets['photos'], storage.buckets['exports']
+    photos.objects.update({'profiles/alice/1.jpg', 'profiles/alice/2.jpg', 'profiles/alice/3.jpg',
+                           'voice_intros/alice/hi.m4a', 'profiles/alicea/1.jpg', 'profiles/bob/1.jpg'})
+    photos.gone.add('profiles/alice/2.jpg')
+    exports.objects.update({f'exports/{user.pk}/1/archive.zip', f'exports/{user.pk}0/1/archive.zip'})
+
+    deleter = job(user, storage)
+    assert deleter.run() is True
+
+    assert photos.objects == {'profiles/alicea/1.jpg', 'profiles/bob/1.jpg'}
+    assert exports.objects == {f'exports/{user.pk}0/1/archive.zip'}
+    assert deleter.stats['blobs'] == 5
@@ -0,0 +1,148 @@
+import json
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from django.conf import settings as django_settings
+
+from apps.users import entitlements
+from apps.users.entitlements import (
+    OVERRIDES_KEY, VERSION_KEY, Entitlement, SearchFilterLevel, _period, compile_ladder, consume, current_table,
+    publish_overrides, usage,
+)
+from apps.users.models import MembershipTier
+
+FREE, SILVER, PLATINUM, TEST = MembershipTier.FREE, MembershipTier.SILVER, MembershipTier.PLATINUM, MembershipTier.TEST
+NOW = datetime(2026, 10, 19, 15, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def table():
+    """Each test starts from the built-in ladder; nothing it publishes leaks into the next."""
+    with mock.patch.object(entitlements, '_table', compile_ladder()), \
+            mock.patch.object(entitlements, '_next_refresh', float('inf')):
+        yield
+
+
+def test_ladder_defaults_with_test_mirroring_platinum():
+    table = compile_ladder()
+
+    assert table.get(FREE, Entitlement.MAX_DAILY_CONNECTS) == 10
+    assert table.get(PLATINUM, Entitlement.MAX_DAILY_CONNECTS) is None
+    assert table.for_tier(TEST) == table.for_tier(PLATINUM)
+    assert table.for_tier('NO_SUCH_TIER') == table.for_tier(FREE)
+    with pytest.raises(AttributeError):
+        table.version = 2
+
+
+def test_overrides_by_name_or_member_replace_single_cells():
+    table = compile_ladder({
+        'MAX_EVENTS': {'FREE': 2, TEST: None},
+        Entitlement.SEARCH_FILTER_LEVEL: {SILVER: 3},
+        'TRAVEL_MODE': {'FREE': True},
+    }, version=7)
+
+    assert table.version == 7
+    assert table.get(FREE, Entitlement.MAX_EVENTS) == 2
+    assert table.get(TEST, Entitlement.MAX_EVENTS) is None
+    assert table.get(SILVER, Entitlement.MAX_EVENTS) == 3
+    assert table.get(SILVER, Entitlement.SEARCH_FILTER_LEVEL) is SearchFilterLevel.ALL
+    assert table.get(FREE, Entitlement.TRAVEL_MODE) is True
+
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'NO_SUCH_THING': {'FREE': 1}}, 'Unknown entitlement'),
+    ({'MAX_EVENTS': {'BRONZE': 1}}, 'Unknown tier'),
+    ({'MAX_EVENTS': {'FREE': -1}}, 'non-negative integer'),
+    ({'MAX_EVENTS': {'FREE': True}}, 'non-negative integer'),
+    ({'MAX_EVENTS': {'FREE': '3'}}, 'non-negative integer'),
+    ({'ANALYTICS': {'FREE': 1}}, 'true/false'),
+    ({'SEARCH_FILTER_LEVEL': {'FREE': 9}}, 'is not a valid SearchFilterLevel'),
+])
+def test_invalid_overrides_are_rejected(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        compile_ladder(overrides)
+
+
+def test_consume_stops_at_the_cap(redis):
+    results = [consume(1, FREE, Entitlement.MAX_DAILY_CONNECTS, now=NOW) for _ in range(10)]
+    assert all(r.allowed for r in results) and results[-1].current == 10
+
+    denied = consume(1, FREE, Entitlement.MAX_DAILY_CONNECTS, now=NOW)
+    assert (denied.allowed, denied.current, denied.limit) == (False, 10, 10)
+    assert usage(1, now=NOW)[Entitlement.MAX_DAILY_CONNECTS] == 10
+
+
+def test_consume_refuses_an_amount_that_would_overshoot(redis):
+    consume(1, SILVER, Entitlement.MAX_DAILY_CONNECTS, amount=45, now=NOW)
+
+    assert not consume(1, SILVER, Entitlement.MAX_DAILY_CONNECTS, amount=6, now=NOW).allowed
+    assert consume(1, SILVER, Entitlement.MAX_DAILY_CONNECTS, amount=5, now=NOW).current == 50
+
+
+def test_unlimited_tiers_are_counted_but_never_refused(redis):
+    for _ in range(3):
+        result = consume(1, PLATINUM, Entitlement.MAX_DAILY_CONNECTS, amount=1000, now=NOW)
+
+    assert result.allowed and result.limit is None and result.current == 3000
+
+
+def test_zero_allotment_is_refused_without_touching_redis(redis):
+    result = consume(1, FREE, Entitlement.BOOSTS_PER_MONTH, now=NOW)
+
+    assert (result.allowed, result.current, result.limit) == (False, 0, 0)
+    assert redis.keys('greengo:usage:*') == []
+
+
+def test_consume_allows_uncounted_when_redis_is_down(redis):
+    django_settings.FAKE_REDIS_SERVER.connected = False
+
+    assert consume(1, FREE, Entitlement.MAX_DAILY_CONNECTS, now=NOW).allowed
+
+
+def test_daily_counters_roll_over_at_midnight_utc(redis):
+    for _ in range(10):
+        consume(1, FREE, Entitlement.MAX_DAILY_CONNECTS, now=NOW)
+
+    assert consume(1, FREE, Entitlement.MAX_DAILY_CONNECTS, now=datetime(2026, 10, 20, tzinfo=timezone.utc)).allowed
+    assert _period(Entitlement.MAX_DAILY_CONNECTS, NOW) == (
+        '20261019', int(datetime(2026, 10, 21, tzinfo=timezone.utc).timestamp()),
+    )
+
+
+@pytest.mark.parametrize('now, label, expires', [
+    (datetime(2026, 11, 30, 23, 59, tzinfo=timezone.utc), '202611', datetime(2026, 12, 2, tzinfo=timezone.utc)),
+    (datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc), '202612', datetime(2027, 1, 2, tzinfo=timezone.utc)),
+    (datetime(2027, 1, 1, tzinfo=timezone.utc), '202701', datetime(2027, 2, 2, tzinfo=timezone.utc)),
+])
+def test_monthly_periods_end_on_the_first_of_the_next_month(now, label, expires):
+    assert _period(Entitlement.BOOSTS_PER_MONTH, now) == (label, int(expires.timestamp()))
+
+
+def test_monthly_counters_roll_over_into_january(redis):
+    december = datetime(2026, 12, 31, 23, 59, tzinfo=timezone.utc)
+    consume(1, SILVER, Entitlement.BOOSTS_PER_MONTH, now=december)
+
+    assert not consume(1, SILVER, Entitlement.BOOSTS_PER_MONTH, now=december).allowed
+    assert consume(1, SILVER, Entitlement.BOOSTS_PER_MONTH, now=datetime(2027, 1, 1, tzinfo=timezone.utc)).allowed
+
+
+def test_publish_bumps_the_version_and_other_processes_pick_it_up(redis):
+    assert publish_overrides({Entitlement.MAX_EVENTS: {FREE: 2}}) == 1
+    assert publish_overrides({'MAX_EVENTS': {'FREE': 4}}) == 2
+
+    assert json.loads(redis.get(OVERRIDES_KEY)) == {'MAX_EVENTS': {'FREE': 4}}
+    assert current_table().version == 2 and current_table().get(FREE, Entitlement.MAX_EVENTS) == 4
+
+    # A process still on the built-in ladder, due for its refresh.
+    with mock.patch.object(entitlements, '_table', compile_ladder()), \
+            mock.patch.object(entitlements, '_next_refresh', 0.0):
+        assert current_table().get(FREE, Entitlement.MAX_EVENTS) == 4
+
+
+def test_invalid_overrides_are_not_published(redis):
+    with pytest.raises(ValueError):
+        publish_overrides({'MAX_EVENTS': {'FREE': -1}})
+
+    assert redis.get(VERSION_KEY) is None
+    assert current_table().version == 0
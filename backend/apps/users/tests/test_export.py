@@ -0,0 +1,147 @@
+import io
+import json
+import zipfile
+from itertools import count
+from unittest import mock
+
+import pytest
+
+from apps.matching.models import Swipe
+from apps.users import export as export_module
+from apps.users.export import COMPOSE_LIMIT, ExportBuilder
+from apps.users.models import DataExport, User
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+
+    @property
+    def size(self):
+        return len(self.bucket.objects[self.name])
+
+    def open(self, mode, chunk_size=None, ignore_flush=False):
+        if mode == 'rb':
+            return io.BytesIO(self.bucket.objects[self.name])
+        blob = self
+
+        class Upload(io.BytesIO):
+            def close(self):
+                blob.bucket.objects[blob.name] = self.getvalue()
+                super().close()
+
+        return Upload()
+
+    def compose(self, sources):
+        self.bucket.composed.append(len(sources))
+        assert len(sources) <= COMPOSE_LIMIT
+        self.bucket.objects[self.name] = b''.join(self.bucket.objects[s.name] for s in sources)
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.composed = []
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix, start_offset=None, max_results=None):
+        names = sorted(n for n in self.objects if n.startswith(prefix) and (start_offset is None or n >= start_offset))
+        return iter([FakeBlob(self, n) for n in names[:max_results]])
+
+
+class FakeStorage:
+    def __init__(self):
+        self.buckets = {}
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket())
+
+
+@pytest.fixture
+def storage(settings):
+    settings.DATA_EXPORT_BUCKET = 'exports'
+    settings.USER_PHOTOS_BUCKET = 'photos'
+    settings.DATA_EXPORT_CHUNK_BYTES = 1024
+    return FakeStorage()
+
+
+@pytest.fixture
+def user(db, storage):
+    user = User.objects.create(username='alice')
+    targets = User.objects.bulk_create(User(username=f'target{i}') for i in range(40))
+    Swipe.objects.bulk_create(Swipe(swiper=user, target=t, direction='like') for t in targets)
+    photos = storage.bucket('photos')
+    photos.objects['profiles/alice/1.jpg'] = b'\xff\xd8' + bytes(range(256)) * 20
+    photos.objects['profiles/alice/2.jpg'] = b'\xff\xd8second'
+    photos.objects['profiles/alicea/other.jpg'] = b'not hers'
+    return user
+
+
+def build(user, storage, **kwargs):
+    """Run the builder to completion, a fresh builder per slice as the task does; returns (archive, slices)."""
+    export = DataExport.objects.create(user=user)
+    for slices in count(1):
+        export.refresh_from_db()
+        if ExportBuilder(export, client=storage, **kwargs).run():
+            break
+    export.refresh_from_db()
+    assert export.status == DataExport.Status.READY and export.progress == {}
+    data = storage.bucket('exports').objects[export.archive_name]
+    assert export.size_bytes == len(data)
+    return zipfile.ZipFile(io.BytesIO(data)), slices
+
+
+def rows(archive, section):
+    names = sorted(n for n in archive.namelist() if n.startswith(section))
+    return [json.loads(line) for name in names for line in archive.read(name).splitlines()]
+
+
+def test_composed_parts_open_as_one_zip(user, storage):
+    archive, slices = build(user, storage, rows_per_entry=15)
+
+    assert slices == 1
+    assert archive.testzip() is None
+    assert archive.namelist() == [
+        'account.jsonl', 'swipes.jsonl', 'swipes-001.jsonl', 'swipes-002.jsonl',
+        'media/profiles/alice/1.jpg', 'media/profiles/alice/2.jpg',
+    ]
+    assert [r['username'] for r in rows(archive, 'account')] == ['alice']
+    assert 'password' not in rows(archive, 'account')[0]
+    assert sorted(r['target_id'] for r in rows(archive, 'swipes')) == sorted(
+        Swipe.objects.filter(swiper=user).values_list('target_id', flat=True))
+    assert archive.read('media/profiles/alice/1.jpg') == storage.bucket('photos').objects['profiles/alice/1.jpg']
+    # Only the archive itself is left behind.
+    assert list(storage.bucket('exports').objects) == [f'exports/{user.pk}/{user.data_exports.get().pk}/'
+                                                       f'greengo-data-{user.pk}.zip']
+
+
+def test_time_sliced_run_resumes_without_duplicating_or_dropping_rows(user, storage):
+    whole, _ = build(user, storage, rows_per_entry=1)
+    clock = count()
+
+    # Every slice gets through one step before its budget runs out.
+    with mock.patch.object(export_module, 'time', mock.Mock(monotonic=lambda: next(clock))):
+        sliced, slices = build(user, storage, rows_per_entry=1, time_budget=1)
+
+    assert slices > 40
+    assert sliced.testzip() is None
+    assert sliced.namelist() == whole.namelist()
+    assert rows(sliced, 'swipes') == rows(whole, 'swipes')
+    assert len({r['id'] for r in rows(sliced, 'swipes')}) == 40
+
+
+def test_more_than_32_parts_are_composed_in_levels(user, storage):
+    archive, _ = build(user, storage, rows_per_entry=1)
+
+    # 1 account + 40 swipes + 2 media entries, plus the central directory.
+    assert len(archive.namelist()) == 43
+    assert archive.testzip() is None
+    assert storage.bucket('exports').composed == [32, 12, 2]
+    assert len(storage.bucket('exports').objects) == 1
@@ -0,0 +1,126 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+import pytest
+
+from apps.core.firebase import get_firestore_client
+from apps.core.models import JobCheckpoint
+from apps.notifications.models import Notification
+from apps.users import referrals
+from apps.users.models import Referral, User
+
+REDEEMED_AT = datetime(2026, 10, 1, 12, tzinfo=dt_timezone.utc)
+
+
+@pytest.fixture
+def users(db):
+    return {name: User.objects.create(username=name) for name in ('alice', 'bob', 'carol', 'dave')}
+
+
+def claim(uid, referrer, minutes=0, pending=True):
+    data = {'redeemedCode': f'{referrer.upper()}1', 'redeemedFrom': referrer,
+            'redeemedAt': REDEEMED_AT + timedelta(minutes=minutes)}
+    if pending:
+        data['referrerRewardPending'] = True
+    return mock.Mock(id=uid, to_dict=mock.Mock(return_value=data))
+
+
+def firestore(docs):
+    query = mock.MagicMock()
+    query.where.return_value = query
+    query.select.return_value = query
+    query.stream.side_effect = lambda: iter(docs)
+    client = mock.Mock()
+    client.collection.return_value.order_by.return_value = query
+    return client
+
+
+def test_sync_copies_claims_and_keeps_pre_cutover_ones_as_legacy(users):
+    client = firestore([claim('carol', 'alice', pending=False), claim('bob', 'alice', 5), claim('eve', 'alice', 6)])
+
+    assert referrals.sync_redemptions(client=client, batch_size=2) == 2
+
+    rows = {r.referred.username: r for r in Referral.objects.select_related('referred')}
+    assert rows.keys() == {'bob', 'carol'}
+    assert rows['carol'].status == Referral.Status.LEGACY
+    assert rows['carol'].processed_at == REDEEMED_AT
+    assert rows['bob'].status == Referral.Status.PENDING
+    assert rows['bob'].created_at == REDEEMED_AT + timedelta(minutes=5)
+    assert JobCheckpoint.load(referrals.SYNC_CHECKPOINT) == {'since': (REDEEMED_AT + timedelta(minutes=6)).isoformat()}
+
+
+def test_sync_resumes_from_the_checkpoint_without_duplicates(users):
+    client = firestore([claim('bob', 'alice')])
+    referrals.sync_redemptions(client=client)
+
+    assert referrals.sync_redemptions(client=client) == 0
+
+    query = client.collection.return_value.order_by.return_value
+    assert query.where.call_args.kwargs['filter'].value == REDEEMED_AT
+    assert Referral.objects.count() == 1
+
+
+@pytest.fixture
+def rewarded(users):
+    alice, bob, carol, dave = users.values()
+    rows = [
+        Referral.objects.create(referrer=alice, referred=bob, code='A', status=Referral.Status.REWARDED, reward_coins=100),
+        Referral.objects.create(referrer=alice, referred=carol, code='A', status=Referral.Status.REWARDED, reward_coins=100),
+        Referral.objects.create(referrer=bob, referred=dave, code='B', status=Referral.Status.REWARDED, reward_coins=100),
+    ]
+    return users, rows
+
+
+def test_attribution_alone_does_not_tell_anyone_they_earned_coins(users):
+    alice, bob = users['alice'], users['bob']
+    Referral.objects.create(referrer=alice, referred=bob, code='A')
+
+    result = referrals.attribute_rewards(graph=referrals.ReferralGraph.load())
+
+    assert result.rewarded == 1
+    assert not Notification.objects.exists()
+
+
+def test_grant_credits_each_referrer_once_and_notifies_after_the_credit(rewarded):
+    users, rows = rewarded
+
+    def credit(client, uid, referrals, now):
+        if uid == 'bob':
+            raise RuntimeError('Firestore unavailable')
+
+    with mock.patch.object(referrals, 'credit_coins', side_effect=credit) as credit_coins:
+        assert referrals.grant_rewards(client=mock.Mock()) == 2
+
+    assert {call.args[1]: [row['id'] for row in call.args[2]] for call in credit_coins.call_args_list} == {
+        'alice': [rows[0].id, rows[1].id], 'bob': [rows[2].id],
+    }
+    assert list(Referral.objects.filter(granted_at__isnull=False).order_by('id')) == rows[:2]
+    notification = Notification.objects.get()
+    assert (notification.user, notification.data['coins']) == (users['alice'], 200)
+
+    with mock.patch.object(referrals, 'credit_coins') as credit_coins:
+        assert referrals.grant_rewards(client=mock.Mock()) == 1
+    assert credit_coins.call_args.args[1] == 'bob'
+
+
+@pytest.mark.skipif(not os.environ.get('FIRESTORE_EMULATOR_HOST'), reason='needs the Firestore emulator')
+def test_credit_is_idempotent_per_referral(rewarded):
+    users, rows = rewarded
+    client = get_firestore_client()
+    uid = f'referrer_{rows[0].id}'
+    batch = list(Referral.objects.filter(id__in=[rows[0].id, rows[1].id]).values(
+        'id', 'reward_coins', 'code', 'referred__username',
+    ))
+    now = datetime.now(dt_timezone.utc)
+
+    referrals.credit_coins(client, uid, batch[:1], now)
+    referrals.credit_coins(client, uid, batch, now)
+
+    balance = client.collection('coinBalances').document(uid).get().to_dict()
+    assert (balance['totalCoins'], balance['earnedCoins'], len(balance['coinBatches'])) == (200, 200, 2)
+    assert client.collection('referrals').document(uid).get().to_dict() == {'invitedCount': 2, 'coinsEarned': 200}
+    for row in batch:
+        client.collection('coinTransactions').document(f'referral_{row["id"]}').delete()
+    client.collection('coinBalances').document(uid).delete()
+    client.collection('referrals').document(uid).delete()
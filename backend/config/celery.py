@@ -0,0 +1,13 @@
+"""
+Celery application for GreenGoChat.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('greengo')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -36,10 +36,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third-party apps
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'drf_spectacular',
     'django_filters',
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
     'django_celery_results',
 
     # Local apps
+    'apps.core',
     'apps.authentication',
     'apps.users',
     'apps.profiles',
@@ -56,6 +59,7 @@ INSTALLED_APPS = [
     'apps.messaging',
     'apps.payments',
     'apps.notifications',
+    'apps.events',
     'apps.analytics',
     'apps.moderation',
 ]
@@ -68,6 +72,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.middleware.GeoIPMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -186,7 +191,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -209,8 +214,8 @@ REST_FRAMEWORK = {
     ],
     'EXCEPTION_HANDLER': 'apps.core.exceptions.custom_exception_handler',
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'apps.core.throttling.AnonRateThrottle',
+        'apps.core.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -218,6 +223,14 @@ REST_FRAMEWORK = {
     }
 }
 
+# Per-tier overrides of DEFAULT_THROTTLE_RATES, e.g. {'user': {'GOLD': '5000/hour'}}
+THROTTLE_TIER_RATES = {}
+# Tokens a worker leases from Redis at once: at most THROTTLE_LEASE_SIZE and
+# at most 1/THROTTLE_LEASE_DIVISOR of the limit, valid for THROTTLE_LEASE_SECONDS.
+THROTTLE_LEASE_SIZE = env.int('THROTTLE_LEASE_SIZE', default=20)
+THROTTLE_LEASE_DIVISOR = env.int('THROTTLE_LEASE_DIVISOR', default=20)
+THROTTLE_LEASE_SECONDS = env.int('THROTTLE_LEASE_SECONDS', default=10)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=env.int('JWT_ACCESS_TOKEN_LIFETIME_MINUTES', default=60)),
@@ -234,6 +247,13 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Verified-claims / user caching in CachedJWTAuthentication
+JWT_CLAIMS_CACHE_SIZE = env.int('JWT_CLAIMS_CACHE_SIZE', default=50000)
+JWT_USER_CACHE_SECONDS = env.int('JWT_USER_CACHE_SECONDS', default=30)
+# How long another process may keep accepting a revoked access token.
+JWT_REVOCATION_SYNC_SECONDS = env.int('JWT_REVOCATION_SYNC_SECONDS', default=5)
+JWT_REVOCATION_REBUILD_SECONDS = env.int('JWT_REVOCATION_REBUILD_SECONDS', default=3600)
+
 # CORS
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[])
 CORS_ALLOW_CREDENTIALS = True
@@ -260,6 +280,62 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Seeded into the DatabaseScheduler tables on beat startup; edit in admin after.
+CELERY_BEAT_SCHEDULE = {
+    'sweep-expired-subscriptions': {
+        'task': 'apps.payments.tasks.sweep_expired_subscriptions',
+        'schedule': timedelta(minutes=15),
+    },
+    'dispatch-notifications': {
+        'task': 'apps.notifications.tasks.dispatch_notifications',
+        'schedule': timedelta(seconds=10),
+    },
+    'create-pending-matches': {
+        'task': 'apps.matching.tasks.create_pending_matches',
+        'schedule': timedelta(seconds=5),
+    },
+    'rebuild-seen-filters': {
+        'task': 'apps.matching.tasks.rebuild_seen_filters',
+        'schedule': timedelta(days=1),
+    },
+    'schedule-discovery-queues': {
+        'task': 'apps.matching.tasks.schedule_discovery_queues',
+        'schedule': timedelta(minutes=1),
+    },
+    'rebuild-ann-index': {
+        'task': 'apps.matching.tasks.rebuild_ann_index',
+        'schedule': timedelta(hours=6),
+    },
+    'update-interaction-model': {
+        'task': 'apps.matching.tasks.update_interaction_model',
+        'schedule': timedelta(minutes=10),
+    },
+    'refit-interaction-model': {
+        'task': 'apps.matching.tasks.update_interaction_model',
+        'schedule': timedelta(days=1),
+        'kwargs': {'full': True},
+    },
+    'ingest-external-events': {
+        'task': 'apps.events.tasks.ingest_external_events',
+        'schedule': timedelta(hours=12),
+    },
+    'resume-account-deletions': {
+        'task': 'apps.users.tasks.resume_account_deletions',
+        'schedule': timedelta(minutes=15),
+    },
+    'attribute-referral-rewards': {
+        'task': 'apps.users.tasks.attribute_referral_rewards',
+        'schedule': timedelta(hours=1),
+    },
+    'fold-sharded-counters': {
+        'task': 'apps.core.tasks.fold_sharded_counters',
+        'schedule': timedelta(seconds=10),
+    },
+    'flush-access-token-revocations': {
+        'task': 'apps.authentication.tasks.flush_access_token_revocations',
+        'schedule': timedelta(days=1),
+    },
+}
 
 # Email Configuration
 EMAIL_BACKEND = 'sendgrid_backend.SendgridBackend'
@@ -271,6 +347,29 @@ TWILIO_ACCOUNT_SID = env('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = env('TWILIO_AUTH_TOKEN', default='')
 TWILIO_PHONE_NUMBER = env('TWILIO_PHONE_NUMBER', default='')
 
+# Notification dispatch (apps.notifications.dispatcher)
+NOTIFICATION_STUB_TRANSPORTS = env.bool('NOTIFICATION_STUB_TRANSPORTS', default=DEBUG)
+NOTIFICATION_TRANSPORTS = {
+    'push': 'apps.notifications.transports.FCMTransport',
+    'email': 'apps.notifications.transports.SendGridTransport',
+    'sms': 'apps.notifications.transports.TwilioTransport',
+}
+# Messages per second, per worker process.
+NOTIFICATION_RATE_LIMITS = {
+    'push': env.int('NOTIFICATION_PUSH_RATE', default=500),
+    'email': env.int('NOTIFICATION_EMAIL_RATE', default=100),
+    'sms': env.int('NOTIFICATION_SMS_RATE', default=10),
+}
+NOTIFICATION_DISPATCH_BATCH_SIZE = env.int('NOTIFICATION_DISPATCH_BATCH_SIZE', default=2000)
+# Rows left 'sending' this long belong to a killed worker and go back to pending.
+# No claim outlives the dispatch task, so the task's hard time limit is a safe floor.
+NOTIFICATION_CLAIM_TIMEOUT_SECONDS = env.int('NOTIFICATION_CLAIM_TIMEOUT_SECONDS', default=CELERY_TASK_TIME_LIMIT)
+
+# GeoIP (apps.core.geoip)
+GEOIP_CITY_DATABASE = env('GEOIP_CITY_DATABASE', default=str(BASE_DIR / 'var' / 'geoip' / 'GeoLite2-City.mmdb'))
+# Only enable behind a proxy that overwrites X-Forwarded-For.
+GEOIP_TRUST_FORWARDED_FOR = env.bool('GEOIP_TRUST_FORWARDED_FOR', default=False)
+
 # Stripe
 STRIPE_PUBLISHABLE_KEY = env('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = env('STRIPE_SECRET_KEY', default='')
@@ -378,3 +477,124 @@ GOLD_DAILY_LIKES_LIMIT = env.int('GOLD_DAILY_LIKES_LIMIT', default=999999)
 MAX_PROFILE_PHOTOS = env.int('MAX_PROFILE_PHOTOS', default=9)
 MAX_BIO_LENGTH = env.int('MAX_BIO_LENGTH', default=500)
 MAX_MESSAGE_LENGTH = env.int('MAX_MESSAGE_LENGTH', default=1000)
+
+# Subscription expiry sweep
+SUBSCRIPTION_SWEEP_BATCH_SIZE = env.int('SUBSCRIPTION_SWEEP_BATCH_SIZE', default=1000)
+
+# One-shot timers (apps.core.timers)
+TIMER_WHEEL_TICK_SECONDS = env.float('TIMER_WHEEL_TICK_SECONDS', default=1.0)
+TIMER_WHEEL_LOOKAHEAD_SECONDS = env.int('TIMER_WHEEL_LOOKAHEAD_SECONDS', default=60)
+TIMER_DISPATCH_BATCH_SIZE = env.int('TIMER_DISPATCH_BATCH_SIZE', default=500)
+# A claimed timer not acked within this long is assumed lost with its scheduler and re-queued.
+TIMER_CLAIM_TIMEOUT_SECONDS = env.int('TIMER_CLAIM_TIMEOUT_SECONDS', default=60)
+# A callback that fails inside a fire_timers batch is re-sent as its own task after this delay.
+TIMER_RETRY_SECONDS = env.int('TIMER_RETRY_SECONDS', default=60)
+
+# Discovery "already seen" filters (apps.matching.seen)
+SEEN_FILTER_INITIAL_CAPACITY = env.int('SEEN_FILTER_INITIAL_CAPACITY', default=1000)
+SEEN_FILTER_ERROR_RATE = env.float('SEEN_FILTER_ERROR_RATE', default=0.01)
+SEEN_FILTER_TTL_DAYS = env.int('SEEN_FILTER_TTL_DAYS', default=30)
+
+# Precomputed discovery queues (apps.matching.discovery)
+DISCOVERY_QUEUE_SIZE = env.int('DISCOVERY_QUEUE_SIZE', default=200)
+DISCOVERY_POOL_SIZE = env.int('DISCOVERY_POOL_SIZE', default=2000)
+DISCOVERY_QUEUE_MAX_AGE_MINUTES = env.int('DISCOVERY_QUEUE_MAX_AGE_MINUTES', default=360)
+DISCOVERY_ACTIVE_DAYS = env.int('DISCOVERY_ACTIVE_DAYS', default=30)
+DISCOVERY_SHARD_SIZE = env.int('DISCOVERY_SHARD_SIZE', default=500)
+# How long a scheduled user is skipped if their shard never reports back.
+DISCOVERY_LEASE_SECONDS = env.int('DISCOVERY_LEASE_SECONDS', default=900)
+
+# User-similarity ANN index (apps.matching.ann)
+# Written by the rebuild task and read by every web process: must be shared storage.
+ANN_INDEX_DIR = env('ANN_INDEX_DIR', default=str(BASE_DIR / 'var' / 'ann'))
+ANN_VECTOR_DIM = env.int('ANN_VECTOR_DIM', default=64)
+ANN_NPROBE = env.int('ANN_NPROBE', default=8)
+ANN_REFRESH_SECONDS = env.int('ANN_REFRESH_SECONDS', default=60)
+# Vectors updated since the build that each process overlays; above this it requests a rebuild.
+ANN_MAX_DELTA = env.int('ANN_MAX_DELTA', default=50000)
+
+# Collaborative-filtering model (apps.matching.interactions); the directory
+# holds the model state for every worker, so it must be shared storage.
+INTERACTION_MODEL_DIR = env('INTERACTION_MODEL_DIR', default=str(BASE_DIR / 'var' / 'interactions'))
+INTERACTION_ALS_ITERATIONS = env.int('INTERACTION_ALS_ITERATIONS', default=10)
+
+# Local reverse geocoding (apps.profiles.geocoding)
+CITY_INDEX_TTL_SECONDS = env.int('CITY_INDEX_TTL_SECONDS', default=24 * 3600)
+REVERSE_GEOCODE_MAX_KM = env.float('REVERSE_GEOCODE_MAX_KM', default=50)
+
+# Profile search (apps.profiles.search)
+# Typo tolerance of the ``%>`` name matches; set per query with SET LOCAL.
+PROFILE_SEARCH_TRIGRAM_THRESHOLD = env.float('PROFILE_SEARCH_TRIGRAM_THRESHOLD', default=0.4)
+
+# External event ingestion (apps.events.ingest)
+# Provider -> JSON Lines feed location, e.g. viator=https://.../viator.jsonl.gz
+EXTERNAL_EVENT_FEEDS = env.dict('EXTERNAL_EVENT_FEEDS', default={})
+EXTERNAL_EVENTS_BATCH_SIZE = env.int('EXTERNAL_EVENTS_BATCH_SIZE', default=1000)
+EXTERNAL_EVENTS_WORKERS = env.int('EXTERNAL_EVENTS_WORKERS', default=4)
+EXTERNAL_EVENTS_QUEUE_DEPTH = env.int('EXTERNAL_EVENTS_QUEUE_DEPTH', default=2)
+
+# Firestore bulk writes (apps.core.firestore_writer)
+FIRESTORE_BULK_MAX_WORKERS = env.int('FIRESTORE_BULK_MAX_WORKERS', default=16)
+FIRESTORE_BULK_MAX_ATTEMPTS = env.int('FIRESTORE_BULK_MAX_ATTEMPTS', default=8)
+FIRESTORE_BULK_INITIAL_OPS_PER_SECOND = env.int('FIRESTORE_BULK_INITIAL_OPS_PER_SECOND', default=500)
+FIRESTORE_BULK_MAX_OPS_PER_SECOND = env.int('FIRESTORE_BULK_MAX_OPS_PER_SECOND', default=10_000)
+
+# Partitioned Firestore scans (apps.core.firestore_scan)
+FIRESTORE_SCAN_WORKERS = env.int('FIRESTORE_SCAN_WORKERS', default=16)
+FIRESTORE_SCAN_PAGE_SIZE = env.int('FIRESTORE_SCAN_PAGE_SIZE', default=1000)
+
+# Pub/Sub consumers (apps.core.pubsub); run with manage.py run_pubsub_consumer <name>
+PUBSUB_PROJECT_ID = env('PUBSUB_PROJECT_ID', default=GCP_PROJECT_ID)
+PUBSUB_CONSUMERS = {
+    'external-events': 'apps.events.consumers.ExternalEventConsumer',
+    'counter-increments': 'apps.core.consumers.CounterConsumer',
+}
+
+# GDPR data exports (apps.users.export)
+DATA_EXPORT_BUCKET = env('DATA_EXPORT_BUCKET', default=USER_PHOTOS_BUCKET)
+DATA_EXPORT_PREFIX = env('DATA_EXPORT_PREFIX', default='exports/')
+# Storage prefixes holding a user's media; {username} is substituted.
+DATA_EXPORT_MEDIA_PREFIXES = env.list(
+    'DATA_EXPORT_MEDIA_PREFIXES',
+    default=['profiles/{username}/', 'video_profiles/{username}/', 'voice_intros/{username}/'],
+)
+DATA_EXPORT_ROWS_PER_ENTRY = env.int('DATA_EXPORT_ROWS_PER_ENTRY', default=100_000)
+DATA_EXPORT_CHUNK_BYTES = env.int('DATA_EXPORT_CHUNK_BYTES', default=8 * 1024 * 1024)
+DATA_EXPORT_SLICE_SECONDS = env.int('DATA_EXPORT_SLICE_SECONDS', default=10 * 60)
+DATA_EXPORT_LINK_HOURS = env.int('DATA_EXPORT_LINK_HOURS', default=72)
+
+# Account deletion (apps.users.deletion)
+ACCOUNT_DELETION_BATCH_SIZE = env.int('ACCOUNT_DELETION_BATCH_SIZE', default=500)
+ACCOUNT_DELETION_ROWS_PER_SECOND = env.int('ACCOUNT_DELETION_ROWS_PER_SECOND', default=5000)
+ACCOUNT_DELETION_LOCK_TIMEOUT_MS = env.int('ACCOUNT_DELETION_LOCK_TIMEOUT_MS', default=2000)
+ACCOUNT_DELETION_SLICE_SECONDS = env.int('ACCOUNT_DELETION_SLICE_SECONDS', default=5 * 60)
+ACCOUNT_DELETION_STALE_SECONDS = env.int('ACCOUNT_DELETION_STALE_SECONDS', default=60 * 60)
+
+# Bulk imports (apps.core.bulk_import)
+BULK_IMPORT_CHUNK_ROWS = env.int('BULK_IMPORT_CHUNK_ROWS', default=50_000)
+BULK_IMPORT_MAX_REPORTED_ERRORS = env.int('BULK_IMPORT_MAX_REPORTED_ERRORS', default=1000)
+
+# Admin for large tables (apps.core.admin)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100_000)
+
+# Tier entitlements (apps.users.entitlements)
+ENTITLEMENTS_REFRESH_SECONDS = env.int('ENTITLEMENTS_REFRESH_SECONDS', default=30)
+ENTITLEMENTS_USAGE_BATCH_SIZE = env.int('ENTITLEMENTS_USAGE_BATCH_SIZE', default=500)
+
+# Feature flags (apps.core.flags)
+FEATURE_FLAGS_RESYNC_SECONDS = env.int('FEATURE_FLAGS_RESYNC_SECONDS', default=60)
+FEATURE_FLAGS_FLUSH_SECONDS = env.int('FEATURE_FLAGS_FLUSH_SECONDS', default=60)
+
+# Referral rewards (apps.users.referrals)
+REFERRAL_REWARD_COINS = env.int('REFERRAL_REWARD_COINS', default=100)
+REFERRAL_MONTHLY_CAP_COINS = env.int('REFERRAL_MONTHLY_CAP_COINS', default=1000)
+REFERRAL_BATCH_SIZE = env.int('REFERRAL_BATCH_SIZE', default=5000)
+# A referrer with this many signups inside the window is treated as a farm.
+REFERRAL_FAN_OUT_LIMIT = env.int('REFERRAL_FAN_OUT_LIMIT', default=20)
+REFERRAL_FAN_OUT_WINDOW_HOURS = env.int('REFERRAL_FAN_OUT_WINDOW_HOURS', default=24)
+
+# Sharded counters (apps.core.counters)
+# Only ever raise this: deltas left in a dropped shard are never folded.
+COUNTER_SHARDS = env.int('COUNTER_SHARDS', default=16)
+COUNTER_DEDUPE_SECONDS = env.int('COUNTER_DEDUPE_SECONDS', default=24 * 60 * 60)
+COUNTER_MIRROR_FIRESTORE = env.bool('COUNTER_MIRROR_FIRESTORE', default=True)
@@ -0,0 +1,34 @@
+"""
+Settings for the pytest suite (``pytest.ini``).
+
+Postgres is still required: several apps use ArrayField, COPY and partial
+indexes. Redis is replaced by an in-process fakeredis server with Lua
+support, so the cache, the locks and every ``get_redis_connection()`` user
+share one server. Tests get a flushed server each (see ``conftest.py``).
+"""
+
+import fakeredis
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES
+
+FAKE_REDIS_SERVER = fakeredis.FakeServer()
+
+CACHES = {
+    **CACHES,
+    'default': {
+        **CACHES['default'],
+        'LOCATION': 'redis://fakeredis:6379/0',
+        'OPTIONS': {
+            **CACHES['default']['OPTIONS'],
+            'CONNECTION_POOL_KWARGS': {
+                'connection_class': fakeredis.FakeConnection,
+                'server': FAKE_REDIS_SERVER,
+            },
+        },
+    },
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
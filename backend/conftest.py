@@ -0,0 +1,16 @@
+import pytest
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+@pytest.fixture(autouse=True)
+def _flush_fake_redis():
+    """Every test starts from an empty, reachable Redis (fakeredis, see config.settings_test)."""
+    yield
+    settings.FAKE_REDIS_SERVER.connected = True
+    get_redis_connection('default').flushall()
+
+
+@pytest.fixture
+def redis():
+    return get_redis_connection('default')
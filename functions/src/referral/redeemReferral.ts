@@ -5,17 +5,20 @@
  *  - Resolves the code owner; rejects self-referral and a user redeeming more
  *    than one code (single-redemption guard on referrals/{newUid}).
  *  - ALWAYS grants the NEW user 1 month of Platinum.
- *  - Credits the REFERRER +100 coins, enforcing a 1000-coins/month cap per
- *    referrer via referralMonthlyGrants/{ownerId}_{yyyymm}.
  *
- * The single-redemption claim and the monthly-cap increment are each done in a
- * transaction so concurrent redemptions can't double-grant or exceed the cap.
+ * The REFERRER's coins are not credited here. The claim is flagged
+ * referrerRewardPending; the backend's hourly referral job (apps.users.referrals)
+ * syncs it, screens it against the whole referral graph for rings and farms,
+ * applies the monthly cap and credits the coins.
+ *
+ * The single-redemption claim is done in a transaction so concurrent
+ * redemptions can't claim twice.
  */
 
 import { onCall, HttpsError, CallableRequest } from 'firebase-functions/v2/https';
 import * as admin from 'firebase-admin';
 import { db, logInfo, logError } from '../shared/utils';
-import { grantCoins, grantMembership } from '../shared/grants';
+import { grantMembership } from '../shared/grants';
 import { monitored } from '../shared/monitoring';
 
 interface RedeemReferralRequest {
@@ -24,12 +27,9 @@ interface RedeemReferralRequest {
 
 interface RedeemReferralResponse {
   ok: true;
-  referrerCredited: boolean;
   membershipGranted: boolean;
 }
 
-const REFERRER_COIN_REWARD = 100;
-const REFERRER_MONTHLY_CAP = 1000;
 const PLATINUM_DURATION_MS = 30 * 24 * 60 * 60 * 1000; // 1 month
 
 export const redeemReferral = onCall<RedeemReferralRequest>(
@@ -69,6 +69,7 @@ export const redeemReferral = onCall<RedeemReferralRequest>(
           redeemedCode: code,
           redeemedFrom: owner,
           redeemedAt: admin.firestore.FieldValue.serverTimestamp(),
+          referrerRewardPending: true,
         }, { merge: true });
         return owner;
       });
@@ -87,44 +88,7 @@ export const redeemReferral = onCall<RedeemReferralRequest>(
       logError('redeemReferral: grantMembership failed', e as any);
     }
 
-    // 3) The REFERRER earns +100 coins, capped at 1000/month.
-    let referrerCredited = false;
-    try {
-      const now = new Date();
-      const period = `${now.getUTCFullYear()}${String(now.getUTCMonth() + 1).padStart(2, '0')}`;
-      const capRef = db.collection('referralMonthlyGrants').doc(`${ownerId}_${period}`);
-
-      const underCap = await db.runTransaction(async (tx) => {
-        const snap = await tx.get(capRef);
-        const already = snap.exists ? ((snap.data() as any).coins || 0) : 0;
-        if (already + REFERRER_COIN_REWARD > REFERRER_MONTHLY_CAP) {
-          return false;
-        }
-        tx.set(capRef, {
-          ownerId,
-          period,
-          coins: already + REFERRER_COIN_REWARD,
-          updatedAt: admin.firestore.FieldValue.serverTimestamp(),
-        }, { merge: true });
-        return true;
-      });
-
-      if (underCap) {
-        await grantCoins(ownerId, REFERRER_COIN_REWARD, 'reward', 'referralBonus', {
-          referredUser: newUid,
-          code,
-        });
-        await db.collection('referrals').doc(ownerId).set({
-          invitedCount: admin.firestore.FieldValue.increment(1),
-          coinsEarned: admin.firestore.FieldValue.increment(REFERRER_COIN_REWARD),
-        }, { merge: true });
-        referrerCredited = true;
-      }
-    } catch (e) {
-      logError('redeemReferral: referrer credit failed', e as any);
-    }
-
-    logInfo(`redeemReferral newUid=${newUid} owner=${ownerId} membership=${membershipGranted} coins=${referrerCredited}`);
-    return { ok: true, referrerCredited, membershipGranted };
+    logInfo(`redeemReferral newUid=${newUid} owner=${ownerId} membership=${membershipGranted}`);
+    return { ok: true, membershipGranted };
   }),
 );